@@ -636,6 +636,10 @@ parameters:
   - name: --overwrite-existing
     type: bool
     short-summary: Overwrite any existing cluster entry with the same name.
+  - name: --all
+    type: bool
+    short-summary: Get access credentials for all the managed clusters in the resource group.
+    long-summary: The credentials of all the clusters are merged before the Kubernetes configuration file is written.
   - name: --output -o
     type: string
     long-summary: Credentials are always in YAML format, so this argument is effectively ignored.
@@ -643,6 +647,8 @@ examples:
   - name: Get access credentials for a managed Kubernetes cluster. (autogenerated)
     text: az aks get-credentials --name MyManagedCluster --resource-group MyResourceGroup
     crafted: true
+  - name: Get access credentials for all the managed Kubernetes clusters of a resource group.
+    text: az aks get-credentials --all --resource-group MyResourceGroup
 """
 
 helps['aks rotate-certs'] = """
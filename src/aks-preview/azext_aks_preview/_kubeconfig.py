@@ -0,0 +1,154 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import errno
+import os
+import platform
+import shutil
+import stat
+import tempfile
+
+import yaml  # pylint: disable=import-error
+from knack.log import get_logger
+from knack.prompting import prompt_y_n, NoTTYException
+from knack.util import CLIError
+
+try:
+    # the C implementations are much faster on kubeconfig files with many clusters
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper  # pylint: disable=import-error
+except ImportError:
+    from yaml import SafeLoader, SafeDumper  # pylint: disable=import-error
+
+logger = get_logger(__name__)
+
+KUBECONFIG_SECTIONS = ('clusters', 'users', 'contexts')
+
+
+def parse_kubernetes_configuration(stream, source):
+    try:
+        return yaml.load(stream, Loader=SafeLoader)
+    except (yaml.parser.ParserError, UnicodeDecodeError) as ex:
+        raise CLIError('Error parsing {} ({})'.format(source, str(ex)))
+
+
+def load_kubernetes_configuration(filename):
+    try:
+        with open(filename) as stream:
+            return parse_kubernetes_configuration(stream, filename)
+    except (IOError, OSError) as ex:
+        if getattr(ex, 'errno', 0) == errno.ENOENT:
+            raise CLIError('{} does not exist'.format(filename))
+        raise
+
+
+class KubeConfig(object):
+    """
+    A kubeconfig file whose clusters, users and contexts are indexed by name, so that any number of
+    kubeconfigs can be merged into it without scanning its entries, before it is written once.
+    """
+
+    def __init__(self, path, config=None):
+        self.path = path
+        self.config = config
+        # section => name => position of the entry in the section
+        self.indexes = {}
+        self._build_indexes()
+
+    @classmethod
+    def load(cls, path):
+        return cls(path, load_kubernetes_configuration(path))
+
+    def merge(self, addition, replace, context_name=None):
+        """ Merges a kubeconfig into this one, returns the name of the context it adds """
+        if addition is None:
+            raise CLIError('failed to load additional configuration')
+
+        if context_name is not None:
+            addition['contexts'][0]['name'] = context_name
+            addition['contexts'][0]['context']['cluster'] = context_name
+            addition['clusters'][0]['name'] = context_name
+            addition['current-context'] = context_name
+
+        # rename the admin context so it doesn't overwrite the user context
+        for ctx in addition.get('contexts', []):
+            try:
+                if ctx['context']['user'].startswith('clusterAdmin'):
+                    admin_name = ctx['name'] + '-admin'
+                    addition['current-context'] = ctx['name'] = admin_name
+                    break
+            except (KeyError, TypeError):
+                continue
+
+        if self.config is None:
+            self.config = addition
+            self._build_indexes()
+        else:
+            for key in KUBECONFIG_SECTIONS:
+                self._merge_section(addition, key, replace)
+            self.config['current-context'] = addition['current-context']
+
+        return addition.get('current-context', 'UNKNOWN')
+
+    def save(self):
+        """ Writes the kubeconfig to a temporary file next to it, then renames the temporary file over it """
+        # write through symbolic links instead of replacing them
+        path = os.path.realpath(self.path)
+        self._check_permissions(path)
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.{}.'.format(os.path.basename(path)))
+        try:
+            with os.fdopen(fd, 'w') as stream:
+                yaml.dump(self.config, stream, Dumper=SafeDumper, default_flow_style=False)
+            if os.path.exists(path):
+                shutil.copymode(path, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _merge_section(self, addition, key, replace):
+        if not addition.get(key):
+            return
+        entries = self.config.get(key)
+        if entries is None:
+            entries = self.config[key] = []
+        index = self.indexes.setdefault(key, {})
+
+        for entry in addition[key]:
+            position = index.get(entry['name'])
+            if position is None:
+                index[entry['name']] = len(entries)
+                entries.append(entry)
+                continue
+            if not replace and entries[position] != entry:
+                msg = 'A different object named {} already exists in your kubeconfig file.\nOverwrite?'
+                overwrite = False
+                try:
+                    overwrite = prompt_y_n(msg.format(entry['name']))
+                except NoTTYException:
+                    pass
+                if not overwrite:
+                    msg = 'A different object named {} already exists in {} in your kubeconfig file.'
+                    raise CLIError(msg.format(entry['name'], key))
+            entries[position] = entry
+
+    def _build_indexes(self):
+        self.indexes = {}
+        if self.config is None:
+            return
+        for key in KUBECONFIG_SECTIONS:
+            index = self.indexes[key] = {}
+            for position, entry in enumerate(self.config.get(key) or []):
+                index.setdefault(entry.get('name'), position)
+
+    @staticmethod
+    def _check_permissions(path):
+        # check that ~/.kube/config is only read- and writable by its owner
+        if platform.system() != 'Windows' and os.path.exists(path):
+            existing_file_perms = "{:o}".format(stat.S_IMODE(os.lstat(path).st_mode))
+            if not existing_file_perms.endswith('600'):
+                logger.warning('%s has permissions "%s".\nIt should be readable and writable only by its owner.',
+                               path, existing_file_perms)
@@ -170,6 +170,8 @@ def load_arguments(self, _):
         c.argument('user', options_list=['--user', '-u'], default='clusterUser', validator=validate_user)
         c.argument('path', options_list=['--file', '-f'], type=file_type, completer=FilesCompleter(),
                    default=os.path.join(os.path.expanduser('~'), '.kube', 'config'))
+        c.argument('all_clusters', options_list=['--all'], action='store_true',
+                   help='Get the credentials of all the managed clusters in the resource group.')
 
 
 def _get_default_install_location(exe_name):
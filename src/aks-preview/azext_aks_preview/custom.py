@@ -15,7 +15,6 @@ import os.path
 import platform
 import re
 import ssl
-import stat
 import subprocess
 import sys
 import tempfile
@@ -73,6 +72,7 @@ from ._client_factory import cf_container_registry_service
 from ._client_factory import cf_storage
 
 
+from ._kubeconfig import KubeConfig, parse_kubernetes_configuration
 from ._helpers import (_populate_api_server_access_profile, _set_vm_set_type,
                        _set_outbound_type, _parse_comma_separated_list,
                        _trim_fqdn_name_containing_hcp)
@@ -1278,33 +1278,57 @@ def _remove_nulls(managed_clusters):
     return managed_clusters
 
 
+# the credentials of at most this many clusters are requested at once by 'aks get-credentials --all'
+CREDENTIALS_FETCH_CONCURRENCY = 10
+
+
 def aks_get_credentials(cmd,    # pylint: disable=unused-argument
                         client,
                         resource_group_name,
-                        name,
+                        name=None,
                         admin=False,
                         user='clusterUser',
                         path=os.path.join(os.path.expanduser('~'), '.kube', 'config'),
                         overwrite_existing=False,
-                        context_name=None):
-    credentialResults = None
-    if admin:
-        credentialResults = client.list_cluster_admin_credentials(resource_group_name, name)
+                        context_name=None,
+                        all_clusters=False):
+    if all_clusters:
+        if name or context_name:
+            raise CLIError("--all cannot be used with --name or --context.")
+        names = [managed_cluster.name for managed_cluster in client.list_by_resource_group(resource_group_name)]
+        if not names:
+            raise CLIError("No managed clusters found in resource group {}.".format(resource_group_name))
+    elif name:
+        names = [name]
     else:
-        if user.lower() == 'clusteruser':
-            credentialResults = client.list_cluster_user_credentials(resource_group_name, name)
-        elif user.lower() == 'clustermonitoringuser':
-            credentialResults = client.list_cluster_monitoring_user_credentials(resource_group_name, name)
+        raise CLIError("Please specify --name or --all.")
+
+    if not admin and user.lower() not in ('clusteruser', 'clustermonitoringuser'):
+        raise CLIError("The user is invalid.")
+
+    def _get_kubeconfig(cluster_name):
+        credentialResults = None
+        if admin:
+            credentialResults = client.list_cluster_admin_credentials(resource_group_name, cluster_name)
+        elif user.lower() == 'clusteruser':
+            credentialResults = client.list_cluster_user_credentials(resource_group_name, cluster_name)
         else:
-            raise CLIError("The user is invalid.")
-    if not credentialResults:
-        raise CLIError("No Kubernetes credentials found.")
+            credentialResults = client.list_cluster_monitoring_user_credentials(resource_group_name, cluster_name)
+        if not credentialResults:
+            raise CLIError("No Kubernetes credentials found.")
+        try:
+            return credentialResults.kubeconfigs[0].value.decode(encoding='UTF-8')
+        except (IndexError, ValueError):
+            raise CLIError("Fail to find kubeconfig file.")
 
-    try:
-        kubeconfig = credentialResults.kubeconfigs[0].value.decode(encoding='UTF-8')
-        _print_or_merge_credentials(path, kubeconfig, overwrite_existing, context_name)
-    except (IndexError, ValueError):
-        raise CLIError("Fail to find kubeconfig file.")
+    if len(names) == 1:
+        kubeconfigs = [_get_kubeconfig(names[0])]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(len(names), CREDENTIALS_FETCH_CONCURRENCY)) as executor:
+            kubeconfigs = list(executor.map(_get_kubeconfig, names))
+
+    _print_or_merge_credentials(path, kubeconfigs, overwrite_existing, context_name)
 
 
 ADDONS = {
@@ -2422,13 +2446,16 @@ def aks_get_versions(cmd, client, location):    # pylint: disable=unused-argumen
     return client.list_orchestrators(location, resource_type='managedClusters')
 
 
-def _print_or_merge_credentials(path, kubeconfig, overwrite_existing, context_name):
-    """Merge an unencrypted kubeconfig into the file at the specified path, or print it to
+def _print_or_merge_credentials(path, kubeconfigs, overwrite_existing, context_name):
+    """Merge unencrypted kubeconfigs into the file at the specified path, or print them to
     stdout if the path is "-".
     """
-    # Special case for printing to stdout
+    # Special case for printing to stdout, several kubeconfigs are printed as separate YAML documents
     if path == "-":
-        print(kubeconfig)
+        for index, kubeconfig in enumerate(kubeconfigs):
+            if index:
+                print('---')
+            print(kubeconfig)
         return
 
     # ensure that at least an empty ~/.kube/config exists
@@ -2443,103 +2470,23 @@ def _print_or_merge_credentials(path, kubeconfig, overwrite_existing, context_na
         with os.fdopen(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600), 'wt'):
             pass
 
-    # merge the new kubeconfig into the existing one
-    fd, temp_path = tempfile.mkstemp()
-    additional_file = os.fdopen(fd, 'w+t')
+    # merge the new kubeconfigs into the existing one, which is written only once
     try:
-        additional_file.write(kubeconfig)
-        additional_file.flush()
-        merge_kubernetes_configurations(path, temp_path, overwrite_existing, context_name)
+        existing = KubeConfig.load(path)
+        current_contexts = []
+        for kubeconfig in kubeconfigs:
+            addition = parse_kubernetes_configuration(kubeconfig, 'the credentials')
+            current_contexts.append(existing.merge(addition, overwrite_existing, context_name))
+        existing.save()
     except yaml.YAMLError as ex:
         logger.warning('Failed to merge credentials to kube config file: %s', ex)
-    finally:
-        additional_file.close()
-        os.remove(temp_path)
-
-
-def _handle_merge(existing, addition, key, replace):
-    if not addition[key]:
-        return
-    if existing[key] is None:
-        existing[key] = addition[key]
         return
 
-    for i in addition[key]:
-        for j in existing[key]:
-            if i['name'] == j['name']:
-                if replace or i == j:
-                    existing[key].remove(j)
-                else:
-                    from knack.prompting import prompt_y_n
-                    msg = 'A different object named {} already exists in your kubeconfig file.\nOverwrite?'
-                    overwrite = False
-                    try:
-                        overwrite = prompt_y_n(msg.format(i['name']))
-                    except NoTTYException:
-                        pass
-                    if overwrite:
-                        existing[key].remove(j)
-                    else:
-                        msg = 'A different object named {} already exists in {} in your kubeconfig file.'
-                        raise CLIError(msg.format(i['name'], key))
-        existing[key].append(i)
-
-
-def load_kubernetes_configuration(filename):
-    try:
-        with open(filename) as stream:
-            return yaml.safe_load(stream)
-    except (IOError, OSError) as ex:
-        if getattr(ex, 'errno', 0) == errno.ENOENT:
-            raise CLIError('{} does not exist'.format(filename))
-    except (yaml.parser.ParserError, UnicodeDecodeError) as ex:
-        raise CLIError('Error parsing {} ({})'.format(filename, str(ex)))
-
-
-def merge_kubernetes_configurations(existing_file, addition_file, replace, context_name=None):
-    existing = load_kubernetes_configuration(existing_file)
-    addition = load_kubernetes_configuration(addition_file)
-
-    if context_name is not None:
-        addition['contexts'][0]['name'] = context_name
-        addition['contexts'][0]['context']['cluster'] = context_name
-        addition['clusters'][0]['name'] = context_name
-        addition['current-context'] = context_name
-
-    # rename the admin context so it doesn't overwrite the user context
-    for ctx in addition.get('contexts', []):
-        try:
-            if ctx['context']['user'].startswith('clusterAdmin'):
-                admin_name = ctx['name'] + '-admin'
-                addition['current-context'] = ctx['name'] = admin_name
-                break
-        except (KeyError, TypeError):
-            continue
-
-    if addition is None:
-        raise CLIError('failed to load additional configuration from {}'.format(addition_file))
-
-    if existing is None:
-        existing = addition
+    if len(current_contexts) == 1:
+        print('Merged "{}" as current context in {}'.format(current_contexts[0], path))
     else:
-        _handle_merge(existing, addition, 'clusters', replace)
-        _handle_merge(existing, addition, 'users', replace)
-        _handle_merge(existing, addition, 'contexts', replace)
-        existing['current-context'] = addition['current-context']
-
-    # check that ~/.kube/config is only read- and writable by its owner
-    if platform.system() != 'Windows':
-        existing_file_perms = "{:o}".format(stat.S_IMODE(os.lstat(existing_file).st_mode))
-        if not existing_file_perms.endswith('600'):
-            logger.warning('%s has permissions "%s".\nIt should be readable and writable only by its owner.',
-                           existing_file, existing_file_perms)
-
-    with open(existing_file, 'w+') as stream:
-        yaml.safe_dump(existing, stream, default_flow_style=False)
-
-    current_context = addition.get('current-context', 'UNKNOWN')
-    msg = 'Merged "{}" as current context in {}'.format(current_context, existing_file)
-    print(msg)
+        print('Merged {} contexts in {}, "{}" is the current context'.format(len(current_contexts), path,
+                                                                           current_contexts[-1]))
 
 
 def cloud_storage_account_service_factory(cli_ctx, kwargs):
@@ -2566,6 +2513,12 @@ def get_storage_account_from_diag_settings(cli_ctx, resource_group_name, name):
     return None
 
 
+# the diagnostic results of all the nodes are listed every few seconds until they are all available
+DIAGNOSTICS_POLL_INTERVAL = 3
+DIAGNOSTICS_MAX_POLLS = 40
+DIAGNOSTIC_NAME_PREFIX = "aks-periscope-diagnostic-"
+
+
 def display_diagnostics_report(temp_kubeconfig_path):   # pylint: disable=too-many-statements
     if not which('kubectl'):
         raise CLIError('Can not find kubectl executable in PATH')
@@ -2575,90 +2528,81 @@ def display_diagnostics_report(temp_kubeconfig_path):   # pylint: disable=too-ma
         universal_newlines=True)
     logger.debug(nodes)
     node_lines = nodes.splitlines()
-    ready_nodes = {}
+    ready_nodes = set()
     for node_line in node_lines:
         columns = node_line.split()
         logger.debug(node_line)
         if columns[1] != "Ready":
             logger.warning("Node %s is not Ready. Current state is: %s.", columns[0], columns[1])
         else:
-            ready_nodes[columns[0]] = False
+            ready_nodes.add(columns[0])
 
     logger.debug('There are %s ready nodes in the cluster', str(len(ready_nodes)))
 
     if not ready_nodes:
         logger.warning('No nodes are ready in the current cluster. Diagnostics info might not be available.')
 
-    network_config_array = []
-    network_status_array = []
-    apds_created = False
+    network_config_found = False
+    network_status_found = False
+    pending_nodes = set(ready_nodes)
 
-    max_retry = 10
-    for retry in range(0, max_retry):
-        if not apds_created:
-            apd = subprocess.check_output(
-                ["kubectl", "--kubeconfig", temp_kubeconfig_path, "get", "apd", "-n", "aks-periscope", "--no-headers"],
-                universal_newlines=True
-            )
-            apd_lines = apd.splitlines()
-            if apd_lines and 'No resources found' in apd_lines[0]:
-                apd_lines.pop(0)
-
-            print("Got {} diagnostic results for {} ready nodes{}\r".format(len(apd_lines),
-                                                                            len(ready_nodes),
-                                                                            '.' * retry), end='')
-            if len(apd_lines) < len(ready_nodes):
-                time.sleep(3)
-            else:
-                apds_created = True
+    for poll in range(0, DIAGNOSTICS_MAX_POLLS):
+        if not pending_nodes:
+            break
+        if poll:
+            time.sleep(DIAGNOSTICS_POLL_INTERVAL)
+
+        # the diagnostic results of all the nodes are fetched at once, and shown as soon as each node has one
+        try:
+            apds = json.loads(subprocess.check_output(
+                ["kubectl", "--kubeconfig", temp_kubeconfig_path, "get", "apd", "-n", "aks-periscope", "-o", "json"],
+                universal_newlines=True))
+        except subprocess.CalledProcessError as err:
+            raise CLIError(err.output)
+
+        for apd in apds.get('items', []):
+            node_name = apd.get('metadata', {}).get('name', '')[len(DIAGNOSTIC_NAME_PREFIX):]
+            if node_name not in pending_nodes:
+                continue
+            spec = apd.get('spec') or {}
+            network_config = spec.get('networkconfig')
+            network_status = spec.get('networkoutbound')
+            logger.debug('Dns status for node %s is %s', node_name, network_config)
+            logger.debug('Network status for node %s is %s', node_name, network_status)
+            if not network_config or not network_status:
+                continue
+
+            pending_nodes.discard(node_name)
+            network_config_array = json.loads('[' + network_config + ']')
+            network_status_array = format_diag_status(json.loads(network_status))
+
+            print()
+            print("Diagnostics results of node {} ({}/{}):".format(
+                format_bright(node_name), len(ready_nodes) - len(pending_nodes), len(ready_nodes)))
+            if network_config_array:
+                network_config_found = True
                 print()
-        else:
-            for node_name in ready_nodes:
-                if ready_nodes[node_name]:
-                    continue
-                apdName = "aks-periscope-diagnostic-" + node_name
-                try:
-                    network_config = subprocess.check_output(
-                        ["kubectl", "--kubeconfig", temp_kubeconfig_path,
-                         "get", "apd", apdName, "-n",
-                         "aks-periscope", "-o=jsonpath={.spec.networkconfig}"],
-                        universal_newlines=True)
-                    logger.debug('Dns status for node %s is %s', node_name, network_config)
-                    network_status = subprocess.check_output(
-                        ["kubectl", "--kubeconfig", temp_kubeconfig_path,
-                         "get", "apd", apdName, "-n",
-                         "aks-periscope", "-o=jsonpath={.spec.networkoutbound}"],
-                        universal_newlines=True)
-                    logger.debug('Network status for node %s is %s', node_name, network_status)
-
-                    if not network_config or not network_status:
-                        print("The diagnostics information for node {} is not ready yet. "
-                              "Will try again in 10 seconds.".format(node_name))
-                        time.sleep(10)
-                        break
-
-                    network_config_array += json.loads('[' + network_config + ']')
-                    network_status_object = json.loads(network_status)
-                    network_status_array += format_diag_status(network_status_object)
-                    ready_nodes[node_name] = True
-                except subprocess.CalledProcessError as err:
-                    raise CLIError(err.output)
+                print("Network configuration:")
+                print(tabulate(network_config_array, headers="keys", tablefmt='simple'))
+            if network_status_array:
+                network_status_found = True
+                print()
+                print("Network connectivity results:")
+                print(tabulate(network_status_array, headers="keys", tablefmt='simple'))
+
+        if pending_nodes:
+            print("Waiting for the diagnostic results of {} of {} ready nodes{}\r".format(
+                len(pending_nodes), len(ready_nodes), '.' * (poll + 1)), end='')
 
     print()
-    if network_config_array:
-        print("Below are the network configuration for each node: ")
-        print()
-        print(tabulate(network_config_array, headers="keys", tablefmt='simple'))
-        print()
-    else:
+    if pending_nodes:
+        logger.warning("The diagnostics information of nodes %s is not ready yet.", ', '.join(sorted(pending_nodes)))
+
+    if not network_config_found:
         logger.warning("Could not get network config. "
                        "Please run 'az aks kanalyze' command later to get the analysis results.")
 
-    if network_status_array:
-        print("Below are the network connectivity results for each node:")
-        print()
-        print(tabulate(network_status_array, headers="keys", tablefmt='simple'))
-    else:
+    if not network_status_found:
         logger.warning("Could not get networking status. "
                        "Please run 'az aks kanalyze' command later to get the analysis results.")
 
@@ -0,0 +1,83 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+import json
+import unittest
+
+import mock
+from six import StringIO
+from azext_aks_preview.custom import (display_diagnostics_report, DIAGNOSTIC_NAME_PREFIX, DIAGNOSTICS_MAX_POLLS)
+
+NODES = 'node1   Ready      agent   1d   v1.15.7\n' \
+        'node2   Ready      agent   1d   v1.15.7\n' \
+        'node3   NotReady   agent   1d   v1.15.7\n'
+
+
+def _apd(node_name, spec):
+    return {'metadata': {'name': DIAGNOSTIC_NAME_PREFIX + node_name}, 'spec': spec}
+
+
+def _results(node_name):
+    return _apd(node_name, {
+        'networkconfig': json.dumps({'HostName': node_name, 'DNSServer': '168.63.129.16'}),
+        'networkoutbound': json.dumps([{'Type': 'DNS', 'Status': 'Connected'}]),
+    })
+
+
+class TestDisplayDiagnosticsReport(unittest.TestCase):
+    def _display(self, polls):
+        """ runs the report with the diagnostic results returned by each poll, the last one is repeated """
+        apd_calls = []
+
+        def _check_output(args, **kwargs):  # pylint: disable=unused-argument
+            if 'node' in args:
+                return NODES
+            apd_calls.append(args)
+            return json.dumps({'items': polls[min(len(apd_calls), len(polls)) - 1]})
+
+        with mock.patch('azext_aks_preview.custom.which', return_value='kubectl'), \
+                mock.patch('azext_aks_preview.custom.subprocess.check_output', side_effect=_check_output), \
+                mock.patch('azext_aks_preview.custom.time.sleep') as sleep, \
+                mock.patch('azext_aks_preview.custom.logger') as logger, \
+                mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            display_diagnostics_report('kubeconfig')
+        warnings = [call[0][0] % call[0][1:] for call in logger.warning.call_args_list]
+        return len(apd_calls), sleep.call_count, stdout.getvalue(), warnings
+
+    def test_partial_results_then_complete(self):
+        polls, sleeps, output, warnings = self._display([
+            [_results('node1')],
+            [_results('node1'), _results('node2')],
+        ])
+
+        self.assertEqual((polls, sleeps), (2, 1))
+        self.assertIn('node1\x1b[0m (1/2)', output)
+        self.assertIn('node2\x1b[0m (2/2)', output)
+        self.assertEqual(output.count('Network configuration:'), 2)
+        self.assertIn('Waiting for the diagnostic results of 1 of 2 ready nodes', output)
+        self.assertEqual(warnings, ['Node node3 is not Ready. Current state is: NotReady.'])
+
+    def test_node_with_empty_spec(self):
+        polls, _, output, warnings = self._display([
+            [_results('node1'), _apd('node2', None)],
+            [_results('node1'), _apd('node2', {})],
+            [_results('node1'), _results('node2')],
+        ])
+
+        self.assertEqual(polls, 3)
+        self.assertEqual(output.count('Diagnostics results of node'), 2)
+        self.assertEqual(len(warnings), 1)
+
+    def test_results_missing_after_max_polls(self):
+        polls, sleeps, output, warnings = self._display([
+            [_results('node1'), _apd('node2', {'networkconfig': json.dumps({'HostName': 'node2'})})],
+        ])
+
+        self.assertEqual((polls, sleeps), (DIAGNOSTICS_MAX_POLLS, DIAGNOSTICS_MAX_POLLS - 1))
+        self.assertEqual(output.count('Diagnostics results of node'), 1)
+        self.assertIn('The diagnostics information of nodes node2 is not ready yet.', warnings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import yaml
+from six import StringIO
+from knack.util import CLIError
+from azext_aks_preview._kubeconfig import KubeConfig, load_kubernetes_configuration
+from azext_aks_preview.custom import _print_or_merge_credentials
+
+
+def _kubeconfig(name, user='clusterUser', server='https://server'):
+    user_name = '{}_{}'.format(user, name)
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Config',
+        'clusters': [{'name': name, 'cluster': {'server': server}}],
+        'users': [{'name': user_name, 'user': {'token': 'token'}}],
+        'contexts': [{'name': name, 'context': {'cluster': name, 'user': user_name}}],
+        'current-context': name
+    }
+
+
+class TestKubeConfig(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_merge_many_into_empty(self):
+        with open(self.path, 'w'):
+            pass
+        existing = KubeConfig.load(self.path)
+        for i in range(3):
+            existing.merge(_kubeconfig('cluster{}'.format(i)), replace=False)
+        existing.save()
+
+        merged = load_kubernetes_configuration(self.path)
+        self.assertEqual(['cluster0', 'cluster1', 'cluster2'], [c['name'] for c in merged['clusters']])
+        self.assertEqual(3, len(merged['users']))
+        self.assertEqual('cluster2', merged['current-context'])
+        self.assertEqual(['config'], os.listdir(self.directory))
+
+    def test_merge_replace(self):
+        existing = KubeConfig(self.path, _kubeconfig('cluster0'))
+        existing.merge(_kubeconfig('cluster1'), replace=False)
+        existing.merge(_kubeconfig('cluster0', server='https://other'), replace=True)
+        self.assertEqual(['cluster0', 'cluster1'], [c['name'] for c in existing.config['clusters']])
+        self.assertEqual('https://other', existing.config['clusters'][0]['cluster']['server'])
+        self.assertEqual('cluster0', existing.config['current-context'])
+
+    def test_merge_conflict(self):
+        existing = KubeConfig(self.path, _kubeconfig('cluster0'))
+        # an identical entry is not a conflict
+        existing.merge(_kubeconfig('cluster0'), replace=False)
+        with self.assertRaises(CLIError):
+            existing.merge(_kubeconfig('cluster0', server='https://other'), replace=False)
+
+    def test_merge_admin_and_context_name(self):
+        existing = KubeConfig(self.path, _kubeconfig('cluster0'))
+        self.assertEqual('cluster0-admin', existing.merge(_kubeconfig('cluster0', user='clusterAdmin'), replace=False))
+        self.assertEqual('custom', existing.merge(_kubeconfig('cluster1'), replace=False, context_name='custom'))
+        self.assertEqual(['cluster0', 'cluster0-admin', 'custom'], [c['name'] for c in existing.config['contexts']])
+
+    def test_save_keeps_permissions(self):
+        with open(self.path, 'w'):
+            pass
+        os.chmod(self.path, 0o640)
+        KubeConfig(self.path, _kubeconfig('cluster0')).save()
+        self.assertEqual(0o640, os.stat(self.path).st_mode & 0o777)
+
+    def test_load_missing_file(self):
+        with self.assertRaises(CLIError):
+            KubeConfig.load(self.path)
+
+
+class TestPrintOrMergeCredentials(unittest.TestCase):
+    def test_print_to_stdout(self):
+        kubeconfigs = [yaml.safe_dump(_kubeconfig('cluster{}'.format(i)), default_flow_style=False) for i in range(3)]
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            _print_or_merge_credentials('-', kubeconfigs, False, None)
+        documents = list(yaml.safe_load_all(stdout.getvalue()))
+        self.assertEqual(['cluster0', 'cluster1', 'cluster2'], [d['current-context'] for d in documents])
+
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            _print_or_merge_credentials('-', kubeconfigs[:1], False, None)
+        self.assertNotIn('---', stdout.getvalue())
+        self.assertEqual(_kubeconfig('cluster0'), yaml.safe_load(stdout.getvalue()))
+
+    def test_merge_into_new_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, '.kube', 'config')
+        kubeconfigs = [yaml.safe_dump(_kubeconfig('cluster{}'.format(i)), default_flow_style=False) for i in range(2)]
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            _print_or_merge_credentials(path, kubeconfigs, False, None)
+
+        merged = load_kubernetes_configuration(path)
+        self.assertEqual(['cluster0', 'cluster1'], [c['name'] for c in merged['contexts']])
+        self.assertEqual('cluster1', merged['current-context'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,6 +11,9 @@ GLOBAL_CONFIG_DIR = get_config_dir()
 ALIAS_FILE_NAME = 'alias'
 ALIAS_HASH_FILE_NAME = 'alias.sha1'
 COLLIDED_ALIAS_FILE_NAME = 'collided_alias'
+ALIAS_INDEX_FILE_NAME = 'alias_index'
+# Bump when the layout of the alias index changes so older indexes get compiled again
+ALIAS_INDEX_FORMAT = 1
 ALIAS_TAB_COMP_TABLE_FILE_NAME = 'alias_tab_completion'
 GLOBAL_ALIAS_TAB_COMP_TABLE_PATH = os.path.join(GLOBAL_CONFIG_DIR, ALIAS_TAB_COMP_TABLE_FILE_NAME)
 COLLISION_CHECK_LEVEL_DEPTH = 5
@@ -11,6 +11,7 @@ import hashlib
 from collections import defaultdict
 
 from knack.log import get_logger
+from knack.util import CLIError
 
 import azext_alias
 from azext_alias import telemetry
@@ -18,17 +19,20 @@ from azext_alias._const import (
     GLOBAL_CONFIG_DIR,
     ALIAS_FILE_NAME,
     ALIAS_HASH_FILE_NAME,
+    ALIAS_INDEX_FILE_NAME,
+    ALIAS_INDEX_FORMAT,
     COLLIDED_ALIAS_FILE_NAME,
     CONFIG_PARSING_ERROR,
     DEBUG_MSG,
     COLLISION_CHECK_LEVEL_DEPTH,
     POS_ARG_DEBUG_MSG
 )
-from azext_alias.argument import build_pos_args_table, render_template
+from azext_alias.argument import build_pos_args_table, render_template, get_placeholders
 from azext_alias.util import (
     is_alias_command,
     cache_reserved_commands,
     get_config_parser,
+    get_file_signature,
     build_tab_completion_table
 )
 
@@ -36,6 +40,7 @@ from azext_alias.util import (
 GLOBAL_ALIAS_PATH = os.path.join(GLOBAL_CONFIG_DIR, ALIAS_FILE_NAME)
 GLOBAL_ALIAS_HASH_PATH = os.path.join(GLOBAL_CONFIG_DIR, ALIAS_HASH_FILE_NAME)
 GLOBAL_COLLIDED_ALIAS_PATH = os.path.join(GLOBAL_CONFIG_DIR, COLLIDED_ALIAS_FILE_NAME)
+GLOBAL_ALIAS_INDEX_PATH = os.path.join(GLOBAL_CONFIG_DIR, ALIAS_INDEX_FILE_NAME)
 
 logger = get_logger(__name__)
 
@@ -48,8 +53,40 @@ class AliasManager(object):
         self.collided_alias = defaultdict(list)
         self.alias_config_str = ''
         self.alias_config_hash = ''
-        self.load_alias_table()
-        self.load_alias_hash()
+        self.alias_config_signature = None
+        # The alias hash and collided aliases as they are stored in their files, so they are only written when changed
+        self.stored_alias_config_hash = None
+        self.stored_collided_alias = None
+        # The first word of each alias => the full alias, its command and its pre-parsed placeholders
+        self.alias_index = {}
+        self.alias_index_loaded = self.load_alias_index()
+        if not self.alias_index_loaded:
+            self.load_alias_table()
+            self.load_alias_hash()
+
+    def load_alias_index(self):
+        """
+        Load the alias index if the alias config file has not been written since the index was built.
+
+        Returns:
+            True if the alias index is up to date. Otherwise, return False.
+        """
+        try:
+            alias_config_signature = get_file_signature(GLOBAL_ALIAS_PATH)
+            with open(GLOBAL_ALIAS_INDEX_PATH, 'r') as alias_index_file:
+                alias_index = json.load(alias_index_file)
+        except (IOError, OSError, ValueError):
+            return False
+
+        if alias_index.get('format') != ALIAS_INDEX_FORMAT or alias_index.get('signature') != alias_config_signature:
+            return False
+
+        self.alias_config_signature = alias_config_signature
+        self.alias_config_hash = self.stored_alias_config_hash = alias_index['hash']
+        self.collided_alias = self.stored_collided_alias = alias_index['collided']
+        self.alias_index = alias_index['aliases']
+        telemetry.set_number_of_aliases_registered(alias_index['count'])
+        return True
 
     def load_alias_table(self):
         """
@@ -59,6 +96,8 @@ class AliasManager(object):
             # w+ creates the alias config file if it does not exist
             open_mode = 'r+' if os.path.exists(GLOBAL_ALIAS_PATH) else 'w+'
             with open(GLOBAL_ALIAS_PATH, open_mode) as alias_config_file:
+                # Get the signature before reading so a concurrent write invalidates the alias index
+                self.alias_config_signature = get_file_signature(GLOBAL_ALIAS_PATH)
                 self.alias_config_str = alias_config_file.read()
             self.alias_table.read(GLOBAL_ALIAS_PATH)
             telemetry.set_number_of_aliases_registered(len(self.alias_table.sections()))
@@ -75,6 +114,7 @@ class AliasManager(object):
         open_mode = 'r+' if os.path.exists(GLOBAL_ALIAS_HASH_PATH) else 'w+'
         with open(GLOBAL_ALIAS_HASH_PATH, open_mode) as alias_config_hash_file:
             self.alias_config_hash = alias_config_hash_file.read()
+        self.stored_alias_config_hash = self.alias_config_hash
 
     def load_collided_alias(self):
         """
@@ -88,6 +128,7 @@ class AliasManager(object):
                 self.collided_alias = json.loads(collided_alias_str if collided_alias_str else '{}')
             except Exception:  # pylint: disable=broad-except
                 self.collided_alias = {}
+        self.stored_collided_alias = self.collided_alias
 
     def detect_alias_config_change(self):
         """
@@ -120,16 +161,18 @@ class AliasManager(object):
         """
         if self.parse_error():
             # Write an empty hash so next run will check the config file against the entire command table again
-            AliasManager.write_alias_config_hash(empty_hash=True)
+            if self.stored_alias_config_hash != '':
+                AliasManager.write_alias_config_hash(empty_hash=True)
             return args
 
-        # Only load the entire command table if it detects changes in the alias config
-        if self.detect_alias_config_change():
-            self.load_full_command_table()
-            self.collided_alias = AliasManager.build_collision_table(self.alias_table.sections())
-            build_tab_completion_table(self.alias_table)
-        else:
+        if not self.alias_index_loaded:
             self.load_collided_alias()
+            # Only load the entire command table if it detects changes in the alias config
+            if self.detect_alias_config_change():
+                self.load_full_command_table()
+                self.collided_alias = AliasManager.build_collision_table(self.alias_table.sections())
+                build_tab_completion_table(self.alias_table)
+            self.alias_index = AliasManager.build_alias_index(self.alias_table)
 
         transformed_commands = []
         alias_iter = enumerate(args, 1)
@@ -144,16 +187,16 @@ class AliasManager(object):
                 transformed_commands.append(alias)
                 continue
 
-            full_alias = self.get_full_alias(alias)
+            alias_entry = self.alias_index.get(alias)
 
-            if self.alias_table.has_option(full_alias, 'command'):
-                cmd_derived_from_alias = self.alias_table.get(full_alias, 'command')
+            if alias_entry and alias_entry['command'] is not None:
+                full_alias, cmd_derived_from_alias = alias_entry['alias'], alias_entry['command']
                 telemetry.set_alias_hit(full_alias)
             else:
                 transformed_commands.append(alias)
                 continue
 
-            pos_args_table = build_pos_args_table(full_alias, args, alias_index)
+            pos_args_table = build_pos_args_table(full_alias, args, alias_index, alias_entry['placeholders'])
             if pos_args_table:
                 logger.debug(POS_ARG_DEBUG_MSG, full_alias, cmd_derived_from_alias, pos_args_table)
                 transformed_commands += render_template(cmd_derived_from_alias, pos_args_table)
@@ -163,7 +206,10 @@ class AliasManager(object):
                     next(alias_iter)
             else:
                 logger.debug(DEBUG_MSG, full_alias, cmd_derived_from_alias)
-                transformed_commands += shlex.split(cmd_derived_from_alias)
+                if alias_entry['args'] is not None:
+                    transformed_commands += alias_entry['args']
+                else:
+                    transformed_commands += shlex.split(cmd_derived_from_alias)
 
         return self.post_transform(transformed_commands)
 
@@ -177,10 +223,8 @@ class AliasManager(object):
         Returns:
             The full alias (with the placeholders, if any).
         """
-        if query in self.alias_table.sections():
-            return query
-
-        return next((section for section in self.alias_table.sections() if section.split()[0] == query), '')
+        alias_entry = self.alias_index.get(query)
+        return alias_entry['alias'] if alias_entry else ''
 
     def load_full_command_table(self):
         """
@@ -192,7 +236,8 @@ class AliasManager(object):
 
     def post_transform(self, args):
         """
-        Inject environment variables, and write hash to alias hash file after transforming alias to commands.
+        Inject environment variables, and write the alias hash, collided aliases and alias index
+        if they have changed after transforming alias to commands.
 
         Args:
             args: A list of args to post-transform.
@@ -208,8 +253,12 @@ class AliasManager(object):
             else:
                 post_transform_commands.append(os.path.expandvars(arg))
 
-        AliasManager.write_alias_config_hash(self.alias_config_hash)
-        AliasManager.write_collided_alias(self.collided_alias)
+        if self.alias_config_hash != self.stored_alias_config_hash:
+            AliasManager.write_alias_config_hash(self.alias_config_hash)
+        if self.collided_alias != self.stored_collided_alias:
+            AliasManager.write_collided_alias(self.collided_alias)
+        if not self.alias_index_loaded:
+            self.write_alias_index()
 
         return post_transform_commands
 
@@ -259,6 +308,80 @@ class AliasManager(object):
         telemetry.set_collided_aliases(list(collided_alias.keys()))
         return collided_alias
 
+    @staticmethod
+    def build_alias_index(alias_table):
+        """
+        Build the alias index, which maps the first word of every alias to the full alias,
+        the command it points to and its placeholders, so transforming an alias does not
+        need to search or parse the alias table.
+
+        For example:
+        {
+            'cp': {
+                'alias': 'cp {{ arg_1 }} {{ arg_2 }}',
+                'command': 'storage blob copy start-batch --source-uri {{ arg_1 }} --destination-container {{ arg_2 }}',
+                'placeholders': ['arg_1', 'arg_2'],
+                'args': None
+            }
+        }
+        'args' is the split command of an alias without placeholders.
+
+        Args:
+            alias_table: The alias table to index.
+
+        Returns:
+            The alias index.
+        """
+        alias_index = {}
+        for alias in alias_table.sections():
+            words = alias.split()
+            # An alias without placeholders takes precedence over the ones sharing its first word,
+            # otherwise the first alias in the config file is used
+            if not words or (words[0] in alias_index and alias != words[0]):
+                continue
+
+            command = alias_table.get(alias, 'command') if alias_table.has_option(alias, 'command') else None
+            try:
+                placeholders = get_placeholders(alias, check_duplicates=True)
+            except CLIError:
+                # Leave the error to be raised when the alias is used
+                placeholders = None
+            try:
+                args = shlex.split(command) if command is not None and placeholders == [] else None
+            except ValueError:
+                args = None
+
+            alias_index[words[0]] = {
+                'alias': alias,
+                'command': command,
+                'placeholders': placeholders,
+                'args': args
+            }
+
+        return alias_index
+
+    def write_alias_index(self):
+        """
+        Write the alias index to the alias index file, along with the signature of the alias config file
+        it was built from, the alias hash and the collided aliases.
+        """
+        alias_index = {
+            'format': ALIAS_INDEX_FORMAT,
+            'signature': self.alias_config_signature,
+            'hash': self.alias_config_hash,
+            'collided': self.collided_alias,
+            'count': len(self.alias_table.sections()),
+            'aliases': self.alias_index
+        }
+        # Write to a temporary file first so concurrent runs never load a partially written index
+        temp_path = '{}.{}.tmp'.format(GLOBAL_ALIAS_INDEX_PATH, os.getpid())
+        try:
+            with open(temp_path, 'w') as alias_index_file:
+                alias_index_file.write(json.dumps(alias_index))
+            os.replace(temp_path, GLOBAL_ALIAS_INDEX_PATH)
+        except (IOError, OSError) as exception:
+            logger.debug('Alias Manager: Failed to write the alias index: %s', exception)
+
     @staticmethod
     def write_alias_config_hash(alias_config_hash='', empty_hash=False):
         """
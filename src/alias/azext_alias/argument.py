@@ -86,7 +86,7 @@ def normalize_placeholders(arg, inject_quotes=False):
     return arg.replace('{{', '"{{').replace('}}', '}}"') if inject_quotes else arg
 
 
-def build_pos_args_table(full_alias, args, start_index):
+def build_pos_args_table(full_alias, args, start_index, placeholders=None):
     """
     Build a dictionary where the key is placeholder name and the value is the position argument value.
 
@@ -94,12 +94,15 @@ def build_pos_args_table(full_alias, args, start_index):
         full_alias: The full alias (including any placeholders).
         args: The arguments that the user inputs in the terminal.
         start_index: The index at which we start ingesting position arguments.
+        placeholders: The placeholders of full_alias, if they have already been parsed.
 
     Returns:
         A dictionary with the key beign the name of the placeholder and its value
         being the respective positional argument.
     """
-    pos_args_placeholder = get_placeholders(full_alias, check_duplicates=True)
+    pos_args_placeholder = placeholders
+    if pos_args_placeholder is None:
+        pos_args_placeholder = get_placeholders(full_alias, check_duplicates=True)
     pos_args = args[start_index: start_index + len(pos_args_placeholder)]
 
     if len(pos_args_placeholder) != len(pos_args):
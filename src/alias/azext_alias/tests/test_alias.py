@@ -8,6 +8,9 @@
 import os
 import sys
 import shlex
+import shutil
+import hashlib
+import tempfile
 import unittest
 from mock import Mock, patch
 from six.moves import configparser
@@ -15,6 +18,10 @@ from six.moves import configparser
 from knack.util import CLIError
 
 import azext_alias
+from azext_alias._const import (ALIAS_FILE_NAME,
+                                ALIAS_HASH_FILE_NAME,
+                                ALIAS_INDEX_FILE_NAME,
+                                COLLIDED_ALIAS_FILE_NAME)
 from azext_alias.tests._const import (DEFAULT_MOCK_ALIAS_STRING,
                                       COLLISION_MOCK_ALIAS_STRING,
                                       TEST_RESERVED_COMMANDS,
@@ -180,6 +187,28 @@ class TestAlias(unittest.TestCase):
         alias_manager.alias_config_str = ''
         self.assertTrue(alias_manager.detect_alias_config_change())
 
+    def test_build_alias_index(self):
+        alias_manager = self.get_alias_manager()
+        alias_index = azext_alias.alias.AliasManager.build_alias_index(alias_manager.alias_table)
+        self.assertEqual(len(alias_manager.alias_table.sections()), len(alias_index))
+        self.assertDictEqual({
+            'alias': 'cp {{ arg_1 }} {{ arg_2 }}',
+            'command': 'storage blob copy start-batch --source-uri {{ arg_1 }} --destination-container {{ arg_2 }}',
+            'placeholders': ['arg_1', 'arg_2'],
+            'args': None
+        }, alias_index['cp'])
+        self.assertEqual(['account'], alias_index['ac']['args'])
+        self.assertEqual([], alias_index['ac']['placeholders'])
+
+    def test_build_alias_index_precedence(self):
+        alias_manager = self.get_alias_manager('[ls {{ 0 }}]\ncommand = list {{ 0 }}\n[ls {{ 1 }}]\ncommand = list\n')
+        alias_index = azext_alias.alias.AliasManager.build_alias_index(alias_manager.alias_table)
+        self.assertEqual('ls {{ 0 }}', alias_index['ls']['alias'])
+
+        alias_manager = self.get_alias_manager('[ls {{ 0 }}]\ncommand = list {{ 0 }}\n[ls]\ncommand = list\n')
+        alias_index = azext_alias.alias.AliasManager.build_alias_index(alias_manager.alias_table)
+        self.assertEqual('ls', alias_index['ls']['alias'])
+
     """
     Helper functions
     """
@@ -217,9 +246,73 @@ class MockAliasManager(azext_alias.alias.AliasManager):
         import hashlib
         self.alias_config_hash = hashlib.sha1(self.alias_config_str.encode('utf-8')).hexdigest()
 
+    def load_alias_index(self):
+        return False
+
     def load_collided_alias(self):
         pass
 
+    def write_alias_index(self):
+        pass
+
+
+class TestAliasIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_config_dir = tempfile.mkdtemp()
+        self.alias_path = os.path.join(self.mock_config_dir, ALIAS_FILE_NAME)
+        self.patchers = []
+        self.patchers.append(patch('azext_alias.alias.GLOBAL_ALIAS_PATH', self.alias_path))
+        self.patchers.append(patch('azext_alias.alias.GLOBAL_ALIAS_HASH_PATH', os.path.join(self.mock_config_dir, ALIAS_HASH_FILE_NAME)))
+        self.patchers.append(patch('azext_alias.alias.GLOBAL_COLLIDED_ALIAS_PATH', os.path.join(self.mock_config_dir, COLLIDED_ALIAS_FILE_NAME)))
+        self.patchers.append(patch('azext_alias.alias.GLOBAL_ALIAS_INDEX_PATH', os.path.join(self.mock_config_dir, ALIAS_INDEX_FILE_NAME)))
+        self.patchers.append(patch('azext_alias.cached_reserved_commands', TEST_RESERVED_COMMANDS))
+        self.patchers.append(patch.object(azext_alias.alias.AliasManager, 'write_alias_config_hash'))
+        self.patchers.append(patch.object(azext_alias.alias.AliasManager, 'write_collided_alias'))
+        for patcher in self.patchers:
+            patcher.start()
+
+        with open(self.alias_path, 'w') as alias_config_file:
+            alias_config_file.write(DEFAULT_MOCK_ALIAS_STRING)
+        with open(os.path.join(self.mock_config_dir, ALIAS_HASH_FILE_NAME), 'w') as alias_config_hash_file:
+            alias_config_hash_file.write(hashlib.sha1(DEFAULT_MOCK_ALIAS_STRING.encode('utf-8')).hexdigest())
+        with open(os.path.join(self.mock_config_dir, COLLIDED_ALIAS_FILE_NAME), 'w') as collided_alias_file:
+            collided_alias_file.write('{}')
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.mock_config_dir)
+
+    def test_transform_with_alias_index(self):
+        alias_manager = azext_alias.alias.AliasManager()
+        self.assertFalse(alias_manager.alias_index_loaded)
+        self.assertEqual(shlex.split('storage blob copy start-batch --source-uri a --destination-container b'), alias_manager.transform(['cp', 'a', 'b']))
+
+        with patch.object(azext_alias.alias.AliasManager, 'load_alias_table') as load_alias_table:
+            alias_manager = azext_alias.alias.AliasManager()
+            self.assertTrue(alias_manager.alias_index_loaded)
+            self.assertEqual(shlex.split('storage blob copy start-batch --source-uri a --destination-container b'), alias_manager.transform(['cp', 'a', 'b']))
+            self.assertEqual(['account', 'list', '-otable'], alias_manager.transform(['ac', 'ls']))
+            self.assertFalse(load_alias_table.called)
+
+        # Neither the alias hash nor the collided aliases have changed
+        self.assertFalse(azext_alias.alias.AliasManager.write_alias_config_hash.called)
+        self.assertFalse(azext_alias.alias.AliasManager.write_collided_alias.called)
+
+    def test_alias_index_outdated(self):
+        azext_alias.alias.AliasManager().transform(['ac'])
+
+        with open(self.alias_path, 'a') as alias_config_file:
+            alias_config_file.write('\n[grp]\ncommand = group\n')
+        alias_manager = azext_alias.alias.AliasManager()
+        self.assertFalse(alias_manager.alias_index_loaded)
+        with patch.object(azext_alias.alias.AliasManager, 'load_full_command_table'):
+            self.assertEqual(['group', 'list'], alias_manager.transform(['grp', 'list']))
+        self.assertTrue(azext_alias.alias.AliasManager.write_alias_config_hash.called)
+
+        self.assertTrue(azext_alias.alias.AliasManager().alias_index_loaded)
+
 
 # Inject data-driven tests into TestAlias class
 for test_type, test_cases in TEST_DATA.items():
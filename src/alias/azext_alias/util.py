@@ -5,6 +5,7 @@
 
 # pylint: disable=wrong-import-order,import-error,relative-import
 
+import os
 import re
 import sys
 import json
@@ -44,6 +45,20 @@ def get_alias_table():
         return get_config_parser()
 
 
+def get_file_signature(path):
+    """
+    Get the signature of a file, which changes whenever the file is written.
+
+    Args:
+        path: The path of the file.
+
+    Returns:
+        A list with the modification time and the size of the file.
+    """
+    file_stat = os.stat(path)
+    return [getattr(file_stat, 'st_mtime_ns', file_stat.st_mtime), file_stat.st_size]
+
+
 def is_alias_command(subcommands, args):
     """
     Check if the user is invoking one of the comments in 'subcommands' in the  from az alias .
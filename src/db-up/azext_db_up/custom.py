@@ -7,7 +7,9 @@
 import os
 import re
 import sys
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from msrestazure.azure_exceptions import CloudError
 from knack.log import get_logger
 from knack.util import CLIError
@@ -24,6 +26,14 @@ from azext_db_up.util import update_kwargs, resolve_poller
 
 logger = get_logger(__name__)
 
+# the most connections attempted to find the client ip addresses, and the most at the same time
+IP_PROBE_COUNT = 20
+IP_PROBE_CONCURRENCY = 5
+# the addresses found are complete once this many attempts found no new address
+IP_PROBE_STABLE_COUNT = 5
+IP_PROBE_TIMEOUT = 15
+IP_ADDRESS_ERROR_REGEX = re.compile(r'.*[\'"](?P<ipAddress>[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)[\'"]')
+
 
 def mysql_up(cmd, client, resource_group_name=None, server_name=None, location=None, backup_retention=None,
              sku_name=None, geo_redundant_backup=None, storage_mb=None, administrator_login=None,
@@ -426,37 +436,31 @@ def _configure_firewall_rules(
     if administrator_login_password is not None:
         kwargs['password'] = administrator_login_password
     kwargs.update(extra_connector_args or {})
-    addresses = set()
     logger.warning('Checking your ip address...')
-    for _ in range(20):
-        try:
-            connection = connector.connect(**kwargs)
-            connection.close()
-        except connector_errors as ex:
-            pattern = re.compile(r'.*[\'"](?P<ipAddress>[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)[\'"]')
-            try:
-                addresses.add(pattern.match(str(ex)).groupdict().get('ipAddress'))
-            except AttributeError:
-                pass
+    addresses = _get_client_ip_addresses(connector, connector_errors, kwargs)
 
     # Create firewall rules for devbox if needed
     firewall_client = cf_firewall(cmd.cli_ctx, None)
 
-    if addresses and len(addresses) == 1:
-        ip_address = addresses.pop()
-        logger.warning('Configuring server firewall rule, \'devbox\', to allow for your ip address: %s', ip_address)
-        resolve_poller(
-            firewall_client.create_or_update(resource_group_name, server_name, 'devbox', ip_address, ip_address),
-            cmd.cli_ctx, '{} Firewall Rule Create/Update'.format(logging_name))
-    elif addresses:
-        logger.warning('Detected dynamic IP address, configuring firewall rules for IP addresses encountered...')
-        logger.warning('IP Addresses: %s', ', '.join(list(addresses)))
-        firewall_results = []
-        for i, ip_address in enumerate(addresses):
-            firewall_results.append(firewall_client.create_or_update(
-                resource_group_name, server_name, 'devbox' + str(i), ip_address, ip_address))
-        for result in firewall_results:
-            resolve_poller(result, cmd.cli_ctx, '{} Firewall Rule Create/Update'.format(logging_name))
+    if len(addresses) == 1:
+        logger.warning('Configuring server firewall rule, \'devbox\', to allow for your ip address: %s',
+                       addresses[0])
+        rule_names = ['devbox']
+    else:
+        if addresses:
+            logger.warning('Detected dynamic IP address, configuring firewall rules for IP addresses encountered...')
+            logger.warning('IP Addresses: %s', ', '.join(addresses))
+        rule_names = ['devbox' + str(i) for i in range(len(addresses))]
+    # the rules are created at the same time, the operations started are only awaited afterwards
+    executor = ThreadPoolExecutor(max_workers=max(1, len(addresses)))
+    try:
+        firewall_results = list(executor.map(
+            lambda rule: firewall_client.create_or_update(resource_group_name, server_name, rule[0], rule[1], rule[1]),
+            zip(rule_names, addresses)))
+    finally:
+        executor.shutdown()
+    for result in firewall_results:
+        resolve_poller(result, cmd.cli_ctx, '{} Firewall Rule Create/Update'.format(logging_name))
     logger.warning('If %s server declines your IP address, please create a new firewall rule using:', logging_name)
     logger.warning('    `az %s server firewall-rule create -g %s -s %s -n {rule_name} '
                    '--start-ip-address {ip_address} --end-ip-address {ip_address}`',
@@ -465,6 +469,56 @@ def _configure_firewall_rules(
     return host, user
 
 
+def _get_client_ip_addresses(connector, connector_errors, connector_kwargs):
+    """
+    Returns the ip addresses the server sees the client connecting from, which the server reports when it
+    declines a connection. Connections are attempted concurrently, until no new address was seen for
+    IP_PROBE_STABLE_COUNT attempts, IP_PROBE_COUNT attempts were made or IP_PROBE_TIMEOUT seconds passed.
+    """
+    executor = ThreadPoolExecutor(max_workers=IP_PROBE_CONCURRENCY)
+    deadline = time.time() + IP_PROBE_TIMEOUT
+    addresses = []
+    attempts = 0
+    attempts_without_new_address = 0
+    pending = set()
+    try:
+        while True:
+            while attempts < IP_PROBE_COUNT and len(pending) < IP_PROBE_CONCURRENCY:
+                pending.add(executor.submit(_probe_ip_address, connector, connector_errors, connector_kwargs))
+                attempts += 1
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=max(0, deadline - time.time()), return_when=FIRST_COMPLETED)
+            if not done:
+                logger.debug('Stopped checking the ip address after %s seconds.', IP_PROBE_TIMEOUT)
+                break
+            for future in done:
+                address = future.result()
+                if address is not None and address not in addresses:
+                    addresses.append(address)
+                    attempts_without_new_address = 0
+                else:
+                    attempts_without_new_address += 1
+            if addresses and attempts_without_new_address >= IP_PROBE_STABLE_COUNT:
+                break
+    finally:
+        # attempts still in progress aren't awaited
+        executor.shutdown(wait=False)
+    return addresses
+
+
+def _probe_ip_address(connector, connector_errors, connector_kwargs):
+    """ Returns the ip address in the error of a declined connection, or None """
+    try:
+        connection = connector.connect(**connector_kwargs)
+        connection.close()
+    except connector_errors as ex:
+        match = IP_ADDRESS_ERROR_REGEX.match(str(ex))
+        if match:
+            return match.group('ipAddress')
+    return None
+
+
 def _create_database(db_context, cmd, resource_group_name, server_name, database_name):
     # check for existing database, create if not
     cf_db, logging_name = db_context.cf_db, db_context.logging_name
@@ -0,0 +1,94 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import itertools
+import threading
+import time
+import unittest
+
+import mock
+
+from azext_db_up import custom
+from azext_db_up.custom import _get_client_ip_addresses, IP_PROBE_COUNT, IP_PROBE_STABLE_COUNT
+
+
+class _ConnectorError(Exception):
+    pass
+
+
+class _Connection(object):  # pylint: disable=too-few-public-methods
+    def close(self):
+        pass
+
+
+class _FakeConnector(object):
+    """ a connector whose connections are declined with the errors given, in turn """
+
+    def __init__(self, errors):
+        self.errors = itertools.cycle(errors)
+        self.attempts = []
+        self.lock = threading.Lock()
+
+    def connect(self, **kwargs):
+        with self.lock:
+            self.attempts.append(kwargs)
+            error = next(self.errors)
+        if error is None:
+            return _Connection()
+        raise error
+
+
+def _mysql_error(address):
+    return _ConnectorError("1045 (28000): Access denied for user 'cloudsa'@'{}' (using password: YES)".format(address))
+
+
+def _postgres_error(address):
+    return _ConnectorError('FATAL:  no pg_hba.conf entry for host "{}", user "cloudsa", database "postgres", '
+                           'SSL on'.format(address))
+
+
+class TestClientIpAddresses(unittest.TestCase):
+    def test_single_address(self):
+        connector = _FakeConnector([_mysql_error('10.0.0.1')])
+        addresses = _get_client_ip_addresses(connector, _ConnectorError, {'user': 'cloudsa'})
+
+        self.assertEqual(addresses, ['10.0.0.1'])
+        # the probe stops once the address is stable
+        self.assertLess(len(connector.attempts), IP_PROBE_COUNT)
+        self.assertGreaterEqual(len(connector.attempts), IP_PROBE_STABLE_COUNT + 1)
+        self.assertEqual(connector.attempts[0], {'user': 'cloudsa'})
+
+    def test_dynamic_addresses(self):
+        connector = _FakeConnector([_postgres_error('10.0.0.1'), _postgres_error('10.0.0.2'),
+                                    _postgres_error('10.0.0.1'), _postgres_error('10.0.0.3')])
+        addresses = _get_client_ip_addresses(connector, _ConnectorError, {})
+
+        self.assertEqual(sorted(addresses), ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+
+    def test_no_address(self):
+        connector = _FakeConnector([None, _ConnectorError('timeout expired')])
+        self.assertEqual(_get_client_ip_addresses(connector, _ConnectorError, {}), [])
+        self.assertEqual(len(connector.attempts), IP_PROBE_COUNT)
+
+    def test_other_errors_are_raised(self):
+        connector = _FakeConnector([ValueError('invalid port')])
+        with self.assertRaises(ValueError):
+            _get_client_ip_addresses(connector, _ConnectorError, {})
+
+    def test_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        connector = _FakeConnector([_mysql_error('10.0.0.1')])
+        connect = connector.connect
+        connector.connect = lambda **kwargs: release.wait() and connect(**kwargs)
+
+        start = time.time()
+        with mock.patch.object(custom, 'IP_PROBE_TIMEOUT', 0.2):
+            self.assertEqual(_get_client_ip_addresses(connector, _ConnectorError, {}), [])
+        self.assertLess(time.time() - start, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -941,6 +941,7 @@ long-summary: |
     2. To list by a topic-type (e.g. storage accounts), specify the --topic-type parameter along with --location (e.g. "westus2") parameter. For global topic types (e.g. "Microsoft.Resources.Subscriptions"), specify the location value as "global".
     3. To list all event subscriptions in a region (across all topic types), specify only the --location parameter.
     4. For both #2 and #3 above, to filter only by a resource group, you can additionally specify the --resource-group parameter.
+    5. To list the event subscriptions of all the regions and of the global scope at once, specify --all-locations instead of --location. It can also be combined with the --resource-group and --topic-type-name parameters.
 parameters:
   - name: --topic-type-name
     short-summary: Name of the topic-type whose event subscriptions need to be listed. When this is specified, you must also specify --location.
@@ -992,6 +993,12 @@ examples:
     text: |
         az eventgrid event-subscription list --location westus2 --resource-group {RG}
         az eventgrid event-subscription list --location global --resource-group {RG}
+  - name: List all regional and global event subscriptions (under the currently selected Azure subscription) across all locations.
+    text: |
+        az eventgrid event-subscription list --all-locations
+  - name: List all Storage event subscriptions (under the given resource group) across all locations.
+    text: |
+        az eventgrid event-subscription list --all-locations --topic-type Microsoft.Storage.StorageAccounts --resource-group {RG}
   - name: List all event subscriptions for an Event Grid domain whose name contains the pattern "XYZ"
     text: |
         az eventgrid event-subscription list --source-resource-id /subscriptions/{SubID}/resourceGroups/{RG}/providers/Microsoft.EventGrid/domains/d1 --odata-query "Contains(name, 'XYZ')"
@@ -300,6 +300,7 @@ def load_arguments(self, _):    # pylint: disable=too-many-statements
 
     with self.argument_context('eventgrid event-subscription list') as c:
         c.argument('odata_query', arg_type=odata_query_type, id_part=None)
+        c.argument('all_locations', action='store_true', options_list=['--all-locations'], help="List the event subscriptions of all the regions and of the global scope at once, instead of a single --location. Can be combined with --resource-group and --topic-type-name.")
 
     with self.argument_context('eventgrid event-subscription show') as c:
         c.argument('include_full_endpoint_url', arg_type=get_three_state_flag(), options_list=['--include-full-endpoint-url'], help="Specify to indicate whether the full endpoint URL should be returned. True if flag present.", )
@@ -8,6 +8,7 @@
 import re
 from knack.log import get_logger
 from knack.util import CLIError
+from msrestazure.azure_exceptions import CloudError
 from msrestazure.tools import parse_resource_id
 from dateutil.parser import parse   # pylint: disable=import-error,relative-import
 
@@ -89,6 +90,8 @@ EVENTTIME = "eventtime"
 EVENTTYPE = "eventtype"
 DATAVERSION = "dataversion"
 DEFAULT_TOP = 100
+# The number of regions whose event subscriptions are listed at once by --all-locations
+EVENT_SUBSCRIPTION_LIST_CONCURRENCY = 10
 
 
 def cli_topic_list(
@@ -770,28 +773,44 @@ def cli_eventgrid_event_subscription_get(
 
 
 def cli_event_subscription_list(   # pylint: disable=too-many-return-statements
+        cmd,
         client,
         source_resource_id=None,
         location=None,
         resource_group_name=None,
         topic_type_name=None,
-        odata_query=None):
+        odata_query=None,
+        all_locations=False):
     if source_resource_id is not None:
         # If Source Resource ID is specified, we need to list event subscriptions for that particular resource.
         # Since a full resource ID is specified, it should override all other defaults such as default location and RG
         # No other parameters must be specified
-        if topic_type_name is not None:
+        if topic_type_name is not None or all_locations:
             raise CLIError('usage error: Since --source-resource-id is specified, none of the other parameters must '
                            'be specified.')
 
         return _list_event_subscriptions_by_resource_id(client, source_resource_id, odata_query, DEFAULT_TOP)
 
+    if all_locations:
+        # The event subscriptions of every region and of the global scope, whatever the location is. They are
+        # collected into a list, as the output formatters only accept lists and the SDK's paged types.
+        return list(_list_event_subscriptions_in_all_locations(
+            cmd,
+            client,
+            resource_group_name,
+            topic_type_name,
+            odata_query))
+
     if location is None:
         # Since resource-id was not specified, location must be specified: e.g. "westus2" or "global". If not error
         # OUT.
-        raise CLIError('usage error: --source-resource-id ID | --location LOCATION'
+        raise CLIError('usage error: --source-resource-id ID | --location LOCATION | --all-locations'
                        ' [--resource-group RG] [--topic-type-name TOPIC_TYPE_NAME]')
 
+    return _list_event_subscriptions_by_location(client, location, resource_group_name, topic_type_name, odata_query)
+
+
+def _list_event_subscriptions_by_location(client, location, resource_group_name, topic_type_name, odata_query):
     if topic_type_name is None:
         # No topic-type is specified: return event subscriptions across all topic types for this location.
         if location.lower() == GLOBAL.lower():
@@ -833,6 +852,75 @@ def cli_event_subscription_list(   # pylint: disable=too-many-return-statements
         DEFAULT_TOP)
 
 
+def _list_event_subscriptions_in_all_locations(cmd, client, resource_group_name, topic_type_name, odata_query):
+    """
+    Lists the event subscriptions of every Event Grid region and of the global scope concurrently. The pages of
+    each listing are yielded as they arrive, leaving out the event subscriptions which were already yielded. The
+    regions which fail to be listed are reported together once the other regions are listed.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    # Global topic types only have global event subscriptions, regional topic types only regional ones.
+    locations = []
+    if topic_type_name is None or _is_topic_type_global_resource(topic_type_name):
+        locations.append(GLOBAL)
+    if topic_type_name is None or not _is_topic_type_global_resource(topic_type_name):
+        locations.extend(_get_eventgrid_locations(cmd.cli_ctx))
+
+    def _list_page(location, paged):
+        try:
+            return paged.advance_page()
+        except StopIteration:
+            return []
+
+    listings = [(location, _list_event_subscriptions_by_location(
+        client, location, resource_group_name, topic_type_name, odata_query)) for location in locations]
+    seen = set()
+    failures = []
+    executor = ThreadPoolExecutor(max_workers=EVENT_SUBSCRIPTION_LIST_CONCURRENCY)
+    running = {executor.submit(_list_page, location, paged): (location, paged) for location, paged in listings}
+    try:
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                location, paged = running.pop(future)
+                try:
+                    page = future.result()
+                except CloudError as ex:
+                    failures.append('{}: {}'.format(location, ex))
+                    continue
+                # a page may be empty while more pages follow
+                if paged.next_link:
+                    running[executor.submit(_list_page, location, paged)] = (location, paged)
+                for event_subscription in page:
+                    key = event_subscription.id.lower()
+                    if key not in seen:
+                        seen.add(key)
+                        yield event_subscription
+        if failures:
+            raise CLIError('Failed to list the event subscriptions in {} regions. {}'.format(
+                len(failures), ' '.join(sorted(failures))))
+    finally:
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _get_eventgrid_locations(cli_ctx):
+    """ Returns the names of the regions where the Event Grid resource provider is available """
+    from azure.cli.core.commands.client_factory import get_mgmt_service_client
+    from azure.cli.core.profiles import ResourceType
+    provider = get_mgmt_service_client(cli_ctx, ResourceType.MGMT_RESOURCE_RESOURCES).providers.get(
+        EVENTGRID_NAMESPACE)
+    locations = set()
+    for resource_type in provider.resource_types or []:
+        for location in resource_type.locations or []:
+            # the provider lists the display names of the regions, e.g. "West US 2"
+            locations.add(location.replace(' ', '').lower())
+    locations.discard(GLOBAL)
+    return sorted(locations)
+
+
 def cli_topic_private_endpoint_connection_get(
         client,
         resource_group_name,
@@ -0,0 +1,118 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import threading
+import unittest
+
+import mock
+from knack.util import CLIError, todict
+from msrestazure.azure_exceptions import CloudError
+
+from azext_eventgrid.custom import cli_event_subscription_list
+
+
+class _Model(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _FakePaged(object):
+    """ pages like msrest's Paged: the next link is None after the last page """
+
+    def __init__(self, pages, error=None):
+        self.pages = list(pages)
+        self.error = error
+        self.next_link = ''
+
+    def advance_page(self):
+        if self.next_link is None:
+            raise StopIteration()
+        if self.error is not None:
+            raise self.error
+        page = self.pages.pop(0) if self.pages else []
+        self.next_link = 'next' if self.pages else None
+        return page
+
+
+def _subscriptions(*names):
+    return [_Model(id='/subscriptions/sub/providers/Microsoft.EventGrid/eventSubscriptions/' + name, name=name)
+            for name in names]
+
+
+class _FakeEventSubscriptionsClient(object):  # pylint: disable=unused-argument
+    def __init__(self, pages, failing_locations=()):
+        self.pages = pages
+        self.failing_locations = failing_locations
+        self.listed = []
+        self.lock = threading.Lock()
+
+    def _list(self, location):
+        with self.lock:
+            self.listed.append(location)
+        error = CloudError(_Model(status_code=403, headers={}, reason='Forbidden'), 'forbidden') \
+            if location in self.failing_locations else None
+        return _FakePaged(self.pages.get(location, []), error)
+
+    def list_global_by_subscription(self, odata_query, top):
+        return self._list('global')
+
+    def list_regional_by_subscription(self, location, odata_query, top):
+        return self._list(location)
+
+    def list_global_by_subscription_for_topic_type(self, topic_type_name, odata_query, top):
+        return self._list('global')
+
+    def list_regional_by_subscription_for_topic_type(self, location, topic_type_name, odata_query, top):
+        return self._list(location)
+
+
+class TestEventSubscriptionListAllLocations(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch('azext_eventgrid.custom._get_eventgrid_locations', return_value=['eastus', 'westus'])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    @staticmethod
+    def _list(client, topic_type_name=None):
+        return cli_event_subscription_list(_Model(cli_ctx=None), client, topic_type_name=topic_type_name,
+                                           all_locations=True)
+
+    def test_all_pages_of_all_locations(self):
+        client = _FakeEventSubscriptionsClient({
+            'global': [_subscriptions('g1', 'g2'), _subscriptions('g3')],
+            # an empty page may be followed by more pages
+            'eastus': [_subscriptions('e1'), [], _subscriptions('e2'), _subscriptions('e3')],
+            # the same event subscription may be listed in several locations
+            'westus': [_subscriptions('w1', 'E1')]
+        })
+        result = self._list(client)
+
+        self.assertIsInstance(result, list)
+        self.assertEqual(sorted(s.name.lower() for s in result), ['e1', 'e2', 'e3', 'g1', 'g2', 'g3', 'w1'])
+        self.assertEqual(sorted(client.listed), ['eastus', 'global', 'westus'])
+        # the result can be written as JSON
+        self.assertEqual(len(json.loads(json.dumps(todict(result)))), 7)
+
+    def test_failed_locations_fail_the_listing(self):
+        client = _FakeEventSubscriptionsClient({'global': [_subscriptions('g1')], 'westus': [_subscriptions('w1')]},
+                                               failing_locations=['eastus', 'global'])
+        with self.assertRaisesRegexp(CLIError, 'in 2 regions. eastus: .* global: '):
+            self._list(client)
+        # the other locations are still listed
+        self.assertEqual(sorted(client.listed), ['eastus', 'global', 'westus'])
+
+    def test_topic_type(self):
+        client = _FakeEventSubscriptionsClient({'global': [_subscriptions('g1')], 'eastus': [_subscriptions('e1')]})
+        self.assertEqual(['g1'], [s.name for s in self._list(client, 'Microsoft.Resources.Subscriptions')])
+        self.assertEqual(['global'], client.listed)
+
+        client.listed = []
+        self.assertEqual(['e1'], [s.name for s in self._list(client, 'Microsoft.Storage.StorageAccounts')])
+        self.assertEqual(['eastus', 'westus'], sorted(client.listed))
+
+
+if __name__ == '__main__':
+    unittest.main()
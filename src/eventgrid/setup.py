@@ -8,7 +8,7 @@
 from codecs import open
 from setuptools import setup, find_packages
 
-VERSION = "0.4.7"
+VERSION = "0.4.8"
 
 CLASSIFIERS = [
     'Development Status :: 4 - Beta',
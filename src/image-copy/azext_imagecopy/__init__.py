@@ -51,6 +51,12 @@ class ImageCopyCommandsLoader(AzCommandsLoader):
                        help='Resource Group name where temporary storage account will be created.')
             c.argument('export_as_snapshot', options_list=['--export-as-snapshot'], action='store_true', default=False,
                        help='Include this switch to export the copies as snapshots instead of images.')
+            c.argument('state_file', options_list=['--state-file'],
+                       help='File to save the progress of the copy to. If the file exists, the copy it belongs to '
+                       'is resumed: completed locations are skipped and failed ones are retried.')
+            c.argument('fan_out', options_list=['--fan-out'], action='store_true', default=False,
+                       help='Include this switch to copy from the source to one location per geography only, and '
+                       'from the locations already copied to the other locations of the geography.')
 
 
 COMMAND_LOADER_CLS = ImageCopyCommandsLoader
@@ -21,4 +21,14 @@ helps['image copy'] = """
           text: >
             az image copy --source-resource-group mySources-rg --source-object-name myVm \\
                 --source-type vm --target-location uksouth northeurope --target-resource-group "images-repo-rg"
+        - name: Copy an image to several regions, saving the progress so that an interrupted copy can be resumed.
+          text: >
+            az image copy --source-resource-group mySources-rg --source-object-name myImage \\
+                --target-location uksouth northeurope westus --target-resource-group "images-repo-rg" \\
+                --state-file image-copy-state.json
+        - name: Copy an image to many regions, copying across the ocean once per geography.
+          text: >
+            az image copy --source-resource-group mySources-rg --source-object-name myImage \\
+                --target-location westeurope uksouth eastus westus --target-resource-group "images-repo-rg" \\
+                --fan-out
 """
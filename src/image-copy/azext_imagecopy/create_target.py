@@ -4,28 +4,21 @@
 # --------------------------------------------------------------------------------------------
 
 import datetime
-import time
 
-from knack.util import CLIError
 from knack.log import get_logger
 
 from msrestazure.tools import resource_id
 from azure.cli.core.commands.client_factory import get_subscription_id
 
-from azext_imagecopy.cli_utils import run_cli_command, prepare_cli_command
-
 logger = get_logger(__name__)
 
 STORAGE_ACCOUNT_NAME_LENGTH = 24
+TARGET_CONTAINER_NAME = 'snapshots'
+SOURCE_DIGEST_TAG = 'image_copy_source_digest'
 
 
-# pylint: disable=too-many-statements
-# pylint: disable=too-many-locals
-def create_target_image(cmd, location, transient_resource_group_name, source_type, source_object_name,
-                        source_os_disk_snapshot_name, source_os_disk_snapshot_url, source_os_type,
-                        target_resource_group_name, azure_pool_frequency, tags, target_name, target_subscription,
-                        export_as_snapshot, timeout):
-
+def create_target_storage(engine, location, transient_resource_group_name, target_subscription):
+    """ creates the storage account and container to copy the source to, returns the account name and endpoint """
     random_string = get_random_string(
         STORAGE_ACCOUNT_NAME_LENGTH - len(location))
 
@@ -33,108 +26,96 @@ def create_target_image(cmd, location, transient_resource_group_name, source_typ
     logger.warning(
         "%s - Creating target storage account (can be slow sometimes)", location)
     target_storage_account_name = location.lower() + random_string
-    cli_cmd = prepare_cli_command(['storage', 'account', 'create',
-                                   '--name', target_storage_account_name,
-                                   '--resource-group', transient_resource_group_name,
-                                   '--location', location,
-                                   '--sku', 'Standard_LRS'],
-                                  subscription=target_subscription)
-
-    json_output = run_cli_command(cli_cmd, return_as_json=True)
-    target_blob_endpoint = json_output['primaryEndpoints']['blob']
+    target_blob_endpoint = engine.create_storage_account(transient_resource_group_name, target_storage_account_name,
+                                                         location, subscription=target_subscription)
 
-    # Setup the target storage account
-    cli_cmd = prepare_cli_command(['storage', 'account', 'keys', 'list',
-                                   '--account-name', target_storage_account_name,
-                                   '--resource-group', transient_resource_group_name],
-                                  subscription=target_subscription)
+    # create a container in the target blob storage account
+    logger.warning(
+        "%s - Creating container in the target storage account", location)
+    target_storage_account_key = get_target_storage_key(engine, transient_resource_group_name,
+                                                        target_storage_account_name, target_subscription)
+    engine.create_container(target_storage_account_name, target_storage_account_key, TARGET_CONTAINER_NAME,
+                            subscription=target_subscription)
+    return target_storage_account_name, target_blob_endpoint
 
-    json_output = run_cli_command(cli_cmd, return_as_json=True)
 
-    target_storage_account_key = json_output[0]['value']
+def get_target_storage_key(engine, transient_resource_group_name, target_storage_account_name, target_subscription):
+    target_storage_account_key = engine.get_storage_account_key(transient_resource_group_name,
+                                                                target_storage_account_name,
+                                                                subscription=target_subscription)
     logger.debug("storage account key: %s", target_storage_account_key)
+    return target_storage_account_key
 
-    expiry_format = "%Y-%m-%dT%H:%MZ"
+
+def start_target_copy(engine, location, target_storage_account_name, target_storage_account_key, blob_name,
+                      source_url, target_subscription, timeout):
+    # Copy the snapshot to the target region using the SAS URL
+    logger.warning(
+        "%s - Copying blob to target storage account", location)
     expiry = datetime.datetime.utcnow() + datetime.timedelta(seconds=timeout)
     logger.debug(
         "create target storage sas using timeout seconds: %d", timeout)
+    engine.start_blob_copy(target_storage_account_name, target_storage_account_key, TARGET_CONTAINER_NAME,
+                           blob_name, source_url, expiry, subscription=target_subscription)
 
-    cli_cmd = prepare_cli_command(['storage', 'account', 'generate-sas',
-                                   '--account-name', target_storage_account_name,
-                                   '--account-key', target_storage_account_key,
-                                   '--expiry', expiry.strftime(expiry_format),
-                                   '--permissions', 'aclrpuw', '--resource-types',
-                                   'sco', '--services', 'b', '--https-only'],
-                                  output_as_json=False,
-                                  subscription=target_subscription)
 
-    sas_token = run_cli_command(cli_cmd)
-    sas_token = sas_token.rstrip("\n\r")  # STRANGE
-    logger.debug("sas token: %s", sas_token)
+def get_target_snapshot(transient_resource_group_name, target_resource_group_name, source_os_disk_snapshot_name,
+                        location, export_as_snapshot):
+    """ returns the resource group and name of the snapshot created in the target region """
+    target_snapshot_name = source_os_disk_snapshot_name + '-' + location
+    if export_as_snapshot:
+        return target_resource_group_name, target_snapshot_name
+    return transient_resource_group_name, target_snapshot_name
 
-    # create a container in the target blob storage account
-    logger.warning(
-        "%s - Creating container in the target storage account", location)
-    target_container_name = 'snapshots'
-    cli_cmd = prepare_cli_command(['storage', 'container', 'create',
-                                   '--name', target_container_name,
-                                   '--account-name', target_storage_account_name],
-                                  subscription=target_subscription)
 
-    run_cli_command(cli_cmd)
+def find_target_snapshot(engine, location, transient_resource_group_name, target_resource_group_name,
+                         source_os_disk_snapshot_name, export_as_snapshot, target_subscription, source_digest):
+    """ returns the id of a snapshot created in the target region from the same source before, or None """
+    snapshot_resource_group_name, target_snapshot_name = get_target_snapshot(
+        transient_resource_group_name, target_resource_group_name, source_os_disk_snapshot_name, location,
+        export_as_snapshot)
+    snapshot = engine.get_snapshot(snapshot_resource_group_name, target_snapshot_name, subscription=target_subscription)
+    if snapshot and (snapshot.get('tags') or {}).get(SOURCE_DIGEST_TAG) == source_digest:
+        logger.warning("%s - Found a snapshot of the same source, skipping the copy", location)
+        return snapshot['id']
+    return None
 
-    # Copy the snapshot to the target region using the SAS URL
-    blob_name = source_os_disk_snapshot_name + '.vhd'
-    logger.warning(
-        "%s - Copying blob to target storage account", location)
-    cli_cmd = prepare_cli_command(['storage', 'blob', 'copy', 'start',
-                                   '--source-uri', source_os_disk_snapshot_url,
-                                   '--destination-blob', blob_name,
-                                   '--destination-container', target_container_name,
-                                   '--account-name', target_storage_account_name,
-                                   '--sas-token', sas_token],
-                                  subscription=target_subscription)
-
-    run_cli_command(cli_cmd)
-
-    # Wait for the copy to complete
-    start_datetime = datetime.datetime.now()
-    wait_for_blob_copy_operation(blob_name, target_container_name, target_storage_account_name,
-                                 azure_pool_frequency, location, target_subscription)
-    msg = "{0} - Copy time: {1}".format(
-        location, datetime.datetime.now() - start_datetime)
-    logger.warning(msg)
-
-    # Create the snapshot in the target region from the copied blob
-    logger.warning(
-        "%s - Creating snapshot in target region from the copied blob", location)
-    target_blob_path = target_blob_endpoint + \
-        target_container_name + '/' + blob_name
-    target_snapshot_name = source_os_disk_snapshot_name + '-' + location
-    if export_as_snapshot:
-        snapshot_resource_group_name = target_resource_group_name
-    else:
-        snapshot_resource_group_name = transient_resource_group_name
 
-    storage_account_name = target_blob_path.split('.')[0].split('/')[-1]
-    if target_subscription:
-        subscription_id = target_subscription
-    else:
-        subscription_id = get_subscription_id(cmd.cli_ctx)
-    source_storage_account_id = resource_id(
-        subscription=subscription_id, resource_group=transient_resource_group_name,
-        namespace='Microsoft.Storage', type='storageAccounts', name=storage_account_name)
-
-    cli_cmd = prepare_cli_command(['snapshot', 'create',
-                                   '--resource-group', snapshot_resource_group_name,
-                                   '--name', target_snapshot_name,
-                                   '--location', location,
-                                   '--source', target_blob_path,
-                                   '--source-storage-account-id', source_storage_account_id],
-                                  subscription=target_subscription)
-
-    json_output = run_cli_command(cli_cmd, return_as_json=True)
-    target_snapshot_id = json_output['id']
+# pylint: disable=too-many-locals
+def create_target_image(cmd, engine, location, transient_resource_group_name, source_type, source_object_name,
+                        source_os_disk_snapshot_name, source_os_type, target_resource_group_name, tags,
+                        target_name, target_subscription, export_as_snapshot, target_blob_endpoint, blob_name,
+                        source_digest=None, target_snapshot_id=None):
+    """
+    creates the snapshot from the blob copied to the target region, unless target_snapshot_id is given,
+    and optionally the image from the snapshot
+    """
+    snapshot_resource_group_name, target_snapshot_name = get_target_snapshot(
+        transient_resource_group_name, target_resource_group_name, source_os_disk_snapshot_name, location,
+        export_as_snapshot)
+
+    if target_snapshot_id is None:
+        # Create the snapshot in the target region from the copied blob
+        logger.warning(
+            "%s - Creating snapshot in target region from the copied blob", location)
+        target_blob_path = target_blob_endpoint + \
+            TARGET_CONTAINER_NAME + '/' + blob_name
+
+        storage_account_name = target_blob_path.split('.')[0].split('/')[-1]
+        if target_subscription:
+            subscription_id = target_subscription
+        else:
+            subscription_id = get_subscription_id(cmd.cli_ctx)
+        source_storage_account_id = resource_id(
+            subscription=subscription_id, resource_group=transient_resource_group_name,
+            namespace='Microsoft.Storage', type='storageAccounts', name=storage_account_name)
+
+        # the digest of the source lets a later copy of the same source find the snapshot
+        snapshot_tags = '{}={}'.format(SOURCE_DIGEST_TAG, source_digest) if source_digest else None
+        target_snapshot_id = engine.create_snapshot(snapshot_resource_group_name, target_snapshot_name,
+                                                    target_blob_path, location=location,
+                                                    source_storage_account_id=source_storage_account_id,
+                                                    tags=snapshot_tags, subscription=target_subscription)
 
     # Optionally create the final image
     if export_as_snapshot:
@@ -149,56 +130,9 @@ def create_target_image(cmd, location, transient_resource_group_name, source_typ
         else:
             target_image_name = target_name
 
-        cli_cmd = prepare_cli_command(['image', 'create',
-                                       '--resource-group', target_resource_group_name,
-                                       '--name', target_image_name,
-                                       '--location', location,
-                                       '--source', target_blob_path,
-                                       '--os-type', source_os_type,
-                                       '--source', target_snapshot_id],
-                                      tags=tags,
-                                      subscription=target_subscription)
-
-        run_cli_command(cli_cmd)
-
-
-def wait_for_blob_copy_operation(blob_name, target_container_name, target_storage_account_name,
-                                 azure_pool_frequency, location, subscription):
-    copy_status = "pending"
-    prev_progress = -1
-    while copy_status == "pending":
-        cli_cmd = prepare_cli_command(['storage', 'blob', 'show',
-                                       '--name', blob_name,
-                                       '--container-name', target_container_name,
-                                       '--account-name', target_storage_account_name],
-                                      subscription=subscription)
-
-        json_output = run_cli_command(cli_cmd, return_as_json=True)
-        copy_status = json_output["properties"]["copy"]["status"]
-        copy_progress_1, copy_progress_2 = json_output["properties"]["copy"]["progress"].split(
-            "/")
-        current_progress = int(
-            int(copy_progress_1) / int(copy_progress_2) * 100)
-
-        if current_progress != prev_progress:
-            msg = "{0} - Copy progress: {1}%"\
-                .format(location, str(current_progress))
-            logger.warning(msg)
-
-        prev_progress = current_progress
-
-        try:
-            time.sleep(azure_pool_frequency)
-        except KeyboardInterrupt:
-            return
-
-    if copy_status != 'success':
-        logger.error(
-            "The copy operation didn't succeed. Last status: %s", copy_status)
-        logger.error("Command run: %s", cli_cmd)
-        logger.error("Command output: %s", json_output)
-
-        raise CLIError('Blob copy failed')
+        engine.create_image(target_resource_group_name, target_image_name, location, source_os_type,
+                            target_snapshot_id, tags=tags, subscription=target_subscription)
+    return target_snapshot_id
 
 
 def get_random_string(length):
@@ -3,13 +3,14 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
-from multiprocessing import Pool
+import hashlib
+import json
 
 from knack.util import CLIError
 from knack.log import get_logger
 
-from azext_imagecopy.cli_utils import run_cli_command, prepare_cli_command
-from azext_imagecopy.create_target import create_target_image
+from azext_imagecopy.engine import get_engine
+from azext_imagecopy.orchestrator import CopyOrchestrator, CopyState
 
 logger = get_logger(__name__)
 
@@ -20,15 +21,13 @@ logger = get_logger(__name__)
 def imagecopy(cmd, source_resource_group_name, source_object_name, target_location,
               target_resource_group_name, temporary_resource_group_name='image-copy-rg',
               source_type='image', cleanup='false', parallel_degree=-1, tags=None, target_name=None,
-              target_subscription=None, export_as_snapshot='false', timeout=3600):
+              target_subscription=None, export_as_snapshot='false', timeout=3600, state_file=None,
+              fan_out=False):
 
     # get the os disk id from source vm/image
     logger.warning("Getting os disk id of the source vm/image")
-    cli_cmd = prepare_cli_command([source_type, 'show',
-                                   '--name', source_object_name,
-                                   '--resource-group', source_resource_group_name])
-
-    json_cmd_output = run_cli_command(cli_cmd, return_as_json=True)
+    engine = get_engine(cmd)
+    json_cmd_output = engine.get_source(source_type, source_resource_group_name, source_object_name)
 
     if json_cmd_output['storageProfile']['dataDisks']:
         logger.warning(
@@ -71,16 +70,34 @@ def imagecopy(cmd, source_resource_group_name, source_object_name, target_locati
     logger.debug("source_os_disk_type: %s. source_os_disk_id: %s. source_os_type: %s",
                  source_os_disk_type, source_os_disk_id, source_os_type)
 
+    target_location = [location.strip() for location in target_location]
+    state = CopyState(state_file, {'resourceGroup': source_resource_group_name, 'name': source_object_name,
+                                   'type': source_type})
+    regions = state.load(target_location)
+
+    # images are immutable, so copies of the same image found in the target locations can be reused
+    source_digest = None
+    if source_type == 'image':
+        source_digest = hashlib.sha256(json.dumps(
+            [json_cmd_output['id'], json_cmd_output['storageProfile']['osDisk']],
+            sort_keys=True).encode('utf-8')).hexdigest()
+
     # create source snapshots
-    # TODO: skip creating another snapshot when the source is a snapshot
-    logger.warning("Creating source snapshot")
     source_os_disk_snapshot_name = source_object_name + '_os_disk_snapshot'
-    cli_cmd = prepare_cli_command(['snapshot', 'create',
-                                   '--name', source_os_disk_snapshot_name,
-                                   '--resource-group', source_resource_group_name,
-                                   '--source', source_os_disk_id])
-
-    run_cli_command(cli_cmd)
+    if source_os_disk_type == "SNAPSHOT":
+        # the source snapshot is used as is, there is no need for another one
+        from msrestazure.tools import parse_resource_id
+        snapshot_id_parts = parse_resource_id(source_os_disk_id)
+        source_snapshot_resource_group_name = snapshot_id_parts['resource_group']
+        source_snapshot_name = snapshot_id_parts['name']
+        logger.warning("Using the source snapshot: %s", source_snapshot_name)
+    else:
+        source_snapshot_resource_group_name = source_resource_group_name
+        source_snapshot_name = source_os_disk_snapshot_name
+        if not state.resumed:
+            logger.warning("Creating source snapshot")
+            engine.create_snapshot(source_resource_group_name, source_os_disk_snapshot_name, source_os_disk_id)
+            state.save()
 
     # Get SAS URL for the snapshotName
     logger.warning(
@@ -89,14 +106,8 @@ def imagecopy(cmd, source_resource_group_name, source_object_name, target_locati
         logger.error("Timeout should be greater than 3600 seconds")
         raise CLIError('Invalid Timeout')
 
-    cli_cmd = prepare_cli_command(['snapshot', 'grant-access',
-                                   '--name', source_os_disk_snapshot_name,
-                                   '--resource-group', source_resource_group_name,
-                                   '--duration-in-seconds', str(timeout)])
-
-    json_output = run_cli_command(cli_cmd, return_as_json=True)
-
-    source_os_disk_snapshot_url = json_output['accessSas']
+    source_os_disk_snapshot_url = engine.grant_snapshot_access(source_snapshot_resource_group_name,
+                                                               source_snapshot_name, timeout)
     logger.debug("source os disk snapshot url: %s",
                  source_os_disk_snapshot_url)
 
@@ -104,107 +115,65 @@ def imagecopy(cmd, source_resource_group_name, source_object_name, target_locati
 
     transient_resource_group_name = temporary_resource_group_name
     # pick the first location for the temp group
-    transient_resource_group_location = target_location[0].strip()
-    create_resource_group(transient_resource_group_name,
+    transient_resource_group_location = target_location[0]
+    create_resource_group(engine, transient_resource_group_name,
                           transient_resource_group_location,
                           target_subscription)
 
     target_locations_count = len(target_location)
     logger.warning("Target location count: %s", target_locations_count)
 
-    create_resource_group(target_resource_group_name,
-                          target_location[0].strip(),
+    create_resource_group(engine, target_resource_group_name,
+                          target_location[0],
                           target_subscription)
 
+    # try to get a handle on arm's 409s
+    azure_pool_frequency = 5
+    if target_locations_count >= 5:
+        azure_pool_frequency = 15
+    elif target_locations_count >= 3:
+        azure_pool_frequency = 10
+
+    if parallel_degree == -1:
+        parallel_degree = target_locations_count
+    orchestrator = CopyOrchestrator(cmd, engine, state, source_os_disk_snapshot_url, transient_resource_group_name,
+                                    source_type, source_object_name, source_os_disk_snapshot_name, source_os_type,
+                                    target_resource_group_name, tags, target_name, target_subscription,
+                                    export_as_snapshot, timeout, min(parallel_degree, target_locations_count),
+                                    azure_pool_frequency, source_digest=source_digest, fan_out=fan_out)
     try:
-
-        # try to get a handle on arm's 409s
-        azure_pool_frequency = 5
-        if target_locations_count >= 5:
-            azure_pool_frequency = 15
-        elif target_locations_count >= 3:
-            azure_pool_frequency = 10
-
-        if (target_locations_count == 1) or (parallel_degree == 1):
-            # Going to copy to targets one-by-one
-            logger.debug("Starting sync process for all locations")
-            for location in target_location:
-                location = location.strip()
-                create_target_image(cmd, location, transient_resource_group_name, source_type,
-                                    source_object_name, source_os_disk_snapshot_name, source_os_disk_snapshot_url,
-                                    source_os_type, target_resource_group_name, azure_pool_frequency,
-                                    tags, target_name, target_subscription, export_as_snapshot, timeout)
-        else:
-            if parallel_degree == -1:
-                pool = Pool(target_locations_count)
-            else:
-                pool = Pool(min(parallel_degree, target_locations_count))
-
-            tasks = []
-            for location in target_location:
-                location = location.strip()
-                tasks.append((location, transient_resource_group_name, source_type,
-                              source_object_name, source_os_disk_snapshot_name, source_os_disk_snapshot_url,
-                              source_os_type, target_resource_group_name, azure_pool_frequency,
-                              tags, target_name, target_subscription, export_as_snapshot, timeout))
-
-            logger.warning("Starting async process for all locations")
-
-            for task in tasks:
-                pool.apply_async(create_target_image, task)
-
-            pool.close()
-            pool.join()
-
+        logger.warning("Starting the copy to all locations")
+        orchestrator.run(regions)
     except KeyboardInterrupt:
         logger.warning('User cancelled the operation')
+        if state_file:
+            logger.warning('To resume the copy, run the command again with the same --state-file.')
         if cleanup:
             logger.warning('To cleanup temporary resources look for ones tagged with "image-copy-extension". \n'
                            'You can use the following command: az resource list --tag created_by=image-copy-extension')
-        pool.terminate()
         return
+    state.delete()
 
     # Cleanup
     if cleanup:
         logger.warning('Deleting transient resources')
 
         # Delete resource group
-        cli_cmd = prepare_cli_command(['group', 'delete', '--no-wait', '--yes',
-                                       '--name', transient_resource_group_name],
-                                      subscription=target_subscription)
-        run_cli_command(cli_cmd)
+        engine.delete_group(transient_resource_group_name, subscription=target_subscription)
 
         # Revoke sas for source snapshot
-        cli_cmd = prepare_cli_command(['snapshot', 'revoke-access',
-                                       '--name', source_os_disk_snapshot_name,
-                                       '--resource-group', source_resource_group_name])
-        run_cli_command(cli_cmd)
+        engine.revoke_snapshot_access(source_snapshot_resource_group_name, source_snapshot_name)
 
-        # Delete source snapshot
-        # TODO: skip this if source is snapshot and not creating a new one
-        cli_cmd = prepare_cli_command(['snapshot', 'delete',
-                                       '--name', source_os_disk_snapshot_name,
-                                       '--resource-group', source_resource_group_name])
-        run_cli_command(cli_cmd)
+        # Delete source snapshot, unless it is the source itself
+        if source_os_disk_type != "SNAPSHOT":
+            engine.delete_snapshot(source_resource_group_name, source_os_disk_snapshot_name)
 
 
-def create_resource_group(resource_group_name, location, subscription=None):
+def create_resource_group(engine, resource_group_name, location, subscription=None):
     # check if target resource group exists
-    cli_cmd = prepare_cli_command(['group', 'exists',
-                                   '--name', resource_group_name],
-                                  output_as_json=False,
-                                  subscription=subscription)
-
-    cmd_output = run_cli_command(cli_cmd)
-
-    if 'true' in cmd_output:
+    if engine.group_exists(resource_group_name, subscription=subscription):
         return
 
     # create the target resource group
     logger.warning("Creating resource group: %s", resource_group_name)
-    cli_cmd = prepare_cli_command(['group', 'create',
-                                   '--name', resource_group_name,
-                                   '--location', location],
-                                  subscription=subscription)
-
-    run_cli_command(cli_cmd)
+    engine.create_group(resource_group_name, location, subscription=subscription)
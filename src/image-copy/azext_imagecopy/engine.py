@@ -0,0 +1,364 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import threading
+
+from knack.log import get_logger
+
+from azext_imagecopy.cli_utils import run_cli_command, prepare_cli_command, EXTENSION_TAG_STRING
+
+logger = get_logger(__name__)
+
+_SAS_EXPIRY_FORMAT = "%Y-%m-%dT%H:%MZ"
+
+
+def get_engine(cmd):
+    """
+    returns the engine which runs the steps of the copy in-process with the SDK clients of the CLI,
+    or the engine which runs every step as an az command when the SDKs can't be loaded
+    """
+    try:
+        return SdkEngine(cmd)
+    except ImportError as ex:
+        logger.debug("Falling back to running az commands, unable to load the SDK clients: %s", ex)
+        return CliEngine()
+
+
+def _parse_tags(tags):
+    # the tags are given as 'key=value' pairs separated by spaces, like the --tags of az commands
+    tag_key, tag_value = EXTENSION_TAG_STRING.split('=', 1)
+    result = {tag_key: tag_value}
+    for tag in (tags or '').split():
+        key, _, value = tag.partition('=')
+        result[key] = value
+    return result
+
+
+def _parse_copy_progress(progress):
+    if not progress:
+        return 0, 0
+    copied, total = progress.split('/')
+    return int(copied), int(total)
+
+
+class CliEngine(object):
+    """ runs every step of the copy as an az command """
+
+    def get_source(self, source_type, resource_group_name, name):
+        cli_cmd = prepare_cli_command([source_type, 'show',
+                                       '--name', name,
+                                       '--resource-group', resource_group_name])
+        return run_cli_command(cli_cmd, return_as_json=True)
+
+    def group_exists(self, resource_group_name, subscription=None):
+        cli_cmd = prepare_cli_command(['group', 'exists',
+                                       '--name', resource_group_name],
+                                      output_as_json=False,
+                                      subscription=subscription)
+        return 'true' in run_cli_command(cli_cmd)
+
+    def create_group(self, resource_group_name, location, subscription=None):
+        cli_cmd = prepare_cli_command(['group', 'create',
+                                       '--name', resource_group_name,
+                                       '--location', location],
+                                      subscription=subscription)
+        run_cli_command(cli_cmd)
+
+    def delete_group(self, resource_group_name, subscription=None):
+        cli_cmd = prepare_cli_command(['group', 'delete', '--no-wait', '--yes',
+                                       '--name', resource_group_name],
+                                      subscription=subscription)
+        run_cli_command(cli_cmd)
+
+    def get_snapshot(self, resource_group_name, name, subscription=None):
+        """ returns the snapshot, or None if it doesn't exist """
+        if not self.group_exists(resource_group_name, subscription=subscription):
+            return None
+        cli_cmd = prepare_cli_command(['snapshot', 'list',
+                                       '--resource-group', resource_group_name,
+                                       '--query', "[?name=='{}']".format(name)],
+                                      subscription=subscription)
+        snapshots = run_cli_command(cli_cmd, return_as_json=True)
+        return snapshots[0] if snapshots else None
+
+    def create_snapshot(self, resource_group_name, name, source, location=None,
+                        source_storage_account_id=None, tags=None, subscription=None):
+        """ creates a snapshot of a disk, snapshot or blob, returns the snapshot id """
+        cmd = ['snapshot', 'create',
+               '--resource-group', resource_group_name,
+               '--name', name,
+               '--source', source]
+        if location:
+            cmd += ['--location', location]
+        if source_storage_account_id:
+            cmd += ['--source-storage-account-id', source_storage_account_id]
+        return run_cli_command(prepare_cli_command(cmd, tags=tags, subscription=subscription),
+                               return_as_json=True)['id']
+
+    def grant_snapshot_access(self, resource_group_name, name, duration_in_seconds):
+        cli_cmd = prepare_cli_command(['snapshot', 'grant-access',
+                                       '--name', name,
+                                       '--resource-group', resource_group_name,
+                                       '--duration-in-seconds', str(duration_in_seconds)])
+        return run_cli_command(cli_cmd, return_as_json=True)['accessSas']
+
+    def revoke_snapshot_access(self, resource_group_name, name):
+        cli_cmd = prepare_cli_command(['snapshot', 'revoke-access',
+                                       '--name', name,
+                                       '--resource-group', resource_group_name])
+        run_cli_command(cli_cmd)
+
+    def delete_snapshot(self, resource_group_name, name):
+        cli_cmd = prepare_cli_command(['snapshot', 'delete',
+                                       '--name', name,
+                                       '--resource-group', resource_group_name])
+        run_cli_command(cli_cmd)
+
+    def create_storage_account(self, resource_group_name, name, location, subscription=None):
+        """ creates a storage account, returns its blob endpoint """
+        cli_cmd = prepare_cli_command(['storage', 'account', 'create',
+                                       '--name', name,
+                                       '--resource-group', resource_group_name,
+                                       '--location', location,
+                                       '--sku', 'Standard_LRS'],
+                                      subscription=subscription)
+        return run_cli_command(cli_cmd, return_as_json=True)['primaryEndpoints']['blob']
+
+    def get_storage_account_key(self, resource_group_name, name, subscription=None):
+        cli_cmd = prepare_cli_command(['storage', 'account', 'keys', 'list',
+                                       '--account-name', name,
+                                       '--resource-group', resource_group_name],
+                                      subscription=subscription)
+        return run_cli_command(cli_cmd, return_as_json=True)[0]['value']
+
+    def create_container(self, account_name, account_key, container_name, subscription=None):
+        cli_cmd = prepare_cli_command(['storage', 'container', 'create',
+                                       '--name', container_name,
+                                       '--account-name', account_name,
+                                       '--account-key', account_key],
+                                      subscription=subscription)
+        run_cli_command(cli_cmd)
+
+    def start_blob_copy(self, account_name, account_key, container_name, blob_name, source_url, expiry,
+                        subscription=None):
+        cli_cmd = prepare_cli_command(['storage', 'account', 'generate-sas',
+                                       '--account-name', account_name,
+                                       '--account-key', account_key,
+                                       '--expiry', expiry.strftime(_SAS_EXPIRY_FORMAT),
+                                       '--permissions', 'aclrpuw', '--resource-types',
+                                       'sco', '--services', 'b', '--https-only'],
+                                      output_as_json=False,
+                                      subscription=subscription)
+        sas_token = run_cli_command(cli_cmd).rstrip("\n\r")
+        logger.debug("sas token: %s", sas_token)
+
+        cli_cmd = prepare_cli_command(['storage', 'blob', 'copy', 'start',
+                                       '--source-uri', source_url,
+                                       '--destination-blob', blob_name,
+                                       '--destination-container', container_name,
+                                       '--account-name', account_name,
+                                       '--sas-token', sas_token],
+                                      subscription=subscription)
+        run_cli_command(cli_cmd)
+
+    def get_blob_read_url(self, account_name, account_key, container_name, blob_name, expiry, subscription=None):
+        """ returns the url of a blob with a SAS to read it until expiry """
+        cli_cmd = prepare_cli_command(['storage', 'blob', 'url',
+                                       '--name', blob_name,
+                                       '--container-name', container_name,
+                                       '--account-name', account_name,
+                                       '--account-key', account_key],
+                                      subscription=subscription)
+        url = run_cli_command(cli_cmd, return_as_json=True)
+        cli_cmd = prepare_cli_command(['storage', 'blob', 'generate-sas',
+                                       '--name', blob_name,
+                                       '--container-name', container_name,
+                                       '--account-name', account_name,
+                                       '--account-key', account_key,
+                                       '--expiry', expiry.strftime(_SAS_EXPIRY_FORMAT),
+                                       '--permissions', 'r', '--https-only'],
+                                      output_as_json=False,
+                                      subscription=subscription)
+        return url + '?' + run_cli_command(cli_cmd).rstrip("\n\r")
+
+    def get_blob_copy_status(self, account_name, account_key, container_name, blob_name, subscription=None):
+        """ returns the status of the copy to a blob with the bytes copied so far and the total bytes """
+        cli_cmd = prepare_cli_command(['storage', 'blob', 'show',
+                                       '--name', blob_name,
+                                       '--container-name', container_name,
+                                       '--account-name', account_name,
+                                       '--account-key', account_key],
+                                      subscription=subscription)
+        copy = run_cli_command(cli_cmd, return_as_json=True)['properties']['copy']
+        copied, total = _parse_copy_progress(copy['progress'])
+        return copy['status'], copied, total
+
+    def create_image(self, resource_group_name, name, location, os_type, snapshot_id, tags=None,
+                     subscription=None):
+        cli_cmd = prepare_cli_command(['image', 'create',
+                                       '--resource-group', resource_group_name,
+                                       '--name', name,
+                                       '--location', location,
+                                       '--os-type', os_type,
+                                       '--source', snapshot_id],
+                                      tags=tags,
+                                      subscription=subscription)
+        run_cli_command(cli_cmd)
+
+
+class SdkEngine(object):  # pylint: disable=too-many-instance-attributes
+    """
+    runs every step of the copy in-process, with SDK clients that are created once per subscription
+    and shared by all the target locations, so they share their authenticated sessions
+    """
+
+    def __init__(self, cmd):
+        from azure.cli.core.commands.client_factory import get_mgmt_service_client, get_subscription_id
+        from azure.cli.core.profiles import ResourceType, get_sdk
+
+        self.cmd = cmd
+        self.cli_ctx = cmd.cli_ctx
+        self.resource_type = ResourceType
+        self.get_mgmt_service_client = get_mgmt_service_client
+        self.default_subscription_id = get_subscription_id(cmd.cli_ctx)
+        self.blob_service_cls = get_sdk(cmd.cli_ctx, ResourceType.DATA_STORAGE, 'blob#PageBlobService')
+        if self.blob_service_cls is None:
+            raise ImportError('The storage data plane SDK is not available.')
+        self.clients = {}
+        self.blob_services = {}
+        self.lock = threading.Lock()
+
+    def _get_subscription_id(self, subscription):
+        if subscription is None:
+            return self.default_subscription_id
+        # like --subscription, the subscription can be a name or an id
+        from azure.cli.core._profile import Profile
+        return Profile(cli_ctx=self.cli_ctx).get_subscription(subscription)['id']
+
+    def _get_client(self, resource_type, subscription=None):
+        with self.lock:
+            key = (resource_type, subscription)
+            if key not in self.clients:
+                self.clients[key] = self.get_mgmt_service_client(
+                    self.cli_ctx, resource_type, subscription_id=self._get_subscription_id(subscription))
+            return self.clients[key]
+
+    def _compute(self, subscription=None):
+        return self._get_client(self.resource_type.MGMT_COMPUTE, subscription)
+
+    def _storage(self, subscription=None):
+        return self._get_client(self.resource_type.MGMT_STORAGE, subscription)
+
+    def _resources(self, subscription=None):
+        return self._get_client(self.resource_type.MGMT_RESOURCE_RESOURCES, subscription)
+
+    def _get_blob_service(self, account_name, account_key):
+        with self.lock:
+            if account_name not in self.blob_services:
+                self.blob_services[account_name] = self.blob_service_cls(
+                    account_name=account_name, account_key=account_key,
+                    endpoint_suffix=self.cli_ctx.cloud.suffixes.storage_endpoint)
+            return self.blob_services[account_name]
+
+    def _get_compute_models(self, *names):
+        return self.cmd.get_models(*names, resource_type=self.resource_type.MGMT_COMPUTE)
+
+    def get_source(self, source_type, resource_group_name, name):
+        from azure.cli.core.util import todict
+        compute = self._compute()
+        if source_type == 'vm':
+            return todict(compute.virtual_machines.get(resource_group_name, name))
+        return todict(compute.images.get(resource_group_name, name))
+
+    def group_exists(self, resource_group_name, subscription=None):
+        return self._resources(subscription).resource_groups.check_existence(resource_group_name)
+
+    def create_group(self, resource_group_name, location, subscription=None):
+        ResourceGroup = self.cmd.get_models('ResourceGroup', resource_type=self.resource_type.MGMT_RESOURCE_RESOURCES)
+        self._resources(subscription).resource_groups.create_or_update(
+            resource_group_name, ResourceGroup(location=location, tags=_parse_tags(None)))
+
+    def delete_group(self, resource_group_name, subscription=None):
+        # like --no-wait, the deletion isn't awaited
+        self._resources(subscription).resource_groups.delete(resource_group_name)
+
+    def get_snapshot(self, resource_group_name, name, subscription=None):
+        """ returns the snapshot, or None if it doesn't exist """
+        from azure.cli.core.util import todict
+        from msrestazure.azure_exceptions import CloudError
+        try:
+            return todict(self._compute(subscription).snapshots.get(resource_group_name, name))
+        except CloudError as ex:
+            if ex.status_code == 404:
+                return None
+            raise
+
+    def create_snapshot(self, resource_group_name, name, source, location=None,
+                        source_storage_account_id=None, tags=None, subscription=None):
+        """ creates a snapshot of a disk, snapshot or blob, returns the snapshot id """
+        Snapshot, CreationData = self._get_compute_models('Snapshot', 'CreationData')
+        if location is None:
+            location = self._resources(subscription).resource_groups.get(resource_group_name).location
+        if source.lower().startswith('http'):
+            creation_data = CreationData(create_option='Import', source_uri=source,
+                                         storage_account_id=source_storage_account_id)
+        else:
+            creation_data = CreationData(create_option='Copy', source_resource_id=source)
+        snapshot = Snapshot(location=location, creation_data=creation_data, tags=_parse_tags(tags))
+        return self._compute(subscription).snapshots.create_or_update(resource_group_name, name, snapshot).result().id
+
+    def grant_snapshot_access(self, resource_group_name, name, duration_in_seconds):
+        return self._compute().snapshots.grant_access(
+            resource_group_name, name, 'Read', duration_in_seconds).result().access_sas
+
+    def revoke_snapshot_access(self, resource_group_name, name):
+        self._compute().snapshots.revoke_access(resource_group_name, name).result()
+
+    def delete_snapshot(self, resource_group_name, name):
+        self._compute().snapshots.delete(resource_group_name, name).result()
+
+    def create_storage_account(self, resource_group_name, name, location, subscription=None):
+        """ creates a storage account, returns its blob endpoint """
+        StorageAccountCreateParameters, Sku = self.cmd.get_models(
+            'StorageAccountCreateParameters', 'Sku', resource_type=self.resource_type.MGMT_STORAGE)
+        parameters = StorageAccountCreateParameters(sku=Sku(name='Standard_LRS'), kind='StorageV2',
+                                                    location=location, tags=_parse_tags(None))
+        account = self._storage(subscription).storage_accounts.create(resource_group_name, name, parameters).result()
+        return account.primary_endpoints.blob
+
+    def get_storage_account_key(self, resource_group_name, name, subscription=None):
+        return self._storage(subscription).storage_accounts.list_keys(resource_group_name, name).keys[0].value
+
+    def create_container(self, account_name, account_key, container_name, subscription=None):  # pylint: disable=unused-argument
+        self._get_blob_service(account_name, account_key).create_container(container_name)
+
+    def start_blob_copy(self, account_name, account_key, container_name, blob_name, source_url, expiry,  # pylint: disable=unused-argument
+                        subscription=None):
+        # the destination is accessed with the account key, so unlike az commands no SAS is needed
+        self._get_blob_service(account_name, account_key).copy_blob(container_name, blob_name, source_url)
+
+    def get_blob_read_url(self, account_name, account_key, container_name, blob_name, expiry, subscription=None):  # pylint: disable=unused-argument
+        """ returns the url of a blob with a SAS to read it until expiry """
+        from azure.cli.core.profiles import get_sdk
+        BlobPermissions = get_sdk(self.cli_ctx, self.resource_type.DATA_STORAGE, 'blob.models#BlobPermissions')
+        blob_service = self._get_blob_service(account_name, account_key)
+        sas_token = blob_service.generate_blob_shared_access_signature(
+            container_name, blob_name, permission=BlobPermissions.READ, expiry=expiry, protocol='https')
+        return blob_service.make_blob_url(container_name, blob_name, sas_token=sas_token)
+
+    def get_blob_copy_status(self, account_name, account_key, container_name, blob_name, subscription=None):  # pylint: disable=unused-argument
+        """ returns the status of the copy to a blob with the bytes copied so far and the total bytes """
+        blob = self._get_blob_service(account_name, account_key).get_blob_properties(container_name, blob_name)
+        copied, total = _parse_copy_progress(blob.properties.copy.progress)
+        return blob.properties.copy.status, copied, total
+
+    def create_image(self, resource_group_name, name, location, os_type, snapshot_id, tags=None,
+                     subscription=None):
+        Image, ImageStorageProfile, ImageOSDisk, SubResource = self._get_compute_models(
+            'Image', 'ImageStorageProfile', 'ImageOSDisk', 'SubResource')
+        image = Image(location=location, tags=_parse_tags(tags), storage_profile=ImageStorageProfile(
+            os_disk=ImageOSDisk(os_type=os_type, os_state='Generalized', snapshot=SubResource(id=snapshot_id))))
+        self._compute(subscription).images.create_or_update(resource_group_name, name, image).result()
+
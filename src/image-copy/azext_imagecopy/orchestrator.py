@@ -0,0 +1,410 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import datetime
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from knack.util import CLIError
+from knack.log import get_logger
+
+from azext_imagecopy.create_target import (
+    create_target_storage, get_target_storage_key, start_target_copy, create_target_image, find_target_snapshot,
+    TARGET_CONTAINER_NAME)
+
+logger = get_logger(__name__)
+
+MIN_POLL_INTERVAL = 2
+MAX_POLL_INTERVAL = 30
+MAX_STATUS_WORKERS = 8
+# a copy fails after this many status checks failed in a row
+MAX_STATUS_ERRORS = 10
+THROUGHPUT_SMOOTHING = 0.3
+# the number of regions a region copies to at the same time in the fan-out mode
+FAN_OUT_DEGREE = 2
+
+# the states of the copy to a region, in order
+PENDING = 'pending'
+STORAGE_CREATED = 'storageCreated'
+COPYING = 'copying'
+COPIED = 'copied'
+DONE = 'done'
+FAILED = 'failed'
+
+_REGION_QUALIFIERS_REGEX = re.compile(r'north|south|east|west|central|euap|stage|\d')
+_GEOGRAPHIES = {
+    'uk': 'europe', 'france': 'europe', 'germany': 'europe', 'switzerland': 'europe', 'norway': 'europe',
+    'sweden': 'europe', 'poland': 'europe', 'italy': 'europe', 'japan': 'asia', 'korea': 'asia', 'india': 'asia',
+    'canada': 'us', 'brazil': 'southamerica', 'uae': 'middleeast', 'qatar': 'middleeast',
+}
+
+
+def get_geography(location):
+    """ the geography of a region, e.g. 'westeurope' and 'uksouth' are both in 'europe' """
+    name = _REGION_QUALIFIERS_REGEX.sub('', location.lower()) or location.lower()
+    return _GEOGRAPHIES.get(name, name)
+
+
+class RegionCopy(object):  # pylint: disable=too-many-instance-attributes
+    """ the state of the copy to a single region """
+
+    def __init__(self, location, state=PENDING, storage_account_name=None, blob_endpoint=None, snapshot_id=None,
+                 error=None, source_location=None):
+        self.location = location
+        self.geography = get_geography(location)
+        self.state = state
+        self.storage_account_name = storage_account_name
+        self.blob_endpoint = blob_endpoint
+        self.snapshot_id = snapshot_id
+        self.error = error
+        # the region the blob is copied from in the fan-out mode, None when it is copied from the source
+        self.source_location = source_location
+        self.blob_copied = False
+        self.storage_account_key = None
+        self.copied_bytes = 0
+        self.total_bytes = 0
+        self.throughput = None
+        self.last_sample = None
+        self.start_time = None
+        self.status_errors = 0
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'storageAccountName': self.storage_account_name,
+            'blobEndpoint': self.blob_endpoint,
+            'snapshotId': self.snapshot_id,
+            'error': self.error,
+            'sourceLocation': self.source_location,
+        }
+
+    @classmethod
+    def from_dict(cls, location, data):
+        region = cls(location, data['state'], data.get('storageAccountName'), data.get('blobEndpoint'),
+                     data.get('snapshotId'), data.get('error'), data.get('sourceLocation'))
+        if region.state == FAILED:
+            # a failed region starts over, with the storage account created before if there is one
+            region.state = STORAGE_CREATED if region.storage_account_name else PENDING
+            region.error = None
+        return region
+
+    def update_progress(self, copied_bytes, total_bytes, now):
+        if self.last_sample is not None and now > self.last_sample[0]:
+            throughput = (copied_bytes - self.last_sample[1]) / (now - self.last_sample[0])
+            if self.throughput is None:
+                self.throughput = throughput
+            else:
+                self.throughput += THROUGHPUT_SMOOTHING * (throughput - self.throughput)
+        self.last_sample = (now, copied_bytes)
+        self.copied_bytes = copied_bytes
+        self.total_bytes = total_bytes
+
+    def get_eta(self):
+        """ the seconds left until the copy completes, or None when it isn't known yet """
+        if not self.throughput or not self.total_bytes:
+            return None
+        return (self.total_bytes - self.copied_bytes) / self.throughput
+
+    def get_progress(self):
+        if self.state != COPYING:
+            return '{}: {}'.format(self.location, self.state)
+        if self.source_location:
+            return '{} (from {}): {}'.format(self.location, self.source_location, self._get_copy_progress())
+        return '{}: {}'.format(self.location, self._get_copy_progress())
+
+    def _get_copy_progress(self):
+        percent = self.copied_bytes * 100 // self.total_bytes if self.total_bytes else 0
+        eta = self.get_eta()
+        if eta is None:
+            return '{}%'.format(percent)
+        return '{}% {:.1f} MB/s ETA {}'.format(percent, self.throughput / 1024 / 1024,
+                                               datetime.timedelta(seconds=int(eta)))
+
+
+class CopyState(object):
+    """ the state of all the regions, saved to a file after every change so that the copy can be resumed """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.regions = {}
+        self.resumed = False
+
+    def load(self, locations):
+        if self.path and os.path.exists(self.path):
+            self.resumed = True
+            with open(self.path, 'r') as state_file:
+                state = json.load(state_file)
+            if state.get('source') != self.source:
+                raise CLIError("The state file '{}' belongs to the copy of another source.".format(self.path))
+            logger.warning("Resuming the copy from the state file: %s", self.path)
+            self.regions = {location: RegionCopy.from_dict(location, data)
+                            for location, data in state['regions'].items() if location in locations}
+        for location in locations:
+            if location not in self.regions:
+                self.regions[location] = RegionCopy(location)
+        return [self.regions[location] for location in locations]
+
+    def save(self):
+        if not self.path:
+            return
+        state = {
+            'source': self.source,
+            'regions': {location: region.to_dict() for location, region in self.regions.items()}
+        }
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp_path, 'w') as state_file:
+            json.dump(state, state_file, indent=2)
+        os.replace(temp_path, self.path)
+
+    def delete(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CopyOrchestrator(object):  # pylint: disable=too-many-instance-attributes
+    """
+    drives the copy to all the regions as state machines: the steps of the regions run on a thread
+    pool, while the copies in progress are all checked by a single poller whose interval adapts to
+    the copy closest to completion. In the fan-out mode only one region per geography copies from
+    the source, the other regions of the geography copy from the regions copied already.
+    """
+
+    def __init__(self, cmd, engine, state, source_url, transient_resource_group_name, source_type,
+                 source_object_name, source_os_disk_snapshot_name, source_os_type, target_resource_group_name,
+                 tags, target_name, target_subscription, export_as_snapshot, timeout, parallel_degree,
+                 poll_interval, source_digest=None, fan_out=False):
+        self.cmd = cmd
+        self.engine = engine
+        self.state = state
+        self.source_url = source_url
+        self.transient_resource_group_name = transient_resource_group_name
+        self.source_type = source_type
+        self.source_object_name = source_object_name
+        self.source_os_disk_snapshot_name = source_os_disk_snapshot_name
+        self.source_os_type = source_os_type
+        self.target_resource_group_name = target_resource_group_name
+        self.tags = tags
+        self.target_name = target_name
+        self.target_subscription = target_subscription
+        self.export_as_snapshot = export_as_snapshot
+        self.timeout = timeout
+        self.parallel_degree = parallel_degree
+        self.poll_interval = poll_interval
+        self.blob_name = source_os_disk_snapshot_name + '.vhd'
+        self.source_digest = source_digest
+        self.fan_out = fan_out
+        self.regions = {}
+        self.seeds = {}
+        self.fan_out_copies = {}
+
+    def run(self, regions):
+        executor = ThreadPoolExecutor(self.parallel_degree)
+        status_executor = ThreadPoolExecutor(min(MAX_STATUS_WORKERS, len(regions)))
+        steps = {}
+        next_poll = time.time()
+        self.regions = {region.location: region for region in regions}
+        for region in regions:
+            if region.state == COPYING:
+                self._add_copy(region)
+        try:
+            self._submit_next_steps(executor, steps, regions)
+
+            while steps or self._copying(regions):
+                timeout = max(0, next_poll - time.time()) if self._copying(regions) else None
+                if steps:
+                    done, _ = wait(list(steps), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    done = []
+                    time.sleep(timeout)
+                for future in done:
+                    region = steps.pop(future)
+                    self._complete_step(region, future)
+
+                if self._copying(regions) and time.time() >= next_poll:
+                    next_poll = time.time() + self._poll(status_executor, regions)
+                self._submit_next_steps(executor, steps, regions)
+        finally:
+            executor.shutdown(wait=False)
+            status_executor.shutdown(wait=False)
+
+        failed = [region for region in regions if region.state == FAILED]
+        for region in failed:
+            logger.error("%s - Copy failed: %s", region.location, region.error)
+        if failed:
+            message = 'Copy failed in: {}'.format(', '.join(region.location for region in failed))
+            if self.state.path:
+                message += '. Run the command again with the same --state-file to retry these locations.'
+            raise CLIError(message)
+
+    @staticmethod
+    def _copying(regions):
+        return any(region.state == COPYING for region in regions)
+
+    def _submit_next_steps(self, executor, steps, regions):
+        running = set(steps.values())
+        for region in regions:
+            if region in running:
+                continue
+            step = {
+                PENDING: self._create_storage,
+                COPIED: self._create_target,
+            }.get(region.state)
+            if region.state == STORAGE_CREATED:
+                source = self._pick_source(region)
+                if source is False:
+                    continue
+                region.source_location = source.location if source else None
+                self._add_copy(region)
+                step = self._start_copy
+            if region.state == COPYING and region.storage_account_key is None:
+                # a copy resumed from the state file needs the key of its storage account to be checked
+                step = self._get_storage_key
+            if step is not None:
+                steps[executor.submit(step, region)] = region
+
+    def _pick_source(self, region):
+        """ returns the region to copy from, None to copy from the source, or False to wait for another region """
+        if not self.fan_out:
+            return None
+        sources = [other for other in self.regions.values()
+                   if other.geography == region.geography and other.blob_copied and other.storage_account_key and
+                   self.fan_out_copies.get(other.location, 0) < FAN_OUT_DEGREE]
+        if sources:
+            return min(sources, key=lambda other: self.fan_out_copies.get(other.location, 0))
+
+        # only one region per geography copies from the source, the others wait for it
+        seed = self.seeds.get(region.geography)
+        if seed is None or seed is region or seed.state not in (PENDING, STORAGE_CREATED, COPYING):
+            if any(other.blob_copied for other in self.regions.values() if other.geography == region.geography):
+                return False
+            self.seeds[region.geography] = region
+            return None
+        return False
+
+    def _add_copy(self, region):
+        if region.source_location:
+            self.fan_out_copies[region.source_location] = self.fan_out_copies.get(region.source_location, 0) + 1
+        elif self.fan_out:
+            self.seeds.setdefault(region.geography, region)
+
+    def _remove_copy(self, region):
+        if region.source_location:
+            self.fan_out_copies[region.source_location] -= 1
+
+    def _fail_copy(self, region, error):
+        self._remove_copy(region)
+        region.state = FAILED
+        region.error = error
+
+    def _complete_step(self, region, future):
+        error = future.exception()
+        if error is not None:
+            if region.state in (STORAGE_CREATED, COPYING):
+                self._remove_copy(region)
+            region.state = FAILED
+            region.error = str(error) or type(error).__name__
+        else:
+            future.result()
+        self.state.save()
+
+    def _create_storage(self, region):
+        region.snapshot_id = find_target_snapshot(
+            self.engine, region.location, self.transient_resource_group_name, self.target_resource_group_name,
+            self.source_os_disk_snapshot_name, self.export_as_snapshot, self.target_subscription,
+            self.source_digest) if self.source_digest else None
+        if region.snapshot_id:
+            region.state = COPIED
+            return
+        region.storage_account_name, region.blob_endpoint = create_target_storage(
+            self.engine, region.location, self.transient_resource_group_name, self.target_subscription)
+        region.state = STORAGE_CREATED
+
+    def _get_storage_key(self, region):
+        region.storage_account_key = get_target_storage_key(
+            self.engine, self.transient_resource_group_name, region.storage_account_name, self.target_subscription)
+
+    def _start_copy(self, region):
+        if region.storage_account_key is None:
+            self._get_storage_key(region)
+        source_url = self.source_url
+        if region.source_location:
+            source = self.regions[region.source_location]
+            source_url = self.engine.get_blob_read_url(
+                source.storage_account_name, source.storage_account_key, TARGET_CONTAINER_NAME, self.blob_name,
+                datetime.datetime.utcnow() + datetime.timedelta(seconds=self.timeout),
+                subscription=self.target_subscription)
+            logger.warning("%s - Copying from %s", region.location, region.source_location)
+        start_target_copy(self.engine, region.location, region.storage_account_name, region.storage_account_key,
+                          self.blob_name, source_url, self.target_subscription, self.timeout)
+        region.start_time = time.time()
+        region.state = COPYING
+
+    def _create_target(self, region):
+        region.snapshot_id = create_target_image(
+            self.cmd, self.engine, region.location, self.transient_resource_group_name, self.source_type,
+            self.source_object_name, self.source_os_disk_snapshot_name, self.source_os_type,
+            self.target_resource_group_name, self.tags, self.target_name, self.target_subscription,
+            self.export_as_snapshot, region.blob_endpoint, self.blob_name, self.source_digest, region.snapshot_id)
+        region.state = DONE
+        logger.warning("%s - Done", region.location)
+
+    def _get_copy_status(self, region):
+        try:
+            return self.engine.get_blob_copy_status(region.storage_account_name, region.storage_account_key,
+                                                    TARGET_CONTAINER_NAME, self.blob_name,
+                                                    subscription=self.target_subscription), None
+        except Exception as ex:  # pylint: disable=broad-except
+            return None, ex
+
+    def _poll(self, status_executor, regions):
+        """ checks all the copies in progress at once, returns the seconds until the next check """
+        copying = [region for region in regions if region.state == COPYING and region.storage_account_key]
+        now = time.time()
+        changed = False
+        for region, (status, error) in zip(copying, status_executor.map(self._get_copy_status, copying)):
+            # a copy resumed from the state file is timed from its first check
+            region.start_time = region.start_time or now
+            if error is not None:
+                logger.debug("%s - Unable to get the copy status: %s", region.location, error)
+                region.status_errors += 1
+                if region.status_errors >= MAX_STATUS_ERRORS:
+                    self._fail_copy(region, "Unable to get the copy status: {}".format(error))
+                    changed = True
+                elif now - region.start_time > self.timeout:
+                    self._fail_copy(region, "The copy didn't complete in {} seconds.".format(self.timeout))
+                    changed = True
+                continue
+            region.status_errors = 0
+            copy_status, copied_bytes, total_bytes = status
+            region.update_progress(copied_bytes, total_bytes, now)
+            if copy_status == 'success':
+                logger.warning("%s - Copy time: %s", region.location,
+                               datetime.timedelta(seconds=int(now - (region.start_time or now))))
+                self._remove_copy(region)
+                region.state = COPIED
+                region.blob_copied = True
+                changed = True
+            elif copy_status != 'pending':
+                self._fail_copy(region, "The copy operation didn't succeed. Last status: {}".format(copy_status))
+                changed = True
+            elif now - region.start_time > self.timeout:
+                self._fail_copy(region, "The copy didn't complete in {} seconds.".format(self.timeout))
+                changed = True
+
+        if changed:
+            self.state.save()
+        if copying:
+            logger.warning("Copy progress - %s", ', '.join(region.get_progress() for region in regions))
+
+        # check more often as the copies get closer to completion
+        etas = [region.get_eta() for region in regions if region.state == COPYING]
+        etas = [eta for eta in etas if eta is not None]
+        if not etas:
+            return self.poll_interval
+        return min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, min(etas) / 2))
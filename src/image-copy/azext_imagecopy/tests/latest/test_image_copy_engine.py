@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+import mock
+from msrestazure.azure_exceptions import CloudError
+
+from azext_imagecopy.engine import CliEngine, SdkEngine, get_engine
+
+
+class _Model(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _get_models(*names, **kwargs):  # pylint: disable=unused-argument
+    return [_Model] * len(names) if len(names) > 1 else _Model
+
+
+def _poller(result=None):
+    poller = mock.MagicMock()
+    poller.result.return_value = result
+    return poller
+
+
+class TestSdkEngine(unittest.TestCase):
+    def setUp(self):
+        self.clients = {}
+        self.blob_service_cls = mock.MagicMock()
+
+        def _get_client(cli_ctx, resource_type, subscription_id=None):  # pylint: disable=unused-argument
+            return self.clients.setdefault((resource_type, subscription_id), mock.MagicMock())
+
+        self.get_client = mock.MagicMock(side_effect=_get_client)
+        patches = [
+            mock.patch('azure.cli.core.commands.client_factory.get_mgmt_service_client', self.get_client),
+            mock.patch('azure.cli.core.commands.client_factory.get_subscription_id', return_value='sub'),
+            mock.patch('azure.cli.core.profiles.get_sdk', return_value=self.blob_service_cls),
+            # the resource types only select the mocked clients and models
+            mock.patch('azure.cli.core.profiles.ResourceType'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.cmd = mock.MagicMock()
+        self.cmd.get_models.side_effect = _get_models
+        self.engine = SdkEngine(self.cmd)
+        self.compute = self.engine._compute()  # pylint: disable=protected-access
+        self.resources = self.engine._resources()  # pylint: disable=protected-access
+
+    def test_create_snapshot_and_image(self):
+        self.resources.resource_groups.get.return_value = _Model(location='eastus')
+        self.compute.snapshots.create_or_update.return_value = _poller(_Model(id='/snapshots/s1'))
+
+        snapshot_id = self.engine.create_snapshot('rg', 's1', 'https://account.blob.core.windows.net/vhds/os.vhd',
+                                                  source_storage_account_id='/accounts/account', tags='a=b')
+        self.engine.create_image('rg', 'image', 'eastus', 'Linux', snapshot_id)
+
+        self.assertEqual(snapshot_id, '/snapshots/s1')
+        _, _, snapshot = self.compute.snapshots.create_or_update.call_args[0]
+        self.assertEqual(snapshot.location, 'eastus')
+        self.assertEqual(snapshot.creation_data.create_option, 'Import')
+        self.assertEqual(snapshot.creation_data.storage_account_id, '/accounts/account')
+        self.assertEqual(snapshot.tags['a'], 'b')
+        _, _, image = self.compute.images.create_or_update.call_args[0]
+        self.assertEqual(image.storage_profile.os_disk.snapshot.id, '/snapshots/s1')
+        self.compute.images.create_or_update.return_value.result.assert_called_once_with()
+
+        # the clients are created once per subscription and resource type
+        self.assertEqual(self.get_client.call_count, 2)
+
+    def test_copy_blob(self):
+        blob_service = self.blob_service_cls.return_value
+        blob_service.get_blob_properties.return_value = _Model(properties=_Model(
+            copy=_Model(status='pending', progress='512/2048')))
+
+        self.engine.create_container('account', 'key', 'vhds')
+        self.engine.start_blob_copy('account', 'key', 'vhds', 'os.vhd', 'https://source', None)
+        status = self.engine.get_blob_copy_status('account', 'key', 'vhds', 'os.vhd')
+
+        self.assertEqual(status, ('pending', 512, 2048))
+        blob_service.copy_blob.assert_called_once_with('vhds', 'os.vhd', 'https://source')
+        self.assertEqual(self.blob_service_cls.call_count, 1)
+
+    def test_clean_up(self):
+        self.engine.revoke_snapshot_access('rg', 's1')
+        self.engine.delete_snapshot('rg', 's1')
+        self.engine.delete_group('transient-rg')
+
+        self.compute.snapshots.revoke_access.return_value.result.assert_called_once_with()
+        self.compute.snapshots.delete.return_value.result.assert_called_once_with()
+        # like --no-wait, the deletion of the group isn't awaited
+        self.resources.resource_groups.delete.assert_called_once_with('transient-rg')
+        self.resources.resource_groups.delete.return_value.result.assert_not_called()
+
+    def test_get_missing_snapshot(self):
+        self.compute.snapshots.get.side_effect = CloudError(mock.MagicMock(status_code=404), 'not found')
+        self.assertIsNone(self.engine.get_snapshot('rg', 's1'))
+
+        self.compute.snapshots.get.side_effect = CloudError(mock.MagicMock(status_code=403), 'forbidden')
+        with self.assertRaises(CloudError):
+            self.engine.get_snapshot('rg', 's1')
+
+    def test_failed_operations_are_raised(self):
+        self.compute.images.create_or_update.return_value.result.side_effect = CloudError(
+            mock.MagicMock(status_code=400), 'bad request')
+        with self.assertRaises(CloudError):
+            self.engine.create_image('rg', 'image', 'eastus', 'Linux', '/snapshots/s1')
+
+    def test_fall_back_to_az_commands(self):
+        with mock.patch('azure.cli.core.profiles.get_sdk', return_value=None):
+            self.assertIsInstance(get_engine(self.cmd), CliEngine)
+        self.assertIsInstance(get_engine(self.cmd), SdkEngine)
+
+
+if __name__ == '__main__':
+    unittest.main()
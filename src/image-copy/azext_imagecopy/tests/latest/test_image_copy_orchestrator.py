@@ -0,0 +1,182 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from knack.util import CLIError
+
+from azext_imagecopy.create_target import SOURCE_DIGEST_TAG
+from azext_imagecopy.orchestrator import (CopyOrchestrator, CopyState, DONE, FAILED, STORAGE_CREATED, MAX_STATUS_ERRORS,
+                                          get_geography)
+
+
+class _Cmd(object):  # pylint: disable=too-few-public-methods
+    cli_ctx = None
+
+
+class _FakeEngine(object):
+    """ an engine whose copies complete after two status checks, failing in the given locations """
+
+    def __init__(self, failing_locations=(), snapshots=None):
+        self.failing_locations = failing_locations
+        self.snapshots = snapshots or {}
+        self.status_checks = {}
+        self.copy_sources = {}
+        self.account_locations = {}
+        self.images = []
+        self.lock = threading.Lock()
+
+    def create_storage_account(self, resource_group_name, name, location, subscription=None):  # pylint: disable=unused-argument
+        with self.lock:
+            self.account_locations[name] = location
+        return 'https://{}.blob.core.windows.net/'.format(name)
+
+    def get_storage_account_key(self, resource_group_name, name, subscription=None):  # pylint: disable=unused-argument
+        return 'key'
+
+    def create_container(self, account_name, account_key, container_name, subscription=None):
+        pass
+
+    def start_blob_copy(self, account_name, account_key, container_name, blob_name, source_url, expiry,  # pylint: disable=unused-argument
+                        subscription=None):
+        with self.lock:
+            self.copy_sources[self.account_locations.get(account_name, account_name)] = source_url
+
+    def get_blob_read_url(self, account_name, account_key, container_name, blob_name, expiry, subscription=None):  # pylint: disable=unused-argument
+        return 'https://{}'.format(self.account_locations[account_name])
+
+    def get_snapshot(self, resource_group_name, name, subscription=None):  # pylint: disable=unused-argument
+        return self.snapshots.get(name)
+
+    def get_blob_copy_status(self, account_name, account_key, container_name, blob_name, subscription=None):  # pylint: disable=unused-argument
+        with self.lock:
+            checks = self.status_checks[account_name] = self.status_checks.get(account_name, 0) + 1
+        if checks < 2:
+            return 'pending', 50, 100
+        if any(account_name.startswith(location) for location in self.failing_locations):
+            return 'failed', 50, 100
+        return 'success', 100, 100
+
+    def create_snapshot(self, resource_group_name, name, source, location=None, source_storage_account_id=None,  # pylint: disable=unused-argument
+                        tags=None, subscription=None):
+        return '/snapshots/' + name
+
+    def create_image(self, resource_group_name, name, location, os_type, snapshot_id, tags=None,  # pylint: disable=unused-argument
+                     subscription=None):
+        with self.lock:
+            self.images.append(name)
+
+
+class _UnreachableEngine(_FakeEngine):
+    """ an engine whose copies never complete, the status checks failing in the given locations """
+
+    def get_blob_copy_status(self, account_name, account_key, container_name, blob_name, subscription=None):
+        with self.lock:
+            self.status_checks[account_name] = self.status_checks.get(account_name, 0) + 1
+        if any(account_name.startswith(location) for location in self.failing_locations):
+            raise IOError('connection reset')
+        return 'pending', 50, 100
+
+
+class TestCopyOrchestrator(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.temp_dir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _run(self, engine, locations, source_digest=None, fan_out=False, timeout=3600):
+        state = CopyState(self.state_file, {'name': 'image'})
+        regions = state.load(locations)
+        orchestrator = CopyOrchestrator(_Cmd(), engine, state, 'https://source', 'transient-rg', 'image', 'image',
+                                        'image_os_disk_snapshot', 'Linux', 'target-rg', None, None, 'sub', False,
+                                        timeout, len(locations), 0, source_digest=source_digest, fan_out=fan_out)
+        orchestrator.run(regions)
+        return regions
+
+    def test_copy_to_all_regions(self):
+        engine = _FakeEngine()
+        regions = self._run(engine, ['eastus', 'westus'])
+
+        self.assertEqual([region.state for region in regions], [DONE, DONE])
+        self.assertEqual(sorted(engine.images), ['image-eastus', 'image-westus'])
+
+    def test_failed_regions_are_resumed(self):
+        engine = _FakeEngine(failing_locations=['westus'])
+        with self.assertRaises(CLIError):
+            self._run(engine, ['eastus', 'westus'])
+
+        with open(self.state_file, 'r') as state_file:
+            state = json.load(state_file)['regions']
+        self.assertEqual(state['eastus']['state'], DONE)
+        self.assertEqual(state['westus']['state'], FAILED)
+
+        engine = _FakeEngine()
+        state = CopyState(self.state_file, {'name': 'image'})
+        regions = state.load(['eastus', 'westus'])
+        self.assertEqual(regions[1].state, STORAGE_CREATED)
+        regions = self._run(engine, ['eastus', 'westus'])
+
+        self.assertEqual([region.state for region in regions], [DONE, DONE])
+        self.assertEqual(engine.images, ['image-westus'])
+
+    def test_existing_snapshots_of_the_same_source_are_reused(self):
+        engine = _FakeEngine(snapshots={
+            'image_os_disk_snapshot-eastus': {'id': '/snapshots/eastus', 'tags': {SOURCE_DIGEST_TAG: 'digest'}},
+            'image_os_disk_snapshot-westus': {'id': '/snapshots/westus', 'tags': {SOURCE_DIGEST_TAG: 'other'}},
+        })
+        regions = self._run(engine, ['eastus', 'westus'], source_digest='digest')
+
+        self.assertEqual([region.state for region in regions], [DONE, DONE])
+        self.assertEqual(list(engine.copy_sources), ['westus'])
+        self.assertEqual(sorted(engine.images), ['image-eastus', 'image-westus'])
+
+    def test_fan_out_copies_once_per_geography(self):
+        engine = _FakeEngine()
+        locations = ['westeurope', 'northeurope', 'uksouth', 'francecentral', 'eastus']
+        regions = self._run(engine, locations, fan_out=True)
+
+        self.assertEqual([region.state for region in regions], [DONE] * len(locations))
+        from_source = sorted(location for location, url in engine.copy_sources.items() if url == 'https://source')
+        self.assertEqual(from_source, ['eastus', 'westeurope'])
+        self.assertEqual(sorted(engine.images), sorted('image-' + location for location in locations))
+
+    def test_copy_fails_after_status_errors(self):
+        engine = _UnreachableEngine(failing_locations=['eastus'])
+        with self.assertRaises(CLIError):
+            self._run(engine, ['eastus'])
+
+        with open(self.state_file, 'r') as state_file:
+            state = json.load(state_file)['regions']
+        self.assertEqual(state['eastus']['state'], FAILED)
+        self.assertIn('connection reset', state['eastus']['error'])
+        self.assertEqual(list(engine.status_checks.values()), [MAX_STATUS_ERRORS])
+
+    def test_copy_fails_after_timeout(self):
+        engine = _UnreachableEngine()
+        with self.assertRaises(CLIError):
+            self._run(engine, ['eastus', 'westus'], timeout=0)
+
+        with open(self.state_file, 'r') as state_file:
+            state = json.load(state_file)['regions']
+        self.assertEqual([state['eastus']['state'], state['westus']['state']], [FAILED, FAILED])
+        self.assertIn("didn't complete", state['eastus']['error'])
+
+    def test_get_geography(self):
+        self.assertEqual(get_geography('westeurope'), 'europe')
+        self.assertEqual(get_geography('uksouth'), 'europe')
+        self.assertEqual(get_geography('eastus2'), 'us')
+        self.assertEqual(get_geography('japaneast'), 'asia')
+        self.assertEqual(get_geography('australiaeast'), 'australia')
+
+
+if __name__ == '__main__':
+    unittest.main()
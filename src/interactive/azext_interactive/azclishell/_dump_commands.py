@@ -5,6 +5,11 @@
 
 import json
 import os
+import re
+import sys
+from collections import OrderedDict
+
+import six
 import yaml  # pylint: disable=import-error
 
 from azure.cli.core import MainCommandsLoader
@@ -13,9 +18,13 @@ from knack.help import REQUIRED_TAG
 from knack.help_files import helps
 from knack.log import get_logger
 
+from .command_cache import get_command_cache_path, write_command_cache
+
 
 logger = get_logger(__name__)
 
+SEGMENT_DIR_NAME = 'segments'
+
 
 class AzInteractiveCommandsLoader(MainCommandsLoader):  # pylint: disable=too-few-public-methods
 
@@ -84,6 +93,8 @@ class FreshTable(object):
         shell_ctx = shell_ctx or self.shell_ctx
         main_loader = AzInteractiveCommandsLoader(shell_ctx.cli_ctx)
 
+        # the completer parses the arguments of every command with this loader, so all the modules and
+        # extensions are loaded even when the segments of only some of them are dumped again
         main_loader.load_command_table(None)
         main_loader.load_arguments(None)
         register_global_subscription_argument(shell_ctx.cli_ctx)
@@ -91,48 +102,145 @@ class FreshTable(object):
         shell_ctx.cli_ctx.raise_event(events.EVENT_INVOKER_POST_CMD_TBL_CREATE, commands_loader=main_loader)
         cmd_table = main_loader.command_table
 
-        cmd_table_data = {}
+        segments = OrderedDict()
         for command_name, cmd in cmd_table.items():
+            segments.setdefault(_get_segment_name(cmd), []).append(command_name)
 
-            try:
-                command_description = cmd.description
-                if callable(command_description):
-                    command_description = command_description()
-
-                # checking all the parameters for a single command
-                parameter_metadata = {}
-                for arg in cmd.arguments.values():
-                    options = {
-                        'name': [name for name in arg.options_list],
-                        'required': REQUIRED_TAG if arg.type.settings.get('required') else '',
-                        'help': arg.type.settings.get('help') or ''
-                    }
-                    # the key is the first alias option
-                    if arg.options_list:
-                        parameter_metadata[arg.options_list[0]] = options
-
-                cmd_table_data[command_name] = {
-                    'parameters': parameter_metadata,
-                    'help': command_description,
-                    'examples': ''
-                }
-            except (ImportError, ValueError):
-                pass
+        # only the segments of the modules and extensions which were installed or updated are dumped again
+        segment_dir = os.path.join(get_cache_dir(shell_ctx), SEGMENT_DIR_NAME)
+        if not os.path.exists(segment_dir):
+            os.makedirs(segment_dir)
+        cmd_table_data = {}
+        changed = _remove_old_segments(segment_dir, segments)
+        for segment_name, command_names in segments.items():
+            segment_path = os.path.join(segment_dir, segment_name + '.json')
+            fingerprint = _get_segment_fingerprint(main_loader, cmd_table[command_names[0]], command_names[0])
+            segment_data = _load_segment(segment_path, fingerprint)
+            if segment_data is None:
+                logger.debug('Dumping command table segment: %s', segment_name)
+                segment_data = _dump_segment(cmd_table, command_names)
+                _save_segment(segment_path, fingerprint, segment_data)
+                changed = True
+            cmd_table_data.update(segment_data)
 
-        load_help_files(cmd_table_data)
         elapsed = timeit.default_timer() - start_time
         logger.debug('Command table dumped: %s sec', elapsed)
         FreshTable.loader = main_loader
 
         # dump into the cache file
-        command_file = shell_ctx.config.get_help_files()
-        with open(os.path.join(get_cache_dir(shell_ctx), command_file), 'w') as help_file:
-            json.dump(cmd_table_data, help_file, default=lambda x: x.target or '', skipkeys=True)
+        command_cache_path = get_command_cache_path(shell_ctx.config)
+        if changed or not os.path.exists(command_cache_path):
+            write_command_cache(command_cache_path, cmd_table_data)
+
+
+def _get_segment_name(cmd):
+    """ the commands of every module and extension are cached in their own segment """
+    source = getattr(cmd, 'command_source', None)
+    extension_name = getattr(source, 'extension_name', None)
+    if extension_name:
+        name = 'extension-' + extension_name
+    elif isinstance(source, six.string_types):
+        name = 'module-' + source.rsplit('.', 1)[-1]
+    else:
+        name = 'core'
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+def _get_segment_fingerprint(main_loader, cmd, command_name):
+    """ changes whenever the module or extension which provides the commands is installed or updated """
+    from azure.cli.core import __version__ as core_version
+
+    version = core_version
+    extension_name = getattr(getattr(cmd, 'command_source', None), 'extension_name', None)
+    if extension_name:
+        from azure.cli.core.extension import get_extension
+        try:
+            version = get_extension(extension_name).version
+        except Exception:  # pylint: disable=broad-except
+            version = None
+
+    mtime = None
+    loaders = getattr(main_loader, 'cmd_to_loader_map', {}).get(command_name)
+    module = sys.modules.get(type(loaders[0]).__module__ if loaders else 'azure.cli.core')
+    if module and getattr(module, '__file__', None):
+        package_dir = os.path.dirname(module.__file__)
+        mtime = max(os.path.getmtime(package_dir), os.path.getmtime(module.__file__))
+    return [version, mtime]
+
+
+def _load_segment(segment_path, fingerprint):
+    try:
+        with open(segment_path, 'r') as segment_file:
+            segment = json.load(segment_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if segment.get('fingerprint') != fingerprint or fingerprint[1] is None:
+        return None
+    return segment['commands']
+
+
+def _save_segment(segment_path, fingerprint, segment_data):
+    temp_path = '{}.{}.tmp'.format(segment_path, os.getpid())
+    with open(temp_path, 'w') as segment_file:
+        json.dump({'fingerprint': fingerprint, 'commands': segment_data}, segment_file,
+                  default=lambda x: x.target or '', skipkeys=True)
+    os.replace(temp_path, segment_path)
+
+
+def _remove_old_segments(segment_dir, segments):
+    """ removes the segments of uninstalled modules and extensions, returns whether there were any """
+    removed = False
+    for file_name in os.listdir(segment_dir):
+        segment_name, extension = os.path.splitext(file_name)
+        if extension == '.json' and segment_name not in segments:
+            os.remove(os.path.join(segment_dir, file_name))
+            removed = True
+    return removed
+
+
+def _dump_segment(cmd_table, command_names):
+    """ dumps the commands of a segment with the help of the commands and their groups """
+    segment_data = {}
+    help_names = set()
+    for command_name in command_names:
+        cmd = cmd_table[command_name]
+        words = command_name.split()
+        help_names.update(' '.join(words[:i]) for i in range(1, len(words) + 1))
 
+        try:
+            command_description = cmd.description
+            if callable(command_description):
+                command_description = command_description()
+
+            # checking all the parameters for a single command
+            parameter_metadata = {}
+            for arg in cmd.arguments.values():
+                options = {
+                    'name': [name for name in arg.options_list],
+                    'required': REQUIRED_TAG if arg.type.settings.get('required') else '',
+                    'help': arg.type.settings.get('help') or ''
+                }
+                # the key is the first alias option
+                if arg.options_list:
+                    parameter_metadata[arg.options_list[0]] = options
+
+            segment_data[command_name] = {
+                'parameters': parameter_metadata,
+                'help': command_description,
+                'examples': ''
+            }
+        except (ImportError, ValueError):
+            pass
 
-def load_help_files(data):
-    """ loads all the extra information from help files """
+    load_help_files(segment_data, help_names)
+    return segment_data
+
+
+def load_help_files(data, help_names=None):
+    """ loads all the extra information from help files, only of help_names if given """
     for command_name, help_yaml in helps.items():
+        if help_names is not None and command_name not in help_names:
+            continue
 
         help_entry = yaml.safe_load(help_yaml)
         try:
@@ -0,0 +1,189 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import marshal
+import mmap
+import os
+import platform
+import struct
+import sys
+
+import six
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # python 2
+    from collections import MutableMapping
+
+
+COMMAND_CACHE_EXTENSION = '.bin'
+_MAGIC = b'AZSHCMD1'
+# magic, python version of the marshalled index, length of the index
+_HEADER = struct.Struct('<8sBBI')
+
+
+def get_command_cache_path(config):
+    """ gets where the command table is cached, next to the configured help file """
+    command_file = os.path.splitext(config.get_help_files())[0] + COMMAND_CACHE_EXTENSION
+    return os.path.join(config.get_config_dir(), 'cache', command_file)
+
+
+def _to_text(value):
+    if value is None or isinstance(value, six.string_types):
+        return value
+    return getattr(value, 'target', None) or ''
+
+
+def write_command_cache(path, data):
+    """
+    writes the command table data to the cache as an index, which is marshalled, followed by
+    all the help texts, which are stored once each and only decoded when they are displayed
+    """
+    texts = []
+    text_refs = {}
+    size = [0]
+
+    def add_text(text):
+        text = _to_text(text)
+        if text is None:
+            return None
+        ref = text_refs.get(text)
+        if ref is None:
+            encoded = text.encode('utf-8')
+            ref = (size[0], len(encoded))
+            texts.append(encoded)
+            size[0] += len(encoded)
+            text_refs[text] = ref
+        return ref
+
+    tree = {}
+    words = []
+    params = []
+    seen_words = set()
+    seen_params = set()
+    help_refs = {}
+    example_refs = {}
+    param_help_refs = {}
+    param_aliases = {}
+
+    for command, entry in data.items():
+        branch = tree
+        for word in command.split():
+            if word not in seen_words:
+                seen_words.add(word)
+                words.append(word)
+            branch = branch.setdefault(word, {})
+
+        help_refs[command] = add_text(entry['help'])
+        if 'examples' in entry:
+            example_refs[command] = [(add_text(example[0]), add_text(example[1])) for example in entry['examples']]
+
+        alias_groups = []
+        for param in entry.get('parameters', {}).values():
+            param_help = _to_text(param['help'])
+            if '==SUPPRESS==' in param_help:
+                continue
+            ref = add_text(param['required'] + " " + param_help)
+            for par in param['name']:
+                param_help_refs[command + " " + par] = ref
+                if par not in seen_params:
+                    seen_params.add(par)
+                    params.append(par)
+            alias_groups.append(tuple(param['name']))
+        if alias_groups:
+            param_aliases[command] = alias_groups
+
+    index = marshal.dumps({
+        'tree': tree,
+        'words': words,
+        'params': params,
+        'help': help_refs,
+        'examples': example_refs,
+        'param_help': param_help_refs,
+        'param_aliases': param_aliases,
+    })
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as cache_file:
+        cache_file.write(_HEADER.pack(_MAGIC, sys.version_info[0], sys.version_info[1], len(index)))
+        cache_file.write(index)
+        for text in texts:
+            cache_file.write(text)
+    os.replace(temp_path, path)
+
+
+class CommandCache(object):
+    """ the command table cache written by write_command_cache """
+
+    def __init__(self, path):
+        with open(path, 'rb') as cache_file:
+            if platform.system() == 'Windows':
+                # a mapped file can't be replaced on Windows, and the cache is rewritten while it is in use
+                self.data = cache_file.read()
+            else:
+                self.data = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < _HEADER.size:
+            raise ValueError('The command cache is truncated.')
+        magic, major, minor, index_size = _HEADER.unpack(self.data[:_HEADER.size])
+        if magic != _MAGIC or (major, minor) != sys.version_info[:2]:
+            raise ValueError('The command cache was written in another format.')
+
+        index = marshal.loads(self.data[_HEADER.size:_HEADER.size + index_size])
+        self.texts_offset = _HEADER.size + index_size
+        self.tree = index['tree']
+        self.words = index['words']
+        self.params = index['params']
+        self.help = index['help']
+        self.examples = index['examples']
+        self.param_help = index['param_help']
+        self.param_aliases = index['param_aliases']
+
+    def get_text(self, ref):
+        if ref is None:
+            return None
+        offset, length = ref
+        start = self.texts_offset + offset
+        return self.data[start:start + length].decode('utf-8')
+
+
+class LazyMapping(MutableMapping):
+    """ a dictionary whose values are resolved from the references of the cache when first used """
+
+    def __init__(self, refs, resolve):
+        self._refs = refs
+        self._resolve = resolve
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = self._resolve(self._refs[key])
+            return value
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        found = self._values.pop(key, self) is not self
+        if key in self._refs:
+            self._refs = dict(self._refs)
+            del self._refs[key]
+            found = True
+        if not found:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._values or key in self._refs
+
+    def __iter__(self):
+        for key in self._refs:
+            yield key
+        for key in self._values:
+            if key not in self._refs:
+                yield key
+
+    def __len__(self):
+        return len(self._refs) + sum(1 for key in self._values if key not in self._refs)
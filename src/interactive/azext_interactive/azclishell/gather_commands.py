@@ -4,10 +4,9 @@
 # --------------------------------------------------------------------------------------------
 
 import math
-import os
-import json
 from knack.log import get_logger
 
+from .command_cache import CommandCache, LazyMapping, get_command_cache_path
 from .command_tree import CommandBranch, CommandHead
 from .util import get_window_dim
 
@@ -112,62 +111,49 @@ class GatherCommands(object):
 
     def _gather_from_files(self, config):
         """ gathers from the files in a way that is convienent to use """
-        command_file = config.get_help_files()
-        cache_path = os.path.join(config.get_config_dir(), 'cache')
-        cols = _get_window_columns()
+        cache = CommandCache(get_command_cache_path(config))
+        line_min = int(_get_window_columns()) - 2 * TOLERANCE
 
-        with open(os.path.join(cache_path, command_file), 'r') as help_file:
-            data = json.load(help_file)
-        self.add_exit()
-        commands = data.keys()
+        def _get_text(ref):
+            return add_new_lines(cache.get_text(ref), line_min=line_min)
 
-        for command in commands:
-            branch = self.command_tree
-            for word in command.split():
-                if word not in self.completable:
-                    self.completable.append(word)
-                if not branch.has_child(word):
-                    branch.add_child(CommandBranch(word))
-                branch = branch.get_child(word)
-
-            description = data[command]['help']
-            self.descrip[command] = add_new_lines(description, line_min=int(cols) - 2 * TOLERANCE)
-
-            if 'examples' in data[command]:
-                examples = []
-                for example in data[command]['examples']:
-                    examples.append([
-                        add_new_lines(example[0], line_min=int(cols) - 2 * TOLERANCE),
-                        add_new_lines(example[1], line_min=int(cols) - 2 * TOLERANCE)])
-                self.command_example[command] = examples
-
-            command_params = data[command].get('parameters', {})
-            for param in command_params:
-                if '==SUPPRESS==' not in command_params[param]['help']:
-                    param_aliases = set()
-
-                    for par in command_params[param]['name']:
-                        param_aliases.add(par)
-
-                        self.param_descript[command + " " + par] = \
-                            add_new_lines(
-                                command_params[param]['required'] +
-                                " " + command_params[param]['help'],
-                                line_min=int(cols) - 2 * TOLERANCE)
-                        if par not in self.completable_param:
-                            self.completable_param.append(par)
-
-                    param_doubles = self.command_param_info.get(command, {})
-                    for alias in param_aliases:
-                        param_doubles[alias] = param_aliases
-                    self.command_param_info[command] = param_doubles
+        def _get_examples(refs):
+            return [[_get_text(name), _get_text(text)] for name, text in refs]
+
+        def _get_param_doubles(alias_groups):
+            param_doubles = {}
+            for aliases in alias_groups:
+                param_aliases = set(aliases)
+                for alias in aliases:
+                    param_doubles[alias] = param_aliases
+            return param_doubles
+
+        # the help texts are only read and wrapped when they are displayed
+        self.descrip = LazyMapping(cache.help, _get_text)
+        self.command_example = LazyMapping(cache.examples, _get_examples)
+        self.param_descript = LazyMapping(cache.param_help, _get_text)
+        self.command_param_info = LazyMapping(cache.param_aliases, _get_param_doubles)
+
+        self.add_exit()
+        self.completable.extend(word for word in cache.words if word not in ("quit", "exit"))
+        self.completable_param.extend(cache.params)
+        _add_branches(self.command_tree, cache.tree)
 
     def get_all_subcommands(self):
         """ returns all the subcommands """
         subcommands = []
+        seen = set()
+        kids = list(self.command_tree.children)
         for command in self.descrip:
             for word in command.split():
-                for kid in self.command_tree.children:
-                    if word != kid and word not in subcommands:
-                        subcommands.append(word)
+                if word not in seen and any(word != kid for kid in kids):
+                    seen.add(word)
+                    subcommands.append(word)
         return subcommands
+
+
+def _add_branches(branch, children):
+    for word, grandchildren in children.items():
+        child = CommandBranch(word)
+        branch.add_child(child)
+        _add_branches(child, grandchildren)
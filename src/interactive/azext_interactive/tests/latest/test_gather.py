@@ -3,8 +3,25 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
 import unittest
-from azext_interactive.azclishell.gather_commands import add_new_lines as nl
+from azext_interactive.azclishell._dump_commands import (
+    _get_segment_name, _load_segment, _save_segment, _remove_old_segments)
+from azext_interactive.azclishell.command_cache import write_command_cache, get_command_cache_path
+from azext_interactive.azclishell.gather_commands import add_new_lines as nl, GatherCommands
+
+
+class _Config(object):
+    def __init__(self, config_dir):
+        self.config_dir = config_dir
+
+    def get_config_dir(self):
+        return self.config_dir
+
+    def get_help_files(self):
+        return 'help_dump.json'
 
 
 class GatherTest(unittest.TestCase):
@@ -55,6 +72,61 @@ class GatherTest(unittest.TestCase):
             nl(phrase3, 1, tolerance=6)
         )
 
+    def test_gather_from_cache(self):
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        os.makedirs(os.path.join(config_dir, 'cache'))
+        write_command_cache(get_command_cache_path(_Config(config_dir)), {
+            'vm': {'help': 'Manage virtual machines.'},
+            'vm create': {
+                'help': 'Create a VM.',
+                'examples': [['Create a VM.', 'az vm create -n MyVm']],
+                'parameters': {
+                    '--name': {'name': ['--name', '-n'], 'required': '[Required]', 'help': 'Name of the VM.'},
+                    '--hidden': {'name': ['--hidden'], 'required': '', 'help': '==SUPPRESS=='}
+                }
+            },
+            'vm list': {'help': None, 'examples': '', 'parameters': {}}
+        })
+
+        commands = GatherCommands(_Config(config_dir))
+
+        self.assertEqual(commands.completable, ['quit', 'exit', 'vm', 'create', 'list'])
+        self.assertEqual(commands.completable_param, ['--name', '-n'])
+        self.assertTrue(commands.command_tree.in_tree(['vm', 'create']))
+        self.assertEqual(commands.descrip['vm create'], 'Create a VM.\n')
+        self.assertIsNone(commands.descrip['vm list'])
+        self.assertEqual(commands.descrip['quit'], 'Exits the program')
+        self.assertEqual(commands.param_descript['vm create -n'], '[Required] Name of the VM.\n')
+        self.assertNotIn('vm create --hidden', commands.param_descript)
+        self.assertEqual(commands.command_example['vm create'], [['Create a VM.\n', 'az vm create -n MyVm\n']])
+        self.assertEqual(commands.command_example['vm list'], [])
+        self.assertEqual(commands.command_param_info['vm create']['-n'], {'--name', '-n'})
+        self.assertEqual(sorted(commands.get_all_subcommands()), ['create', 'exit', 'list', 'quit', 'vm'])
+
+    def test_command_table_segments(self):
+        class _ExtensionCommandSource(object):  # pylint: disable=too-few-public-methods
+            extension_name = 'my-ext'
+
+        class _Command(object):  # pylint: disable=too-few-public-methods
+            def __init__(self, command_source):
+                self.command_source = command_source
+
+        self.assertEqual(_get_segment_name(_Command('azure.cli.command_modules.vm')), 'module-vm')
+        self.assertEqual(_get_segment_name(_Command(_ExtensionCommandSource())), 'extension-my-ext')
+        self.assertEqual(_get_segment_name(_Command(None)), 'core')
+
+        segment_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, segment_dir)
+        segment_path = os.path.join(segment_dir, 'module-vm.json')
+        _save_segment(segment_path, ['2.0.62', 1.5], {'vm list': {'help': 'List VMs.'}})
+
+        self.assertEqual(_load_segment(segment_path, ['2.0.62', 1.5]), {'vm list': {'help': 'List VMs.'}})
+        self.assertIsNone(_load_segment(segment_path, ['2.0.63', 1.5]))
+        self.assertFalse(_remove_old_segments(segment_dir, {'module-vm': ['vm list']}))
+        self.assertTrue(_remove_old_segments(segment_dir, {}))
+        self.assertFalse(os.path.exists(segment_path))
+
 
 if __name__ == '__main__':
     unittest.main()
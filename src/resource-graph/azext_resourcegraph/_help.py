@@ -25,13 +25,16 @@ helps['graph query'] = """
           short-summary: "Resource Graph query to execute."
         - name: --first
           type: int
-          short-summary: "The maximum number of objects to return. Accepted range: 1-5000."
+          short-summary: "The maximum number of objects to return. Accepted range: 1-5000, unlimited with --output-file."
         - name: --skip
           type: int
           short-summary: Ignores the first N objects and then gets the remaining objects.
         - name: --subscriptions -s
           type: string
           short-summary: List of subscriptions to run query against. By default all accessible subscriptions are queried.
+        - name: --cache-ttl
+          type: int
+          short-summary: Reuse the results of the same query run less than this many seconds ago. By default the results aren't cached.
     examples:
         - name: Query resources requesting a subset of resource fields.
           text: >
@@ -45,6 +48,12 @@ helps['graph query'] = """
         - name: Choose subscriptions to query.
           text: >
             az graph query -q "where type =~ "Microsoft.Compute" | project name, tags" --subscriptions 11111111-1111-1111-1111-111111111111, 22222222-2222-2222-2222-222222222222
+        - name: Reuse the results of the same query run during the last minute.
+          text: >
+            az graph query -q "summarize count() by type" --cache-ttl 60
+        - name: Export all virtual machines to a gzip compressed CSV file, continuing the export if it was interrupted.
+          text: >
+            az graph query -q "where type =~ 'Microsoft.Compute/virtualMachines' | project id, name, location" --first 100000 --output-file vms.csv.gz --file-format csv --compress --resume
 """
 
 helps['graph shared-query'] = """
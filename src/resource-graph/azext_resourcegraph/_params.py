@@ -7,9 +7,9 @@
 
 
 from azure.cli.core.commands.parameters import get_generic_completion_list
-from azure.cli.core.commands.parameters import tags_type
+from azure.cli.core.commands.parameters import tags_type, get_enum_type, get_three_state_flag
 
-from azext_resourcegraph.resource_graph_enums import IncludeOptionsEnum
+from azext_resourcegraph.resource_graph_enums import IncludeOptionsEnum, FileFormatEnum
 
 _QUERY_EXAMPLES = [
     '''summarize count()''',
@@ -38,6 +38,17 @@ def load_arguments(self, _):
                    help='List of subscriptions to run query against. By default all accessible subscriptions are queried.')
         c.argument('include', options_list=['--include'], required=False,
                    help='Indicates if result should be extended with subscription and tenants names. Possible values: none, displayNames')
+        c.argument('cache_ttl', options_list=['--cache-ttl'], required=False, type=int,
+                   help='Reuse the results of the same query run less than this many seconds ago.')
+        c.argument('output_file', options_list=['--output-file'], required=False,
+                   help='Write the rows to this file as they arrive instead of returning them, "-" for stdout. '
+                        'The value of --first can be larger than 5000 when exporting.')
+        c.argument('file_format', options_list=['--file-format'], required=False, arg_type=get_enum_type(FileFormatEnum),
+                   default=FileFormatEnum.ndjson, help='Format of the rows written to --output-file.')
+        c.argument('compress', options_list=['--compress'], required=False, arg_type=get_three_state_flag(),
+                   help='Compress --output-file with gzip.')
+        c.argument('resume', options_list=['--resume'], required=False, arg_type=get_three_state_flag(),
+                   help='Continue an interrupted export to --output-file, using the same query and subscriptions.')
 
     with self.argument_context('graph shared-query') as c:
         c.argument('graph_query', options_list=['--graph-query', '--q', '-q'],
@@ -0,0 +1,209 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from knack.log import get_logger
+from six.moves import queue
+
+from .vendored_sdks.resourcegraph.models import (
+    QueryRequest, QueryRequestOptions, ResultFormat, ResultTruncated, ErrorResponseException)
+
+ROWS_PER_PAGE = 1000
+SUBSCRIPTION_LIMIT = 1000
+MAX_PARALLEL_SHARDS = 4
+MAX_THROTTLING_RETRIES = 5
+DEFAULT_THROTTLING_DELAY = 5
+SHARD_PAGE_BUFFER = 8
+
+_QUOTA_REMAINING_HEADER = 'x-ms-user-quota-remaining'
+_QUOTA_RESETS_AFTER_HEADER = 'x-ms-user-quota-resets-after'
+_AGGREGATION_REGEX = re.compile(r'\b(summarize|order\s+by|sort\s+by|top|take|limit|distinct|count)\b', re.IGNORECASE)
+_END_OF_SHARD = object()
+
+logger = get_logger(__name__)
+
+
+class QueryStatistics(object):  # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.result_truncated = False
+        self.pages = 0
+        self.shards = 0
+        self.skip_token = None
+
+
+class ThrottlingGate(object):
+    """
+    Shared by all the shards of a query, so that all of them pause when Resource Graph reports
+    that the user quota is used up, until the quota window resets.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resume_at = 0
+
+    def wait(self):
+        delay = self.resume_at - time.time()
+        if delay > 0:
+            logger.info("Resource Graph quota is used up, waiting %.1f seconds.", delay)
+            time.sleep(delay)
+
+    def update(self, headers, throttled=False):
+        remaining = headers.get(_QUOTA_REMAINING_HEADER)
+        delay = _parse_duration(headers.get(_QUOTA_RESETS_AFTER_HEADER))
+        if throttled:
+            delay = delay or _parse_duration(headers.get('Retry-After')) or DEFAULT_THROTTLING_DELAY
+        elif remaining is None or int(remaining) > 0:
+            return
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.time() + (delay or DEFAULT_THROTTLING_DELAY))
+
+
+def iter_query_results(client, query, subscriptions, first, skip, statistics=None, skip_token=None,
+                       max_workers=MAX_PARALLEL_SHARDS):
+    """Yields the rows of a query as the pages arrive, see iter_query_pages."""
+    for page in iter_query_pages(client, query, subscriptions, first, skip, statistics, skip_token, max_workers):
+        for row in page:
+            yield row
+
+
+def iter_query_pages(client, query, subscriptions, first, skip, statistics=None, skip_token=None,
+                     max_workers=MAX_PARALLEL_SHARDS):
+    """
+    Yields the pages of rows of a query as they arrive. Subscription lists longer than the limit of a
+    single request are split into shards which are queried concurrently; their rows are merged in
+    shard order. The skip token of the last page is kept in the statistics when the query runs as a
+    single shard.
+    """
+    statistics = statistics or QueryStatistics()
+    gate = ThrottlingGate()
+    shards = [subscriptions[i:i + SUBSCRIPTION_LIMIT] for i in range(0, len(subscriptions), SUBSCRIPTION_LIMIT)]
+    statistics.shards = len(shards)
+
+    if len(shards) <= 1:
+        for page in _iter_shard_pages(client, query, subscriptions, first, skip, gate, statistics, skip_token):
+            yield page
+        return
+
+    if _AGGREGATION_REGEX.search(query):
+        logger.warning("The query runs against %d batches of up to %d subscriptions. Aggregations, sorting "
+                       "and limits in the query apply to every batch separately.", len(shards), SUBSCRIPTION_LIMIT)
+
+    # every shard may have to provide all the rows, as the skipped rows are only known after the merge
+    pages = _iter_sharded_pages(client, query, shards, skip + first, gate, statistics, max_workers)
+    skipped = 0
+    returned = 0
+    for page in pages:
+        merged_page = []
+        for row in page:
+            if skipped < skip:
+                skipped += 1
+                continue
+            merged_page.append(row)
+            if returned + len(merged_page) >= first:
+                break
+        returned += len(merged_page)
+        if merged_page:
+            yield merged_page
+        if returned >= first:
+            break
+
+
+def _iter_sharded_pages(client, query, shards, first, gate, statistics, max_workers):
+    stop = threading.Event()
+    page_queues = [queue.Queue(SHARD_PAGE_BUFFER) for _ in shards]
+
+    def _fetch_shard(subscriptions, page_queue):
+        try:
+            for page in _iter_shard_pages(client, query, subscriptions, first, 0, gate, statistics):
+                if not _put(page_queue, page, stop):
+                    return
+            _put(page_queue, _END_OF_SHARD, stop)
+        except Exception as ex:  # pylint: disable=broad-except
+            _put(page_queue, ex, stop)
+
+    executor = ThreadPoolExecutor(min(max_workers, len(shards)))
+    try:
+        # the executor starts the shards in order, so the shard being read has always been started
+        for subscriptions, page_queue in zip(shards, page_queues):
+            executor.submit(_fetch_shard, subscriptions, page_queue)
+        for page_queue in page_queues:
+            while True:
+                page = page_queue.get()
+                if page is _END_OF_SHARD:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+def _put(page_queue, item, stop):
+    while not stop.is_set():
+        try:
+            page_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _iter_shard_pages(client, query, subscriptions, first, skip, gate, statistics, skip_token=None):
+    returned = 0
+    while True:
+        request_options = QueryRequestOptions(
+            top=min(first - returned, ROWS_PER_PAGE),
+            skip=skip + returned,
+            skip_token=skip_token,
+            result_format=ResultFormat.object_array
+        )
+
+        request = QueryRequest(query=query, subscriptions=subscriptions, options=request_options)
+        response = _send_query(client, request, gate)
+        if response.result_truncated == ResultTruncated.true:
+            statistics.result_truncated = True
+        statistics.pages += 1
+
+        skip_token = response.skip_token
+        statistics.skip_token = skip_token
+        returned += len(response.data)
+        yield response.data
+
+        if returned >= first or skip_token is None:
+            break
+
+
+def _send_query(client, request, gate):
+    retries = 0
+    while True:
+        gate.wait()
+        try:
+            raw_response = client.resources(request, raw=True)
+        except ErrorResponseException as ex:
+            if ex.response is None or ex.response.status_code != 429 or retries >= MAX_THROTTLING_RETRIES:
+                raise
+            retries += 1
+            gate.update(ex.response.headers, throttled=True)
+            continue
+        gate.update(raw_response.response.headers)
+        return raw_response.output
+
+
+def _parse_duration(value):
+    # the quota resets after a duration like '00:00:05', Retry-After is in seconds
+    if not value:
+        return None
+    try:
+        seconds = 0
+        for part in value.split(':'):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
@@ -0,0 +1,88 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import time
+
+from knack.log import get_logger
+
+RESULT_CACHE_DIR_NAME = "graphcache"
+DEFAULT_MAX_CACHE_ENTRIES = 256
+DEFAULT_MAX_CACHE_SIZE = 64 * 1024 * 1024
+_CACHE_FILE_SUFFIX = ".json"
+
+logger = get_logger(__name__)
+
+
+def get_cache_key(query, subscriptions, **options):
+    """
+    Key of the results of a query. The order of the subscriptions doesn't change the results, so
+    it doesn't change the key either. Whitespace in the query may be part of a string literal, so
+    only leading and trailing whitespace is ignored.
+    """
+    key = json.dumps([query.strip(), sorted(subscriptions), sorted(options.items())])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class QueryResultCache(object):
+    """
+    Results of queries stored as one file per key, with the least recently used entries evicted
+    when the cache holds more than max_entries entries or max_size bytes. The modification time
+    of an entry is updated whenever it is read, so it is also the time it was last used.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_CACHE_ENTRIES, max_size=DEFAULT_MAX_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_size = max_size
+
+    def get(self, key, ttl):
+        """Returns the cached value if it was stored less than ttl seconds ago, or None."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if time.time() - entry['created'] > ttl:
+            return None
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+        return entry['value']
+
+    def set(self, key, value):
+        entry_path = self._entry_path(key)
+        temp_path = '{}.{}.tmp'.format(entry_path, os.getpid())
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            with open(temp_path, 'w') as f:
+                json.dump({'created': time.time(), 'value': value}, f, separators=(',', ':'))
+            os.replace(temp_path, entry_path)
+            self._evict()
+        except (IOError, OSError) as e:
+            logger.debug("Failed to save the query results to the cache: %s", e)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(_CACHE_FILE_SUFFIX):
+                stat = os.stat(os.path.join(self.path, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        entries.sort(reverse=True)
+        total_size = 0
+        for index, (_, size, name) in enumerate(entries):
+            total_size += size
+            if index >= self.max_entries or total_size > self.max_size:
+                os.remove(os.path.join(self.path, name))
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + _CACHE_FILE_SUFFIX)
@@ -0,0 +1,158 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+from azext_resourcegraph.resource_graph_enums import FileFormatEnum
+
+STDOUT_FILE_NAME = '-'
+_RESUME_STATE_SUFFIX = '.resume.json'
+
+logger = get_logger(__name__)
+
+
+class ExportState(object):
+    """
+    Progress of an export to a file, saved next to the file after every page, so that an
+    interrupted export can be continued with the skip token of the last page written. The size
+    of the file at that point is saved as well, as rows written after it are written again.
+    """
+
+    def __init__(self, output_file, query, subscriptions, file_format, compress):
+        self.path = output_file + _RESUME_STATE_SUFFIX
+        self.key = hashlib.sha256(json.dumps(
+            [query, sorted(subscriptions), file_format, compress]).encode('utf-8')).hexdigest()
+        self.rows_written = 0
+        self.skip_token = None
+        self.columns = None
+        self.size = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            raise CLIError("No export to resume was found for '{}'.".format(self.path[:-len(_RESUME_STATE_SUFFIX)]))
+        if state.get('key') != self.key:
+            raise CLIError("The export can't be resumed with a different query, subscriptions or file format.")
+        self.rows_written = state['rowsWritten']
+        self.skip_token = state.get('skipToken')
+        self.columns = state.get('columns')
+        self.size = state.get('size')
+
+    def save(self):
+        state = {'key': self.key, 'rowsWritten': self.rows_written, 'skipToken': self.skip_token,
+                 'columns': self.columns, 'size': self.size}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.path)
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ResultWriter(object):
+    """
+    Writes query result rows to a file or stdout as NDJSON or CSV, optionally gzip compressed.
+    An appending writer first truncates the file to 'size', the size at the last checkpoint.
+    """
+
+    def __init__(self, output_file, file_format=FileFormatEnum.ndjson, compress=False, append=False, columns=None,
+                 size=None):
+        self.file_format = file_format
+        self.columns = columns
+        self.compress = compress
+        self.csv_writer = None
+        self.rows_written = 0
+        if output_file == STDOUT_FILE_NAME:
+            sys.stdout.flush()
+            self.raw = sys.stdout.buffer
+            self.owns_raw = False
+        else:
+            self.raw = open(output_file, 'ab' if append else 'wb')
+            self.owns_raw = True
+            if append and size is not None:
+                if self.raw.seek(0, io.SEEK_END) < size:
+                    self.raw.close()
+                    raise CLIError("The export can't be resumed, '{}' is shorter than when it was interrupted."
+                                   .format(output_file))
+                self.raw.truncate(size)
+        self._open()
+
+    def _open(self):
+        # every gzip member is a complete gzip stream, and readers treat a sequence of them as one stream
+        self.binary = gzip.GzipFile(fileobj=self.raw, mode='wb') if self.compress else self.raw
+        self.text = io.TextIOWrapper(self.binary, encoding='utf-8', newline='')
+        if self.csv_writer is not None:
+            self.csv_writer = csv.writer(self.text)
+
+    def write_rows(self, rows):
+        for row in rows:
+            if self.file_format == FileFormatEnum.csv:
+                self._write_csv_row(row)
+            else:
+                self.text.write(json.dumps(row, separators=(',', ':'), ensure_ascii=False))
+                self.text.write('\n')
+            self.rows_written += 1
+
+    def flush(self):
+        self.text.flush()
+        self.binary.flush()
+        if self.binary is not self.raw:
+            self.raw.flush()
+
+    def checkpoint(self):
+        """
+        Completes the rows written so far, so that the file can be truncated to its returned size
+        and appended to. A compressed file gets a new gzip member after every checkpoint.
+        """
+        self._close_binary()
+        size = self.raw.tell() if self.owns_raw else None
+        self._open()
+        return size
+
+    def close(self):
+        self._close_binary()
+        if self.owns_raw:
+            self.raw.close()
+
+    def _close_binary(self):
+        self.flush()
+        self.text.detach()
+        if self.binary is not self.raw:
+            self.binary.close()
+        self.raw.flush()
+
+    def _write_csv_row(self, row):
+        if self.csv_writer is None:
+            write_header = self.columns is None
+            if write_header:
+                self.columns = list(row.keys()) if isinstance(row, dict) else ['value']
+            self.csv_writer = csv.writer(self.text)
+            if write_header:
+                self.csv_writer.writerow(self.columns)
+        if isinstance(row, dict):
+            self.csv_writer.writerow([_csv_value(row.get(column)) for column in self.columns])
+        else:
+            self.csv_writer.writerow([_csv_value(row)])
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+    return value
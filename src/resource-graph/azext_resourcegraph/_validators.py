@@ -7,8 +7,24 @@ from knack.util import CLIError
 
 
 def validate_query_args(namespace):
-    if not 1 <= namespace.first <= 5000:
+    if namespace.output_file:
+        # exports are written page by page, so they aren't limited like the results kept in memory
+        if namespace.first < 1:
+            raise CLIError("Value of --first has to be positive.")
+    elif not 1 <= namespace.first <= 5000:
         raise CLIError("Value of --first has to be between 1 and 5000.")
 
+    if not namespace.output_file and (namespace.compress or namespace.resume):
+        raise CLIError("--compress and --resume can only be used with --output-file.")
+
+    if namespace.resume and namespace.output_file == '-':
+        raise CLIError("An export to stdout can't be resumed.")
+
+    if namespace.cache_ttl is not None and namespace.cache_ttl < 0:
+        raise CLIError("Value of --cache-ttl cannot be negative.")
+
+    if namespace.cache_ttl and namespace.output_file:
+        raise CLIError("--cache-ttl can't be used with --output-file.")
+
     if not namespace.skip >= 0:
         raise CLIError("Value of --skip cannot be negative.")
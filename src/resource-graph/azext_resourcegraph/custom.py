@@ -7,8 +7,9 @@
 
 import json
 import os
+import time
 from collections import OrderedDict
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 import requests
 from azure.cli.core._config import GLOBAL_CONFIG_DIR
@@ -17,74 +18,118 @@ from azure.cli.core._session import SESSION
 from knack.log import get_logger
 from knack.util import todict, CLIError, ensure_dir
 
-from azext_resourcegraph.resource_graph_enums import IncludeOptionsEnum
+from azext_resourcegraph.resource_graph_enums import IncludeOptionsEnum, FileFormatEnum
 from azext_resourcegraph.vendored_sdks.resourcegraph.models import ResultTruncated
+from ._query_executor import iter_query_results, iter_query_pages, QueryStatistics
+from ._result_cache import QueryResultCache, get_cache_key, RESULT_CACHE_DIR_NAME
+from ._result_writer import ResultWriter, ExportState, STDOUT_FILE_NAME
 from .vendored_sdks.resourcegraph import ResourceGraphClient
 from .vendored_sdks.resourcegraph.models import \
     QueryRequest, QueryRequestOptions, QueryResponse, ResultFormat, ErrorResponseException, ErrorResponse
 
-__ROWS_PER_PAGE = 1000
 __CACHE_FILE_NAME = ".azgraphcache"
-__CACHE_KEY = "query_extension"
-__SUBSCRIPTION_LIMIT = 1000
+__CACHE_KEY = "display_names"
+__DISPLAY_NAMES_TTL = timedelta(days=1)
 __logger = get_logger(__name__)
 
 
-def execute_query(client, graph_query, first, skip, subscriptions, include):
-    # type: (ResourceGraphClient, str, int, int, list[str], str) -> object
+def execute_query(client, graph_query, first, skip, subscriptions, include, cache_ttl=None,
+                  output_file=None, file_format=FileFormatEnum.ndjson, compress=False, resume=False):
+    # type: (ResourceGraphClient, str, int, int, list[str], str, int, str, str, bool, bool) -> object
 
     subs_list = subscriptions or _get_cached_subscriptions()
-
-    if len(subs_list) > __SUBSCRIPTION_LIMIT:
-        subs_list = subs_list[:__SUBSCRIPTION_LIMIT]
-        warning_message = "The query included more subscriptions than allowed. "\
-                          "Only the first {0} subscriptions were included for the results. "\
-                          "To use more than {0} subscriptions, "\
-                          "see the docs for examples: https://aka.ms/arg-error-toomanysubs".format(__SUBSCRIPTION_LIMIT)
-        __logger.warning(warning_message)
-
-    results = []
-    skip_token = None
-    full_query = graph_query
+    display_names = None
 
     if include == IncludeOptionsEnum.display_names:
         try:
-            full_query = _get_extension() + "| " + graph_query
+            display_names = _get_display_names()
 
         except Exception as e:
             __logger.warning("Failed to include displayNames to result. Error: %s", e)
 
-    try:
-        result_truncated = False
-        while True:
-            request_options = QueryRequestOptions(
-                top=min(first - len(results), __ROWS_PER_PAGE),
-                skip=skip + len(results),
-                skip_token=skip_token,
-                result_format=ResultFormat.object_array
-            )
-
-            request = QueryRequest(query=full_query, subscriptions=subs_list, options=request_options)
-            response = client.resources(request)  # type: QueryResponse
-            if response.result_truncated == ResultTruncated.true:
-                result_truncated = True
-
-            skip_token = response.skip_token
-            results.extend(response.data)
-
-            if len(results) >= first or skip_token is None:
-                break
-
-        if result_truncated and len(results) < first:
-            __logger.warning("Unable to paginate the results of the query. "
-                             "Some resources may be missing from the results. "
-                             "To rewrite the query and enable paging, "
-                             "see the docs for an example: https://aka.ms/arg-results-truncated")
+    if output_file:
+        return _export_query(client, graph_query, first, skip, subs_list, output_file, file_format, compress, resume,
+                             display_names)
+
+    cache = None
+    cached = None
+    if cache_ttl:
+        cache = QueryResultCache(os.path.join(GLOBAL_CONFIG_DIR, RESULT_CACHE_DIR_NAME))
+        cache_key = get_cache_key(graph_query, subs_list, first=first, skip=skip)
+        cached = cache.get(cache_key, cache_ttl)
+
+    if cached is not None:
+        __logger.info("Using the results of the query cached less than %d seconds ago.", cache_ttl)
+        results = cached['data']
+        result_truncated = cached['resultTruncated']
+    else:
+        statistics = QueryStatistics()
+        try:
+            results = list(iter_query_results(client, graph_query, subs_list, first, skip, statistics))
+        except ErrorResponseException as ex:
+            raise CLIError(json.dumps(_to_dict(ex.error), indent=4))
+        result_truncated = statistics.result_truncated
+        if cache:
+            cache.set(cache_key, {'data': results, 'resultTruncated': result_truncated})
+
+    if result_truncated and len(results) < first:
+        __logger.warning("Unable to paginate the results of the query. "
+                         "Some resources may be missing from the results. "
+                         "To rewrite the query and enable paging, "
+                         "see the docs for an example: https://aka.ms/arg-results-truncated")
+
+    if display_names:
+        _add_display_names(results, display_names)
+    return results
+
 
+def _export_query(client, query, first, skip, subscriptions, output_file, file_format, compress, resume,
+                  display_names=None):
+    # type: (ResourceGraphClient, str, int, int, list[str], str, str, bool, bool, dict) -> object
+
+    state = None
+    skip_token = None
+    if output_file != STDOUT_FILE_NAME:
+        state = ExportState(output_file, query, subscriptions, file_format, compress)
+        if resume:
+            state.load()
+            skip_token = state.skip_token
+
+    rows_written = state.rows_written if state else 0
+    writer = ResultWriter(output_file, file_format, compress, append=rows_written > 0,
+                          columns=state.columns if state else None, size=state.size if state else None)
+    statistics = QueryStatistics()
+    try:
+        pages = iter_query_pages(client, query, subscriptions, first - rows_written, skip + rows_written,
+                                 statistics, skip_token) if rows_written < first else []
+        for page in pages:
+            if display_names:
+                _add_display_names(page, display_names)
+            # every page is completed before it is recorded, so a resumed export doesn't miss rows,
+            # and rows written after the last record are truncated when the export is resumed
+            writer.write_rows(page)
+            size = writer.checkpoint()
+            if state:
+                state.size = size
+                state.rows_written = rows_written + writer.rows_written
+                state.skip_token = statistics.skip_token if statistics.shards <= 1 else None
+                state.columns = writer.columns
+                state.save()
     except ErrorResponseException as ex:
         raise CLIError(json.dumps(_to_dict(ex.error), indent=4))
+    finally:
+        writer.close()
 
-    return results
+    if state:
+        state.delete()
+    if statistics.result_truncated:
+        __logger.warning("Unable to paginate the results of the query. "
+                         "Some resources may be missing from the results. "
+                         "To rewrite the query and enable paging, "
+                         "see the docs for an example: https://aka.ms/arg-results-truncated")
+    if output_file == STDOUT_FILE_NAME:
+        return None
+    return OrderedDict([('outputFile', output_file), ('rowsWritten', rows_written + writer.rows_written)])
 
 
 def create_shared_query(client, resource_group_name,
@@ -146,40 +191,44 @@ def _to_dict(obj):
     return obj
 
 
-def _get_extension():
+def _get_display_names():
+    # type: () -> dict[str, dict[str, str]]
+
     # try to get from cache
     ensure_dir(GLOBAL_CONFIG_DIR)
     path_cache = os.path.join(GLOBAL_CONFIG_DIR, __CACHE_FILE_NAME)
     SESSION.data = {}
     SESSION.load(path_cache)
-    query_extension = SESSION.data.get(__CACHE_KEY)
+    display_names = SESSION.data.get(__CACHE_KEY)
 
     # if cache is older than 1 day, we don't want to use it
-    if datetime.utcnow() - datetime.utcfromtimestamp(os.path.getmtime(path_cache)) < timedelta(days=1) \
-            and query_extension is not None:
-        return query_extension
-
-    queries_parts = []
-    subscription_list = _get_cached_detailed_subscriptions()
-    if subscription_list:
-        sub_query = "extend subscriptionDisplayName=case("
-        for sub in subscription_list:
-            sub_query += "subscriptionId=='" + sub[0] + "', '" + sub[1] + "',"
-        sub_query += "'')"
-        queries_parts.append(sub_query)
-
-    tenant_list = _get_cached_detailed_tenant()
-    if tenant_list:
-        tenant_query = "extend tenantDisplayName=case("
-        for tenant in tenant_list:
-            tenant_query += "tenantId=='" + tenant[0] + "', '" + tenant[1] + "',"
-        tenant_query += "'')"
-        queries_parts.append(tenant_query)
-
-    query_extension = "| ".join(queries_parts)
+    if display_names is not None and \
+            time.time() - display_names.get('created', 0) < __DISPLAY_NAMES_TTL.total_seconds():
+        return display_names
+
+    display_names = {
+        'created': time.time(),
+        'subscriptions': {sub_id.lower(): name for sub_id, name in _get_cached_detailed_subscriptions()},
+        'tenants': {tenant_id.lower(): name for tenant_id, name in _get_cached_detailed_tenant()},
+    }
 
     # save to cache
     SESSION.filename = path_cache
-    SESSION.data.update({__CACHE_KEY: query_extension})
+    SESSION.data.update({__CACHE_KEY: display_names})
     SESSION.save()
-    return query_extension
+    return display_names
+
+
+def _add_display_names(rows, display_names):
+    # type: (list, dict[str, dict[str, str]]) -> None
+
+    # the names are added to the rows rather than to the query, so that the query stays small
+    subscription_names = display_names['subscriptions']
+    tenant_names = display_names['tenants']
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        if 'subscriptionId' in row:
+            row['subscriptionDisplayName'] = subscription_names.get(str(row['subscriptionId']).lower(), '')
+        if 'tenantId' in row:
+            row['tenantDisplayName'] = tenant_names.get(str(row['tenantId']).lower(), '')
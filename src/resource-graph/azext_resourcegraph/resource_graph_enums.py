@@ -9,3 +9,8 @@ from enum import Enum
 class IncludeOptionsEnum(str, Enum):
     none = "none"
     display_names = "displayNames"
+
+
+class FileFormatEnum(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
@@ -0,0 +1,62 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from azext_resourcegraph._result_cache import QueryResultCache, get_cache_key
+from azext_resourcegraph.custom import _add_display_names
+
+
+class TestQueryResultCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_cache_key(self):
+        self.assertEqual(get_cache_key(' project id | limit 1\n', ['s2', 's1'], first=100),
+                         get_cache_key('project id | limit 1', ['s1', 's2'], first=100))
+        self.assertNotEqual(get_cache_key("where name == 'a  b'", ['s1'], first=100),
+                            get_cache_key("where name == 'a b'", ['s1'], first=100))
+        self.assertNotEqual(get_cache_key('project id', ['s1'], first=100),
+                            get_cache_key('project id', ['s1'], first=10))
+
+    def test_ttl(self):
+        cache = QueryResultCache(self.temp_dir)
+        cache.set('key', [{'id': 'a'}])
+
+        self.assertEqual(cache.get('key', 60), [{'id': 'a'}])
+        self.assertIsNone(cache.get('key', -1))
+        self.assertIsNone(cache.get('missing', 60))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = QueryResultCache(self.temp_dir, max_entries=2)
+        for index, key in enumerate(['a', 'b']):
+            cache.set(key, key)
+            os.utime(os.path.join(self.temp_dir, key + '.json'), (time.time() - 10 + index,) * 2)
+        cache.get('a', 60)
+        cache.set('c', 'c')
+
+        self.assertEqual(cache.get('a', 60), 'a')
+        self.assertIsNone(cache.get('b', 60))
+        self.assertEqual(cache.get('c', 60), 'c')
+
+    def test_add_display_names(self):
+        rows = [{'subscriptionId': 'S1', 'tenantId': 't1'}, {'subscriptionId': 's2'}, {'name': 'n'}]
+        _add_display_names(rows, {'subscriptions': {'s1': 'Sub 1'}, 'tenants': {'t1': 'Tenant 1'}})
+
+        self.assertEqual(rows, [
+            {'subscriptionId': 'S1', 'subscriptionDisplayName': 'Sub 1', 'tenantId': 't1', 'tenantDisplayName': 'Tenant 1'},
+            {'subscriptionId': 's2', 'subscriptionDisplayName': ''},
+            {'name': 'n'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import threading
+import unittest
+
+from azext_resourcegraph import _query_executor
+from azext_resourcegraph._query_executor import iter_query_results, QueryStatistics
+from azext_resourcegraph.vendored_sdks.resourcegraph.models import QueryResponse, ResultTruncated
+
+
+class _Response(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, output, headers=None):
+        self.output = output
+        self.response = self
+        self.headers = headers or {}
+
+
+class _FakeResourceGraphClient(object):
+    """Serves 'rows_per_subscription' resources per subscription, 'page_size' rows per page."""
+
+    def __init__(self, rows_per_subscription=3, page_size=2, id_format='/subscriptions/{}/resources/{}'):
+        self.rows_per_subscription = rows_per_subscription
+        self.page_size = page_size
+        self.id_format = id_format
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def resources(self, request, raw=False):
+        with self.lock:
+            self.requests.append(request)
+        rows = [{'id': self.id_format.format(sub, i)}
+                for sub in request.subscriptions for i in range(self.rows_per_subscription)]
+        start = int(request.options.skip_token or request.options.skip)
+        end = start + min(request.options.top, self.page_size)
+        output = QueryResponse(total_records=len(rows), count=len(rows[start:end]), data=rows[start:end],
+                               facets=None, result_truncated=ResultTruncated.false,
+                               skip_token=str(end) if end < len(rows) else None)
+        return _Response(output, {'x-ms-user-quota-remaining': '10'})
+
+
+class TestQueryExecutor(unittest.TestCase):
+    def setUp(self):
+        self.subscription_limit = _query_executor.SUBSCRIPTION_LIMIT
+        _query_executor.SUBSCRIPTION_LIMIT = 2
+
+    def tearDown(self):
+        _query_executor.SUBSCRIPTION_LIMIT = self.subscription_limit
+
+    def test_single_shard_pages(self):
+        client = _FakeResourceGraphClient()
+        statistics = QueryStatistics()
+        rows = list(iter_query_results(client, 'project id', ['s1', 's2'], 5, 0, statistics))
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(statistics.pages, 3)
+        self.assertTrue(all(len(request.subscriptions) == 2 for request in client.requests))
+
+    def test_all_subscriptions_are_queried(self):
+        client = _FakeResourceGraphClient()
+        subscriptions = ['s{}'.format(i) for i in range(5)]
+        rows = list(iter_query_results(client, 'project id', subscriptions, 100, 0))
+
+        self.assertEqual(len(rows), 15)
+        self.assertEqual([row['id'] for row in rows],
+                         ['/subscriptions/{}/resources/{}'.format(sub, i) for sub in subscriptions for i in range(3)])
+        self.assertEqual({sub for request in client.requests for sub in request.subscriptions}, set(subscriptions))
+
+    def test_skip_and_first_across_shards(self):
+        client = _FakeResourceGraphClient()
+        subscriptions = ['s{}'.format(i) for i in range(5)]
+        rows = list(iter_query_results(client, 'project id', subscriptions, 4, 5))
+
+        self.assertEqual([row['id'] for row in rows],
+                         ['/subscriptions/s1/resources/2', '/subscriptions/s2/resources/0',
+                          '/subscriptions/s2/resources/1', '/subscriptions/s2/resources/2'])
+
+    def test_rows_with_the_same_id_are_kept(self):
+        # e.g. the rows of a query which expands an array of every resource
+        client = _FakeResourceGraphClient(id_format='/resources/{1}')
+        subscriptions = ['s{}'.format(i) for i in range(3)]
+        rows = list(iter_query_results(client, 'mv-expand properties.ipConfigurations', subscriptions, 100, 0))
+
+        self.assertEqual([row['id'] for row in rows],
+                         ['/resources/{}'.format(i) for _ in subscriptions for i in range(3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
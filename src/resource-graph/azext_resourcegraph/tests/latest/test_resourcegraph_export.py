@@ -0,0 +1,105 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from knack.util import CLIError
+
+from azext_resourcegraph.custom import _export_query
+from azext_resourcegraph._result_writer import ResultWriter, ExportState
+from azext_resourcegraph.resource_graph_enums import FileFormatEnum
+from .test_resourcegraph_executor import _FakeResourceGraphClient
+
+
+class _InterruptingClient(_FakeResourceGraphClient):
+    def __init__(self, fail_after_requests):
+        super(_InterruptingClient, self).__init__(rows_per_subscription=5, page_size=2)
+        self.fail_after_requests = fail_after_requests
+
+    def resources(self, request, raw=False):
+        if len(self.requests) >= self.fail_after_requests:
+            raise KeyboardInterrupt()
+        return super(_InterruptingClient, self).resources(request, raw)
+
+
+class TestResultExport(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.temp_dir, 'result')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_csv_writer(self):
+        writer = ResultWriter(self.output_file, FileFormatEnum.csv, compress=True)
+        writer.write_rows([{'id': 'a', 'tags': {'k': 'v'}}, {'id': 'b', 'tags': None}])
+        writer.close()
+
+        with gzip.open(self.output_file, 'rt') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows, [['id', 'tags'], ['a', '{"k":"v"}'], ['b', '']])
+
+    def test_export_is_resumed(self):
+        with self.assertRaises(KeyboardInterrupt):
+            _export_query(_InterruptingClient(2), 'project id', 10, 0, ['s1'], self.output_file,
+                          FileFormatEnum.ndjson, True, False)
+        state = ExportState(self.output_file, 'project id', ['s1'], FileFormatEnum.ndjson, True)
+        state.load()
+        self.assertEqual(state.rows_written, 4)
+        self.assertEqual(state.skip_token, '4')
+
+        result = _export_query(_InterruptingClient(10), 'project id', 10, 0, ['s1'], self.output_file,
+                               FileFormatEnum.ndjson, True, True)
+
+        self.assertEqual(result['rowsWritten'], 5)
+        self.assertFalse(os.path.exists(state.path))
+        with gzip.open(self.output_file, 'rb') as f:
+            ids = [json.loads(line)['id'] for line in io.TextIOWrapper(f, encoding='utf-8')]
+        self.assertEqual(ids, ['/subscriptions/s1/resources/{}'.format(i) for i in range(5)])
+
+    def test_rows_after_the_last_save_are_rewritten(self):
+        saves = []
+
+        def _save(state):
+            # the process dies after the second page is written, but before it is recorded
+            if len(saves) == 1:
+                raise KeyboardInterrupt()
+            saves.append(state.rows_written)
+            _save_state(state)
+
+        _save_state = ExportState.save
+        with mock.patch.object(ExportState, 'save', _save), self.assertRaises(KeyboardInterrupt):
+            _export_query(_FakeResourceGraphClient(rows_per_subscription=5), 'project id', 10, 0, ['s1'],
+                          self.output_file, FileFormatEnum.ndjson, True, False)
+        # and leaves an incomplete gzip member behind
+        with open(self.output_file, 'ab') as f:
+            f.write(b'\x1f\x8b\x08\x00incomplete')
+
+        result = _export_query(_FakeResourceGraphClient(rows_per_subscription=5), 'project id', 10, 0, ['s1'],
+                               self.output_file, FileFormatEnum.ndjson, True, True)
+
+        self.assertEqual(saves, [2])
+        self.assertEqual(result['rowsWritten'], 5)
+        with gzip.open(self.output_file, 'rb') as f:
+            ids = [json.loads(line)['id'] for line in io.TextIOWrapper(f, encoding='utf-8')]
+        self.assertEqual(ids, ['/subscriptions/s1/resources/{}'.format(i) for i in range(5)])
+
+    def test_resume_with_another_query_fails(self):
+        ExportState(self.output_file, 'project id', ['s1'], FileFormatEnum.ndjson, False).save()
+        with self.assertRaises(CLIError):
+            ExportState(self.output_file, 'project name', ['s1'], FileFormatEnum.ndjson, False).load()
+
+
+if __name__ == '__main__':
+    unittest.main()
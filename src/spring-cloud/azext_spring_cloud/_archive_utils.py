@@ -0,0 +1,163 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+from six.moves import queue
+
+DEFAULT_GZIP_BLOCK_SIZE = 1024 * 1024
+GZIP_DICTIONARY_SIZE = 32 * 1024
+DEFAULT_PIPE_CAPACITY = 16
+_PIPE_EOF = object()
+
+
+def _compress_block(data, dictionary, compresslevel, last):
+    if dictionary:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                      zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # a sync flush ends the block on a byte boundary, so the raw deflate output of all
+    # blocks can be concatenated into a single deflate stream
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def max_compressed_size(size, block_size=DEFAULT_GZIP_BLOCK_SIZE):
+    """Upper bound of the gzip output size for `size` bytes written to a ParallelGzipWriter."""
+    blocks = size // block_size + 1
+    # deflate falls back to stored blocks of at most 64 KB with 5 bytes of overhead each,
+    # plus the sync flush marker per block and the gzip header and trailer
+    return size + (size // 16384 + 1) * 5 + blocks * 16 + 64
+
+
+class ParallelGzipWriter(object):
+    """
+    File-like object which writes a single member gzip stream to fileobj. The input is
+    split into blocks that are deflated concurrently, each block primed with the last
+    32 KB of the previous one, in the same way as pigz. zlib releases the GIL while
+    compressing, so the blocks are compressed on multiple cores.
+    """
+
+    def __init__(self, fileobj, compresslevel=6, block_size=DEFAULT_GZIP_BLOCK_SIZE, max_workers=None):
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.max_workers = max_workers or cpu_count()
+        self.executor = ThreadPoolExecutor(self.max_workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.dictionary = None
+        self.crc = 0
+        self.size = 0
+        self.closed = False
+        # magic, deflate, no flags, mtime, no extra flags, unknown OS
+        self.fileobj.write(struct.pack('<BBBBLBB', 0x1f, 0x8b, 8, 0, int(time.time()), 0, 255))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.executor.shutdown(wait=False)
+            self.closed = True
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self._submit(block, last=False)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self._submit(bytes(self.buffer), last=True)
+        self.buffer = bytearray()
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().result())
+        self.fileobj.write(struct.pack('<LL', self.crc & 0xffffffff, self.size & 0xffffffff))
+        self.executor.shutdown()
+        self.closed = True
+
+    def _submit(self, block, last):
+        self.pending.append(self.executor.submit(
+            _compress_block, block, self.dictionary, self.compresslevel, last))
+        self.dictionary = block[-GZIP_DICTIONARY_SIZE:]
+        # keep the output ordered and the number of blocks held in memory bounded
+        while len(self.pending) > self.max_workers * 2 or (self.pending and self.pending[0].done()):
+            self.fileobj.write(self.pending.popleft().result())
+
+
+class StreamPipe(object):
+    """
+    Bounded in-memory pipe which connects a producer thread writing an archive to a
+    consumer reading it, e.g. the file share uploader.
+    """
+
+    def __init__(self, capacity=DEFAULT_PIPE_CAPACITY):
+        self.queue = queue.Queue(capacity)
+        self.remainder = b''
+        self.error = None
+        self.eof = False
+        self.aborted = threading.Event()
+
+    def write(self, data):
+        if not data:
+            return 0
+        self._put(bytes(data))
+        return len(data)
+
+    def close(self, error=None):
+        """
+        Called by the producer. An error is raised to the consumer on its next read. Nothing is
+        left to do once the consumer has aborted.
+        """
+        if self.aborted.is_set():
+            return
+        self.error = error
+        try:
+            self._put(_PIPE_EOF)
+        except IOError:
+            # the consumer aborted while the producer was waiting for room in the pipe
+            pass
+
+    def abort(self):
+        """Called by the consumer when it stops reading, so that the producer doesn't block."""
+        self.aborted.set()
+
+    def read(self, size):
+        chunks = [self.remainder]
+        available = len(self.remainder)
+        while available < size and not self.eof:
+            data = self.queue.get()
+            if data is _PIPE_EOF:
+                self.eof = True
+                if self.error is not None:
+                    raise self.error  # pylint: disable=raising-bad-type
+                break
+            chunks.append(data)
+            available += len(data)
+        data = b''.join(chunks)
+        self.remainder = data[size:]
+        return data[:size]
+
+    def _put(self, data):
+        while not self.aborted.is_set():
+            try:
+                self.queue.put(data, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise IOError('The reader of the pipe has stopped.')
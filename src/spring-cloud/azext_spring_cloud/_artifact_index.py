@@ -0,0 +1,87 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from knack.log import get_logger
+from azure.cli.core.api import get_config_dir
+
+logger = get_logger(__name__)
+
+ARTIFACT_INDEX_FILE_NAME = 'spring_cloud_artifacts.json'
+ARTIFACT_INDEX_TTL = timedelta(days=1)
+_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def get_file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def get_service_id(subscription_id, resource_group, service):
+    return '/subscriptions/{}/resourceGroups/{}/providers/Microsoft.AppPlatform/Spring/{}'.format(
+        subscription_id, resource_group, service).lower()
+
+
+class ArtifactIndex(object):
+    """
+    Local index of the artifacts uploaded to the storage of each Azure Spring Cloud service,
+    keyed by the SHA256 of their content, so that an artifact which was uploaded already
+    doesn't need to be uploaded again.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_config_dir(), ARTIFACT_INDEX_FILE_NAME)
+
+    def find(self, service_id, file_hash):
+        """Returns the share_name and relative_path of the unexpired upload of an artifact, or None."""
+        return self._load().get(service_id, {}).get(file_hash)
+
+    def find_hash(self, service_id, relative_path):
+        """Returns the hash of the artifact uploaded to relative_path, or None."""
+        for file_hash, entry in self._load().get(service_id, {}).items():
+            if entry['relative_path'] == relative_path:
+                return file_hash
+        return None
+
+    def record(self, service_id, file_hash, share_name, relative_path, ttl=ARTIFACT_INDEX_TTL):
+        index = self._load()
+        index.setdefault(service_id, {})[file_hash] = {
+            'share_name': share_name,
+            'relative_path': relative_path,
+            'expiry': (datetime.utcnow() + ttl).strftime(_DATETIME_FORMAT),
+        }
+        self._save(index)
+
+    def remove(self, service_id, file_hash):
+        index = self._load()
+        if index.get(service_id, {}).pop(file_hash, None) is not None:
+            self._save(index)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+        now = datetime.utcnow().strftime(_DATETIME_FORMAT)
+        return {service_id: {file_hash: entry for file_hash, entry in artifacts.items() if entry['expiry'] > now}
+                for service_id, artifacts in index.items()}
+
+    def _save(self, index):
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(temp_path, self.path)
+        except (IOError, OSError) as e:
+            logger.debug("Failed to save the artifact index: %s", e)
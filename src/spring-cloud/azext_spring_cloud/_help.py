@@ -125,6 +125,8 @@ helps['spring-cloud app deploy'] = """
       text: az spring-cloud app deploy -n MyApp -s MyCluster -g MyResourceGroup --jar-path app.jar --jvm-options="-XX:+UseG1GC -XX:+UseStringDeduplication" --env foo=bar
     - name: Deploy source code to a specific deployment of an app.
       text: az spring-cloud app deploy -n MyApp -s MyCluster -g MyResourceGroup -d green-deployment
+    - name: Deploy the jar which was deployed to the staging deployment to the production deployment without uploading it again.
+      text: az spring-cloud app deploy -n MyApp -s MyCluster -g MyResourceGroup --jar-path app.jar --skip-unchanged
 """
 
 helps['spring-cloud app scale'] = """
@@ -164,6 +166,11 @@ helps['spring-cloud app log'] = """
 helps['spring-cloud app logs'] = """
     type: command
     short-summary: Show logs of an app instance, logs will be streamed when setting '-f/--follow'.
+    examples:
+    - name: Follow the logs of all instances of an app, only showing errors.
+      text: az spring-cloud app logs -n MyApp -s MyCluster -g MyResourceGroup --all-instances --level ERROR -f
+    - name: Show the log lines of an app instance that mention a request id.
+      text: az spring-cloud app logs -n MyApp -s MyCluster -g MyResourceGroup -i MyInstance --filter "requestId=42"
 """
 
 helps['spring-cloud app deployment'] = """
@@ -11,6 +11,7 @@ from ._validators import (validate_env, validate_cosmos_type, validate_resource_
                           validate_name, validate_app_name, validate_deployment_name, validate_nodes_count,
                           validate_log_lines, validate_log_limit, validate_log_since)
 from ._utils import ApiType
+from ._constants import LOG_LEVELS
 
 from .vendored_sdks.appplatform.models import RuntimeVersion, TestKeyType
 
@@ -61,6 +62,9 @@ def load_arguments(self, _):
         c.argument('follow', options_list=['--follow ', '-f'], help='Specify if the logs should be streamed.', action='store_true')
         c.argument('since', help='Only return logs newer than a relative duration like 5s, 2m, or 1h. Maximum is 1h', validator=validate_log_since)
         c.argument('limit', type=int, help='Maximum kilobytes of logs to return. Ceiling number is 2048.', validator=validate_log_limit)
+        c.argument('all_instances', help='Show the logs of all instances of the production deployment, each line prefixed with the instance name.', action='store_true')
+        c.argument('log_filter', options_list=['--filter'], help='Only show the log lines that match a regular expression.')
+        c.argument('level', arg_type=get_enum_type(LOG_LEVELS), help='Only show the log lines of this level or higher.')
 
     with self.argument_context('spring-cloud app log tail') as c:
         c.argument('instance', options_list=['--instance', '-i'], help='Name of an existing instance of the deployment.')
@@ -112,6 +116,9 @@ def load_arguments(self, _):
                 'target_module', help='Child module to be deployed, required for multiple jar packages built from source code')
             c.argument(
                 'version', help='Deployment version, keep unchanged if not set.')
+            c.argument('skip_unchanged', arg_type=get_three_state_flag(),
+                       help='If true, a jar uploaded to the service before is referenced instead of uploaded again, '
+                            'and the deployment is skipped if it already runs the same jar and no settings are changed.')
 
     with self.argument_context('spring-cloud app deployment create') as c:
         c.argument('skip_clone_settings', help='Create staging deployment will automatically copy settings from production deployment.',
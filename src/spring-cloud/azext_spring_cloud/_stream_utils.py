@@ -5,20 +5,32 @@
 
 # pylint: disable=wrong-import-order
 
+import codecs
+import re
+import sys
 import time
+import certifi
 import colorama   # pylint: disable=import-error
-from io import BytesIO
+import urllib3
+import urllib3.contrib.pyopenssl
 from random import uniform
+from threading import Thread
+from six.moves import queue
 from knack.util import CLIError
 from knack.log import get_logger
 from msrestazure.azure_exceptions import CloudError
 from azure.storage.blob import AppendBlobService
 from azure.common import AzureHttpError
 from ._utils import get_blob_info
+from ._constants import LOG_LEVELS
 
 logger = get_logger(__name__)
 
 DEFAULT_CHUNK_SIZE = 1024 * 4
+MAX_CHUNK_SIZE = 1024 * 1024 * 4
+MAX_PENDING_LOG_SIZE = 1024 * 1024
+LOG_LINE_QUEUE_SIZE = 10000
+_LOG_LEVEL_REGEX = re.compile(br'\b(TRACE|DEBUG|INFO|WARN|WARNING|ERROR|FATAL)\b')
 DEFAULT_LOG_TIMEOUT_IN_SEC = 60 * 30  # 30 minutes
 
 
@@ -75,10 +87,10 @@ def _stream_logs(no_format,  # pylint: disable=too-many-locals, too-many-stateme
     if not no_format:
         colorama.init()
 
-    stream = BytesIO()
+    lines = _LogLineBuffer(logger_level_func)
     metadata = {}
     start = 0
-    end = byte_size - 1
+    chunk_size = byte_size
     available = 0
     sleep_time = 1
     max_sleep_time = 15
@@ -96,97 +108,81 @@ def _stream_logs(no_format,  # pylint: disable=too-many-locals, too-many-stateme
     except (AttributeError, AzureHttpError):
         pass
 
-    while (_blob_is_not_complete(metadata) or start < available):
-        while start < available:
-            # Success! Reset our polling backoff.
-            sleep_time = 1
-            num_fails = 0
-            consecutive_sleep_in_sec = 0
+    try:
+        while (_blob_is_not_complete(metadata) or start < available):
+            while start < available:
+                # Success! Reset our polling backoff.
+                sleep_time = 1
+                num_fails = 0
+                consecutive_sleep_in_sec = 0
+
+                try:
+                    blob = blob_service.get_blob_to_bytes(
+                        container_name=container_name,
+                        blob_name=blob_name,
+                        start_range=start,
+                        end_range=start + chunk_size - 1,
+                        max_connections=1)
+                except AzureHttpError as ae:
+                    if ae.status_code != 404:
+                        raise CLIError(ae)
+                    break
+
+                data = blob.content
+                if not data:
+                    break
+                start += len(data)
+                # the ranged read reports the current size of the blob, so a busy log
+                # is read to its end without polling the blob properties in between
+                available = max(available, _get_blob_size(blob.properties, start))
+                if blob.metadata:
+                    metadata = blob.metadata
+                lines.append(data)
+
+                # read larger ranges while the reads come back full, i.e. the log grows faster
+                # than it is read, and go back to smaller ones when it slows down
+                if len(data) >= chunk_size:
+                    chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+                elif len(data) < chunk_size // 4:
+                    chunk_size = max(chunk_size // 2, byte_size)
 
             try:
-                old_byte_size = len(stream.getvalue())
-                blob_service.get_blob_to_stream(
-                    container_name=container_name,
-                    blob_name=blob_name,
-                    start_range=start,
-                    end_range=end,
-                    stream=stream)
-
-                curr_bytes = stream.getvalue()
-                new_byte_size = len(curr_bytes)
-                amount_read = new_byte_size - old_byte_size
-                start += amount_read
-                end = start + byte_size - 1
-
-                # Only scan what's newly read. If nothing is read, default to 0.
-                min_scan_range = max(new_byte_size - amount_read - 1, 0)
-                for i in range(new_byte_size - 1, min_scan_range, -1):
-                    if curr_bytes[i - 1:i + 1] == b'\r\n':
-                        flush = curr_bytes[:i]  # won't logger.warning \n
-                        stream = BytesIO()
-                        stream.write(curr_bytes[i + 1:])
-                        logger_level_func(flush.decode('utf-8', errors='ignore'))
-                        break
-                    if curr_bytes[i:i + 1] == b'\r':
-                        flush = curr_bytes[:i + 1]  # won't logger.warning \n
-                        stream = BytesIO()
-                        stream.write(curr_bytes[i + 1:])
-                        logger_level_func(flush.decode('utf-8', errors='ignore'))
-                        break
-
+                props = blob_service.get_blob_properties(
+                    container_name=container_name, blob_name=blob_name)
+                metadata = props.metadata
+                available = props.properties.content_length
             except AzureHttpError as ae:
                 if ae.status_code != 404:
                     raise CLIError(ae)
-            except KeyboardInterrupt:
-                curr_bytes = stream.getvalue()
-                if curr_bytes:
-                    logger_level_func(curr_bytes.decode('utf-8', errors='ignore'))
+            except Exception as err:
+                raise CLIError(err)
+
+            if consecutive_sleep_in_sec > timeout_in_seconds:
+                # Flush anything remaining in the buffer - this would be the case
+                # if the file has expired and we weren't able to detect any line end
+                lines.flush()
                 return
 
-        try:
-            props = blob_service.get_blob_properties(
-                container_name=container_name, blob_name=blob_name)
-            metadata = props.metadata
-            available = props.properties.content_length
-        except AzureHttpError as ae:
-            if ae.status_code != 404:
-                raise CLIError(ae)
-        except KeyboardInterrupt:
-            if curr_bytes:
-                logger_level_func(curr_bytes.decode('utf-8', errors='ignore'))
-            return
-        except Exception as err:
-            raise CLIError(err)
-
-        if consecutive_sleep_in_sec > timeout_in_seconds:
-            # Flush anything remaining in the buffer - this would be the case
-            # if the file has expired and we weren't able to detect any \r\n
-            curr_bytes = stream.getvalue()
-            if curr_bytes:
-                logger_level_func(curr_bytes.decode('utf-8', errors='ignore'))
-
-            return
-
-        # If no new data available but not complete, sleep before trying to process additional data.
-        if (_blob_is_not_complete(metadata) and start >= available):
-            num_fails += 1
-
-            if num_fails >= num_fails_for_backoff:
-                num_fails = 0
-                sleep_time = min(sleep_time * 2, max_sleep_time)
+            # If no new data available but not complete, sleep before trying to process additional data.
+            if (_blob_is_not_complete(metadata) and start >= available):
+                num_fails += 1
+
+                if num_fails >= num_fails_for_backoff:
+                    num_fails = 0
+                    sleep_time = min(sleep_time * 2, max_sleep_time)
 
-            rnd = uniform(1, 2)  # 1.0 <= x < 2.0
-            total_sleep_time = sleep_time + rnd
-            consecutive_sleep_in_sec += total_sleep_time
-            time.sleep(total_sleep_time)
+                rnd = uniform(1, 2)  # 1.0 <= x < 2.0
+                total_sleep_time = sleep_time + rnd
+                consecutive_sleep_in_sec += total_sleep_time
+                time.sleep(total_sleep_time)
+    except KeyboardInterrupt:
+        lines.flush()
+        return
 
     # One final check to see if there's anything in the buffer to flush
     # E.g., metadata has been set and start == available, but the log file
-    # didn't end in \r\n, so we were unable to flush out the final contents.
-    curr_bytes = stream.getvalue()
-
-    if curr_bytes:
-        logger_level_func(curr_bytes.decode('utf-8', errors='ignore'))
+    # didn't end with a line end, so we were unable to flush out the final contents.
+    lines.flush()
 
     build_status = _get_run_status(metadata).lower()
     logger_level_func("Log status was: '%s'", build_status)
@@ -200,6 +196,63 @@ def _stream_logs(no_format,  # pylint: disable=too-many-locals, too-many-stateme
             raise CLIError("Run was canceled")
 
 
+class _LogLineBuffer(object):
+    """
+    Holds the bytes read after the last complete line of the log. Complete lines are logged as
+    soon as they are read, and a line longer than max_size is logged in parts, so the buffer
+    never grows beyond max_size.
+    """
+
+    def __init__(self, logger_level_func, max_size=MAX_PENDING_LOG_SIZE):
+        self.logger_level_func = logger_level_func
+        self.max_size = max_size
+        self.buffer = bytearray()
+
+    def append(self, data):
+        self.buffer.extend(data)
+        line_end = max(self.buffer.rfind(b'\n'), self.buffer.rfind(b'\r'))
+        if line_end >= 0:
+            self._flush(line_end + 1)
+        while len(self.buffer) >= self.max_size:
+            self._flush(self._character_start(self.max_size))
+
+    def flush(self):
+        if self.buffer:
+            self._flush(len(self.buffer))
+
+    def _character_start(self, end):
+        """
+        Returns the start of the utf-8 character at end, so that a long line is not split in the middle
+        of a multi-byte character. Continuation bytes are 0b10xxxxxx, and a character has at most 3.
+        """
+        start = end
+        while start > end - 3 and start > 0 and self.buffer[start] & 0xC0 == 0x80:
+            start -= 1
+        # not utf-8, or a character starting at the beginning of the buffer, is split as it is
+        return start if start > 0 and self.buffer[start] & 0xC0 != 0x80 else end
+
+    def _flush(self, end):
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        # the logger ends every message with a new line
+        if data.endswith(b'\r\n'):
+            data = data[:-2]
+        elif data.endswith((b'\n', b'\r')):
+            data = data[:-1]
+        self.logger_level_func(data.decode('utf-8', errors='ignore'))
+
+
+def _get_blob_size(properties, default):
+    # e.g. 'bytes 0-4095/102400'
+    content_range = getattr(properties, 'content_range', None)
+    if content_range:
+        try:
+            return int(content_range.split('/')[1])
+        except (IndexError, ValueError):
+            pass
+    return default
+
+
 def _blob_is_not_complete(metadata):
     if not metadata:
         return True
@@ -216,3 +269,116 @@ def _get_run_status(metadata):
         if key.lower() == '__complete_status':
             return metadata[key]
     return 'inprogress'
+
+
+def is_utf8(encoding):
+    try:
+        return codecs.lookup(encoding).name == 'utf-8'
+    except (LookupError, TypeError):
+        return False
+
+
+class LogLineFilter(object):
+    """
+    Filters log lines by a regular expression and by a minimum log level. A line without
+    a level, e.g. a line of a stack trace, is kept if the previous line of the same instance is.
+    """
+
+    def __init__(self, pattern=None, level=None):
+        self.pattern = re.compile(pattern.encode('utf-8')) if pattern else None
+        self.min_level = LOG_LEVELS.index(level.upper()) if level else None
+        self.last_accepted = {}
+
+    def accept(self, instance, line):
+        if self.min_level is not None:
+            level_match = _LOG_LEVEL_REGEX.search(line)
+            if level_match:
+                level = level_match.group(1).decode('utf-8')
+                accepted = LOG_LEVELS.index('WARN' if level == 'WARNING' else level) >= self.min_level
+                self.last_accepted[instance] = accepted
+            else:
+                accepted = self.last_accepted.get(instance, False)
+            if not accepted:
+                return False
+        return self.pattern is None or self.pattern.search(line) is not None
+
+
+def stream_instance_logs(instance_urls, user_name, password, line_filter, prefix_instance=True):
+    """
+    Follows the log streams of several app instances concurrently over one pooled connection
+    manager, and writes the lines which pass the filter to stdout as a single stream.
+    """
+    try:
+        urllib3.contrib.pyopenssl.inject_into_urllib3()
+    except ImportError:
+        pass
+
+    http = urllib3.PoolManager(
+        maxsize=len(instance_urls), cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+    headers = urllib3.util.make_headers(
+        basic_auth='{0}:{1}'.format(user_name, password))
+    lines = queue.Queue(LOG_LINE_QUEUE_SIZE)
+    exceptions = []
+
+    for instance, url in instance_urls:
+        t = Thread(target=_read_instance_log, args=(http, url, headers, instance, lines, exceptions))
+        t.daemon = True
+        t.start()
+
+    std_buffer = getattr(sys.stdout, 'buffer', None)
+    if std_buffer is None or not is_utf8(sys.stdout.encoding):
+        std_buffer = None
+    sys.stdout.flush()
+
+    remaining = len(instance_urls)
+    while remaining:
+        try:
+            instance, line = lines.get(timeout=1)  # so that ctrl+c can stop the command
+        except queue.Empty:
+            continue
+        if line is None:
+            remaining -= 1
+            continue
+        if not line_filter.accept(instance, line):
+            continue
+
+        if prefix_instance:
+            line = '[{}] '.format(instance).encode('utf-8') + line
+        if std_buffer is not None:
+            std_buffer.write(line + b'\n')
+            if lines.empty():
+                std_buffer.flush()
+        else:
+            sys.stdout.write(line.decode('utf-8', errors='replace') + '\n')
+
+    if std_buffer is not None:
+        std_buffer.flush()
+    if exceptions:
+        raise exceptions[0]
+
+
+def _read_instance_log(http, url, headers, instance, lines, exceptions):
+    try:
+        response = http.request('GET', url, headers=headers, preload_content=False)
+        if response.status != 200:
+            raise CLIError("Failed to connect to the server of instance '{}' with status code '{}' and reason '{}'"
+                           .format(instance, response.status, response.reason))
+        pending = b''
+        try:
+            for chunk in response.stream(2 ** 16):
+                complete, _, pending = (pending + chunk).rpartition(b'\n')
+                if complete:
+                    for line in complete.split(b'\n'):
+                        lines.put((instance, line.rstrip(b'\r')))
+        except urllib3.exceptions.ProtocolError:
+            pass
+        if pending:
+            lines.put((instance, pending))
+        response.release_conn()
+    except CLIError as e:
+        exceptions.append(e)
+    except urllib3.exceptions.HTTPError as e:
+        exceptions.append(CLIError("Failed to read the logs of instance '{}': {}".format(instance, e)))
+    finally:
+        # tells the reader that this stream has ended
+        lines.put((instance, None))
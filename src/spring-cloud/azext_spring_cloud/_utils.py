@@ -4,76 +4,200 @@
 # --------------------------------------------------------------------------------------------
 
 from enum import Enum
+from datetime import datetime, timedelta
 import os
 import codecs
+import hashlib
 import tarfile
-import tempfile
-import uuid
 from io import open
-from re import (search, match)
-from json import dumps
+from re import search, compile as compile_regex
+from threading import Thread
+from json import dumps, dump as json_dump, load as json_load
 from knack.util import CLIError, todict
 from knack.log import get_logger
+from six.moves.urllib import parse
+from ._archive_utils import ParallelGzipWriter, StreamPipe, max_compressed_size
 from ._client_factory import cf_resource_groups
 
 
 logger = get_logger(__name__)
 
+UPLOAD_SESSION_DIR_NAME = 'spring_cloud_uploads'
+
 
 def _get_upload_local_file(jar_path=None):
     file_path = jar_path
     file_type = "Jar"
 
     if file_path is None:
+        # the source code is packed while it is uploaded, see _upload_source_code
         file_type = "Source"
-        file_path = os.path.join(tempfile.gettempdir(
-        ), 'build_archive_{}.tar.gz'.format(uuid.uuid4().hex))
-        _pack_source_code(os.getcwd(), file_path)
+        file_path = os.getcwd()
     return file_type, file_path
 
 
-def _pack_source_code(source_location, tar_file_path):
+def _get_upload_session_path(resource_group, service, app, deployment, file_path):
+    from azure.cli.core.api import get_config_dir
+    key = '|'.join([resource_group, service, app, deployment, os.path.abspath(file_path)]).lower()
+    # the session holds a writable SAS URL, so it is kept in a directory only the user can read
+    session_dir = os.path.join(get_config_dir(), UPLOAD_SESSION_DIR_NAME)
+    if not os.path.isdir(session_dir):
+        os.makedirs(session_dir, 0o700)
+    return os.path.join(session_dir, '{}.json'.format(hashlib.sha1(key.encode('utf-8')).hexdigest()))
+
+
+def _load_upload_session(session_path, min_remaining=timedelta(minutes=10)):
+    """Returns the upload URL and relative path of an interrupted upload, if its SAS token is still valid."""
+    try:
+        with open(session_path, 'r') as f:
+            session = json_load(f)
+        upload_url = session['upload_url']
+        relative_path = session['relative_path']
+        expiry = parse.parse_qs(parse.urlparse(upload_url).query)['se'][0]
+        if datetime.strptime(expiry, '%Y-%m-%dT%H:%M:%SZ') - datetime.utcnow() < min_remaining:
+            return None, None
+    except (IOError, OSError, ValueError, KeyError):
+        return None, None
+    return upload_url, relative_path
+
+
+def _save_upload_session(session_path, upload_url, relative_path):
+    temp_path = '{}.{}.tmp'.format(session_path, os.getpid())
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json_dump({'upload_url': upload_url, 'relative_path': relative_path}, f)
+    os.replace(temp_path, session_path)
+
+
+def _delete_upload_session(session_path):
+    for path in (session_path, session_path + '.ranges'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _upload_source_code(file_service, share_name, file_name, source_location, max_connections=2):
+    """Packs the source code into a tar.gz archive and uploads it to the file share while it is packed."""
+    entries, total_size = _collect_source_files(source_location)
+    pipe = StreamPipe()
+
+    def _pack():
+        try:
+            _pack_source_code(source_location, pipe, entries)
+        except Exception as e:  # pylint: disable=broad-except
+            pipe.close(e)
+        else:
+            pipe.close()
+
+    packer = Thread(target=_pack)
+    packer.daemon = True
+    packer.start()
+    try:
+        file_service.create_file_from_stream_with_max_size(
+            share_name, None, file_name, pipe, max_compressed_size(_max_tar_size(entries, total_size)),
+            max_connections=max_connections)
+    finally:
+        pipe.abort()
+        packer.join()
+
+
+def _pack_source_code(source_location, tar_file, entries=None):
+    """Writes the source code as tar.gz into tar_file, which is a path or a writable file object."""
     logger.info("Packing source code into tar to upload...")
 
+    if entries is None:
+        entries, _ = _collect_source_files(source_location)
+
+    if isinstance(tar_file, str):
+        with open(tar_file, 'wb') as f:
+            _write_tar_gz(f, entries)
+    else:
+        _write_tar_gz(tar_file, entries)
+
+
+def _write_tar_gz(fileobj, entries):
+    with ParallelGzipWriter(fileobj) as gzip_writer:
+        with tarfile.open(fileobj=gzip_writer, mode="w|") as tar:
+            for name, arcname in entries:
+                # create a TarInfo object from the file
+                tarinfo = tar.gettarinfo(name, arcname)
+                if tarinfo is None:
+                    raise CLIError("tarfile: unsupported type {}".format(name))
+
+                # append the tar header and data to the archive
+                if tarinfo.isreg():
+                    with open(name, "rb") as f:
+                        tar.addfile(tarinfo, f)
+                else:
+                    tar.addfile(tarinfo)
+
+
+def _max_tar_size(entries, total_size):
+    # every entry takes a header block, possibly an extended header for long names, and
+    # its content padded to the block size; the archive ends with two empty records
+    return total_size + len(entries) * (3 * tarfile.BLOCKSIZE) + 2 * tarfile.RECORDSIZE
+
+
+def _collect_source_files(source_location):
+    """
+    Returns the (path, arcname) pairs of the files and directories to archive, evaluated
+    against the .gitignore rules, and the total size of the files.
+    """
     ignore_list, ignore_list_size = _load_gitignore_file(source_location)
+    ignore_matcher = IgnoreMatcher(ignore_list) if ignore_list else None
     common_vcs_ignore_list = {'.git', '.gitignore', 'bzrignore', '.hg',
                               '.hgignore', '.svn', '.circleci', 'target', 'docker'}
 
-    def _ignore_check(tarinfo, parent_ignored, parent_matching_rule_index):
+    def _ignore_check(name, parent_ignored, parent_matching_rule_index):
         # ignore common vcs dir or file
-        if tarinfo.name in common_vcs_ignore_list:
+        if name in common_vcs_ignore_list:
             logger.info(
-                "Excluding '%s' based on default ignore rules", tarinfo.name)
+                "Excluding '%s' based on default ignore rules", name)
             return True, parent_matching_rule_index
 
-        if ignore_list is None:
+        if ignore_matcher is None:
             # if .dockerignore doesn't exists, inherit from parent
             # eg, it will ignore the files under .git folder.
             return parent_ignored, parent_matching_rule_index
 
-        for index, item in enumerate(ignore_list):
-            # stop checking the remaining rules whose priorities are lower than the parent matching rule
-            # at this point, current item should just inherit from parent
-            if index >= parent_matching_rule_index:
-                break
-            if match(item.pattern, tarinfo.name):
-                logger.debug(".gitignore: rule '%s' matches '%s'.",
-                             item.rule, tarinfo.name)
-                return item.ignore, index
+        # only the rules whose priorities are higher than the parent matching rule are checked,
+        # otherwise current item should just inherit from parent
+        index = ignore_matcher.match(name, parent_matching_rule_index)
+        if index is not None:
+            logger.debug(".gitignore: rule '%s' matches '%s'.",
+                         ignore_list[index].rule, name)
+            return ignore_list[index].ignore, index
 
         logger.debug(".gitignore: no rule for '%s'. parent ignore '%s'",
-                     tarinfo.name, parent_ignored)
+                     name, parent_ignored)
         # inherit from parent
         return parent_ignored, parent_matching_rule_index
 
-    with tarfile.open(tar_file_path, "w:gz") as tar:
-        # need to set arcname to empty string as the archive root path
-        _archive_file_recursively(tar,
-                                  source_location,
-                                  arcname="",
-                                  parent_ignored=False,
-                                  parent_matching_rule_index=ignore_list_size,
-                                  ignore_check=_ignore_check)
+    entries = []
+    total_size = 0
+    # the archive root path has an empty arcname
+    stack = [(source_location, "", False, ignore_list_size)]
+    while stack:
+        name, arcname, parent_ignored, parent_matching_rule_index = stack.pop()
+
+        # check if the file/dir is ignored, using the same name as the tar entry would have
+        ignored, matching_rule_index = _ignore_check(
+            arcname.replace(os.sep, "/").lstrip("/"), parent_ignored, parent_matching_rule_index)
+
+        is_dir = os.path.isdir(name) and not os.path.islink(name)
+        if not ignored:
+            entries.append((name, arcname))
+            if not is_dir and not os.path.islink(name):
+                total_size += os.path.getsize(name)
+
+        # even the dir is ignored, its child items can still be included, so continue to scan
+        if is_dir:
+            children = sorted(os.listdir(name), reverse=True)
+            stack.extend((os.path.join(name, f), os.path.join(arcname, f), ignored, matching_rule_index)
+                         for f in children)
+
+    return entries, total_size
 
 
 class IgnoreRule(object):  # pylint: disable=too-few-public-methods
@@ -104,6 +228,31 @@ class IgnoreRule(object):  # pylint: disable=too-few-public-methods
         self.pattern += "$"
 
 
+class IgnoreMatcher(object):  # pylint: disable=too-few-public-methods
+    """
+    Matches a path against a list of ignore rules with a single compiled regular expression
+    instead of evaluating every rule separately.
+    """
+    def __init__(self, ignore_list):
+        self.ignore_list = ignore_list
+        self.regexes = {}
+
+    def match(self, name, limit):
+        """Returns the index of the first rule before `limit` that matches name, or None."""
+        if limit <= 0:
+            return None
+        regex = self.regexes.get(limit)
+        if regex is None:
+            # the alternatives are tried in order, so the first matching rule wins
+            regex = compile_regex("|".join("(?P<rule{}>{})".format(index, item.pattern)
+                                           for index, item in enumerate(self.ignore_list[:limit])))
+            self.regexes[limit] = regex
+        result = regex.match(name)
+        if result is None:
+            return None
+        return int(result.lastgroup[len("rule"):])
+
+
 def _load_gitignore_file(source_location):
     # reference: https://git-scm.com/docs/gitignore
     git_ignore_file = os.path.join(source_location, ".gitignore")
@@ -130,33 +279,6 @@ def _load_gitignore_file(source_location):
     return ignore_list, len(ignore_list)
 
 
-def _archive_file_recursively(tar, name, arcname, parent_ignored, parent_matching_rule_index, ignore_check):
-    # create a TarInfo object from the file
-    tarinfo = tar.gettarinfo(name, arcname)
-
-    if tarinfo is None:
-        raise CLIError("tarfile: unsupported type {}".format(name))
-
-    # check if the file/dir is ignored
-    ignored, matching_rule_index = ignore_check(
-        tarinfo, parent_ignored, parent_matching_rule_index)
-
-    if not ignored:
-        # append the tar header and data to the archive
-        if tarinfo.isreg():
-            with open(name, "rb") as f:
-                tar.addfile(tarinfo, f)
-        else:
-            tar.addfile(tarinfo)
-
-    # even the dir is ignored, its child items can still be included, so continue to scan
-    if tarinfo.isdir():
-        for f in os.listdir(name):
-            _archive_file_recursively(tar, os.path.join(name, f), os.path.join(arcname, f),
-                                      parent_ignored=ignored, parent_matching_rule_index=matching_rule_index,
-                                      ignore_check=ignore_check)
-
-
 def get_blob_info(blob_sas_url):
     matchObj = search((r"http(s)?://(?P<account_name>.*?)\.blob\.(?P<endpoint_suffix>.*?)/(?P<container_name>.*?)/"
                        r"(?P<blob_name>.*?)\?(?P<sas_token>.*)"), blob_sas_url)
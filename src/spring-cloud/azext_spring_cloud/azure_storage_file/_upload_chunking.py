@@ -6,6 +6,12 @@
 
 # pylint: disable=too-few-public-methods, too-many-instance-attributes
 
+import base64
+import collections
+import hashlib
+import json
+import mmap
+import os
 import threading
 import concurrent.futures
 
@@ -44,6 +50,37 @@ def _upload_file_chunks(file_service, share_name, directory_name, file_name,
     return range_ids
 
 
+def _upload_file_chunks_of_unknown_size(file_service, share_name, directory_name, file_name,
+                                        block_size, stream, max_connections, progress_callback,
+                                        validate_content, timeout):
+    uploader = _FileChunkUploader(
+        file_service,
+        share_name,
+        directory_name,
+        file_name,
+        None,
+        block_size,
+        stream,
+        False,
+        progress_callback,
+        validate_content,
+        timeout
+    )
+
+    if max_connections > 1:
+        # the stream is still read sequentially, only the range uploads run in parallel
+        uploader.progress_lock = threading.Lock()
+        executor = concurrent.futures.ThreadPoolExecutor(max_connections)
+        try:
+            uploader.process_all_unknown_size(executor, max_pending=max_connections * 2)
+        finally:
+            executor.shutdown()
+    else:
+        uploader.process_all_unknown_size()
+
+    return uploader.stream_size
+
+
 class _FileChunkUploader(object):
     def __init__(self, file_service, share_name, directory_name, file_name,
                  file_size, chunk_size, stream, parallel, progress_callback,
@@ -62,6 +99,7 @@ class _FileChunkUploader(object):
         self.progress_lock = threading.Lock() if parallel else None
         self.validate_content = validate_content
         self.timeout = timeout
+        self.stream_size = None
 
     def get_chunk_offsets(self):
         index = 0
@@ -86,19 +124,32 @@ class _FileChunkUploader(object):
         chunk_data = self._read_from_stream(chunk_offset, size)
         return self._upload_chunk_with_progress(chunk_offset, chunk_data)
 
-    def process_all_unknown_size(self):
+    def process_all_unknown_size(self, executor=None, max_pending=1):
         assert self.stream_lock is None
         range_ids = []
+        pending = collections.deque()
         index = 0
-        while True:
-            data = self._read_from_stream(None, self.chunk_size)
-            if data:
+        try:
+            while True:
+                data = self._read_from_stream(None, self.chunk_size)
+                if not data:
+                    break
+                if executor is None:
+                    range_ids.append(self._upload_chunk_with_progress(index, data))
+                else:
+                    pending.append(executor.submit(self._upload_chunk_with_progress, index, data))
+                    # bound the number of chunks which are read but not uploaded yet
+                    while len(pending) >= max_pending:
+                        range_ids.append(pending.popleft().result())
                 index += len(data)
-                range_id = self._upload_chunk_with_progress(index, data)
-                range_ids.append(range_id)
-            else:
-                break
 
+            range_ids.extend(future.result() for future in pending)
+        except BaseException:
+            # the chunks which are not uploaded yet are not needed anymore
+            for future in pending:
+                future.cancel()
+            raise
+        self.stream_size = index
         return range_ids
 
     def _read_from_stream(self, offset, count):
@@ -136,3 +187,173 @@ class _FileChunkUploader(object):
         range_id = 'bytes={0}-{1}'.format(chunk_start, chunk_end)
         self._update_progress(len(chunk_data))
         return range_id
+
+
+def _upload_file_chunks_resumable(file_service, share_name, directory_name, file_name,
+                                  local_file_path, file_size, block_size, max_connections,
+                                  progress_callback, validate_content, timeout, checkpoint):
+    with open(local_file_path, 'rb') as f:
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    uploader = _MemoryMappedFileChunkUploader(
+        file_service,
+        share_name,
+        directory_name,
+        file_name,
+        file_size,
+        block_size,
+        source,
+        progress_callback,
+        validate_content,
+        timeout,
+        checkpoint
+    )
+
+    try:
+        if progress_callback is not None:
+            progress_callback(0, file_size)
+
+        if max_connections > 1:
+            # the workers read from the memory map, they must be done before it is closed
+            with concurrent.futures.ThreadPoolExecutor(max_connections) as executor:
+                futures = [executor.submit(uploader.process_chunk, start)
+                           for start in uploader.get_chunk_offsets()]
+                try:
+                    range_ids = [future.result() for future in futures]
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        else:
+            range_ids = [uploader.process_chunk(
+                start) for start in uploader.get_chunk_offsets()]
+    finally:
+        uploader.close()
+
+    return range_ids
+
+
+class _MemoryMappedFileChunkUploader(_FileChunkUploader):
+    '''
+    Uploads ranges out of a read-only memory map of the source file. Every worker
+    slices its own range, so no stream lock is needed, and ranges already recorded
+    in the checkpoint with a matching MD5 are skipped.
+    '''
+
+    def __init__(self, file_service, share_name, directory_name, file_name,
+                 file_size, chunk_size, source, progress_callback,
+                 validate_content, timeout, checkpoint):
+        super(_MemoryMappedFileChunkUploader, self).__init__(
+            file_service, share_name, directory_name, file_name, file_size,
+            chunk_size, source, True, progress_callback, validate_content, timeout)
+        self.view = memoryview(source)
+        self.checkpoint = checkpoint
+
+    def process_chunk(self, chunk_offset):
+        chunk_end = min(chunk_offset + self.chunk_size, self.file_size) - 1
+        range_id = 'bytes={0}-{1}'.format(chunk_offset, chunk_end)
+
+        with self.view[chunk_offset:chunk_end + 1] as chunk_view:
+            chunk_md5 = base64.b64encode(hashlib.md5(chunk_view).digest()).decode('utf-8')
+            if not self.checkpoint.is_completed(chunk_offset, chunk_md5):
+                # the storage http pipeline only accepts bytes, so this is the single copy per range
+                self.file_service.update_range(
+                    self.share_name,
+                    self.directory_name,
+                    self.file_name,
+                    chunk_view.tobytes(),
+                    chunk_offset,
+                    chunk_end,
+                    self.validate_content,
+                    timeout=self.timeout
+                )
+                self.checkpoint.mark_completed(chunk_offset, chunk_md5)
+
+        self._update_progress(chunk_end - chunk_offset + 1)
+        return range_id
+
+    def close(self):
+        self.view.release()
+        self.stream.close()
+
+
+class _UploadCheckpoint(object):
+    '''
+    Small JSON record of the ranges that were uploaded from a local file to a
+    target file, so that an interrupted upload can be resumed.
+    '''
+
+    def __init__(self, checkpoint_path, local_file_path, file_size, chunk_size, target):
+        self.checkpoint_path = checkpoint_path
+        self.source = {
+            'path': os.path.abspath(local_file_path),
+            'size': file_size,
+            'mtime': os.path.getmtime(local_file_path),
+            'chunk_size': chunk_size,
+        }
+        self.target = target
+        self.completed = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        '''
+        Loads the completed ranges if the checkpoint on disk belongs to the same source and
+        target. Returns True when a matching checkpoint was found.
+        '''
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                content = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+
+        if content.get('source') != self.source or content.get('target') != self.target:
+            return False
+
+        self.completed = {int(offset): md5 for offset, md5 in content.get('completed', {}).items()}
+        return True
+
+    def discard_missing(self, valid_ranges):
+        '''
+        Forgets the completed ranges which are not fully covered by the valid ranges of the
+        target file, e.g. because the file was truncated or recreated since the checkpoint
+        was written.
+        '''
+        chunk_size = self.source['chunk_size']
+        file_size = self.source['size']
+
+        def _covered(offset):
+            end = min(offset + chunk_size, file_size) - 1
+            return any(r.start <= offset and end <= r.end for r in valid_ranges)
+
+        with self.lock:
+            self.completed = {offset: md5 for offset, md5 in self.completed.items() if _covered(offset)}
+
+    def is_completed(self, offset, md5):
+        return self.completed.get(offset) == md5
+
+    def mark_completed(self, offset, md5):
+        with self.lock:
+            self.completed[offset] = md5
+            self._save()
+
+    def reset(self):
+        with self.lock:
+            self.completed = {}
+            self._save()
+
+    def delete(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except OSError:
+            pass
+
+    def _save(self):
+        content = {
+            'source': self.source,
+            'target': self.target,
+            'completed': {str(offset): md5 for offset, md5 in self.completed.items()},
+        }
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(content, f)
+        # replace the previous checkpoint in a single step, so it is never left half written
+        os.replace(temp_path, self.checkpoint_path)
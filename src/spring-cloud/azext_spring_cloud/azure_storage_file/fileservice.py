@@ -83,7 +83,12 @@ from ._serialization import (
     _get_path,
     _validate_and_format_range_headers,
     _validate_and_return_file_permission)
-from ._upload_chunking import _upload_file_chunks
+from ._upload_chunking import (
+    _upload_file_chunks,
+    _upload_file_chunks_of_unknown_size,
+    _upload_file_chunks_resumable,
+    _UploadCheckpoint,
+)
 from .models import (
     FileProperties,
     SMBProperties)
@@ -1894,11 +1899,18 @@ class FileService(StorageClient):
     def create_file_from_path(self, share_name, directory_name, file_name,
                               local_file_path, content_settings=None,
                               metadata=None, validate_content=False, progress_callback=None,
-                              max_connections=2, file_permission=None, smb_properties=SMBProperties(), timeout=None):
+                              max_connections=2, file_permission=None, smb_properties=SMBProperties(), timeout=None,
+                              checkpoint_path=None):
         '''
         Creates a new azure file from a local file path, or updates the content of an
         existing file, with automatic chunking and progress notifications.
 
+        If checkpoint_path is given, the local file is memory mapped and uploaded
+        range by range, and the completed ranges are recorded in the checkpoint.
+        When a matching checkpoint is found on a later call, the existing file is
+        kept and only the ranges that are missing or changed are uploaded. The
+        checkpoint is removed once the upload has finished.
+
         :param str share_name:
             Name of existing share.
         :param str directory_name:
@@ -1934,18 +1946,77 @@ class FileService(StorageClient):
             The timeout parameter is expressed in seconds. This method may make
             multiple calls to the Azure service and the timeout will apply to
             each call individually.
+        :param str checkpoint_path:
+            Path of the local file used to record the uploaded ranges, which makes
+            the upload resumable.
         '''
         _validate_not_none('share_name', share_name)
         _validate_not_none('file_name', file_name)
         _validate_not_none('local_file_path', local_file_path)
 
         count = path.getsize(local_file_path)
+        if checkpoint_path is not None and count > 0:
+            self._create_file_from_path_resumable(
+                share_name, directory_name, file_name, local_file_path, count,
+                content_settings, metadata, validate_content, progress_callback,
+                max_connections, file_permission, smb_properties, timeout, checkpoint_path)
+            return
+
         with open(local_file_path, 'rb') as stream:
             self.create_file_from_stream(
                 share_name, directory_name, file_name, stream,
                 count, content_settings, metadata, validate_content, progress_callback,
                 max_connections, file_permission=file_permission, smb_properties=smb_properties, timeout=timeout)
 
+    def _create_file_from_path_resumable(self, share_name, directory_name, file_name,
+                                         local_file_path, count, content_settings, metadata,
+                                         validate_content, progress_callback, max_connections,
+                                         file_permission, smb_properties, timeout, checkpoint_path):
+        checkpoint = _UploadCheckpoint(
+            checkpoint_path, local_file_path, count, self.MAX_RANGE_SIZE,
+            {'share': share_name, 'directory': directory_name, 'file': file_name})
+
+        resumed = False
+        if checkpoint.load():
+            try:
+                existing = self.get_file_properties(share_name, directory_name, file_name, timeout=timeout)
+                if existing.properties.content_length == count:
+                    checkpoint.discard_missing(
+                        self.list_ranges(share_name, directory_name, file_name, timeout=timeout))
+                    resumed = True
+            except AzureHttpError as ex:
+                _dont_fail_not_exist(ex)
+
+        if not resumed:
+            self.create_file(
+                share_name,
+                directory_name,
+                file_name,
+                count,
+                content_settings,
+                metadata,
+                file_permission=file_permission,
+                smb_properties=smb_properties,
+                timeout=timeout
+            )
+            checkpoint.reset()
+
+        _upload_file_chunks_resumable(
+            self,
+            share_name,
+            directory_name,
+            file_name,
+            local_file_path,
+            count,
+            self.MAX_RANGE_SIZE,
+            max_connections,
+            progress_callback,
+            validate_content,
+            timeout,
+            checkpoint
+        )
+        checkpoint.delete()
+
     def create_file_from_text(self, share_name, directory_name, file_name,
                               text, encoding='utf-8', content_settings=None,
                               metadata=None, validate_content=False, timeout=None, file_permission=None,
@@ -2152,6 +2223,91 @@ class FileService(StorageClient):
             timeout
         )
 
+    def create_file_from_stream_with_max_size(
+            self, share_name, directory_name, file_name, stream, max_count,
+            content_settings=None, metadata=None, validate_content=False,
+            progress_callback=None, max_connections=2, timeout=None,
+            file_permission=None, smb_properties=SMBProperties()):
+        '''
+        Creates a new file from a stream whose length is not known in advance, e.g.
+        an archive that is still being written by another thread. The file is created
+        with max_count bytes, the stream is read sequentially until it is exhausted,
+        and the file is resized to the number of bytes read at the end.
+
+        :param str share_name:
+            Name of existing share.
+        :param str directory_name:
+            The path to the directory.
+        :param str file_name:
+            Name of file to create or update.
+        :param io.IOBase stream:
+            Opened file/stream to upload as the file content. It doesn't need to be seekable.
+        :param int max_count:
+            Upper bound of the number of bytes that will be read from the stream.
+        :param ~azure.storage.file.models.ContentSettings content_settings:
+            ContentSettings object used to set file properties.
+        :param metadata:
+            Name-value pairs associated with the file as metadata.
+        :type metadata: dict(str, str)
+        :param bool validate_content:
+            If true, calculates an MD5 hash for each range of the file. The storage
+            service checks the hash of the content that has arrived with the hash
+            that was sent.
+        :param progress_callback:
+            Callback for progress with signature function(current, total) where
+            current is the number of bytes transfered so far and total is None.
+        :type progress_callback: func(current, total)
+        :param int max_connections:
+            Maximum number of parallel connections to use.
+        :param str file_permission:
+            File permission, a portable SDDL
+        :param ~azure.storage.file.models.SMBProperties smb_properties:
+            Sets the SMB related file properties
+        :param int timeout:
+            The timeout parameter is expressed in seconds. This method may make
+            multiple calls to the Azure service and the timeout will apply to
+            each call individually.
+        :return: The number of bytes uploaded.
+        :rtype: int
+        '''
+        _validate_not_none('share_name', share_name)
+        _validate_not_none('file_name', file_name)
+        _validate_not_none('stream', stream)
+        _validate_not_none('max_count', max_count)
+
+        if max_count < 0:
+            raise TypeError(_ERROR_VALUE_NEGATIVE.format('max_count'))
+
+        self.create_file(
+            share_name,
+            directory_name,
+            file_name,
+            max_count,
+            content_settings,
+            metadata,
+            file_permission=file_permission,
+            smb_properties=smb_properties,
+            timeout=timeout
+        )
+
+        count = _upload_file_chunks_of_unknown_size(
+            self,
+            share_name,
+            directory_name,
+            file_name,
+            self.MAX_RANGE_SIZE,
+            stream,
+            max_connections,
+            progress_callback,
+            validate_content,
+            timeout
+        )
+        if count > max_count:
+            raise ValueError('The stream is longer than max_count.')
+
+        self.resize_file(share_name, directory_name, file_name, count, timeout=timeout)
+        return count
+
     def _get_file(self, share_name, directory_name, file_name,
                   start_range=None, end_range=None, validate_content=False,
                   timeout=None, _context=None, snapshot=None):
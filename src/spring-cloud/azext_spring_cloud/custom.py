@@ -7,22 +7,27 @@
 
 import yaml   # pylint: disable=import-error
 from time import sleep
-from ._stream_utils import stream_logs
+from ._stream_utils import stream_logs, stream_instance_logs, LogLineFilter, is_utf8
 from msrestazure.azure_exceptions import CloudError
 from msrestazure.tools import parse_resource_id
-from ._utils import _get_upload_local_file
+from ._utils import _get_upload_local_file, _upload_source_code
+from ._artifact_index import ArtifactIndex, get_file_hash, get_service_id
 from knack.util import CLIError
 from .vendored_sdks.appplatform import models
 from knack.log import get_logger
 from .azure_storage_file import FileService
 from azure.cli.core.util import sdk_no_wait
+from azure.common import AzureHttpError
 from ast import literal_eval
 from azure.cli.core.commands import cached_put
 from ._utils import _get_rg_location
+from ._utils import (_get_upload_session_path, _load_upload_session, _save_upload_session,
+                     _delete_upload_session)
 from six.moves.urllib import parse
 from threading import Thread
 from threading import Timer
 import certifi
+import os
 import urllib3
 import sys
 import urllib3.contrib.pyopenssl
@@ -31,6 +36,7 @@ logger = get_logger(__name__)
 DEFAULT_DEPLOYMENT_NAME = "default"
 DEPLOYMENT_CREATE_OR_UPDATE_SLEEP_INTERVAL = 5
 APP_CREATE_OR_UPDATE_SLEEP_INTERVAL = 2
+UPLOAD_MAX_CONNECTIONS = 8
 
 # pylint: disable=line-too-long
 NO_PRODUCTION_DEPLOYMENT_ERROR = "No production deployment found, use --deployment to specify deployment or create deployment with: az spring-cloud app deployment create"
@@ -309,7 +315,8 @@ def app_deploy(cmd, client, resource_group, service, name,
                memory=None,
                instance_count=None,
                env=None,
-               no_wait=False):
+               no_wait=False,
+               skip_unchanged=False):
     logger.warning(LOG_RUNNING_PROMPT)
     if not deployment:
         deployment = client.apps.get(
@@ -337,7 +344,8 @@ def app_deploy(cmd, client, resource_group, service, name,
                        target_module,
                        no_wait,
                        file_type,
-                       True)
+                       True,
+                       skip_unchanged)
 
 
 def app_scale(cmd, client, resource_group, service, name,
@@ -374,7 +382,11 @@ def app_get_build_log(cmd, client, resource_group, service, name, deployment=Non
     return stream_logs(client.deployments, resource_group, service, name, deployment)
 
 
-def app_tail_log(cmd, client, resource_group, service, name, instance=None, follow=False, lines=50, since=None, limit=2048):
+def app_tail_log(cmd, client, resource_group, service, name, instance=None, follow=False, lines=50, since=None, limit=2048,
+                 all_instances=False, log_filter=None, level=None):
+    if instance and all_instances:
+        raise CLIError('usage error: --instance/-i and --all-instances cannot be used together.')
+    instances = None
     if not instance:
         deployment_name = client.apps.get(
             resource_group, service, name).properties.active_deployment_name
@@ -386,14 +398,16 @@ def app_tail_log(cmd, client, resource_group, service, name, instance=None, foll
         if not deployment.properties.instances:
             raise CLIError("No instances found for deployment '{0}' in app '{1}'".format(
                 deployment_name, name))
-        instances = deployment.properties.instances
-        if len(instances) > 1:
+        instances = [temp_instance.name for temp_instance in deployment.properties.instances]
+        if len(instances) > 1 and not all_instances:
             logger.warning("Mulitple app instances found:")
             for temp_instance in instances:
-                logger.warning("{}".format(temp_instance.name))
-            logger.warning("Please use '-i/--instance' parameter to specify the instance name")
+                logger.warning("{}".format(temp_instance))
+            logger.warning("Please use '-i/--instance' parameter to specify the instance name, "
+                           "or '--all-instances' to show the logs of all instances")
             return None
-        instance = instances[0].name
+    else:
+        instances = [instance]
 
     primary_key = client.services.list_test_keys(
         resource_group, service).primary_key
@@ -401,8 +415,6 @@ def app_tail_log(cmd, client, resource_group, service, name, instance=None, foll
         raise CLIError("To use the log streaming feature, please enable the test endpoint")
 
     base_url = 'azuremicroservices.io' if cmd.cli_ctx.cloud.name == 'AzureCloud' else 'asc-test.net'
-    streaming_url = "https://{0}.{1}/api/logstream/apps/{2}/instances/{3}".format(
-        service, base_url, name, instance)
     params = {}
     params["tailLines"] = lines
     params["limitBytes"] = limit
@@ -411,10 +423,21 @@ def app_tail_log(cmd, client, resource_group, service, name, instance=None, foll
     if follow:
         params["follow"] = True
 
+    streaming_urls = []
+    for temp_instance in instances:
+        streaming_url = "https://{0}.{1}/api/logstream/apps/{2}/instances/{3}".format(
+            service, base_url, name, temp_instance)
+        streaming_url += "?{}".format(parse.urlencode(params)) if params else ""
+        streaming_urls.append((temp_instance, streaming_url))
+
+    if len(streaming_urls) > 1 or log_filter or level:
+        stream_instance_logs(streaming_urls, "primary", primary_key, LogLineFilter(log_filter, level),
+                             prefix_instance=len(streaming_urls) > 1)
+        return None
+
     exceptions = []
-    streaming_url += "?{}".format(parse.urlencode(params)) if params else ""
     t = Thread(target=_get_app_log, args=(
-        streaming_url, "primary", primary_key, exceptions))
+        streaming_urls[0][1], "primary", primary_key, exceptions))
     t.daemon = True
     t.start()
 
@@ -455,7 +478,8 @@ def deployment_create(cmd, client, resource_group, service, app, name,
                       memory=None,
                       instance_count=None,
                       env=None,
-                      no_wait=False):
+                      no_wait=False,
+                      skip_unchanged=False):
     logger.warning(LOG_RUNNING_PROMPT)
     deployments = _get_all_deployments(client, resource_group, service, app)
     if name in deployments:
@@ -483,7 +507,8 @@ def deployment_create(cmd, client, resource_group, service, app, name,
                        env,
                        target_module,
                        no_wait,
-                       file_type)
+                       file_type,
+                       skip_unchanged=skip_unchanged)
 
 
 def deployment_list(cmd, client, resource_group, service, app):
@@ -957,30 +982,82 @@ def _app_deploy(client, resource_group, service, app, name, version, path, runti
                 target_module=None,
                 no_wait=False,
                 file_type="Jar",
-                update=False):
+                update=False,
+                skip_unchanged=False):
     upload_url = None
     relative_path = None
-    logger.warning("[1/3] Requesting for upload URL")
-    try:
-        response = client.apps.get_resource_upload_url(resource_group,
-                                                       service,
-                                                       app,
-                                                       None,
-                                                       None)
-        upload_url = response.upload_url
-        relative_path = response.relative_path
-    except (AttributeError, CloudError) as e:
-        raise CLIError(
-            "Failed to get a SAS URL to upload context. Error: {}".format(e.message))
+    session_path = None
+    artifact_index = None
+    artifact = None
+    if file_type == "Jar" and skip_unchanged:
+        artifact_index = ArtifactIndex()
+        service_id = get_service_id(client.config.subscription_id, resource_group, service)
+        file_hash = get_file_hash(path)
+        artifact = artifact_index.find(service_id, file_hash)
+        if update and artifact and all(
+                x is None for x in (version, runtime_version, jvm_options, cpu, memory, instance_count, env,
+                                    target_module)):
+            deployment = client.deployments.get(resource_group, service, app, name)
+            source = deployment.properties.source
+            if source and source.type == "Jar" and source.relative_path == artifact['relative_path']:
+                logger.warning("The jar is already deployed to deployment '{}', skip deploying.".format(name))
+                return deployment
+
+    if file_type == "Jar":
+        # a jar upload that was interrupted earlier can be resumed while its SAS URL is still valid
+        session_path = _get_upload_session_path(resource_group, service, app, name, path)
+        upload_url, relative_path = _load_upload_session(session_path)
+
+    if upload_url:
+        logger.warning("[1/3] Resuming the upload of a previous deployment attempt")
+    else:
+        logger.warning("[1/3] Requesting for upload URL")
+        try:
+            response = client.apps.get_resource_upload_url(resource_group,
+                                                           service,
+                                                           app,
+                                                           None,
+                                                           None)
+            upload_url = response.upload_url
+            relative_path = response.relative_path
+        except (AttributeError, CloudError) as e:
+            raise CLIError(
+                "Failed to get a SAS URL to upload context. Error: {}".format(e.message))
 
-    if not upload_url:
-        raise CLIError("Failed to get a SAS URL to upload context.")
+        if not upload_url:
+            raise CLIError("Failed to get a SAS URL to upload context.")
 
     prase_result = parse.urlparse(upload_url)
     storage_name = prase_result.netloc.split('.')[0]
     split_path = prase_result.path.split('/')[1:3]
     share_name = split_path[0]
     sas_token = "?" + prase_result.query
+    file_service = FileService(storage_name, sas_token=sas_token)
+
+    reused_path = None
+    if artifact and artifact['share_name'] == share_name:
+        reused_path = _reuse_uploaded_artifact(file_service, share_name, path, artifact)
+        if reused_path is None:
+            artifact_index.remove(service_id, file_hash)
+
+    # upload file
+    if reused_path:
+        relative_path = reused_path
+        _delete_upload_session(session_path)
+    elif file_type == "Jar":
+        logger.warning("[2/3] Uploading package to blob")
+        _save_upload_session(session_path, upload_url, relative_path)
+        file_service.create_file_from_path(share_name, None, relative_path, path,
+                                           max_connections=UPLOAD_MAX_CONNECTIONS,
+                                           checkpoint_path=session_path + '.ranges')
+        _delete_upload_session(session_path)
+        if artifact_index:
+            artifact_index.record(service_id, file_hash, share_name, relative_path)
+    else:
+        logger.warning("[2/3] Uploading package to blob")
+        _upload_source_code(file_service, share_name, relative_path, path,
+                            max_connections=UPLOAD_MAX_CONNECTIONS)
+
     deployment_settings = models.DeploymentSettings(
         cpu=cpu,
         memory_in_gb=memory,
@@ -997,11 +1074,6 @@ def _app_deploy(client, resource_group, service, app, name, version, path, runti
         deployment_settings=deployment_settings,
         source=user_source_info)
 
-    # upload file
-    logger.warning("[2/3] Uploading package to blob")
-    file_service = FileService(storage_name, sas_token=sas_token)
-    file_service.create_file_from_path(share_name, None, relative_path, path)
-
     if file_type == "Source" and not no_wait:
         def get_log_url():
             try:
@@ -1043,6 +1115,21 @@ def _app_deploy(client, resource_group, service, app, name, version, path, runti
                        resource_group, service, app, name, properties)
 
 
+def _reuse_uploaded_artifact(file_service, share_name, path, artifact):
+    """
+    Returns the relative path of an identical artifact uploaded before, or None if the artifact
+    cannot be reused.
+    """
+    try:
+        uploaded = file_service.get_file_properties(share_name, None, artifact['relative_path'])
+        if uploaded.properties.content_length == os.path.getsize(path):
+            logger.warning("[2/3] Skip uploading, the same package was uploaded before")
+            return artifact['relative_path']
+    except AzureHttpError as e:
+        logger.info("The package uploaded before can't be reused: %s", e)
+    return None
+
+
 def _get_app_log(url, user_name, password, exceptions):
     try:
         urllib3.contrib.pyopenssl.inject_into_urllib3()
@@ -1078,12 +1165,21 @@ def _get_app_log(url, user_name, password, exceptions):
             raise CLIError("Failed to connect to the server with status code '{}' and reason '{}'".format(
                 response.status, response.reason))
         std_encoding = sys.stdout.encoding
-
-        for chunk in stream(response):
-            if chunk:
-                sys.stdout.write(chunk.decode(encoding='utf-8', errors='replace')
-                                 .encode(std_encoding, errors='replace')
-                                 .decode(std_encoding, errors='replace'))
+        std_buffer = getattr(sys.stdout, 'buffer', None)
+
+        if std_buffer is not None and is_utf8(std_encoding):
+            # the log is utf-8 already, so the bytes can be passed through as they are
+            sys.stdout.flush()
+            for chunk in stream(response):
+                if chunk:
+                    std_buffer.write(chunk)
+                    std_buffer.flush()
+        else:
+            for chunk in stream(response):
+                if chunk:
+                    sys.stdout.write(chunk.decode(encoding='utf-8', errors='replace')
+                                     .encode(std_encoding, errors='replace')
+                                     .decode(std_encoding, errors='replace'))
         response.release_conn()
     except CLIError as e:
         exceptions.append(e)
@@ -0,0 +1,150 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+import urllib3
+from six.moves import queue
+from knack.util import CLIError
+from azext_spring_cloud._stream_utils import _LogLineBuffer, _stream_logs, _read_instance_log, LogLineFilter
+
+
+class _Properties(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, content_length=None, content_range=None):
+        self.content_length = content_length
+        self.content_range = content_range
+
+
+class _Blob(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, content=None, metadata=None, properties=None):
+        self.content = content
+        self.metadata = metadata
+        self.properties = properties
+
+
+class _FakeLogBlobService(object):
+    """A log blob which grows by one part each time its properties are read, and then completes."""
+
+    def __init__(self, parts, status='succeeded'):
+        self.parts = list(parts)
+        self.content = b''
+        self.status = status
+        self.ranges = []
+
+    def _metadata(self):
+        return {'__complete_status': self.status} if not self.parts else {}
+
+    def get_blob_properties(self, container_name, blob_name):  # pylint: disable=unused-argument
+        if self.parts:
+            self.content += self.parts.pop(0)
+        return _Blob(metadata=self._metadata(), properties=_Properties(content_length=len(self.content)))
+
+    def get_blob_to_bytes(self, container_name, blob_name, start_range, end_range,
+                          max_connections):  # pylint: disable=unused-argument
+        self.ranges.append((start_range, end_range))
+        content_range = 'bytes {}-{}/{}'.format(start_range, end_range, len(self.content))
+        return _Blob(content=self.content[start_range:end_range + 1], metadata=self._metadata(),
+                     properties=_Properties(content_range=content_range))
+
+
+class TestLogLineBuffer(unittest.TestCase):
+    def test_complete_lines(self):
+        lines = []
+        buffer = _LogLineBuffer(lines.append)
+        buffer.append(b'first\nsec')
+        buffer.append(b'ond\r\nthird')
+        self.assertEqual(['first', 'second'], lines)
+        buffer.flush()
+        self.assertEqual(['first', 'second', 'third'], lines)
+
+    def test_long_line_split_on_character_boundary(self):
+        lines = []
+        buffer = _LogLineBuffer(lines.append, max_size=8)
+        # every character takes 3 bytes, so a split at 8 bytes falls in the middle of the third one
+        buffer.append(u'€€€€€'.encode('utf-8'))
+        buffer.flush()
+        self.assertEqual(u'€€€€€', u''.join(lines))
+        self.assertTrue(all(len(line.encode('utf-8')) <= 8 for line in lines))
+
+    def test_invalid_utf8_is_still_split(self):
+        lines = []
+        buffer = _LogLineBuffer(lines.append, max_size=4)
+        buffer.append(b'\x80' * 10)
+        self.assertEqual(2, len(lines))
+
+
+class TestStreamLogs(unittest.TestCase):
+    def _stream(self, blob_service, byte_size=4, raise_error_on_failure=True):
+        lines = []
+        _stream_logs(True, byte_size, 60, blob_service, 'container', 'blob', raise_error_on_failure,
+                     lambda message, *args: lines.append(message % args if args else message))
+        return lines
+
+    def test_stream_growing_log(self):
+        blob_service = _FakeLogBlobService([b'line 1\nline', b' 2\n', b'line 3 without end'])
+        lines = self._stream(blob_service)
+        self.assertEqual(['line 1', 'line 2', 'line 3 without end', "Log status was: 'succeeded'"], lines)
+
+    def test_range_size_adapts(self):
+        blob_service = _FakeLogBlobService([b'x' * 100 + b'\n'])
+        self._stream(blob_service)
+        sizes = [end - start + 1 for start, end in blob_service.ranges]
+        # full reads double the range size
+        self.assertEqual([4, 8, 16, 32, 64], sizes[:5])
+
+    def test_failed_run(self):
+        with self.assertRaisesRegex(CLIError, 'Run failed'):
+            self._stream(_FakeLogBlobService([b'error\n'], status='Failed'))
+        self.assertEqual(['error', "Log status was: 'failed'"],
+                         self._stream(_FakeLogBlobService([b'error\n'], status='Failed'),
+                                      raise_error_on_failure=False))
+
+
+class TestLogLineFilter(unittest.TestCase):
+    def test_level(self):
+        line_filter = LogLineFilter(level='warn')
+        self.assertFalse(line_filter.accept('a', b'2020-01-01 INFO started'))
+        self.assertTrue(line_filter.accept('a', b'2020-01-01 WARN slow'))
+        self.assertTrue(line_filter.accept('a', b'2020-01-01 WARNING slow'))
+        self.assertTrue(line_filter.accept('a', b'2020-01-01 FATAL down'))
+        # a line without a level is dropped when the instance has no previous line
+        self.assertFalse(line_filter.accept('b', b'no level'))
+
+    def test_stack_trace_follows_previous_line_of_instance(self):
+        line_filter = LogLineFilter(level='ERROR')
+        self.assertTrue(line_filter.accept('a', b'ERROR failed'))
+        self.assertFalse(line_filter.accept('b', b'DEBUG detail'))
+        self.assertTrue(line_filter.accept('a', b'\tat com.example.App.main(App.java:10)'))
+        self.assertFalse(line_filter.accept('b', b'\tat com.example.App.main(App.java:10)'))
+
+    def test_pattern(self):
+        line_filter = LogLineFilter(pattern='user=[0-9]+')
+        self.assertTrue(line_filter.accept('a', b'INFO login user=42'))
+        self.assertFalse(line_filter.accept('a', b'INFO login user=guest'))
+
+        line_filter = LogLineFilter(pattern='login', level='INFO')
+        self.assertFalse(line_filter.accept('a', b'DEBUG login user=42'))
+        self.assertTrue(line_filter.accept('a', b'INFO login user=42'))
+        self.assertFalse(line_filter.accept('a', b'INFO logout user=42'))
+
+
+class _FailingHttp(object):  # pylint: disable=too-few-public-methods
+    def request(self, *_, **__):  # pylint: disable=no-self-use
+        raise urllib3.exceptions.MaxRetryError(None, 'https://instance', 'connection refused')
+
+
+class TestReadInstanceLog(unittest.TestCase):
+    def test_connection_error(self):
+        lines = queue.Queue()
+        exceptions = []
+        _read_instance_log(_FailingHttp(), 'https://instance', {}, 'instance-1', lines, exceptions)
+        self.assertEqual(('instance-1', None), lines.get_nowait())
+        self.assertEqual(1, len(exceptions))
+        self.assertIsInstance(exceptions[0], CLIError)
+        self.assertIn('instance-1', str(exceptions[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
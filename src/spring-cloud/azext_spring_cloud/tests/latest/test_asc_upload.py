@@ -0,0 +1,232 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+
+from azext_spring_cloud._archive_utils import ParallelGzipWriter, StreamPipe
+from azext_spring_cloud._artifact_index import ArtifactIndex, get_file_hash
+from azext_spring_cloud._utils import _pack_source_code, _upload_source_code
+from azext_spring_cloud.azure_storage_file import FileService
+from azext_spring_cloud.azure_storage_file.models import File, FileRange
+
+
+class _InMemoryFileService(FileService):
+    # pylint: disable=super-init-not-called, arguments-differ, unused-argument
+    def __init__(self, fail_after=None):
+        self.ranges = {}
+        self.content_length = None
+        self.created = 0
+        self.uploaded = 0
+        self.fail_after = fail_after
+
+    def create_file(self, share_name, directory_name, file_name, content_length, *args, **kwargs):
+        self.created += 1
+        self.ranges = {}
+        self.content_length = content_length
+
+    def get_file_properties(self, share_name, directory_name, file_name, timeout=None, snapshot=None):
+        file = File(file_name)
+        file.properties.content_length = self.content_length
+        return file
+
+    def resize_file(self, share_name, directory_name, file_name, content_length, timeout=None):
+        self.content_length = content_length
+
+    def list_ranges(self, share_name, directory_name, file_name, *args, **kwargs):
+        return [FileRange(start, start + len(data) - 1) for start, data in self.ranges.items()]
+
+    def update_range(self, share_name, directory_name, file_name, data, start_range, end_range,
+                     validate_content=False, timeout=None):
+        if self.fail_after is not None and self.uploaded >= self.fail_after:
+            raise IOError('connection reset')
+        self.uploaded += 1
+        self.ranges[start_range] = data
+
+    def content(self):
+        return b''.join(self.ranges[start] for start in sorted(self.ranges))
+
+
+class TestResumableUpload(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.temp_dir, 'app.jar')
+        with open(self.source, 'wb') as f:
+            f.write(os.urandom(2 * FileService.MAX_RANGE_SIZE + 17))
+        self.checkpoint = os.path.join(self.temp_dir, 'upload.ranges')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _expected(self):
+        with open(self.source, 'rb') as f:
+            return f.read()
+
+    def test_upload_with_checkpoint(self):
+        file_service = _InMemoryFileService()
+        file_service.create_file_from_path('share', None, 'app.jar', self.source,
+                                           max_connections=4, checkpoint_path=self.checkpoint)
+
+        self.assertEqual(file_service.uploaded, 3)
+        self.assertEqual(file_service.content(), self._expected())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_interrupted_upload(self):
+        file_service = _InMemoryFileService(fail_after=1)
+        with self.assertRaises(IOError):
+            file_service.create_file_from_path('share', None, 'app.jar', self.source,
+                                               max_connections=1, checkpoint_path=self.checkpoint)
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        file_service.fail_after = None
+        file_service.create_file_from_path('share', None, 'app.jar', self.source,
+                                           max_connections=1, checkpoint_path=self.checkpoint)
+
+        self.assertEqual(file_service.created, 1)
+        self.assertEqual(file_service.uploaded, 3)
+        self.assertEqual(file_service.content(), self._expected())
+
+    def test_restart_when_target_changed(self):
+        file_service = _InMemoryFileService(fail_after=1)
+        with self.assertRaises(IOError):
+            file_service.create_file_from_path('share', None, 'app.jar', self.source,
+                                               max_connections=1, checkpoint_path=self.checkpoint)
+
+        file_service.fail_after = None
+        file_service.create_file_from_path('share', None, 'other.jar', self.source,
+                                           max_connections=1, checkpoint_path=self.checkpoint)
+
+        self.assertEqual(file_service.created, 2)
+        self.assertEqual(file_service.uploaded, 4)
+        self.assertEqual(file_service.content(), self._expected())
+
+
+    def test_failed_range_with_parallel_connections(self):
+        file_service = _InMemoryFileService()
+        update_range = file_service.update_range
+        active = []
+
+        def _update_range(share_name, directory_name, file_name, data, start_range, end_range, *args, **kwargs):
+            active.append(start_range)
+            try:
+                if start_range == 0:
+                    raise IOError('connection reset')
+                time.sleep(0.2)
+                update_range(share_name, directory_name, file_name, data, start_range, end_range, *args, **kwargs)
+            finally:
+                active.remove(start_range)
+
+        file_service.update_range = _update_range
+        with self.assertRaisesRegexp(IOError, 'connection reset'):
+            file_service.create_file_from_path('share', None, 'app.jar', self.source,
+                                               max_connections=4, checkpoint_path=self.checkpoint)
+
+        # the other ranges are finished before the source is released
+        self.assertEqual(active, [])
+        self.assertEqual(file_service.uploaded, 2)
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+
+class TestSourceArchive(unittest.TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        for directory in ['src', 'build', '.git']:
+            os.makedirs(os.path.join(self.source, directory))
+        with open(os.path.join(self.source, '.gitignore'), 'w') as f:
+            f.write('build\n*.log\n!keep.log\n')
+        for name in ['src/App.java', 'build/App.class', 'debug.log', 'keep.log', '.git/HEAD', 'README']:
+            with open(os.path.join(self.source, name), 'wb') as f:
+                f.write(os.urandom(5 * 1024 * 1024) if name == 'src/App.java' else b'content')
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+
+    def _assert_archive(self, content):
+        with tarfile.open(fileobj=io.BytesIO(content), mode='r:gz') as tar:
+            self.assertEqual(sorted(tar.getnames()), ['', 'README', 'keep.log', 'src', 'src/App.java'])
+            with open(os.path.join(self.source, 'src/App.java'), 'rb') as f:
+                self.assertEqual(tar.extractfile('src/App.java').read(), f.read())
+
+    def test_parallel_gzip_round_trip(self):
+        data = os.urandom(1000) * 300 + os.urandom(200000)
+        output = io.BytesIO()
+        with ParallelGzipWriter(output, block_size=64 * 1024, max_workers=4) as writer:
+            writer.write(data[:12345])
+            writer.write(data[12345:])
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(output.getvalue())).read(), data)
+        self.assertLess(len(output.getvalue()), len(data))
+
+    def test_pack_source_code(self):
+        output = io.BytesIO()
+        _pack_source_code(self.source, output)
+        self._assert_archive(output.getvalue())
+
+    def test_upload_source_code_while_packing(self):
+        file_service = _InMemoryFileService()
+        _upload_source_code(file_service, 'share', 'source.tar.gz', self.source, max_connections=4)
+        self.assertEqual(file_service.content_length, len(file_service.content()))
+        self._assert_archive(file_service.content())
+
+    def test_upload_source_code_failure(self):
+        thread_errors = []
+        excepthook = threading.excepthook
+        threading.excepthook = thread_errors.append
+        try:
+            with self.assertRaisesRegex(IOError, 'connection reset'):
+                _upload_source_code(_InMemoryFileService(fail_after=1), 'share', 'source.tar.gz', self.source,
+                                    max_connections=4)
+        finally:
+            threading.excepthook = excepthook
+        # the packer stops quietly once the upload is aborted
+        self.assertEqual([], thread_errors)
+
+    def test_stream_pipe_close_after_abort(self):
+        pipe = StreamPipe(capacity=1)
+        pipe.write(b'data')
+        pipe.abort()
+        with self.assertRaises(IOError):
+            pipe.write(b'more')
+        pipe.close(IOError('packing failed'))
+        self.assertIsNone(pipe.error)
+
+
+class TestArtifactIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.index = ArtifactIndex(os.path.join(self.temp_dir, 'artifacts.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_record_and_find(self):
+        artifact = os.path.join(self.temp_dir, 'app.jar')
+        with open(artifact, 'wb') as f:
+            f.write(b'jar content')
+        file_hash = get_file_hash(artifact)
+
+        self.assertIsNone(self.index.find('service', file_hash))
+        self.index.record('service', file_hash, 'share', 'resources/app')
+        self.assertEqual(self.index.find('service', file_hash)['relative_path'], 'resources/app')
+        self.assertEqual(self.index.find_hash('service', 'resources/app'), file_hash)
+        self.assertIsNone(self.index.find('other-service', file_hash))
+
+        self.index.remove('service', file_hash)
+        self.assertIsNone(self.index.find('service', file_hash))
+
+    def test_expired_entry(self):
+        self.index.record('service', 'hash', 'share', 'resources/app', ttl=timedelta(seconds=-1))
+        self.assertIsNone(self.index.find('service', 'hash'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,71 +3,129 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+from collections import OrderedDict
+from itertools import chain, islice
+
 from azure.cli.core.profiles import get_sdk
 from .profiles import CUSTOM_DATA_STORAGE
 
 
-def build_table_output(result, projection):
+# the widths of the columns of a streamed table are taken from its first rows
+TABLE_SAMPLE_SIZE = 1000
 
-    if not isinstance(result, list):
-        result = [result]
 
-    final_list = []
+def _value_from_path(item, path):
+    obj = item
+    try:
+        for part in path:
+            obj = obj.get(part, None)
+    except AttributeError:
+        obj = None
+    return obj or ' '
 
-    from collections import OrderedDict
-    for item in result:
-        def _value_from_path(each_item, path):
-            obj = each_item
-            try:
-                for part in path.split('.'):
-                    obj = obj.get(part, None)
-            except AttributeError:
-                obj = None
-            return obj or ' '
 
-        item_dict = OrderedDict()
-        for element in projection:
-            item_dict[element[0]] = _value_from_path(item, element[1])
-        final_list.append(item_dict)
+class TableProjection(object):
+    """
+    The columns of a table and the dotted paths of their values in the items of a result. The paths are split once,
+    so that the projection can be applied to any number of items, lazily when the result is an iterator.
+    """
+
+    def __init__(self, columns):
+        self.headers = tuple(header for header, _ in columns)
+        self.paths = tuple(tuple(path.split('.')) for _, path in columns)
+
+    def __call__(self, result):
+        return list(self.rows(result))
+
+    def values(self, result):
+        """ Yields the tuple of the column values of each item of the result """
+        if isinstance(result, dict) or not hasattr(result, '__iter__'):
+            result = [result]
+        paths = self.paths
+        for item in result:
+            yield tuple([_value_from_path(item, path) for path in paths])
+
+    def rows(self, result):
+        """ Yields the row of each item of the result, keyed by the column headers """
+        headers = self.headers
+        for values in self.values(result):
+            yield OrderedDict(zip(headers, values))
+
+    def write_tsv(self, result, stream):
+        """ Writes a tab-separated line per item of the result to the stream, as the items are read """
+        for values in self.values(result):
+            stream.write('\t'.join(str(value) for value in values) + '\n')
+
+    def write_table(self, result, stream, sample_size=TABLE_SAMPLE_SIZE):
+        """
+        Writes the result to the stream as a table, as the items are read. The columns are as wide as the widest
+        values of the first sample_size items, wider values of later items are not cut.
+        """
+        values = self.values(result)
+        sample = list(islice(values, sample_size))
+        widths = [len(header) for header in self.headers]
+        for row in sample:
+            widths = [max(width, len(str(value))) for width, value in zip(widths, row)]
+
+        def _write(row):
+            stream.write('  '.join(str(value).ljust(width) for width, value in zip(widths, row)).rstrip() + '\n')
+
+        _write(self.headers)
+        _write(['-' * width for width in widths])
+        for row in chain(sample, values):
+            _write(row)
 
-    return final_list
+
+def build_table_output(result, projection):
+    if not isinstance(projection, TableProjection):
+        projection = TableProjection(projection)
+    return projection(result)
+
+
+_CONTAINER_LIST_PROJECTION = TableProjection([
+    ('Name', 'name'),
+    ('Lease Status', 'properties.leaseStatus'),
+    ('Last Modified', 'properties.lastModified')
+])
+
+_CONTAINER_SHOW_PROJECTION = TableProjection([
+    ('Name', 'name'),
+    ('Lease Status', 'properties.lease.status'),
+    ('Last Modified', 'properties.lastModified')
+])
+
+_BLOB_PROJECTION = TableProjection([
+    ('Name', 'name'),
+    ('IsDirectory', 'metadata.hdi_isfolder'),
+    ('Blob Type', 'properties.blobType'),
+    ('Blob Tier', 'properties.blobTier'),
+    ('Length', 'properties.contentLength'),
+    ('Content Type', 'properties.contentSettings.contentType'),
+    ('Last Modified', 'properties.lastModified'),
+    ('Snapshot', 'snapshot')
+])
+
+_SHARE_LIST_PROJECTION = TableProjection([
+    ('Name', 'name'),
+    ('Quota', 'properties.quota'),
+    ('Last Modified', 'properties.lastModified')
+])
 
 
 def transform_container_list(result):
-    return build_table_output(result, [
-        ('Name', 'name'),
-        ('Lease Status', 'properties.leaseStatus'),
-        ('Last Modified', 'properties.lastModified')
-    ])
+    return _CONTAINER_LIST_PROJECTION(result)
 
 
 def transform_container_show(result):
-    return build_table_output(result, [
-        ('Name', 'name'),
-        ('Lease Status', 'properties.lease.status'),
-        ('Last Modified', 'properties.lastModified')
-    ])
+    return _CONTAINER_SHOW_PROJECTION(result)
 
 
 def transform_blob_output(result):
-    return build_table_output(result, [
-        ('Name', 'name'),
-        ('IsDirectory', 'metadata.hdi_isfolder'),
-        ('Blob Type', 'properties.blobType'),
-        ('Blob Tier', 'properties.blobTier'),
-        ('Length', 'properties.contentLength'),
-        ('Content Type', 'properties.contentSettings.contentType'),
-        ('Last Modified', 'properties.lastModified'),
-        ('Snapshot', 'snapshot')
-    ])
+    return _BLOB_PROJECTION(result)
 
 
 def transform_share_list(result):
-    return build_table_output(result, [
-        ('Name', 'name'),
-        ('Quota', 'properties.quota'),
-        ('Last Modified', 'properties.lastModified')
-    ])
+    return _SHARE_LIST_PROJECTION(result)
 
 
 def transform_file_output(result):
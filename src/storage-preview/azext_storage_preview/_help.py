@@ -31,6 +31,23 @@ helps['storage account update'] = """
     short-summary: Update the properties of a storage account.
 """
 
+helps['storage account network-rule sync'] = """
+    type: command
+    short-summary: Make the IP and virtual network rules of a storage account the given ones in a single update.
+    long-summary: >
+        The rules which are missing are added and the rules which are not given are removed. The rules which are
+        already there are kept as they are. The update is retried if the storage account is changed meanwhile.
+    examples:
+        - name: Allow only the given IP ranges and subnet.
+          text: az storage account network-rule sync -g MyResourceGroup --account-name MyStorageAccount --ip-addresses 23.45.1.0/24 23.45.2.0/24 --subnets /subscriptions/{SubID}/resourceGroups/MyResourceGroup/providers/Microsoft.Network/virtualNetworks/MyVnet/subnets/MySubnet
+        - name: Sync the network rules with the rules saved from another storage account.
+          text: |
+            az storage account network-rule list -g MyResourceGroup --account-name MyOtherStorageAccount > rules.json
+            az storage account network-rule sync -g MyResourceGroup --account-name MyStorageAccount --rules rules.json
+        - name: Remove all the network rules.
+          text: az storage account network-rule sync -g MyResourceGroup --account-name MyStorageAccount --rules "{}"
+"""
+
 helps['storage blob service-properties'] = """
     type: group
     short-summary: Manage storage blob service properties.
@@ -79,6 +96,10 @@ helps['storage azcopy blob upload'] = """
           text: az storage azcopy blob upload -c MyContainer --account-name MyStorageAccount -s "path/to/directory" --recursive
         - name: Upload the contents of a directory to a container.
           text: az storage azcopy blob upload -c MyContainer --account-name MyStorageAccount -s "path/to/directory/*" --recursive
+        - name: Upload a directory to a container in process, without the AzCopy binary.
+          text: az storage azcopy blob upload -c MyContainer --account-name MyStorageAccount -s "path/to/directory" --recursive --engine native
+        - name: Resume an upload job of the native engine, uploading only the files which were not uploaded yet.
+          text: az storage azcopy blob upload -c MyContainer --account-name MyStorageAccount -s "path/to/directory" --recursive --engine native --job-id MyJobId
 """
 
 helps['storage azcopy blob download'] = """
@@ -91,6 +112,8 @@ helps['storage azcopy blob download'] = """
           text: az storage azcopy blob download -c MyContainer --account-name MyStorageAccount -s "path/to/virtual_directory" -d "download/path" --recursive
         - name: Download the contents of a container onto a local file system.
           text: az storage azcopy blob download -c MyContainer --account-name MyStorageAccount -s * -d "download/path" --recursive
+        - name: Download a virtual directory in process, without the AzCopy binary.
+          text: az storage azcopy blob download -c MyContainer --account-name MyStorageAccount -s "path/to/virtual_directory" -d "download/path" --recursive --engine native
 """
 
 helps['storage azcopy blob delete'] = """
@@ -113,6 +136,8 @@ helps['storage azcopy blob sync'] = """
           text: az storage azcopy blob sync -c MyContainer --account-name MyStorageAccount -s "path/to/file" -d NewBlob
         - name: Sync a directory to a container.
           text: az storage azcopy blob sync -c MyContainer --account-name MyStorageAccount -s "path/to/directory"
+        - name: Sync a directory to a container in process, without the AzCopy binary.
+          text: az storage azcopy blob sync -c MyContainer --account-name MyStorageAccount -s "path/to/directory" --engine native
 """
 
 helps['storage azcopy run-command'] = """
@@ -51,6 +51,14 @@ def load_arguments(self, _):  # pylint: disable=too-many-locals, too-many-statem
                                     '"[default:]user|group|other|mask:[entity id or UPN]:r|-w|-x|-,'
                                     '[default:]user|group|other|mask:[entity id or UPN]:r|-w|-x|-,...". '
                                     'e.g."user::rwx,user:john.doe@contoso:rwx,group::r--,other::---,mask::rwx".')
+    transfer_engine_type = CLIArgumentType(
+        arg_type=get_enum_type(['azcopy', 'native']), arg_group='Transfer',
+        help='The transfer engine. "native" transfers in process, without the azcopy binary. '
+             'Default: azcopy if the azcopy binary is available, otherwise native.')
+    transfer_job_id_type = CLIArgumentType(
+        arg_group='Transfer',
+        help='The id of the native engine job. Run the command again with the id of a job to resume it '
+             'and skip the files which have already been transferred.')
 
     with self.argument_context('storage') as c:
         c.argument('container_name', container_name_type)
@@ -146,6 +154,14 @@ def load_arguments(self, _):  # pylint: disable=too-many-locals, too-many-statem
         c.argument('vnet_name', help='Name of a virtual network.', validator=validate_subnet)
         c.argument('action', help='The action of virtual network rule.')
 
+    with self.argument_context('storage account network-rule sync') as c:
+        c.argument('rules', type=file_type, completer=FilesCompleter(),
+                   help='The IP and virtual network rules the account should have, in the JSON format of '
+                        '`az storage account network-rule list`. Either a file path or a JSON string.')
+        c.argument('ip_addresses', nargs='+', help='Space-separated IPv4 addresses or CIDR ranges.')
+        c.argument('subnets', nargs='+', help='Space-separated IDs of subnets.')
+        c.argument('action', help='The action of the rules which are added.')
+
     with self.argument_context('storage account management-policy create') as c:
         c.argument('policy', type=file_type, completer=FilesCompleter(),
                    help='The Storage Account ManagementPolicies Rules, in JSON format. See more details in: '
@@ -168,6 +184,10 @@ def load_arguments(self, _):  # pylint: disable=too-many-locals, too-many-statem
                    help='Represents the path to the error document that should be shown when an error 404 is issued,'
                         ' in other words, when a browser requests a page that does not exist.')
 
+    with self.argument_context('storage azcopy blob') as c:
+        c.argument('engine', transfer_engine_type)
+        c.argument('job_id', transfer_job_id_type)
+
     with self.argument_context('storage azcopy blob upload') as c:
         c.extra('destination_container', options_list=['--container', '-c'], required=True,
                 help='The upload destination container.')
@@ -277,6 +297,10 @@ def load_arguments(self, _):  # pylint: disable=too-many-locals, too-many-statem
                         'is supported here.')
         c.argument('directory_path', directory_path_type, validator=validate_directory_name)
 
+    with self.argument_context('storage blob directory') as c:
+        c.argument('engine', transfer_engine_type)
+        c.argument('job_id', transfer_job_id_type)
+
     with self.argument_context('storage blob directory download') as c:
         c.extra('source_container', options_list=['--container', '-c'], required=True,
                 help='The download source container.')
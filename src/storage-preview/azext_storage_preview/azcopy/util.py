@@ -34,6 +34,13 @@ class AzCopy(object):
         self.executable = os.path.join(curr_path, *AzCopy.system_executable_path[self.system])
         self.creds = creds
 
+    @classmethod
+    def is_installed(cls):
+        try:
+            return os.path.isfile(cls().executable)
+        except KeyError:  # no azcopy binary for the system
+            return False
+
     def run_command(self, args):
         args = [self.executable] + args
         args = ' '.join(args)
@@ -59,6 +59,7 @@ The secondary cluster will become the primary cluster after failover. Please und
         g.custom_command('add', 'add_network_rule')
         g.custom_command('list', 'list_network_rules')
         g.custom_command('remove', 'remove_network_rule')
+        g.custom_command('sync', 'sync_network_rules')
 
     storage_account_sdk_preview = CliCommandType(
         operations_tmpl='azext_storage_preview.vendored_sdks.azure_mgmt_preview_storage.operations.'
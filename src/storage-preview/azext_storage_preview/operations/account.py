@@ -7,8 +7,15 @@
 
 import os
 from azure.cli.core.util import get_file_json, shell_safe_json_parse
+from knack.log import get_logger
+from knack.util import CLIError
 from .._client_factory import storage_client_factory
 
+logger = get_logger(__name__)
+
+# the network rules are read and updated again when the account is changed by someone else in between
+NETWORK_RULE_UPDATE_RETRIES = 5
+
 
 # pylint: disable=too-many-locals
 def create_storage_account(cmd, resource_group_name, account_name, sku=None, location=None, kind=None,
@@ -146,6 +153,10 @@ def update_storage_account(cmd, instance, sku=None, tags=None, custom_domain=Non
 
 def list_network_rules(client, resource_group_name, account_name):
     sa = client.get_properties(resource_group_name, account_name)
+    return _list_rules(sa)
+
+
+def _list_rules(sa):
     rules = sa.network_rule_set
     delattr(rules, 'bypass')
     delattr(rules, 'default_action')
@@ -154,41 +165,140 @@ def list_network_rules(client, resource_group_name, account_name):
 
 def add_network_rule(cmd, client, resource_group_name, account_name, action='Allow', subnet=None,
                      vnet_name=None, ip_address=None):  # pylint: disable=unused-argument
-    sa = client.get_properties(resource_group_name, account_name)
-    rules = sa.network_rule_set
     if subnet:
         from msrestazure.tools import is_valid_resource_id
         if not is_valid_resource_id(subnet):
-            from knack.util import CLIError
             raise CLIError("Expected fully qualified resource ID: got '{}'".format(subnet))
-        VirtualNetworkRule = cmd.get_models('VirtualNetworkRule')
-        if not rules.virtual_network_rules:
-            rules.virtual_network_rules = []
-        rules.virtual_network_rules.append(VirtualNetworkRule(virtual_network_resource_id=subnet, action=action))
-    if ip_address:
-        IpRule = cmd.get_models('IPRule')
-        if not rules.ip_rules:
-            rules.ip_rules = []
-        rules.ip_rules.append(IpRule(ip_address_or_range=ip_address, action=action))
+    VirtualNetworkRule, IpRule = cmd.get_models('VirtualNetworkRule', 'IPRule')
 
-    StorageAccountUpdateParameters = cmd.get_models('StorageAccountUpdateParameters')
-    params = StorageAccountUpdateParameters(network_rule_set=rules)
-    return client.update(resource_group_name, account_name, params)
+    def _add(rules):
+        if subnet:
+            if not rules.virtual_network_rules:
+                rules.virtual_network_rules = []
+            rules.virtual_network_rules.append(VirtualNetworkRule(virtual_network_resource_id=subnet, action=action))
+        if ip_address:
+            if not rules.ip_rules:
+                rules.ip_rules = []
+            rules.ip_rules.append(IpRule(ip_address_or_range=ip_address, action=action))
+        return bool(subnet or ip_address)
+
+    return _update_network_rules(cmd, client, resource_group_name, account_name, _add)
 
 
 def remove_network_rule(cmd, client, resource_group_name, account_name, ip_address=None, subnet=None,
                         vnet_name=None):  # pylint: disable=unused-argument
-    sa = client.get_properties(resource_group_name, account_name)
-    rules = sa.network_rule_set
-    if subnet:
-        rules.virtual_network_rules = [x for x in rules.virtual_network_rules
-                                       if not x.virtual_network_resource_id.endswith(subnet)]
-    if ip_address:
-        rules.ip_rules = [x for x in rules.ip_rules if x.ip_address_or_range != ip_address]
+    def _remove(rules):
+        if subnet:
+            rules.virtual_network_rules = [x for x in rules.virtual_network_rules
+                                           if not x.virtual_network_resource_id.endswith(subnet)]
+        if ip_address:
+            rules.ip_rules = [x for x in rules.ip_rules if x.ip_address_or_range != ip_address]
+        return bool(subnet or ip_address)
+
+    return _update_network_rules(cmd, client, resource_group_name, account_name, _remove)
+
+
+def sync_network_rules(cmd, client, resource_group_name, account_name, rules=None, ip_addresses=None,
+                       subnets=None, action='Allow'):
+    """
+    Makes the IP and virtual network rules of the account the given ones. The rules which are already there are
+    kept as they are, and all the rules added and removed are written in a single update.
+    """
+    from msrestazure.tools import is_valid_resource_id
+    if rules is None and not ip_addresses and not subnets:
+        # syncing to no rules at all removes every rule, which has to be asked for explicitly
+        raise CLIError('usage error: --rules | --ip-addresses | --subnets. To remove all the network rules, use '
+                       '--rules "{}".')
+    desired_ips = list(ip_addresses or [])
+    desired_subnets = list(subnets or [])
+    if rules:
+        ip_rules, vnet_rules = _parse_network_rules(rules)
+        desired_ips.extend(ip_rules)
+        desired_subnets.extend(vnet_rules)
+    for subnet in desired_subnets:
+        if not is_valid_resource_id(subnet):
+            raise CLIError("Expected fully qualified resource ID: got '{}'".format(subnet))
+    VirtualNetworkRule, IpRule = cmd.get_models('VirtualNetworkRule', 'IPRule')
+
+    def _sync(current):
+        # IP addresses are compared as they are written, resource IDs are case insensitive
+        ips = _dedupe(desired_ips, lambda ip: ip)
+        vnets = _dedupe(desired_subnets, lambda subnet: subnet.lower())
+        kept_ips = [rule for rule in current.ip_rules or [] if ips.pop(rule.ip_address_or_range, None)]
+        kept_vnets = [rule for rule in current.virtual_network_rules or []
+                      if vnets.pop(rule.virtual_network_resource_id.lower(), None)]
+        removed = len(current.ip_rules or []) - len(kept_ips) + \
+            len(current.virtual_network_rules or []) - len(kept_vnets)
+        logger.info('Adding %d and removing %d network rules.', len(ips) + len(vnets), removed)
+        current.ip_rules = kept_ips + [IpRule(ip_address_or_range=ip, action=action) for ip in ips.values()]
+        current.virtual_network_rules = kept_vnets + [
+            VirtualNetworkRule(virtual_network_resource_id=subnet, action=action) for subnet in vnets.values()]
+        return bool(ips or vnets or removed)
+
+    sa = _update_network_rules(cmd, client, resource_group_name, account_name, _sync)
+    return _list_rules(sa)
+
+
+def _dedupe(values, key):
+    """ Returns an ordered dict of the values by their key, the first value of each key is kept """
+    from collections import OrderedDict
+    result = OrderedDict()
+    for value in values:
+        result.setdefault(key(value), value)
+    return result
+
+
+def _parse_network_rules(rules):
+    """
+    Returns the IP addresses and subnet IDs of rules in the format of 'az storage account network-rule list', read
+    from a file or a JSON string. The entries may also be plain strings.
+    """
+    if os.path.exists(rules):
+        rules = get_file_json(rules)
+    else:
+        rules = shell_safe_json_parse(rules)
+    if not isinstance(rules, dict):
+        raise CLIError('usage error: --rules must be an object with "ipRules" and "virtualNetworkRules" lists.')
+
+    def _values(key, value_key):
+        values = []
+        for entry in rules.get(key) or []:
+            value = entry.get(value_key) if isinstance(entry, dict) else entry
+            if not value:
+                raise CLIError('usage error: each entry of "{}" must have a "{}".'.format(key, value_key))
+            values.append(value)
+        return values
+
+    return _values('ipRules', 'ipAddressOrRange'), _values('virtualNetworkRules', 'virtualNetworkResourceId')
+
 
+def _update_network_rules(cmd, client, resource_group_name, account_name, update_rules):
+    """
+    Reads the network rule set of the account, changes it with update_rules and writes it back in one update. The
+    update is conditional on the ETag of the account when the service returns one, and is retried on the new rule set
+    when the account was changed in between. update_rules returns False when the rule set is left unchanged.
+    """
+    from msrestazure.azure_exceptions import CloudError
     StorageAccountUpdateParameters = cmd.get_models('StorageAccountUpdateParameters')
-    params = StorageAccountUpdateParameters(network_rule_set=rules)
-    return client.update(resource_group_name, account_name, params)
+    for _ in range(NETWORK_RULE_UPDATE_RETRIES):
+        response = client.get_properties(resource_group_name, account_name, raw=True)
+        sa = response.output
+        if not update_rules(sa.network_rule_set):
+            return sa
+        etag = response.response.headers.get('ETag')
+        if not etag:
+            logger.debug('The storage account has no ETag, updating its network rules unconditionally.')
+        params = StorageAccountUpdateParameters(network_rule_set=sa.network_rule_set)
+        try:
+            return client.update(resource_group_name, account_name, params,
+                                 custom_headers={'If-Match': etag} if etag else None)
+        except CloudError as ex:
+            if ex.status_code != 412:
+                raise
+            logger.warning('The storage account %s was changed while updating its network rules, retrying...',
+                           account_name)
+    raise CLIError('Failed to update the network rules of {}, the storage account kept changing.'.format(
+        account_name))
 
 
 def create_management_policies(client, resource_group_name, account_name, policy=None):
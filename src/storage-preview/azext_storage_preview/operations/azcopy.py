@@ -4,9 +4,15 @@
 # --------------------------------------------------------------------------------------------
 
 from __future__ import print_function
-# from knack.util import CLIError
+from knack.log import get_logger
+from knack.util import CLIError
 from ..azcopy.util import AzCopy, blob_client_auth_for_azcopy, login_auth_for_azcopy
 
+logger = get_logger(__name__)
+
+NATIVE_ENGINE = 'native'
+AZCOPY_ENGINE = 'azcopy'
+
 
 def storage_blob_copy(azcopy, source, destination, recursive=None):
     flags = []
@@ -15,14 +21,26 @@ def storage_blob_copy(azcopy, source, destination, recursive=None):
     azcopy.copy(source, destination, flags=flags)
 
 
-def storage_blob_upload(cmd, client, source, destination, recursive=None):
+def storage_blob_upload(cmd, client, source, destination, recursive=None, engine=None, job_id=None):
+    if _use_native_engine(engine, job_id):
+        from ..transfer import plan_upload
+        container, blob_path = _parse_blob_url(cmd, destination)
+        return _native_transfer(cmd, client, 'upload', source, destination, job_id,
+                                plan_upload(source, container, blob_path, recursive=recursive))
     azcopy = _azcopy_blob_client(cmd, client)
     storage_blob_copy(azcopy, source, _add_url_sas(destination, azcopy.creds.sas_token), recursive=recursive)
+    return None
 
 
-def storage_blob_download(cmd, client, source, destination, recursive=None):
+def storage_blob_download(cmd, client, source, destination, recursive=None, engine=None, job_id=None):
+    if _use_native_engine(engine, job_id):
+        from ..transfer import plan_download
+        container, blob_path = _parse_blob_url(cmd, source)
+        return _native_transfer(cmd, client, 'download', source, destination, job_id,
+                                plan_download(client, container, blob_path, destination, recursive=recursive))
     azcopy = _azcopy_blob_client(cmd, client)
     storage_blob_copy(azcopy, _add_url_sas(source, azcopy.creds.sas_token), destination, recursive=recursive)
+    return None
 
 
 # def storage_blob_upload_batch(cmd, client, source, destination):
@@ -43,9 +61,15 @@ def storage_blob_remove(cmd, client, target, recursive=None):
     azcopy.remove(_add_url_sas(target, azcopy.creds.sas_token), flags=flags)
 
 
-def storage_blob_sync(cmd, client, source, destination):
+def storage_blob_sync(cmd, client, source, destination, engine=None, job_id=None):
+    if _use_native_engine(engine, job_id):
+        from ..transfer import plan_sync
+        container, blob_path = _parse_blob_url(cmd, destination)
+        return _native_transfer(cmd, client, 'sync', source, destination, job_id,
+                                plan_sync(client, source, container, blob_path))
     azcopy = _azcopy_blob_client(cmd, client)
     azcopy.sync(source, _add_url_sas(destination, azcopy.creds.sas_token), flags=['--delete-destination true'])
+    return None
 
 
 def storage_run_command(cmd, command_args):
@@ -55,6 +79,53 @@ def storage_run_command(cmd, command_args):
     azcopy.run_command([command_args])
 
 
+def _use_native_engine(engine, job_id):
+    if engine is None:
+        # hosts without the azcopy binary use the native engine
+        engine = AZCOPY_ENGINE if AzCopy.is_installed() else NATIVE_ENGINE
+    if engine != NATIVE_ENGINE and job_id:
+        raise CLIError('usage error: --job-id is only supported by the native engine.')
+    return engine == NATIVE_ENGINE
+
+
+def _parse_blob_url(cmd, url):
+    from ..storage_url_helpers import StorageResourceIdentifier
+    identifier = StorageResourceIdentifier(cmd.cli_ctx.cloud, url)
+    return identifier.container, identifier.blob or ''
+
+
+# pylint: disable=too-many-arguments
+def _native_transfer(cmd, client, operation, source, destination, job_id, transfers):
+    import os
+    import uuid
+    from ..transfer import TransferEngine, TransferJournal, JOURNAL_DIR_NAME
+
+    # plan the transfers before the job is recorded, so a usage error leaves no journal behind
+    transfers = list(transfers)
+    journal = TransferJournal(os.path.join(cmd.cli_ctx.config.config_dir, JOURNAL_DIR_NAME),
+                              job_id or str(uuid.uuid4()),
+                              {'operation': operation, 'source': source, 'destination': destination})
+    progress = cmd.cli_ctx.get_progress_controller(det=True)
+
+    def _progress_callback(current, total):
+        progress.add(message='Alive', value=current, total_val=total)
+
+    try:
+        engine = TransferEngine(client, cmd.get_models('blob.models#BlobBlock'), progress_callback=_progress_callback)
+        summary = engine.run(transfers, journal)
+    except BaseException:
+        if not journal.file.closed:
+            journal.close()
+        raise
+    finally:
+        progress.end()
+
+    if summary['failed']:
+        logger.warning('%d transfers failed, run the command again with --job-id %s to retry them.',
+                       summary['failed'], summary['jobId'])
+    return summary
+
+
 def _add_url_sas(url, sas):
     if not sas:
         return url
@@ -0,0 +1,77 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+import unittest
+
+from six import StringIO
+from azext_storage_preview._format import TableProjection, build_table_output, transform_blob_output
+
+BLOBS = [
+    {'name': 'a.txt', 'metadata': {}, 'snapshot': None,
+     'properties': {'blobType': 'BlockBlob', 'contentLength': 10, 'contentSettings': {'contentType': 'text/plain'},
+                    'lastModified': '2020-01-01T00:00:00+00:00'}},
+    {'name': 'dir', 'metadata': {'hdi_isfolder': 'true'}, 'properties': {'contentLength': 0}},
+    {'name': 'a-much-longer-name.txt', 'metadata': None, 'properties': None}
+]
+
+
+class TestStorageFormat(unittest.TestCase):
+    def test_build_table_output(self):
+        rows = transform_blob_output(BLOBS)
+        self.assertEqual(['Name', 'IsDirectory', 'Blob Type', 'Blob Tier', 'Length', 'Content Type', 'Last Modified',
+                          'Snapshot'], list(rows[0].keys()))
+        self.assertEqual(['a.txt', ' ', 'BlockBlob', ' ', 10, 'text/plain', '2020-01-01T00:00:00+00:00', ' '],
+                         list(rows[0].values()))
+        # missing and falsy values are shown as blanks
+        self.assertEqual(['dir', 'true', ' ', ' ', ' ', ' ', ' ', ' '], list(rows[1].values()))
+        self.assertEqual(rows[:1], transform_blob_output(BLOBS[0]))
+
+        self.assertEqual([{'Name': 'a.txt', 'Type': 'BlockBlob'}],
+                         build_table_output(BLOBS[0], [('Name', 'name'), ('Type', 'properties.blobType')]))
+
+    def test_projection_is_lazy(self):
+        read = []
+
+        def _generate():
+            for blob in BLOBS:
+                read.append(blob['name'])
+                yield blob
+
+        rows = TableProjection([('Name', 'name')]).rows(_generate())
+        self.assertEqual({'Name': 'a.txt'}, next(rows))
+        self.assertEqual(['a.txt'], read)
+
+    def test_write_tsv_and_table(self):
+        projection = TableProjection([('Name', 'name'), ('Length', 'properties.contentLength')])
+        stream = StringIO()
+        projection.write_tsv(iter(BLOBS), stream)
+        self.assertEqual('a.txt\t10\ndir\t \na-much-longer-name.txt\t \n', stream.getvalue())
+
+        stream = StringIO()
+        projection.write_table(iter(BLOBS), stream, sample_size=2)
+        self.assertEqual(['Name   Length', '-----  ------', 'a.txt  10', 'dir', 'a-much-longer-name.txt'],
+                         stream.getvalue().splitlines())
+
+    def test_writers_stream_the_rows(self):
+        projection = TableProjection([('Name', 'name')])
+        written = []
+
+        def _generate(stream):
+            for blob in BLOBS:
+                written.append(stream.getvalue().splitlines())
+                yield blob
+
+        stream = StringIO()
+        projection.write_tsv(_generate(stream), stream)
+        self.assertEqual([[], ['a.txt'], ['a.txt', 'dir']], written)
+
+        # the table is written once the rows of the sample are read
+        stream = StringIO()
+        del written[:]
+        projection.write_table(_generate(stream), stream, sample_size=1)
+        self.assertEqual([[], ['Name', '-----', 'a.txt'], ['Name', '-----', 'a.txt', 'dir']], written)
+
+
+if __name__ == '__main__':
+    unittest.main()
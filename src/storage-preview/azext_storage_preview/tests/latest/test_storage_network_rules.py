@@ -0,0 +1,159 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from knack.util import CLIError
+from msrestazure.azure_exceptions import CloudError
+
+from azext_storage_preview.operations import account
+from azext_storage_preview.operations.account import sync_network_rules, _dedupe, _parse_network_rules
+
+SUBNET = '/subscriptions/sub/resourceGroups/rg/providers/Microsoft.Network/virtualNetworks/vnet/subnets/{}'
+
+
+class _Model(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class IPRule(_Model):  # pylint: disable=too-few-public-methods
+    pass
+
+
+class VirtualNetworkRule(_Model):  # pylint: disable=too-few-public-methods
+    pass
+
+
+class StorageAccountUpdateParameters(_Model):  # pylint: disable=too-few-public-methods
+    pass
+
+
+class _Cmd(object):  # pylint: disable=too-few-public-methods
+    @staticmethod
+    def get_models(*names):
+        models = [globals()[name] for name in names]
+        return models[0] if len(models) == 1 else models
+
+
+class _FakeStorageClient(object):
+    """ an account whose rules are changed by someone else during the first 'conflicts' updates """
+
+    def __init__(self, ips=(), subnets=(), etag='"1"', conflicts=0):
+        self.ips = list(ips)
+        self.subnets = list(subnets)
+        self.etag = etag
+        self.conflicts = conflicts
+        self.updates = []
+
+    def _account(self):
+        rule_set = _Model(bypass='AzureServices', default_action='Deny',
+                          ip_rules=[IPRule(ip_address_or_range=ip, action='Allow') for ip in self.ips],
+                          virtual_network_rules=[VirtualNetworkRule(virtual_network_resource_id=subnet, action='Allow')
+                                                 for subnet in self.subnets])
+        return _Model(network_rule_set=rule_set)
+
+    def get_properties(self, resource_group_name, account_name, raw=False):  # pylint: disable=unused-argument
+        return _Model(output=self._account(), response=_Model(headers={'ETag': self.etag} if self.etag else {}))
+
+    def update(self, resource_group_name, account_name, params, custom_headers=None):  # pylint: disable=unused-argument
+        self.updates.append(custom_headers)
+        if self.conflicts:
+            self.conflicts -= 1
+            raise CloudError(_Model(status_code=412, headers={}, reason='Precondition Failed'), 'changed')
+        rule_set = params.network_rule_set
+        self.ips = [rule.ip_address_or_range for rule in rule_set.ip_rules]
+        self.subnets = [rule.virtual_network_resource_id for rule in rule_set.virtual_network_rules]
+        return self._account()
+
+
+class TestNetworkRules(unittest.TestCase):
+    def _sync(self, client, **kwargs):
+        return sync_network_rules(_Cmd(), client, 'rg', 'account', **kwargs)
+
+    def test_sync_adds_and_removes_rules(self):
+        client = _FakeStorageClient(ips=['1.1.1.1', '2.2.2.0/24'], subnets=[SUBNET.format('a'), SUBNET.format('b')])
+        result = self._sync(client, ip_addresses=['2.2.2.0/24', '3.3.3.3', '3.3.3.3'],
+                            subnets=[SUBNET.format('B').upper(), SUBNET.format('c')])
+
+        # the rules kept stay in place, resource IDs are compared case insensitively
+        self.assertEqual(client.ips, ['2.2.2.0/24', '3.3.3.3'])
+        self.assertEqual(client.subnets, [SUBNET.format('b'), SUBNET.format('c')])
+        self.assertEqual(client.updates, [{'If-Match': '"1"'}])
+        self.assertEqual([rule.ip_address_or_range for rule in result.ip_rules], client.ips)
+
+    def test_sync_without_changes(self):
+        client = _FakeStorageClient(ips=['1.1.1.1'], subnets=[SUBNET.format('a')])
+        self._sync(client, ip_addresses=['1.1.1.1'], subnets=[SUBNET.format('a')])
+        self.assertEqual(client.updates, [])
+
+    def test_sync_requires_rules(self):
+        client = _FakeStorageClient(ips=['1.1.1.1'])
+        with self.assertRaises(CLIError):
+            self._sync(client)
+        with self.assertRaises(CLIError):
+            self._sync(client, ip_addresses=[], subnets=[])
+        self.assertEqual(client.ips, ['1.1.1.1'])
+
+        # an explicitly empty rule set removes all the rules
+        self._sync(client, rules='{}')
+        self.assertEqual(client.ips, [])
+        self.assertEqual(client.updates, [{'If-Match': '"1"'}])
+
+    def test_sync_invalid_subnet(self):
+        with self.assertRaises(CLIError):
+            self._sync(_FakeStorageClient(), subnets=['subnet'])
+
+    def test_update_is_retried_when_the_account_changed(self):
+        client = _FakeStorageClient(ips=['1.1.1.1'], conflicts=2)
+        self._sync(client, ip_addresses=['2.2.2.2'])
+        self.assertEqual(client.ips, ['2.2.2.2'])
+        self.assertEqual(len(client.updates), 3)
+
+        client = _FakeStorageClient(etag=None, conflicts=account.NETWORK_RULE_UPDATE_RETRIES)
+        with self.assertRaises(CLIError):
+            self._sync(client, ip_addresses=['2.2.2.2'])
+        self.assertEqual(client.updates, [None] * account.NETWORK_RULE_UPDATE_RETRIES)
+
+    def test_other_errors_are_not_retried(self):
+        client = _FakeStorageClient(ips=['1.1.1.1'])
+
+        def _fail(*_, **__):
+            client.updates.append(None)
+            raise CloudError(_Model(status_code=403, headers={}, reason='Forbidden'), 'forbidden')
+        client.update = _fail
+        with self.assertRaises(CloudError):
+            self._sync(client, ip_addresses=['2.2.2.2'])
+        self.assertEqual(len(client.updates), 1)
+
+    def test_dedupe(self):
+        values = _dedupe(['a', 'B', 'b', 'A', 'c'], lambda value: value.lower())
+        self.assertEqual(list(values.items()), [('a', 'a'), ('b', 'B'), ('c', 'c')])
+
+    def test_parse_network_rules(self):
+        rules = {
+            'ipRules': [{'ipAddressOrRange': '1.1.1.1', 'action': 'Allow'}, '2.2.2.2'],
+            'virtualNetworkRules': [{'virtualNetworkResourceId': SUBNET.format('a'), 'state': 'Succeeded'}]
+        }
+        self.assertEqual(_parse_network_rules(json.dumps(rules)), (['1.1.1.1', '2.2.2.2'], [SUBNET.format('a')]))
+        self.assertEqual(_parse_network_rules('{"ipRules": null}'), ([], []))
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'rules.json')
+        with open(path, 'w') as f:
+            json.dump(rules, f)
+        self.assertEqual(_parse_network_rules(path), (['1.1.1.1', '2.2.2.2'], [SUBNET.format('a')]))
+
+        for invalid in ('[]', '{"ipRules": [{"action": "Allow"}]}', '{"virtualNetworkRules": [""]}'):
+            with self.assertRaises(CLIError):
+                _parse_network_rules(invalid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,297 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from knack.util import CLIError
+from azext_storage_preview.transfer import (plan_upload, plan_download, plan_sync, TransferJournal, TransferEngine,
+                                            UPLOAD, DOWNLOAD, DELETE)
+from azext_storage_preview.operations.azcopy import _use_native_engine, _native_transfer, NATIVE_ENGINE, AZCOPY_ENGINE
+
+
+class _Properties(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, content_length, last_modified=None):
+        self.content_length = content_length
+        self.last_modified = last_modified
+        self.etag = '"etag"'
+
+
+class _Blob(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, name, content=b''):
+        self.name = name
+        self.content = content
+        self.metadata = {}
+        self.properties = _Properties(len(content))
+
+
+class _BlobBlock(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, block_id):
+        self.id = block_id
+
+
+class _FakeBlobService(object):
+    def __init__(self, blobs=None):
+        self.blobs = dict(blobs or {})
+        self.blocks = {}
+
+    def list_blobs(self, _, prefix='', include=None, delimiter=None):  # pylint: disable=unused-argument
+        for name in sorted(self.blobs):
+            if name.startswith(prefix) and not (delimiter and delimiter in name[len(prefix):]):
+                yield _Blob(name, self.blobs[name])
+
+    def get_blob_properties(self, _, blob_name):
+        from azure.common import AzureMissingResourceHttpError
+        if blob_name not in self.blobs:
+            raise AzureMissingResourceHttpError('not found', 404)
+        return _Blob(blob_name, self.blobs[blob_name])
+
+    def create_blob_from_path(self, _, blob_name, path, **kwargs):  # pylint: disable=unused-argument
+        with open(path, 'rb') as stream:
+            self.blobs[blob_name] = stream.read()
+
+    def put_block(self, _, blob_name, data, block_id):
+        self.blocks[(blob_name, block_id)] = data
+
+    def put_block_list(self, _, blob_name, block_list):
+        self.blobs[blob_name] = b''.join(self.blocks.pop((blob_name, block.id)) for block in block_list)
+
+    def get_blob_to_path(self, _, blob_name, path, **kwargs):  # pylint: disable=unused-argument
+        with open(path, 'wb') as stream:
+            stream.write(self.blobs[blob_name])
+
+    def get_blob_to_bytes(self, _, blob_name, start_range, end_range, **kwargs):  # pylint: disable=unused-argument
+        return _Blob(blob_name, self.blobs[blob_name][start_range:end_range + 1])
+
+    def delete_blob(self, _, blob_name):
+        del self.blobs[blob_name]
+
+
+class _Progress(object):
+    def __init__(self):
+        self.values = []
+        self.ended = False
+
+    def add(self, message=None, value=None, total_val=None):  # pylint: disable=unused-argument
+        self.values.append((value, total_val))
+
+    def end(self):
+        self.ended = True
+
+
+class _CliContext(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, config_dir):
+        self.config = mock.Mock(config_dir=config_dir)
+        self.progress = _Progress()
+
+    def get_progress_controller(self, det=False):  # pylint: disable=unused-argument
+        return self.progress
+
+
+class _Cmd(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, config_dir):
+        self.cli_ctx = _CliContext(config_dir)
+
+    @staticmethod
+    def get_models(*_):
+        return _BlobBlock
+
+
+class TestStorageTransfer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'source')
+        self.journals = os.path.join(self.directory, 'jobs')
+        os.makedirs(os.path.join(self.source, 'sub'))
+        self._write('a.txt', b'a' * 10)
+        self._write(os.path.join('sub', 'b.txt'), b'b' * 25)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, relative_path, content):
+        with open(os.path.join(self.source, relative_path), 'wb') as stream:
+            stream.write(content)
+
+    def test_plan_upload(self):
+        names = sorted(t.blob_name for t in plan_upload(self.source, 'cont', 'dir', recursive=True))
+        self.assertEqual(['dir/source/a.txt', 'dir/source/sub/b.txt'], names)
+
+        names = sorted(t.blob_name for t in plan_upload(os.path.join(self.source, '*'), 'cont', '', recursive=True))
+        self.assertEqual(['a.txt', 'sub/b.txt'], names)
+
+        transfers = list(plan_upload(os.path.join(self.source, 'a.txt'), 'cont', 'dir/'))
+        self.assertEqual(['dir/a.txt'], [t.blob_name for t in transfers])
+        self.assertEqual(10, transfers[0].size)
+
+        with self.assertRaises(CLIError):
+            list(plan_upload(self.source, 'cont', 'dir'))
+
+    def test_plan_download(self):
+        client = _FakeBlobService({'dir/a.txt': b'a', 'dir/sub/b.txt': b'bb', 'other.txt': b'c'})
+        destination = os.path.join(self.directory, 'dest')
+        os.makedirs(destination)
+
+        transfers = list(plan_download(client, 'cont', 'dir', destination, recursive=True))
+        self.assertEqual([os.path.join(destination, 'dir', 'a.txt'), os.path.join(destination, 'dir', 'sub', 'b.txt')],
+                         [t.local_path for t in transfers])
+
+        transfers = list(plan_download(client, 'cont', 'dir/*', destination))
+        self.assertEqual([os.path.join(destination, 'a.txt')], [t.local_path for t in transfers])
+
+        transfers = list(plan_download(client, 'cont', 'other.txt', destination))
+        self.assertEqual([(DOWNLOAD, os.path.join(destination, 'other.txt'), 1)],
+                         [(t.kind, t.local_path, t.size) for t in transfers])
+
+        with self.assertRaises(CLIError):
+            list(plan_download(client, 'cont', 'missing', destination))
+
+    def test_plan_sync(self):
+        client = _FakeBlobService({'dir/a.txt': b'a' * 10, 'dir/sub/b.txt': b'b', 'dir/stale.txt': b'c'})
+        transfers = list(plan_sync(client, self.source, 'cont', 'dir'))
+        # the blobs have no last modified time, so every local file is uploaded
+        self.assertEqual([(DELETE, 'dir/stale.txt'), (UPLOAD, 'dir/a.txt'), (UPLOAD, 'dir/sub/b.txt')],
+                         sorted((t.kind, t.blob_name) for t in transfers))
+
+        transfers = list(plan_sync(client, self.source, 'cont', 'dir', delete_destination=False))
+        self.assertNotIn(DELETE, [t.kind for t in transfers])
+
+    def test_engine_upload_blocks_and_resume(self):
+        client = _FakeBlobService()
+        transfers = list(plan_upload(self.source, 'cont', '', recursive=True))
+        description = 'upload {}'.format(self.source)
+
+        journal = TransferJournal(self.journals, 'job1', description)
+        journal.record(transfers[0])
+        journal.close()
+
+        journal = TransferJournal(self.journals, 'job1', description)
+        summary = TransferEngine(client, _BlobBlock, block_size=8).run(transfers, journal)
+        self.assertEqual('Completed', summary['status'])
+        self.assertEqual(1, summary['skipped'])
+        self.assertEqual(1, summary['completed'])
+        self.assertEqual(sorted(client.blobs), ['source/sub/b.txt'])
+        self.assertEqual(b'b' * 25, client.blobs['source/sub/b.txt'])
+        self.assertEqual({}, client.blocks)
+        # the journal of a completed job is deleted
+        self.assertFalse(os.path.exists(journal.path))
+
+        with self.assertRaises(CLIError):
+            TransferJournal(self.journals, '../job', description)
+
+    def test_engine_download_ranges(self):
+        content = bytes(bytearray(range(100)))
+        client = _FakeBlobService({'dir/blob': content})
+        destination = os.path.join(self.directory, 'dest')
+        transfers = list(plan_download(client, 'cont', 'dir/blob', destination))
+
+        progress = []
+        engine = TransferEngine(client, _BlobBlock, block_size=16,
+                                progress_callback=lambda current, total: progress.append((current, total)))
+        summary = engine.run(transfers, TransferJournal(self.journals, 'job2', 'download'))
+        self.assertEqual('Completed', summary['status'])
+        self.assertEqual(100, summary['bytesTransferred'])
+        self.assertEqual((100, 100), progress[-1])
+        with open(destination, 'rb') as stream:
+            self.assertEqual(content, stream.read())
+        # the ranges are written to a partial file, which is renamed once they are all written
+        self.assertEqual(['dest'], [name for name in os.listdir(self.directory) if name.startswith('dest')])
+
+    def test_interrupted_downloads_leave_no_partial_files(self):
+        client = _FakeBlobService({'dir/blob': b'x' * 100})
+        destination = os.path.join(self.directory, 'dest')
+
+        def _downloads():
+            return [name for name in os.listdir(self.directory) if name.startswith('dest')]
+
+        def _interrupt(*_):
+            # the partial file is only created once the first range is written
+            self.assertEqual(1, len(_downloads()))
+            raise KeyboardInterrupt()
+
+        engine = TransferEngine(client, _BlobBlock, block_size=16, progress_callback=_interrupt)
+        transfer = next(plan_download(client, 'cont', 'dir/blob', destination))
+        self.assertEqual(7, len(engine._plan_tasks(transfer)))  # pylint: disable=protected-access
+        self.assertEqual([], _downloads())
+
+        with self.assertRaises(KeyboardInterrupt):
+            engine.run(plan_download(client, 'cont', 'dir/blob', destination),
+                       TransferJournal(self.journals, 'job7', 'download'))
+        self.assertEqual([], _downloads())
+
+    def test_failed_downloads_keep_the_destination(self):
+        client = _FakeBlobService({'small': b's' * 10, 'large': b'l' * 100})
+        destination = os.path.join(self.directory, 'dest')
+        os.makedirs(destination)
+        for name in ('small', 'large'):
+            with open(os.path.join(destination, name), 'wb') as stream:
+                stream.write(b'old')
+        transfers = list(plan_download(client, 'cont', 'small', destination)) + \
+            list(plan_download(client, 'cont', 'large', destination))
+
+        def _fail(*_, **__):
+            raise ValueError('connection reset')
+        client.get_blob_to_path = client.get_blob_to_bytes = _fail
+
+        journal = TransferJournal(self.journals, 'job4', 'download')
+        summary = TransferEngine(client, _BlobBlock, block_size=16).run(transfers, journal)
+        self.assertEqual(2, summary['failed'])
+        self.assertEqual(['large', 'small'], sorted(os.listdir(destination)))
+        for name in ('small', 'large'):
+            with open(os.path.join(destination, name), 'rb') as stream:
+                self.assertEqual(b'old', stream.read())
+
+    def test_use_native_engine(self):
+        with mock.patch('azext_storage_preview.operations.azcopy.AzCopy.is_installed', return_value=True):
+            self.assertFalse(_use_native_engine(None, None))
+            self.assertTrue(_use_native_engine(NATIVE_ENGINE, 'job'))
+            with self.assertRaises(CLIError):
+                _use_native_engine(None, 'job')
+        with mock.patch('azext_storage_preview.operations.azcopy.AzCopy.is_installed', return_value=False):
+            self.assertTrue(_use_native_engine(None, 'job'))
+            with self.assertRaises(CLIError):
+                _use_native_engine(AZCOPY_ENGINE, 'job')
+
+    def test_native_transfer(self):
+        cmd = _Cmd(self.directory)
+        client = _FakeBlobService()
+        summary = _native_transfer(cmd, client, 'upload', self.source, 'https://account/cont', 'job5',
+                                   plan_upload(self.source, 'cont', '', recursive=True))
+        self.assertEqual(('job5', 'Completed', 2), (summary['jobId'], summary['status'], summary['completed']))
+        self.assertEqual(['source/a.txt', 'source/sub/b.txt'], sorted(client.blobs))
+        self.assertEqual((35, 35), cmd.cli_ctx.progress.values[-1])
+        self.assertTrue(cmd.cli_ctx.progress.ended)
+
+        # an interrupted job keeps its journal, and a usage error leaves none behind
+        cmd = _Cmd(self.directory)
+        with mock.patch.object(TransferEngine, 'run', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                _native_transfer(cmd, client, 'upload', self.source, 'https://account/cont', 'job6',
+                                 plan_upload(self.source, 'cont', '', recursive=True))
+        self.assertTrue(cmd.cli_ctx.progress.ended)
+        with self.assertRaises(CLIError):
+            _native_transfer(cmd, client, 'upload', self.source, 'https://account/cont', 'job7',
+                             plan_upload(self.source, 'cont', ''))
+        self.assertEqual(['job6.jsonl'], os.listdir(os.path.join(self.directory, 'storage_transfer_jobs')))
+
+    def test_engine_failures_keep_journal(self):
+        client = _FakeBlobService()
+        transfers = list(plan_sync(client, self.source, 'cont', ''))
+
+        def _fail(*_, **__):
+            raise ValueError('boom')
+        client.create_blob_from_path = _fail
+
+        summary = TransferEngine(client, _BlobBlock).run(transfers, TransferJournal(self.journals, 'job3', 'sync'))
+        self.assertEqual('CompletedWithErrors', summary['status'])
+        self.assertEqual(2, summary['failed'])
+        self.assertEqual('boom', summary['failures'][0]['error'])
+        self.assertTrue(os.path.exists(summary['journal']))
+
+
+if __name__ == '__main__':
+    unittest.main()
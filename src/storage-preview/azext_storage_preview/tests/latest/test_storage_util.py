@@ -0,0 +1,139 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+import os
+import unittest
+from fnmatch import fnmatch
+
+from azext_storage_preview import util
+from azext_storage_preview.util import collect_blobs, glob_files_remotely
+
+
+class _Entry(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, name, is_blob=True):
+        self.name = name
+        if is_blob:
+            self.properties = None
+
+
+class _Page(list):
+    next_marker = None
+
+
+class _FakeBlobService(object):
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.calls = []
+
+    def exists(self, _, name):
+        return name in self.names
+
+    def list_blobs(self, _, prefix='', delimiter=None, num_results=None, marker=None):
+        self.calls.append((prefix, delimiter, marker))
+        entries = []
+        for name in self.names:
+            if not name.startswith(prefix):
+                continue
+            if delimiter and delimiter in name[len(prefix):]:
+                directory = name[:name.index(delimiter, len(prefix)) + 1]
+                if entries and entries[-1].name == directory:
+                    continue
+                entries.append(_Entry(directory, is_blob=False))
+            else:
+                entries.append(_Entry(name))
+        start = int(marker or 0)
+        page = _Page(entries[start:start + num_results])
+        if start + num_results < len(entries):
+            page.next_marker = str(start + num_results)
+        return page
+
+
+class _Directory(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, name):
+        self.name = name
+
+
+class _File(_Directory):  # pylint: disable=too-few-public-methods
+    pass
+
+
+class _FakeCmd(object):  # pylint: disable=too-few-public-methods
+    @staticmethod
+    def get_models(*_):
+        return _Directory, _File
+
+
+class _FakeFileService(object):
+    def __init__(self, paths):
+        self.paths = paths
+        self.listed = []
+
+    def list_directories_and_files(self, _, directory_name):
+        self.listed.append(directory_name)
+        prefix = directory_name + '/' if directory_name else ''
+        children = {}
+        for path in self.paths:
+            if path.startswith(prefix):
+                name, _, rest = path[len(prefix):].partition('/')
+                children[name] = _Directory(name) if rest else _File(name)
+        return list(children.values())
+
+
+BLOB_NAMES = ['logs/2019-12/app.log', 'logs/2020-01/app.log', 'logs/2020-01/web/web.log',
+              'logs/2020-02/app.txt', 'logs/2021-01/app.log', 'data/2020-01/app.log', 'readme.md']
+
+
+class TestStorageGlob(unittest.TestCase):
+    def setUp(self):
+        self.page_size = util.GLOB_PAGE_SIZE
+        util.GLOB_PAGE_SIZE = 2
+
+    def tearDown(self):
+        util.GLOB_PAGE_SIZE = self.page_size
+
+    def _assert_glob_blobs(self, pattern):
+        service = _FakeBlobService(BLOB_NAMES)
+        expected = sorted(name for name in BLOB_NAMES if fnmatch(name, pattern))
+        self.assertEqual(expected, sorted(collect_blobs(service, 'container', pattern)))
+        return service.calls
+
+    def test_collect_blobs_literal_prefix(self):
+        calls = self._assert_glob_blobs('logs/2020-*')
+        self.assertTrue(all(prefix == 'logs/2020-' for prefix, _, _ in calls))
+        # the pages are listed one after another
+        self.assertEqual([None, '2'], [marker for _, _, marker in calls])
+
+    def test_collect_blobs_prune_directories(self):
+        calls = self._assert_glob_blobs('logs/2020-0[1-2]/app.*')
+        self.assertEqual([('logs/', '/'), ('logs/2020-01/app.', None), ('logs/2020-02/app.', None)],
+                         sorted(set((prefix, delimiter) for prefix, delimiter, marker in calls if not marker)))
+
+    def test_collect_blobs_wildcards_matching_slashes(self):
+        # like '*', '?' and '[!...]' match '/', so their directories can't be listed with the delimiter
+        names = ['a/b/x', 'a-b/x', 'a/c/x']
+        self.assertEqual(['a-b/x', 'a/b/x'], sorted(collect_blobs(_FakeBlobService(names), 'container', 'a?b/x')))
+        self.assertEqual(['a/b/x', 'a/c/x'], sorted(collect_blobs(_FakeBlobService(names), 'container', 'a[!-]?/x')))
+        files = glob_files_remotely(_FakeCmd(), _FakeFileService(names), 'share', 'a?b/x')
+        self.assertEqual([('a-b', 'x'), ('a/b', 'x')], sorted((d.replace(os.sep, '/'), f) for d, f in files))
+
+    def test_collect_blobs_match_all(self):
+        self._assert_glob_blobs('*')
+        self._assert_glob_blobs('*/2020-01/*.log')
+        self.assertEqual(sorted(BLOB_NAMES), sorted(collect_blobs(_FakeBlobService(BLOB_NAMES), 'container')))
+        self.assertEqual(['readme.md'], collect_blobs(_FakeBlobService(BLOB_NAMES), 'container', 'readme.md'))
+
+    def test_glob_files_remotely(self):
+        service = _FakeFileService(BLOB_NAMES)
+        files = glob_files_remotely(_FakeCmd(), service, 'share', 'logs/2020-0[0-9]/*.log')
+        self.assertEqual([('logs/2020-01', 'app.log'), ('logs/2020-01/web', 'web.log')],
+                         sorted((d.replace(os.sep, '/'), f) for d, f in files))
+        self.assertEqual(['logs', 'logs/2020-01', 'logs/2020-01/web', 'logs/2020-02'],
+                         sorted(d.replace(os.sep, '/') for d in service.listed))
+
+        files = glob_files_remotely(_FakeCmd(), _FakeFileService(BLOB_NAMES), 'share', None)
+        self.assertEqual(len(BLOB_NAMES), len(list(files)))
+
+
+if __name__ == '__main__':
+    unittest.main()
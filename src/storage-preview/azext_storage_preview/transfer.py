@@ -0,0 +1,487 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""
+An in-process alternative to azcopy. Uploads, downloads and syncs are planned as file transfers, which are split into
+block transfers, and run on a bounded thread pool sharing the connections of one blob service client.
+"""
+
+import base64
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from knack.log import get_logger
+from knack.util import CLIError
+
+logger = get_logger(__name__)
+
+UPLOAD = 'upload'
+DOWNLOAD = 'download'
+DELETE = 'delete'
+
+BLOCK_SIZE = 8 * 1024 * 1024
+MIN_CONCURRENCY = 2
+INITIAL_CONCURRENCY = 8
+MAX_CONCURRENCY = 64
+# the concurrency is adjusted to the throughput of each interval
+ADJUST_INTERVAL = 2.0
+JOURNAL_DIR_NAME = 'storage_transfer_jobs'
+# a file is downloaded next to its destination under this suffix, and renamed once it is complete
+PARTIAL_DOWNLOAD_SUFFIX = '.partial'
+
+_JOB_ID_REGEX = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class FileTransfer(object):  # pylint: disable=too-many-instance-attributes
+    """ A file to upload or download, or a blob to delete """
+
+    def __init__(self, kind, local_path, container, blob_name, size=0, etag=None):
+        self.kind = kind
+        self.local_path = local_path
+        self.container = container
+        self.blob_name = blob_name
+        self.size = size
+        self.etag = etag
+        self.pending = 0
+        self.committed = False
+        self.block_ids = []
+        self.error = None
+        # the file the ranges of a download are written to
+        self.partial_path = None
+
+    @property
+    def key(self):
+        return '{}:{}/{}'.format(self.kind, self.container, self.blob_name)
+
+    @property
+    def source(self):
+        return self.local_path if self.kind == UPLOAD else '{}/{}'.format(self.container, self.blob_name)
+
+    @property
+    def destination(self):
+        return self.local_path if self.kind == DOWNLOAD else '{}/{}'.format(self.container, self.blob_name)
+
+
+def _is_directory_blob(blob):
+    metadata = getattr(blob, 'metadata', None) or {}
+    return blob.name.endswith('/') or metadata.get('hdi_isfolder') == 'true'
+
+
+def _join_blob_path(*parts):
+    return '/'.join(part.strip('/') for part in parts if part and part.strip('/'))
+
+
+def _walk_files(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, directory).replace(os.sep, '/')
+
+
+def _split_contents_wildcard(path):
+    """ Returns the directory of a "directory/*" path, which stands for the contents of the directory, or None """
+    if path == '*':
+        return ''
+    if path.endswith('/*'):
+        return path[:-2]
+    return None
+
+
+def plan_upload(source, container, blob_path, recursive=False):
+    """
+    Yields the file transfers uploading the local file or directory to the blob path. The directory itself is
+    created under the blob path, unless the source is "directory/*".
+    """
+    contents = _split_contents_wildcard(source.replace(os.sep, '/'))
+    source = os.path.abspath(os.path.expanduser(source if contents is None else contents or '.'))
+    if os.path.isdir(source):
+        if not recursive:
+            raise CLIError('usage error: {} is a directory, specify --recursive to upload it.'.format(source))
+        prefix = _join_blob_path(blob_path, os.path.basename(source)) if contents is None else blob_path
+        for path, relative_path in _walk_files(source):
+            yield FileTransfer(UPLOAD, path, container, _join_blob_path(prefix, relative_path),
+                               os.path.getsize(path))
+    elif os.path.isfile(source):
+        blob_name = blob_path
+        if not blob_path or blob_path.endswith('/'):
+            blob_name = _join_blob_path(blob_path, os.path.basename(source))
+        yield FileTransfer(UPLOAD, source, container, blob_name, os.path.getsize(source))
+    else:
+        raise CLIError('{} does not exist.'.format(source))
+
+
+def plan_download(client, container, blob_path, destination, recursive=False):
+    """
+    Yields the file transfers downloading the blob or virtual directory to the local destination. The virtual
+    directory itself is created under the destination, unless the source is "directory/*".
+    """
+    destination = os.path.abspath(os.path.expanduser(destination))
+    contents = _split_contents_wildcard(blob_path)
+    if contents is not None:
+        blob_path = contents
+    blob = None
+    if blob_path and not blob_path.endswith('/') and contents is None:
+        from azure.common import AzureMissingResourceHttpError
+        try:
+            blob = client.get_blob_properties(container, blob_path)
+        except AzureMissingResourceHttpError:
+            pass
+
+    if blob is not None and not _is_directory_blob(blob):
+        path = os.path.join(destination, os.path.basename(blob_path)) if os.path.isdir(destination) else destination
+        yield FileTransfer(DOWNLOAD, path, container, blob_path, blob.properties.content_length, blob.properties.etag)
+        return
+
+    prefix = blob_path.rstrip('/') + '/' if blob_path else ''
+    root = destination if contents is not None else \
+        os.path.join(destination, os.path.basename(prefix.rstrip('/')) or container)
+    delimiter = None if recursive else '/'
+    found = False
+    for blob in client.list_blobs(container, prefix=prefix, include='metadata', delimiter=delimiter):
+        if not hasattr(blob, 'properties') or _is_directory_blob(blob):
+            continue
+        found = True
+        path = os.path.join(root, *blob.name[len(prefix):].split('/'))
+        yield FileTransfer(DOWNLOAD, path, container, blob.name, blob.properties.content_length,
+                           blob.properties.etag)
+    if not found and blob is None:
+        raise CLIError('No blobs found in {}/{}.'.format(container, blob_path or ''))
+
+
+def plan_sync(client, source, container, blob_path, delete_destination=True):
+    """
+    Yields the file transfers uploading the local files that are missing, or have a different size or are newer
+    than their blob. When the source is a directory, the blobs which have no local file are deleted.
+    """
+    source = os.path.abspath(os.path.expanduser(source))
+    if os.path.isfile(source):
+        blob_name = blob_path
+        if not blob_path or blob_path.endswith('/'):
+            blob_name = _join_blob_path(blob_path, os.path.basename(source))
+        from azure.common import AzureMissingResourceHttpError
+        try:
+            blob = client.get_blob_properties(container, blob_name)
+        except AzureMissingResourceHttpError:
+            blob = None
+        if not _is_up_to_date(source, blob):
+            yield FileTransfer(UPLOAD, source, container, blob_name, os.path.getsize(source))
+        return
+    if not os.path.isdir(source):
+        raise CLIError('{} does not exist.'.format(source))
+
+    prefix = blob_path.rstrip('/') + '/' if blob_path else ''
+    blobs = {}
+    for blob in client.list_blobs(container, prefix=prefix, include='metadata'):
+        if not _is_directory_blob(blob):
+            blobs[blob.name] = blob
+
+    for path, relative_path in _walk_files(source):
+        blob = blobs.pop(prefix + relative_path, None)
+        if not _is_up_to_date(path, blob):
+            yield FileTransfer(UPLOAD, path, container, prefix + relative_path, os.path.getsize(path))
+
+    if delete_destination:
+        for name in sorted(blobs):
+            yield FileTransfer(DELETE, None, container, name)
+
+
+def _is_up_to_date(path, blob):
+    import calendar
+    if blob is None or blob.properties.content_length != os.path.getsize(path):
+        return False
+    last_modified = blob.properties.last_modified
+    return last_modified is not None and os.path.getmtime(path) <= calendar.timegm(last_modified.utctimetuple())
+
+
+class TransferJournal(object):
+    """
+    The file transfers completed by a job, appended to a file as they complete so that the job can be resumed.
+    The first line of the file describes the job, so that it is not resumed by a different transfer.
+    """
+
+    def __init__(self, directory, job_id, description):
+        if not _JOB_ID_REGEX.match(job_id):
+            raise CLIError('usage error: the job id may only contain letters, digits, "-" and "_".')
+        self.job_id = job_id
+        self.path = os.path.join(directory, job_id + '.jsonl')
+        self.completed = set()
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as journal_file:
+                lines = journal_file.read().splitlines()
+            entries = []
+            for line in lines:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # the last entry may have been cut short when the job was interrupted
+                    continue
+            if not entries or entries[0].get('job') != description:
+                raise CLIError('Job {} was started by another transfer.'.format(job_id))
+            self.completed = {entry['completed'] for entry in entries[1:] if 'completed' in entry}
+            logger.warning('Resuming job %s, %d files were already transferred.', job_id, len(self.completed))
+            self.file = open(self.path, 'a')
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.file = open(self.path, 'w')
+            self._write({'job': description})
+
+    def is_completed(self, transfer):
+        return transfer.key in self.completed
+
+    def record(self, transfer):
+        self.completed.add(transfer.key)
+        self._write({'completed': transfer.key})
+
+    def close(self, delete=False):
+        self.file.close()
+        if delete:
+            os.remove(self.path)
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+
+class _Task(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, transfer, run, size=0):
+        self.transfer = transfer
+        self.run = run
+        self.size = size
+
+
+class TransferEngine(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Runs file transfers on a thread pool. The number of tasks in flight starts at INITIAL_CONCURRENCY and is moved
+    up or down every ADJUST_INTERVAL, keeping the direction while the throughput improves, and halved when the
+    service is busy.
+    """
+
+    def __init__(self, client, blob_block_type, max_concurrency=MAX_CONCURRENCY, block_size=BLOCK_SIZE,
+                 progress_callback=None):
+        self.client = client
+        self.blob_block_type = blob_block_type
+        self.max_concurrency = max(MIN_CONCURRENCY, max_concurrency)
+        self.concurrency = min(INITIAL_CONCURRENCY, self.max_concurrency)
+        self.block_size = block_size
+        self.progress_callback = progress_callback
+        self._direction = 1
+        self._window_start = None
+        self._window_bytes = 0
+        self._last_throughput = 0
+        self._lock = threading.Lock()
+        self._reuse_connections()
+
+    def run(self, transfers, journal):
+        """ Runs the transfers which are not completed in the journal, returns the summary of the job """
+        start = time.time()
+        transfers = list(transfers)
+        pending = [transfer for transfer in transfers if not journal.is_completed(transfer)]
+        total_bytes = sum(transfer.size for transfer in pending if transfer.kind != DELETE)
+        tasks = deque()
+        for transfer in pending:
+            tasks.extend(self._plan_tasks(transfer))
+
+        self._window_start = start
+        transferred_bytes = 0
+        completed = []
+        failed = []
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                while tasks or running:
+                    while tasks and len(running) < self.concurrency:
+                        task = tasks.popleft()
+                        if task.transfer.error is not None:
+                            self._finish_task(task.transfer, tasks, completed, failed, journal)
+                            continue
+                        running[executor.submit(task.run)] = task
+
+                    done, _ = wait(running, timeout=ADJUST_INTERVAL, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+                        error = future.exception()
+                        if error is not None:
+                            logger.debug('Failed to %s %s: %s', task.transfer.kind, task.transfer.source, error)
+                            task.transfer.error = str(error)
+                            if getattr(error, 'status_code', None) in (500, 503):
+                                self.concurrency = max(MIN_CONCURRENCY, self.concurrency // 2)
+                        else:
+                            transferred_bytes += task.size
+                            self._window_bytes += task.size
+                            if self.progress_callback and task.size:
+                                self.progress_callback(transferred_bytes, total_bytes)
+                        self._finish_task(task.transfer, tasks, completed, failed, journal)
+                    self._adjust_concurrency()
+        except BaseException:
+            # a resumed job downloads to new partial files, the unfinished ones would be left behind
+            for transfer in pending:
+                if transfer.partial_path is not None:
+                    self._remove(transfer.partial_path)
+            raise
+
+        elapsed = time.time() - start
+        journal.close(delete=not failed)
+        return {
+            'jobId': journal.job_id,
+            'status': 'CompletedWithErrors' if failed else 'Completed',
+            'totalTransfers': len(transfers),
+            'completed': len(completed),
+            'skipped': len(transfers) - len(pending),
+            'failed': len(failed),
+            'failures': [{'source': transfer.source, 'destination': transfer.destination, 'error': transfer.error}
+                         for transfer in failed],
+            'bytesTransferred': transferred_bytes,
+            'elapsedSeconds': round(elapsed, 3),
+            'throughputMBps': round(transferred_bytes / elapsed / 1024 / 1024, 3) if elapsed else 0,
+            'journal': journal.path if failed else None
+        }
+
+    def _plan_tasks(self, transfer):
+        if transfer.kind == DELETE:
+            return [self._task(transfer, lambda: self.client.delete_blob(transfer.container, transfer.blob_name))]
+        if transfer.size <= self.block_size:
+            run = self._put_blob if transfer.kind == UPLOAD else self._get_blob
+            return [self._task(transfer, lambda: run(transfer), transfer.size)]
+
+        run = self._put_block if transfer.kind == UPLOAD else self._get_range
+        block_prefix = uuid.uuid4().hex
+        tasks = []
+        for index, offset in enumerate(range(0, transfer.size, self.block_size)):
+            length = min(self.block_size, transfer.size - offset)
+            block_id = base64.b64encode('{}{:08d}'.format(block_prefix, index).encode('utf-8')).decode('utf-8')
+            transfer.block_ids.append(block_id)
+            tasks.append(self._task(transfer, lambda b=block_id, o=offset, l=length: run(transfer, b, o, l), length))
+        return tasks
+
+    @staticmethod
+    def _task(transfer, run, size=0):
+        transfer.pending += 1
+        return _Task(transfer, run, size)
+
+    def _finish_task(self, transfer, tasks, completed, failed, journal):  # pylint: disable=too-many-arguments
+        transfer.pending -= 1
+        if transfer.pending:
+            return
+        if transfer.kind == DOWNLOAD and transfer.block_ids:
+            self._finish_download(transfer)
+        if transfer.error is not None:
+            failed.append(transfer)
+        elif transfer.block_ids and transfer.kind == UPLOAD and not transfer.committed:
+            transfer.committed = True
+            tasks.appendleft(self._task(transfer, lambda: self._put_block_list(transfer)))
+        else:
+            completed.append(transfer)
+            journal.record(transfer)
+
+    def _adjust_concurrency(self):
+        now = time.time()
+        elapsed = now - self._window_start
+        if elapsed < ADJUST_INTERVAL:
+            return
+        throughput = self._window_bytes / elapsed
+        if throughput < self._last_throughput * 0.95:
+            self._direction = -self._direction
+        step = max(1, self.concurrency // 4)
+        self.concurrency = min(self.max_concurrency, max(MIN_CONCURRENCY, self.concurrency + self._direction * step))
+        logger.debug('Transferred %.1f MB/s, running %d transfers at once', throughput / 1024 / 1024,
+                     self.concurrency)
+        self._last_throughput = throughput
+        self._window_start = now
+        self._window_bytes = 0
+
+    def _reuse_connections(self):
+        # the client's connection pool has to hold a connection per thread, or connections are dropped after use
+        session = getattr(getattr(self.client, '_httpclient', None), 'session', None)
+        if session is None:
+            return
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def _put_blob(self, transfer):
+        self.client.create_blob_from_path(transfer.container, transfer.blob_name, transfer.local_path,
+                                          max_connections=1)
+
+    def _put_block(self, transfer, block_id, offset, length):
+        with open(transfer.local_path, 'rb') as stream:
+            stream.seek(offset)
+            data = stream.read(length)
+        self.client.put_block(transfer.container, transfer.blob_name, data, block_id)
+
+    def _put_block_list(self, transfer):
+        self.client.put_block_list(transfer.container, transfer.blob_name,
+                                   [self.blob_block_type(block_id) for block_id in transfer.block_ids])
+
+    def _get_blob(self, transfer):
+        self._makedirs(transfer.local_path)
+        partial_path = self._get_partial_path(transfer)
+        try:
+            self.client.get_blob_to_path(transfer.container, transfer.blob_name, partial_path,
+                                         max_connections=1, if_match=transfer.etag)
+            os.replace(partial_path, transfer.local_path)
+        except BaseException:
+            self._remove(partial_path)
+            raise
+
+    def _get_range(self, transfer, _, offset, length):
+        blob = self.client.get_blob_to_bytes(transfer.container, transfer.blob_name, start_range=offset,
+                                             end_range=offset + length - 1, max_connections=1, if_match=transfer.etag)
+        with open(self._create_partial_file(transfer), 'r+b') as stream:
+            stream.seek(offset)
+            stream.write(blob.content)
+
+    def _create_partial_file(self, transfer):
+        """ Creates the partial file of a download, at the full size, when its first range is written """
+        with self._lock:
+            if transfer.partial_path is None:
+                self._makedirs(transfer.local_path)
+                partial_path = self._get_partial_path(transfer)
+                with open(partial_path, 'wb') as stream:
+                    stream.truncate(transfer.size)
+                transfer.partial_path = partial_path
+            return transfer.partial_path
+
+    def _finish_download(self, transfer):
+        """ Renames a download whose ranges are all written to its destination, or deletes it if one failed """
+        if transfer.partial_path is None:
+            return
+        try:
+            if transfer.error is None:
+                os.replace(transfer.partial_path, transfer.local_path)
+            else:
+                self._remove(transfer.partial_path)
+        except OSError as ex:
+            transfer.error = str(ex)
+        transfer.partial_path = None
+
+    @staticmethod
+    def _get_partial_path(transfer):
+        # downloads of the same file by different jobs don't share a partial file
+        return '{}.{}{}'.format(transfer.local_path, uuid.uuid4().hex[:8], PARTIAL_DOWNLOAD_SUFFIX)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _makedirs(path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
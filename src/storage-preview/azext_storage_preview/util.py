@@ -5,11 +5,19 @@
 
 
 import os
+import re
+
+# the number of directories or pages of blobs listed at once when globbing remotely
+GLOB_CONCURRENCY = 8
+# the most blobs the service returns in a page
+GLOB_PAGE_SIZE = 5000
+_WILDCARD_REGEX = re.compile(r'\*|\?|\[!?\]?[^\]]*\]')
 
 
 def collect_blobs(blob_service, container, pattern=None):
     """
     List the blobs in the given blob container, filter the blob by comparing their path to the given pattern.
+    The literal prefix of the pattern is pushed down to the service, and the blobs are yielded as they are listed.
     """
     if not blob_service:
         raise ValueError('missing parameter blob_service')
@@ -20,18 +28,49 @@ def collect_blobs(blob_service, container, pattern=None):
     if not _pattern_has_wildcards(pattern):
         return [pattern] if blob_service.exists(container, pattern) else []
 
-    results = []
-    for blob in blob_service.list_blobs(container):
-        try:
-            blob_name = blob.name.encode(
-                'utf-8') if isinstance(blob.name, unicode) else blob.name
-        except NameError:
-            blob_name = blob.name
+    return _glob_blobs(blob_service, container, pattern or '*')
+
+
+def _glob_blobs(blob_service, container, pattern):
+    """
+    Lists the blobs matching the pattern a page at a time. The directories of the pattern whose wildcards can't
+    match '/' are listed with the '/' delimiter, so that only the matching virtual directories are listed further.
+    """
+    segments = pattern.split('/')
+
+    def _list_page(item):
+        prefix, index, marker = item
+        # the literal directories are part of the prefix of every match
+        while index < len(segments) - 1 and not _has_wildcards(segments[index]):
+            prefix += segments[index] + '/'
+            index += 1
+        segment = segments[index]
+        if index < len(segments) - 1 and _matches_one_name(segment):
+            page = blob_service.list_blobs(container, prefix=prefix, delimiter='/', num_results=GLOB_PAGE_SIZE,
+                                           marker=marker)
+            # the blobs listed along the virtual directories are too short to match
+            children = [(entry.name, index + 1, None) for entry in page
+                        if not hasattr(entry, 'properties') and _match_path(entry.name[len(prefix):-1], segment)]
+            matches = []
+        else:
+            rest = '/'.join(segments[index:])
+            page = blob_service.list_blobs(container, prefix=prefix + _literal_prefix(rest),
+                                           num_results=GLOB_PAGE_SIZE, marker=marker)
+            names = (_get_blob_name(blob) for blob in page)
+            matches = [name for name in names if _match_path(name[len(prefix):], rest)]
+            children = []
+        if page.next_marker:
+            children.append((prefix, index, page.next_marker))
+        return matches, children
 
-        if not pattern or _match_path(blob_name, pattern):
-            results.append(blob_name)
+    return _iter_concurrently([('', 0, None)], _list_page)
 
-    return results
+
+def _get_blob_name(blob):
+    try:
+        return blob.name.encode('utf-8') if isinstance(blob.name, unicode) else blob.name
+    except NameError:
+        return blob.name
 
 
 def collect_files(cmd, file_service, share, pattern=None):
@@ -85,18 +124,67 @@ def glob_files_locally(folder_path, pattern):
 
 def glob_files_remotely(cmd, client, share_name, pattern):
     """glob the files in remote file share based on the given pattern"""
-    from collections import deque
+    from azure.common import AzureMissingResourceHttpError
     t_dir, t_file = cmd.get_models('file.models#Directory', 'file.models#File')
+    segments = pattern.split('/') if pattern else []
 
-    queue = deque([""])
-    while queue:
-        current_dir = queue.pop()
-        for f in client.list_directories_and_files(share_name, current_dir):
+    def _list_directory(current_dir):
+        files, directories = [], []
+        try:
+            entries = list(client.list_directories_and_files(share_name, current_dir))
+        except AzureMissingResourceHttpError:
+            return files, directories
+        for f in entries:
             if isinstance(f, t_file):
                 if not pattern or _match_path(os.path.join(current_dir, f.name), pattern):
-                    yield current_dir, f.name
+                    files.append((current_dir, f.name))
             elif isinstance(f, t_dir):
-                queue.appendleft(os.path.join(current_dir, f.name))
+                directory = os.path.join(current_dir, f.name)
+                if not segments or _may_contain_matches(directory, segments):
+                    directories.append(directory)
+        return files, directories
+
+    # start from the literal directories of the pattern rather than the root of the share
+    root = []
+    for segment in segments[:-1]:
+        if _has_wildcards(segment):
+            break
+        root.append(segment)
+    return _iter_concurrently([os.path.join('', *root)], _list_directory)
+
+
+def _may_contain_matches(directory, segments):
+    """ Returns False when no file under the directory can match the segments of the pattern """
+    for index, name in enumerate(directory.replace(os.sep, '/').split('/')):
+        if index < len(segments) and not _matches_one_name(segments[index]):
+            # the segment matches across directories
+            return True
+        if index >= len(segments) - 1 or not _match_path(name, segments[index]):
+            return False
+    return True
+
+
+def _iter_concurrently(items, expand, max_workers=GLOB_CONCURRENCY):
+    """
+    Expands the items on a thread pool. expand returns the results of an item and the items to expand next, the
+    results are yielded as soon as their expansion completes.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    running = {executor.submit(expand, item) for item in items}
+    try:
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, children = future.result()
+                running.update(executor.submit(expand, child) for child in children)
+                for result in results:
+                    yield result
+    finally:
+        # the caller may stop iterating before all the items are expanded
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=True)
 
 
 def create_short_lived_blob_sas(cmd, account_name, account_key, container, blob):
@@ -173,6 +261,23 @@ def _pattern_has_wildcards(p):
     return not p or p.find('*') != -1 or p.find('?') != -1 or p.find('[') != -1
 
 
+def _has_wildcards(p):
+    return any(c in p for c in '*?[')
+
+
+def _matches_one_name(segment):
+    """ Returns whether the segment of a pattern only matches names without '/', unlike '*', '?' or '[!a]' """
+    return not any(_match_path('/', wildcard) for wildcard in _WILDCARD_REGEX.findall(segment))
+
+
+def _literal_prefix(pattern):
+    """ Returns the part of the pattern before its first wildcard """
+    for index, c in enumerate(pattern):
+        if c in '*?[':
+            return pattern[:index]
+    return pattern
+
+
 def _match_path(path, pattern):
     from fnmatch import fnmatch
     return fnmatch(path, pattern)
@@ -8,7 +8,7 @@
 from codecs import open
 from setuptools import setup, find_packages
 
-VERSION = "0.2.10"
+VERSION = "0.2.14"
 
 CLASSIFIERS = [
     'Development Status :: 4 - Beta',
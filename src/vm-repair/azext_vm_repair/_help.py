@@ -68,3 +68,17 @@ helps['vm repair list-scripts'] = """
           text: >
             az vm repair list-scripts --query "[?contains(description, 'test')]"
 """
+
+helps['vm repair refresh-catalog'] = """
+    type: command
+    short-summary: Refresh the local catalog of VM sizes and images used to create repair VMs.
+    long-summary: |
+        'az vm repair create' looks up the VM size and image of the repair VM in a catalog cached for a day. Run this command ahead of time, for example on a schedule, so that creating a repair VM doesn't wait for these listings.
+    examples:
+        - name: Refresh the catalog of the locations repair VMs were created in before.
+          text: >
+            az vm repair refresh-catalog --verbose
+        - name: Refresh the catalog for VMs in westus2 and eastus.
+          text: >
+            az vm repair refresh-catalog -l westus2 eastus --verbose
+"""
@@ -40,3 +40,6 @@ def load_arguments(self, _):
         c.argument('custom_script_file', help='Custom script file to run on VM. Script should be PowerShell for windows, Bash for Linux.')
         c.argument('parameters', nargs='+', help="Space-separated parameters in the format of '[name=]value'. Positional for bash scripts.")
         c.argument('run_on_repair', help="Script will be run on the linked repair VM.")
+
+    with self.argument_context('vm repair refresh-catalog') as c:
+        c.argument('locations', options_list=['--locations', '-l'], nargs='+', help='Space-separated locations to refresh the images of. Defaults to the locations repair VMs were created in before.')
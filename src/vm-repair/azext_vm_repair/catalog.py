@@ -0,0 +1,178 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+# pylint: disable=line-too-long
+
+import json
+import os
+import threading
+import time
+
+from knack.log import get_logger
+
+logger = get_logger(__name__)
+
+CATALOG_DIR_NAME = 'vm_repair_catalog'
+# VM sizes and gallery images rarely change, a day old catalog is still accurate enough to pick a repair VM
+CATALOG_TTL = 24 * 60 * 60
+
+# the catalog files are read and written by the concurrent steps of 'vm repair create'
+_catalog_lock = threading.RLock()
+
+
+def _get_capability(capabilities, name, default):
+    try:
+        return float(capabilities.get(name, default))
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _is_sku_restricted(sku, location):
+    """ Returns True if the sku can't be used in the location by the subscription """
+    for restriction in sku.restrictions or []:
+        if restriction.type == 'Location' and location.lower() in [loc.lower() for loc in restriction.values or []]:
+            return True
+    return False
+
+
+def _sku_to_entry(sku, location):
+    capabilities = {capability.name: capability.value for capability in sku.capabilities or []}
+    return {
+        'name': sku.name,
+        'family': sku.family or '',
+        'vCPUs': _get_capability(capabilities, 'vCPUs', 'inf'),
+        'memoryGB': _get_capability(capabilities, 'MemoryGB', 'inf'),
+        'maxDataDiskCount': _get_capability(capabilities, 'MaxDataDiskCount', '0'),
+        'premiumIO': capabilities.get('PremiumIO') == 'True',
+        'restricted': _is_sku_restricted(sku, location)
+    }
+
+
+class RepairCatalog(object):
+    """
+    The VM sizes and gallery image urns of the locations of a subscription, stored as one file per location
+    under the CLI config directory. The VM sizes of all the locations are listed at once, while the image urns
+    are listed per location and image. Entries older than the ttl are listed again when used.
+    """
+
+    def __init__(self, cli_ctx, ttl=CATALOG_TTL):
+        from azure.cli.core.commands.client_factory import get_subscription_id
+        self.cli_ctx = cli_ctx
+        self.ttl = ttl
+        self.path = os.path.join(cli_ctx.config.config_dir, CATALOG_DIR_NAME, get_subscription_id(cli_ctx))
+        self.locations = {}
+        # (location, family, vCPUs, restricted) => VM sizes, in the order they were listed
+        self.index = {}
+
+    def get_sku(self, location, name):
+        """ Returns the VM size with the name in the location, or None """
+        for sku in self._get_skus(location):
+            if sku['name'].lower() == name.lower():
+                return sku
+        return None
+
+    def find_skus(self, location, family=None, max_vcpus=None, restricted=False):
+        """ Returns the VM sizes of the location with the family, at most max_vcpus vCPUs and the restriction """
+        self._get_skus(location)
+        location = location.lower()
+        skus = []
+        for (sku_location, sku_family, vcpus, sku_restricted), entries in self.index.items():
+            if sku_location == location and sku_restricted == restricted and \
+                    (family is None or sku_family == family.lower()) and (max_vcpus is None or vcpus <= max_vcpus):
+                skus.extend(entries)
+        return sorted(skus, key=lambda sku: sku['order'])
+
+    def get_image_urns(self, location, publisher, offer, sku):
+        """ Returns the urns of all the versions of the image in the location """
+        image = ':'.join([publisher, offer, sku])
+        images = self._load(location).setdefault('images', {})
+        entry = images.get(image)
+        if entry is None or self._is_expired(entry):
+            logger.info('Fetching the versions of the image %s in %s...', image, location)
+            from .repair_utils import _get_compute_client
+            versions = _get_compute_client(self.cli_ctx).virtual_machine_images.list(location, publisher, offer, sku)
+            entry = {'created': time.time(), 'urns': ['{}:{}'.format(image, version.name) for version in versions]}
+            self._update(location, lambda data: data.setdefault('images', {}).__setitem__(image, entry))
+        return entry['urns']
+
+    def refresh_skus(self):
+        """ Lists the VM sizes of all the locations, returns the locations listed """
+        from .repair_utils import _get_compute_client
+        logger.info('Fetching the VM sizes of all locations...')
+        created = time.time()
+        locations = {}
+        for sku in _get_compute_client(self.cli_ctx).resource_skus.list():
+            if sku.resource_type != 'virtualMachines':
+                continue
+            for location in sku.locations or []:
+                skus = locations.setdefault(location.lower(), [])
+                entry = _sku_to_entry(sku, location)
+                entry['order'] = len(skus)
+                skus.append(entry)
+
+        def _set_skus(skus):
+            return lambda data: data.__setitem__('skus', {'created': created, 'items': skus})
+
+        for location, skus in locations.items():
+            self._update(location, _set_skus(skus))
+        return sorted(locations)
+
+    def list_image_locations(self):
+        """ Returns the locations with image urns in the catalog """
+        if not os.path.isdir(self.path):
+            return []
+        locations = sorted(os.path.splitext(name)[0] for name in os.listdir(self.path) if name.endswith('.json'))
+        return [location for location in locations if self._load(location).get('images')]
+
+    def _get_skus(self, location):
+        data = self._load(location)
+        if 'skus' not in data or self._is_expired(data['skus']):
+            self.refresh_skus()
+            data = self._load(location)
+        return data.get('skus', {}).get('items', [])
+
+    def _is_expired(self, entry):
+        return time.time() - entry['created'] > self.ttl
+
+    def _load(self, location):
+        location = location.lower()
+        with _catalog_lock:
+            if location not in self.locations:
+                try:
+                    with open(self._get_location_path(location), 'r') as f:
+                        data = json.load(f)
+                except (IOError, OSError, ValueError):
+                    data = {}
+                self._set_location(location, data)
+            return self.locations[location]
+
+    def _update(self, location, update):
+        """ Applies the update to the location file, which other commands may have changed since it was loaded """
+        location = location.lower()
+        with _catalog_lock:
+            self.locations.pop(location, None)
+            data = self._load(location)
+            update(data)
+            self._set_location(location, data)
+            location_path = self._get_location_path(location)
+            temp_path = '{}.{}.{}.tmp'.format(location_path, os.getpid(), threading.current_thread().ident)
+            try:
+                if not os.path.isdir(self.path):
+                    os.makedirs(self.path)
+                with open(temp_path, 'w') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.replace(temp_path, location_path)
+            except (IOError, OSError) as e:
+                logger.debug('Failed to save the VM repair catalog: %s', e)
+
+    def _set_location(self, location, data):
+        self.locations[location] = data
+        self.index = {key: entries for key, entries in self.index.items() if key[0] != location}
+        for sku in data.get('skus', {}).get('items', []):
+            key = (location, sku['family'].lower(), sku['vCPUs'], sku['restricted'])
+            self.index.setdefault(key, []).append(sku)
+
+    def _get_location_path(self, location):
+        return os.path.join(self.path, location + '.json')
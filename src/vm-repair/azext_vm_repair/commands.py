@@ -15,3 +15,4 @@ def load_command_table(self, _):
         g.custom_command('restore', 'restore', validator=validate_restore)
         g.custom_command('run', 'run', validator=validate_run)
         g.custom_command('list-scripts', 'list_scripts')
+        g.custom_command('refresh-catalog', 'refresh_catalog')
@@ -9,18 +9,25 @@ import timeit
 import os
 import pkgutil
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
 from knack.log import get_logger
 
 from azure.cli.command_modules.vm.custom import get_vm, _is_linux_os
 from azure.cli.command_modules.storage.storage_url_helpers import StorageResourceIdentifier
+from msrestazure.azure_exceptions import CloudError
 from msrestazure.tools import parse_resource_id
 
+from .catalog import RepairCatalog
 from .command_helper_class import command_helper
 from .repair_utils import (
     _uses_managed_disk,
     _call_az_command,
     _clean_up_resources,
+    _create_resource_group,
+    _copy_managed_disk,
+    _delete_managed_disk,
+    _attach_managed_disk,
     _fetch_compatible_sku,
     _list_resource_ids_in_rg,
     _get_repair_resource_tag,
@@ -31,7 +38,7 @@ from .repair_utils import (
     _process_bash_parameters,
     _parse_run_script_raw_logs,
     _check_script_succeeded,
-    _fetch_disk_info
+    WINDOWS_REPAIR_IMAGE
 )
 from .exceptions import AzCommandError, SkuNotAvailableError, UnmanagedDiskCopyError, WindowsOsNotAvailableError, RunScriptNotFoundForIdError
 
@@ -42,6 +49,12 @@ def create(cmd, vm_name, resource_group_name, repair_password=None, repair_usern
 
     # Init command helper object
     command = command_helper(logger, cmd, 'vm repair create')
+    # Steps that don't depend on each other run concurrently
+    executor = ThreadPoolExecutor(max_workers=4)
+    copy_disk_future = None
+    # The steps creating resources in the repair resource group, which are awaited before it is deleted
+    repair_futures = []
+    interrupted = False
 
     # Main command calling block
     try:
@@ -56,52 +69,45 @@ def create(cmd, vm_name, resource_group_name, repair_password=None, repair_usern
         # List of created resouces
         created_resources = []
 
-        # Fetch OS image urn and set OS type for disk create
+        # Create new resource group
+        logger.info('Creating resource group for repair VM and its resources...')
+        resource_group_future = executor.submit(_create_resource_group, cmd, repair_group_name, source_vm.location)
+        repair_futures.append(resource_group_future)
+
+        # Copy the OS disk while the repair VM is set up, only attaching it waits for the copy
+        if is_managed:
+            logger.info('Source VM uses managed disks. Creating repair VM with managed disks.\n')
+            copy_disk_future = executor.submit(_copy_managed_disk, cmd, resource_group_name, target_disk_name, copy_disk_name)
+
+        # fetch VM size of repair VM
+        sku_future = executor.submit(_fetch_compatible_sku, cmd, source_vm)
+
+        # Fetch OS image urn
         if is_linux:
             os_image_urn = "UbuntuLTS"
-            os_type = 'Linux'
         else:
-            os_image_urn = _fetch_compatible_windows_os_urn(source_vm)
-            os_type = 'Windows'
+            os_image_urn = executor.submit(_fetch_compatible_windows_os_urn, cmd, source_vm).result()
 
         # Set up base create vm command
         create_repair_vm_command = 'az vm create -g {g} -n {n} --tag {tag} --image {image} --admin-username {username} --admin-password {password}' \
                                    .format(g=repair_group_name, n=repair_vm_name, tag=resource_tag, image=os_image_urn, username=repair_username, password=repair_password)
-        # fetch VM size of repair VM
-        sku = _fetch_compatible_sku(source_vm)
+        sku = sku_future.result()
         if not sku:
             raise SkuNotAvailableError('Failed to find compatible VM size for source VM\'s OS disk within given region and subscription.')
         create_repair_vm_command += ' --size {sku}'.format(sku=sku)
-
-        # Create new resource group
-        create_resource_group_command = 'az group create -l {loc} -n {group_name}' \
-                                        .format(loc=source_vm.location, group_name=repair_group_name)
-        logger.info('Creating resource group for repair VM and its resources...')
-        _call_az_command(create_resource_group_command)
+        resource_group_future.result()
 
         # MANAGED DISK
         if is_managed:
-            logger.info('Source VM uses managed disks. Creating repair VM with managed disks.\n')
-
-            # Copy OS disk command
-            disk_sku, location, os_type, hyperV_generation = _fetch_disk_info(resource_group_name, target_disk_name)
-            copy_disk_command = 'az disk create -g {g} -n {n} --source {s} --sku {sku} --location {loc} --os-type {os_type} --hyper-v-generation {hyperV} --query id -o tsv' \
-                                .format(g=resource_group_name, n=copy_disk_name, s=target_disk_name, sku=disk_sku, loc=location, os_type=os_type, hyperV=hyperV_generation)
-            # Validate create vm create command to validate parameters before runnning copy disk command
-            validate_create_vm_command = create_repair_vm_command + ' --validate'
-
-            logger.info('Validating VM template before continuing...')
-            _call_az_command(validate_create_vm_command, secure_params=[repair_password, repair_username])
-            logger.info('Copying OS disk of source VM...')
-            copy_disk_id = _call_az_command(copy_disk_command).strip('\n')
-
-            attach_disk_command = 'az vm disk attach -g {g} --vm-name {repair} --name {id}' \
-                                  .format(g=repair_group_name, repair=repair_vm_name, id=copy_disk_id)
-
+            # The disk copy is deleted if the VM can't be created, so the VM template isn't validated beforehand
             logger.info('Creating repair VM...')
-            _call_az_command(create_repair_vm_command, secure_params=[repair_password, repair_username])
+            create_repair_vm_future = executor.submit(_call_az_command, create_repair_vm_command, secure_params=[repair_password, repair_username])
+            repair_futures.append(create_repair_vm_future)
+            copy_disk_id = copy_disk_future.result()
+            create_repair_vm_future.result()
+
             logger.info('Attaching copied disk to repair VM...')
-            _call_az_command(attach_disk_command)
+            _attach_managed_disk(cmd, repair_group_name, repair_vm_name, copy_disk_id)
         # UNMANAGED DISK
         else:
             logger.info('Source VM uses unmanaged disks. Creating repair VM with unmanaged disks.\n')
@@ -152,15 +158,16 @@ def create(cmd, vm_name, resource_group_name, repair_password=None, repair_usern
                                   .format(g=repair_group_name, disk_name=copy_disk_name, vm_name=repair_vm_name, uri=copy_disk_id)
             _call_az_command(attach_disk_command)
 
-        created_resources = _list_resource_ids_in_rg(repair_group_name)
+        created_resources = _list_resource_ids_in_rg(cmd.cli_ctx, repair_group_name)
         command.set_status_success()
 
     # Some error happened. Stop command and clean-up resources.
     except KeyboardInterrupt:
+        interrupted = True
         command.error_stack_trace = traceback.format_exc()
         command.error_message = "Command interrupted by user input."
         command.message = "Command interrupted by user input. Cleaning up resources."
-    except AzCommandError as azCommandError:
+    except (AzCommandError, CloudError) as azCommandError:
         command.error_stack_trace = traceback.format_exc()
         command.error_message = str(azCommandError)
         command.message = "Repair create failed. Cleaning up created resources."
@@ -181,6 +188,11 @@ def create(cmd, vm_name, resource_group_name, repair_password=None, repair_usern
         command.error_message = str(exception)
         command.message = 'An unexpected error occurred. Try running again with the --debug flag to debug.'
     finally:
+        # The steps which haven't started yet are cancelled, the ones still running aren't awaited here
+        for future in repair_futures + [copy_disk_future]:
+            if future is not None:
+                future.cancel()
+        executor.shutdown(wait=False)
         if command.error_stack_trace:
             logger.debug(command.error_stack_trace)
 
@@ -188,7 +200,13 @@ def create(cmd, vm_name, resource_group_name, repair_password=None, repair_usern
     if not command.is_status_success():
         command.set_status_error()
         return_dict = command.init_return_dict()
-        _clean_up_resources(repair_group_name, confirm=False)
+        # Otherwise a step still running could create resources after the resource group is deleted
+        if not all(future.done() for future in repair_futures):
+            logger.info('Waiting for the repair resources being created before cleaning up...')
+            wait(repair_futures)
+        _clean_up_resources(cmd.cli_ctx, repair_group_name, confirm=False)
+        if copy_disk_future is not None:
+            _clean_up_copied_disk(cmd, copy_disk_future, resource_group_name, copy_disk_name, interrupted)
     else:
         created_resources.append(copy_disk_id)
         command.message = 'Your repair VM \'{n}\' has been created in the resource group \'{repair_rg}\' with disk \'{d}\' attached as data disk. ' \
@@ -210,6 +228,24 @@ def create(cmd, vm_name, resource_group_name, repair_password=None, repair_usern
     return return_dict
 
 
+def _clean_up_copied_disk(cmd, copy_disk_future, resource_group_name, copy_disk_name, interrupted):
+    """ The copied disk is in the resource group of the source VM, so it isn't deleted with the repair resources """
+    if interrupted and not copy_disk_future.done():
+        logger.warning('The copy of the OS disk may still be in progress. Delete the disk \'%s\' in the resource group \'%s\' if it is created.', copy_disk_name, resource_group_name)
+        return
+    try:
+        copy_disk_future.result()
+    except Exception:
+        # The disk wasn't copied
+        return
+    logger.info('Deleting the copied disk \'%s\'...', copy_disk_name)
+    try:
+        _delete_managed_disk(cmd, resource_group_name, copy_disk_name)
+    except CloudError as cloudError:
+        logger.error(cloudError)
+        logger.error("Failed to delete the copied disk '%s'.", copy_disk_name)
+
+
 def restore(cmd, vm_name, resource_group_name, disk_name=None, repair_vm_id=None, yes=False):
 
     # Init command helper object
@@ -259,7 +295,7 @@ def restore(cmd, vm_name, resource_group_name, disk_name=None, repair_vm_id=None
             logger.info('Attaching repaired data disk to source VM as an OS disk...')
             _call_az_command(attach_unmanaged_command)
         # Clean
-        _clean_up_resources(repair_resource_group, confirm=not yes)
+        _clean_up_resources(cmd.cli_ctx, repair_resource_group, confirm=not yes)
         command.set_status_success()
     except KeyboardInterrupt:
         command.error_stack_trace = traceback.format_exc()
@@ -470,3 +506,45 @@ def list_scripts(cmd):
         return_dict['map'] = run_map
 
     return return_dict
+
+
+def refresh_catalog(cmd, locations=None):
+
+    # Init command helper object
+    command = command_helper(logger, cmd, 'vm repair refresh-catalog')
+
+    try:
+        # Everything is listed again, whatever its age
+        catalog = RepairCatalog(cmd.cli_ctx, ttl=0)
+        vm_size_locations = catalog.refresh_skus()
+
+        # Refresh the images of the given locations, or of the locations repair VMs were created in before
+        locations = sorted(set(location.lower() for location in locations)) if locations else catalog.list_image_locations()
+        executor = ThreadPoolExecutor(max_workers=max(1, min(len(locations), 8)))
+        try:
+            list(executor.map(lambda location: catalog.get_image_urns(location, *WINDOWS_REPAIR_IMAGE), locations))
+        finally:
+            executor.shutdown(wait=False)
+        command.set_status_success()
+    except CloudError as cloudError:
+        command.error_stack_trace = traceback.format_exc()
+        command.error_message = str(cloudError)
+        command.message = 'Failed to refresh the catalog of VM sizes and images.'
+    except Exception as exception:
+        command.error_stack_trace = traceback.format_exc()
+        command.error_message = str(exception)
+        command.message = 'An unexpected error occurred. Try running again with the --debug flag to debug.'
+    finally:
+        if command.error_stack_trace:
+            logger.debug(command.error_stack_trace)
+
+    if not command.is_status_success():
+        command.set_status_error()
+        return_dict = command.init_return_dict()
+    else:
+        command.message = 'The catalog of VM sizes and images used to create repair VMs has been refreshed.'
+        return_dict = command.init_return_dict()
+        return_dict['vm_size_locations'] = vm_size_locations
+        return_dict['image_locations'] = locations
+
+    return return_dict
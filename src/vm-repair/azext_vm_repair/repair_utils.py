@@ -7,16 +7,18 @@ import subprocess
 import shlex
 import os
 import re
-from json import loads
 import requests
 
 from knack.log import get_logger
 from knack.prompting import prompt_y_n, NoTTYException
 
+from .catalog import RepairCatalog
 from .exceptions import AzCommandError, WindowsOsNotAvailableError, RunScriptNotFoundForIdError
 # pylint: disable=line-too-long, deprecated-method
 
 REPAIR_MAP_URL = 'https://raw.githubusercontent.com/Azure/repair-script-library/master/map.json'
+# publisher, offer and sku of the image of Windows repair VMs
+WINDOWS_REPAIR_IMAGE = ('MicrosoftWindowsServer', 'WindowsServer', '2016-Datacenter')
 
 logger = get_logger(__name__)
 
@@ -92,12 +94,12 @@ def check_extension_version(extension_name):
     logger.debug('The extension with name %s does not exist within available extensions.', extension_name)
 
 
-def _clean_up_resources(resource_group_name, confirm):
+def _clean_up_resources(cli_ctx, resource_group_name, confirm):
 
     try:
         if confirm:
             message = 'The clean-up will remove the resource group \'{rg}\' and all repair resources within:\n\n{r}' \
-                      .format(rg=resource_group_name, r='\n'.join(_list_resource_ids_in_rg(resource_group_name)))
+                      .format(rg=resource_group_name, r='\n'.join(_list_resource_ids_in_rg(cli_ctx, resource_group_name)))
             logger.warning(message)
             if not prompt_y_n('Continue with clean-up and delete resources?'):
                 logger.warning('Skipping clean-up')
@@ -121,72 +123,108 @@ def _clean_up_resources(resource_group_name, confirm):
         logger.error("Clean up failed.")
 
 
-def _fetch_compatible_sku(source_vm):
+def _get_compute_client(cli_ctx):
+    from azure.cli.command_modules.vm._client_factory import _compute_client_factory
+    return _compute_client_factory(cli_ctx)
+
+
+def _get_resource_client(cli_ctx):
+    from azure.cli.command_modules.resource._client_factory import _resource_client_factory
+    return _resource_client_factory(cli_ctx)
+
+
+def _get_compute_models(cmd, *names):
+    from azure.cli.core.profiles import ResourceType
+    return cmd.get_models(*names, resource_type=ResourceType.MGMT_COMPUTE)
+
+
+def _create_resource_group(cmd, resource_group_name, location):
+    from azure.cli.core.profiles import ResourceType
+    ResourceGroup = cmd.get_models('ResourceGroup', resource_type=ResourceType.MGMT_RESOURCE_RESOURCES)
+    _get_resource_client(cmd.cli_ctx).resource_groups.create_or_update(resource_group_name, ResourceGroup(location=location))
+
+
+def _is_compatible_repair_sku(sku):
+    # TODO, premium IO only when needed
+    return 'standard_d' in sku['name'].lower() and \
+        sku['memoryGB'] <= 16 and \
+        sku['maxDataDiskCount'] > 0 and \
+        sku['premiumIO']
+
+
+def _fetch_compatible_sku(cmd, source_vm):
 
     location = source_vm.location
     source_vm_sku = source_vm.hardware_profile.vm_size
+    catalog = RepairCatalog(cmd.cli_ctx)
 
-    # First get the source_vm sku, if its available go with it
-    check_sku_command = 'az vm list-skus -s {sku} -l {loc} --query [].name -o tsv'.format(sku=source_vm_sku, loc=location)
-
+    # First check the source_vm sku, if its available go with it
     logger.info('Checking if source VM size is available...')
-    sku_check = _call_az_command(check_sku_command).strip('\n')
-
-    if sku_check:
+    source_sku = catalog.get_sku(location, source_vm_sku)
+    if source_sku and not source_sku['restricted']:
         logger.info('Source VM size \'%s\' is available. Using it to create repair VM.\n', source_vm_sku)
         return source_vm_sku
 
     logger.info('Source VM size: \'%s\' is NOT available.\n', source_vm_sku)
 
-    # List available standard SKUs
-    # TODO, premium IO only when needed
-    list_sku_command = 'az vm list-skus -s standard_d -l {loc} --query ' \
-                       '"[?capabilities[?name==\'vCPUs\' && to_number(value)<= to_number(\'4\')] && ' \
-                       'capabilities[?name==\'MemoryGB\' && to_number(value)<=to_number(\'16\')] && ' \
-                       'capabilities[?name==\'MaxDataDiskCount\' && to_number(value)>to_number(\'0\')] && ' \
-                       'capabilities[?name==\'PremiumIO\' && value==\'True\']].name" -o json'\
-                       .format(loc=location)
-
+    # Otherwise use the first available standard SKU
     logger.info('Fetching available VM sizes for repair VM...')
-    sku_list = loads(_call_az_command(list_sku_command).strip('\n'))
-
+    sku_list = [sku['name'] for sku in catalog.find_skus(location, max_vcpus=4) if _is_compatible_repair_sku(sku)]
     if sku_list:
         return sku_list[0]
 
     return None
 
 
-def _fetch_disk_info(resource_group_name, disk_name):
-    """ Returns sku, location, os_type, hyperVgeneration as tuples """
-    show_disk_command = 'az disk show -g {g} -n {name} --query [sku.name,location,osType,hyperVgeneration] -o json'.format(g=resource_group_name, name=disk_name)
-    disk_info = loads(_call_az_command(show_disk_command))
-    # Note that disk_info will always have 4 elements if the command succeeded, if it fails it will cause an exception
-    sku, location, os_type, hyper_v_version = disk_info[0], disk_info[1], disk_info[2], disk_info[3]
-    return (sku, location, os_type, hyper_v_version)
+def _copy_managed_disk(cmd, resource_group_name, disk_name, copy_disk_name):
+    """ Copies the disk with its sku, location, os type and hyperV generation, returns the id of the copy """
+    Disk, DiskSku, CreationData = _get_compute_models(cmd, 'Disk', 'DiskSku', 'CreationData')
+    compute_client = _get_compute_client(cmd.cli_ctx)
+    source_disk = compute_client.disks.get(resource_group_name, disk_name)
+    copy_disk = Disk(location=source_disk.location, sku=DiskSku(name=source_disk.sku.name), os_type=source_disk.os_type,
+                     hyper_v_generation=source_disk.hyper_v_generation,
+                     creation_data=CreationData(create_option='Copy', source_resource_id=source_disk.id))
+    logger.info('Copying OS disk of source VM...')
+    return compute_client.disks.create_or_update(resource_group_name, copy_disk_name, copy_disk).result().id
+
+
+def _delete_managed_disk(cmd, resource_group_name, disk_name):
+    # like --no-wait, the deletion isn't awaited
+    _get_compute_client(cmd.cli_ctx).disks.delete(resource_group_name, disk_name)
+
+
+def _attach_managed_disk(cmd, resource_group_name, vm_name, disk_id):
+    """ Attaches the disk to the VM as a data disk on the first free lun """
+    DataDisk, ManagedDiskParameters = _get_compute_models(cmd, 'DataDisk', 'ManagedDiskParameters')
+    compute_client = _get_compute_client(cmd.cli_ctx)
+    vm = compute_client.virtual_machines.get(resource_group_name, vm_name)
+    luns = [disk.lun for disk in vm.storage_profile.data_disks or []]
+    lun = next(lun for lun in range(len(luns) + 1) if lun not in luns)
+    vm.storage_profile.data_disks = (vm.storage_profile.data_disks or []) + [
+        DataDisk(lun=lun, create_option='Attach', managed_disk=ManagedDiskParameters(id=disk_id))]
+    # the VM can't be updated with its extensions in the resources
+    vm.resources = None
+    compute_client.virtual_machines.create_or_update(resource_group_name, vm_name, vm).result()
 
 
 def _get_repair_resource_tag(resource_group_name, source_vm_name):
     return 'repair_source={rg}/{vm_name}'.format(rg=resource_group_name, vm_name=source_vm_name)
 
 
-def _list_resource_ids_in_rg(resource_group_name):
-    get_resources_command = 'az resource list --resource-group {rg} --query [].id -o json' \
-                            .format(rg=resource_group_name)
+def _list_resource_ids_in_rg(cli_ctx, resource_group_name):
     logger.debug('Fetching resources in resource group...')
-    ids = loads(_call_az_command(get_resources_command))
-    return ids
+    return [resource.id for resource in _get_resource_client(cli_ctx).resources.list_by_resource_group(resource_group_name)]
 
 
 def _uses_encrypted_disk(vm):
     return vm.storage_profile.os_disk.encryption_settings
 
 
-def _fetch_compatible_windows_os_urn(source_vm):
+def _fetch_compatible_windows_os_urn(cmd, source_vm):
 
     location = source_vm.location
-    fetch_urn_command = 'az vm image list -s "2016-Datacenter" -f WindowsServer -p MicrosoftWindowsServer -l {loc} --verbose --all --query "[?sku==\'2016-Datacenter\'].urn | reverse(sort(@))" -o json'.format(loc=location)
     logger.info('Fetching compatible Windows OS images from gallery...')
-    urns = loads(_call_az_command(fetch_urn_command))
+    urns = sorted(RepairCatalog(cmd.cli_ctx).get_image_urns(location, *WINDOWS_REPAIR_IMAGE), reverse=True)
 
     # No OS images available for Windows2016
     if not urns:
@@ -0,0 +1,129 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from azext_vm_repair.catalog import RepairCatalog, CATALOG_DIR_NAME
+
+
+class _Named(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _sku(name, family, vcpus, locations, restricted_locations=(), resource_type='virtualMachines'):
+    restrictions = [_Named(type='Location', values=list(restricted_locations))] if restricted_locations else None
+    return _Named(name=name, family=family, resource_type=resource_type, locations=locations,
+                  restrictions=restrictions,
+                  capabilities=[_Named(name='vCPUs', value=str(vcpus)), _Named(name='MemoryGB', value='8')])
+
+
+SKUS = [
+    _sku('Standard_D2s_v3', 'standardDSv3Family', 2, ['eastus', 'westus']),
+    _sku('Standard_D4s_v3', 'standardDSv3Family', 4, ['eastus']),
+    _sku('Standard_D8s_v3', 'standardDSv3Family', 8, ['eastus']),
+    _sku('Standard_B2s', 'standardBSFamily', 2, ['EastUS'], restricted_locations=['eastus']),
+    _sku('Premium_LRS', None, 0, ['eastus'], resource_type='disks'),
+]
+
+
+class _FakeComputeClient(object):  # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.sku_lists = 0
+        self.image_lists = []
+        self.resource_skus = _Named(list=self._list_skus)
+        self.virtual_machine_images = _Named(list=self._list_images)
+
+    def _list_skus(self):
+        self.sku_lists += 1
+        return iter(SKUS)
+
+    def _list_images(self, location, publisher, offer, sku):
+        self.image_lists.append((location, publisher, offer, sku))
+        return [_Named(name='1.0.0'), _Named(name='1.0.1')]
+
+
+class TestRepairCatalog(unittest.TestCase):
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.cli_ctx = _Named(config=_Named(config_dir=self.config_dir))
+        self.client = _FakeComputeClient()
+        patches = [
+            mock.patch('azure.cli.core.commands.client_factory.get_subscription_id', return_value='sub'),
+            mock.patch('azext_vm_repair.repair_utils._get_compute_client', return_value=self.client)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.config_dir)
+
+    def _read_location(self, location):
+        with open(os.path.join(self.config_dir, CATALOG_DIR_NAME, 'sub', location + '.json'), 'r') as f:
+            return json.load(f)
+
+    def test_find_skus(self):
+        catalog = RepairCatalog(self.cli_ctx)
+
+        def _names(skus):
+            return [sku['name'] for sku in skus]
+
+        self.assertEqual(_names(catalog.find_skus('eastus')), ['Standard_D2s_v3', 'Standard_D4s_v3', 'Standard_D8s_v3'])
+        self.assertEqual(_names(catalog.find_skus('EastUS', family='standardDSv3Family', max_vcpus=4)),
+                         ['Standard_D2s_v3', 'Standard_D4s_v3'])
+        self.assertEqual(_names(catalog.find_skus('eastus', restricted=True)), ['Standard_B2s'])
+        self.assertEqual(_names(catalog.find_skus('westus', max_vcpus=1)), [])
+        self.assertEqual(catalog.get_sku('westus', 'standard_d2s_v3')['vCPUs'], 2)
+        self.assertIsNone(catalog.get_sku('westus', 'Standard_D4s_v3'))
+        # the VM sizes of all the locations are listed at once
+        self.assertEqual(self.client.sku_lists, 1)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.config_dir, CATALOG_DIR_NAME, 'sub'))),
+                         ['eastus.json', 'westus.json'])
+
+    def test_expired_entries_are_listed_again(self):
+        RepairCatalog(self.cli_ctx).find_skus('eastus')
+        RepairCatalog(self.cli_ctx).find_skus('eastus')
+        self.assertEqual(self.client.sku_lists, 1)
+
+        catalog = RepairCatalog(self.cli_ctx, ttl=-1)
+        catalog.find_skus('eastus')
+        self.assertEqual(self.client.sku_lists, 2)
+
+        urns = catalog.get_image_urns('eastus', 'Canonical', 'UbuntuServer', '18.04-LTS')
+        self.assertEqual(urns, ['Canonical:UbuntuServer:18.04-LTS:1.0.0', 'Canonical:UbuntuServer:18.04-LTS:1.0.1'])
+        catalog.get_image_urns('eastus', 'Canonical', 'UbuntuServer', '18.04-LTS')
+        self.assertEqual(len(self.client.image_lists), 2)
+
+        catalog = RepairCatalog(self.cli_ctx)
+        self.assertEqual(catalog.get_image_urns('eastus', 'Canonical', 'UbuntuServer', '18.04-LTS'), urns)
+        self.assertEqual(len(self.client.image_lists), 2)
+
+    def test_update_merges_changes_of_other_catalogs(self):
+        first = RepairCatalog(self.cli_ctx)
+        second = RepairCatalog(self.cli_ctx)
+        first.get_image_urns('eastus', 'Canonical', 'UbuntuServer', '18.04-LTS')
+        second.find_skus('eastus')
+        # the location loaded by the first catalog has no VM sizes yet
+        first.get_image_urns('eastus', 'MicrosoftWindowsServer', 'WindowsServer', '2016-Datacenter')
+
+        data = self._read_location('eastus')
+        self.assertEqual(len(data['skus']['items']), 4)
+        self.assertEqual(sorted(data['images']),
+                         ['Canonical:UbuntuServer:18.04-LTS', 'MicrosoftWindowsServer:WindowsServer:2016-Datacenter'])
+        self.assertEqual(len(first.find_skus('eastus')), 3)
+        self.assertEqual(self.client.sku_lists, 1)
+        self.assertEqual(RepairCatalog(self.cli_ctx).list_image_locations(), ['eastus'])
+        self.assertFalse([name for name in os.listdir(os.path.join(self.config_dir, CATALOG_DIR_NAME, 'sub'))
+                          if name.endswith('.tmp')])
+
+if __name__ == '__main__':
+    unittest.main()
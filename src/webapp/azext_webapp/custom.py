@@ -263,7 +263,10 @@ def create_tunnel(cmd, resource_group_name, name, port=None, slot=None):
     profiles = list_publish_profiles(cmd, resource_group_name, name, slot)
     user_name = next(p['userName'] for p in profiles)
     user_password = next(p['userPWD'] for p in profiles)
+    import sys
     import threading
+    if sys.version_info < (3, 5):
+        raise CLIError('remote-connection requires Python 3.5 or later')
     from .tunnel import TunnelServer
 
     if port is None:
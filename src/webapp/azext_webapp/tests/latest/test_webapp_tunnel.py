@@ -0,0 +1,202 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import asyncio
+import base64
+import hashlib
+import struct
+import unittest
+
+from azext_webapp.tunnel import (_LocalConnection, _WebSocketConnection, _mask, TunnelStats, _WEBSOCKET_GUID,
+                                 _OPCODE_BINARY, _OPCODE_CLOSE, _OPCODE_PING, _OPCODE_PONG, BUFFER_SIZE)
+
+
+class _FakeTransport(object):
+    """ a transport which keeps the data written, like a transport which can't send it right away """
+
+    def __init__(self):
+        self.written = []
+        self.reading = True
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def writelines(self, lines):
+        self.written.extend(lines)
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def pause_reading(self):
+        self.reading = False
+
+    def resume_reading(self):
+        self.reading = True
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        pass
+
+    def get_extra_info(self, name, default=None):  # pylint: disable=unused-argument
+        return default
+
+
+class _FakeServer(object):
+    def __init__(self, loop):
+        self.loop = loop
+        self.stats = TunnelStats()
+        self.index = 0
+
+    def next_index(self):
+        self.index += 1
+        return self.index
+
+    def connection_made(self, local):
+        pass
+
+    def connection_lost(self, local):
+        pass
+
+
+def _server_frame(opcode, payload, mask_key=None):
+    frame = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask_key else 0
+    if len(payload) < 126:
+        frame.append(mask_bit | len(payload))
+    elif len(payload) < 65536:
+        frame.append(mask_bit | 126)
+        frame.extend(struct.pack('!H', len(payload)))
+    else:
+        frame.append(mask_bit | 127)
+        frame.extend(struct.pack('!Q', len(payload)))
+    if mask_key:
+        frame.extend(mask_key)
+        payload = _mask(mask_key, payload)
+    return bytes(frame + payload)
+
+
+def _parse_client_frames(data):
+    """ returns the (opcode, payload) of the masked frames in the data """
+    frames = []
+    while data:
+        if not data[1] & 0x80:
+            raise AssertionError('the frames of a client must be masked')
+        length, offset = data[1] & 0x7F, 2
+        if length == 126:
+            length, offset = struct.unpack_from('!H', data, 2)[0], 4
+        elif length == 127:
+            length, offset = struct.unpack_from('!Q', data, 2)[0], 10
+        mask_key = data[offset:offset + 4]
+        frames.append((data[0] & 0x0F, _mask(mask_key, data[offset + 4:offset + 4 + length])))
+        data = data[offset + 4 + length:]
+    return frames
+
+
+def _feed(protocol, data, chunk_size):
+    for start in range(0, len(data), chunk_size):
+        protocol.data_received(data[start:start + chunk_size])
+
+
+class TestWebSocketMask(unittest.TestCase):
+    def test_mask(self):
+        self.assertEqual(_mask(b'\x01\x02\x03\x04', b'\x00' * 6), b'\x01\x02\x03\x04\x01\x02')
+        self.assertEqual(_mask(b'\x01\x02\x03\x04', b''), b'')
+        data = bytes(bytearray(range(256))) * 3
+        masked = _mask(b'\xde\xad\xbe\xef', memoryview(data))
+        self.assertNotEqual(masked, data)
+        self.assertEqual(_mask(b'\xde\xad\xbe\xef', masked), data)
+
+
+class TestTunnelConnection(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = _FakeServer(self.loop)
+        self.local = _LocalConnection(self.server)
+        self.local.connection_made(_FakeTransport())
+        self.websocket = _WebSocketConnection(self.server, self.local, 'app.scm.azurewebsites.net', 'auth')
+        self.websocket.connection_made(_FakeTransport())
+        self.local.websocket = self.websocket
+
+    def tearDown(self):
+        if self.websocket.ping_handle is not None:
+            self.websocket.ping_handle.cancel()
+        self.loop.close()
+
+    def _open(self):
+        accept = base64.b64encode(hashlib.sha1((self.websocket.key + _WEBSOCKET_GUID).encode('utf-8')).digest())
+        self.websocket.transport.written = []
+        self.websocket.data_received(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                                     b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        self.assertTrue(self.websocket.handshake.done())
+        self.assertIs(self.websocket.handshake.result(), self.websocket)
+
+    def _received(self):
+        return b''.join(bytes(data) for data in self.local.transport.written)
+
+    def test_handshake_rejected(self):
+        self.websocket.data_received(b'HTTP/1.1 401 Unauthorized\r\nContent-Length: 0\r\n\r\n')
+        self.assertIsNotNone(self.websocket.handshake.exception())
+        self.assertFalse(self.websocket.is_open)
+        self.assertTrue(self.websocket.transport.closed)
+
+    def test_frames_are_parsed(self):
+        self._open()
+        payloads = [b'a' * 5, b'b' * 200, b'c' * 70000, bytes(bytearray(range(256))) * 1200]
+        data = b''.join(_server_frame(_OPCODE_BINARY, payload) for payload in payloads)
+        data += _server_frame(_OPCODE_BINARY, b'masked', mask_key=b'\x01\x02\x03\x04')
+        # the frames arrive split at arbitrary points, and the last one doesn't fit in the initial buffer
+        _feed(self.websocket, data, 1000)
+
+        self.assertEqual(self._received(), b''.join(payloads) + b'masked')
+        self.assertEqual(self.server.stats.bytes_received, len(self._received()))
+        self.assertGreater(len(payloads[-1]), BUFFER_SIZE * 2)
+
+    def test_written_data_is_not_overwritten(self):
+        self._open()
+        # every frame is read into the start of the buffer, while the local transport still holds the one before
+        for payload in (b'first', b'second', b'third'):
+            self.websocket.data_received(_server_frame(_OPCODE_BINARY, payload))
+        self.assertEqual([bytes(data) for data in self.local.transport.written], [b'first', b'second', b'third'])
+
+    def test_control_frames(self):
+        self._open()
+        self.websocket.data_received(_server_frame(_OPCODE_PING, b'ping'))
+        self.assertEqual(_parse_client_frames(b''.join(self.websocket.transport.written)), [(_OPCODE_PONG, b'ping')])
+
+        self.websocket.transport.written = []
+        self.websocket.data_received(_server_frame(_OPCODE_CLOSE, b''))
+        self.assertEqual([opcode for opcode, _ in _parse_client_frames(b''.join(self.websocket.transport.written))],
+                         [_OPCODE_CLOSE])
+        self.assertTrue(self.websocket.transport.closed)
+        self.assertEqual(self._received(), b'')
+
+    def test_local_data_is_sent_masked(self):
+        self._open()
+        for payload in (b'x' * 10, b'y' * 1000, b'z' * 65536):
+            _feed(self.local, payload, len(payload))
+        frames = _parse_client_frames(b''.join(self.websocket.transport.written))
+        self.assertEqual(frames, [(_OPCODE_BINARY, b'x' * 10), (_OPCODE_BINARY, b'y' * 1000),
+                                  (_OPCODE_BINARY, b'z' * 65536)])
+        self.assertEqual(self.local.bytes_sent, 66546)
+
+    def test_backpressure(self):
+        self._open()
+        self.local.pause_writing()
+        self.assertFalse(self.websocket.transport.reading)
+        self.local.resume_writing()
+        self.assertTrue(self.websocket.transport.reading)
+
+        self.local.transport.resume_reading()
+        self.websocket.pause_writing()
+        self.assertFalse(self.local.transport.reading)
+        self.websocket.resume_writing()
+        self.assertTrue(self.local.transport.reading)
+
+
+if __name__ == '__main__':
+    unittest.main()
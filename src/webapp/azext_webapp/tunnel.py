@@ -4,38 +4,347 @@
 # --------------------------------------------------------------------------------------------
 
 # pylint: disable=import-error,unused-import
-import sys
+import asyncio
+import base64
+import hashlib
+import os
 import ssl
 import socket
+import struct
 import time
-import traceback
-import logging as logs
 from contextlib import closing
-from datetime import datetime
-from threading import Thread
-
-import websocket
-from websocket import create_connection, WebSocket
 
 from knack.util import CLIError
 from knack.log import get_logger
 logger = get_logger(__name__)
 
+# the size of the buffers the data is read into, which are reused for every read
+BUFFER_SIZE = 64 * 1024
+# reading from one side of a connection pauses while this much data waits to be sent to the other side
+WRITE_BUFFER_LIMIT = 1024 * 1024
+# websockets without traffic are pinged to keep them open, and closed if they don't answer
+PING_INTERVAL = 60
+PING_TIMEOUT = 30
+TUNNEL_PATH = '/AppServiceTunnel/Tunnel.ashx'
+
+_WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_OPCODE_CONTINUATION = 0x0
+_OPCODE_TEXT = 0x1
+_OPCODE_BINARY = 0x2
+_OPCODE_CLOSE = 0x8
+_OPCODE_PING = 0x9
+_OPCODE_PONG = 0xA
+_CLOSE_NORMAL = struct.pack('!H', 1000)
+
+# reading into a buffer of the protocol is only available since Python 3.7
+_BaseProtocol = getattr(asyncio, 'BufferedProtocol', asyncio.Protocol)
+
+
+def _mask(mask_key, data):
+    """ masks the data with the key, as the websocket protocol requires for the frames clients send """
+    length = len(data)
+    if not length:
+        return b''
+    mask = (mask_key * (length // 4 + 1))[:length]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(mask, 'big')).to_bytes(length, 'big')
+
+
+def _set_no_delay(transport):
+    sock = transport.get_extra_info('socket')
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class TunnelStats(object):
+    """ counters of the connections of the tunnel """
+
+    def __init__(self):
+        self.connections = 0
+        self.active_connections = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connect_time_total = 0.0
+        self.connect_time_max = 0.0
+        self.ping_time = None
+
+    def add_connect_time(self, connect_time):
+        self.connect_time_total += connect_time
+        self.connect_time_max = max(self.connect_time_max, connect_time)
+
+    def to_dict(self):
+        connected = self.connections or 1
+        return {
+            'connections': self.connections,
+            'activeConnections': self.active_connections,
+            'bytesSent': self.bytes_sent,
+            'bytesReceived': self.bytes_received,
+            'averageConnectMs': int(self.connect_time_total * 1000 / connected),
+            'maxConnectMs': int(self.connect_time_max * 1000),
+            'pingMs': int(self.ping_time * 1000) if self.ping_time is not None else None
+        }
+
+
+class _BufferedProtocol(_BaseProtocol):
+    """ a protocol reading into its own reusable buffer """
 
-class TunnelWebSocket(WebSocket):
-    def recv_frame(self):
-        frame = super(TunnelWebSocket, self).recv_frame()
-        logger.info('Received frame: %s', frame)
-        return frame
+    def __init__(self, size=BUFFER_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
 
-    def recv(self):
-        data = super(TunnelWebSocket, self).recv()
-        logger.info('Received websocket data: %s', data)
-        return data
+    def get_buffer(self, sizehint):
+        raise NotImplementedError()
+
+    def buffer_updated(self, nbytes):
+        raise NotImplementedError()
+
+    def data_received(self, data):
+        # before Python 3.7 the data is passed in instead of being read into get_buffer
+        data = memoryview(data)
+        while data:
+            buf = self.get_buffer(len(data))
+            nbytes = min(len(buf), len(data))
+            buf[:nbytes] = data[:nbytes]
+            data = data[nbytes:]
+            self.buffer_updated(nbytes)
+
+
+class _LocalConnection(_BufferedProtocol):
+    """ a connection of a local client, forwarded through its own websocket """
+
+    def __init__(self, server):
+        super(_LocalConnection, self).__init__()
+        self.server = server
+        self.index = server.next_index()
+        self.transport = None
+        self.websocket = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        _set_no_delay(transport)
+        transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT)
+        # nothing is read until the websocket is connected
+        transport.pause_reading()
+        self.server.connection_made(self)
+
+    def get_buffer(self, sizehint):
+        return self.view
+
+    def buffer_updated(self, nbytes):
+        # the data is masked into a new buffer when it is sent, so the buffer can be read into again right away
+        self.websocket.send_binary(self.view[:nbytes])
+        self.bytes_sent += nbytes
+        self.server.stats.bytes_sent += nbytes
+
+    def write(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+            self.bytes_received += len(data)
+            self.server.stats.bytes_received += len(data)
+
+    def close(self):
+        if not self.transport.is_closing():
+            self.transport.close()
+
+    def pause_writing(self):
+        if self.websocket is not None:
+            self.websocket.transport.pause_reading()
+
+    def resume_writing(self):
+        if self.websocket is not None:
+            self.websocket.transport.resume_reading()
+
+    def eof_received(self):
+        return False
+
+    def connection_lost(self, exc):
+        if self.websocket is not None:
+            self.websocket.close()
+        self.server.connection_lost(self)
+
+
+class _WebSocketConnection(_BufferedProtocol):  # pylint: disable=too-many-instance-attributes
+    """ the client side of a websocket, forwarding the data it receives to a local connection """
+
+    def __init__(self, server, local, host, basic_auth):
+        super(_WebSocketConnection, self).__init__(BUFFER_SIZE * 2)
+        self.server = server
+        self.local = local
+        self.host = host
+        self.basic_auth = basic_auth
+        self.key = base64.b64encode(os.urandom(16)).decode('utf-8')
+        self.transport = None
+        self.handshake = server.loop.create_future()
+        self.is_open = False
+        self.is_closing = False
+        self.start = 0
+        self.end = 0
+        self.last_activity = time.time()
+        self.ping_sent = None
+        self.ping_handle = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        _set_no_delay(transport)
+        transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT)
+        request = ('GET {} HTTP/1.1\r\n'
+                   'Host: {}\r\n'
+                   'Upgrade: websocket\r\n'
+                   'Connection: Upgrade\r\n'
+                   'Sec-WebSocket-Key: {}\r\n'
+                   'Sec-WebSocket-Version: 13\r\n'
+                   'Authorization: Basic {}\r\n\r\n').format(TUNNEL_PATH, self.host, self.key, self.basic_auth)
+        transport.write(request.encode('utf-8'))
+
+    def get_buffer(self, sizehint):
+        if self.end == len(self.buffer):
+            unread = self.end - self.start
+            if self.start:
+                # move the start of the frame being received to the start of the buffer
+                self.buffer[:unread] = self.buffer[self.start:self.end]
+            else:
+                # the frame doesn't fit in the buffer
+                buf = bytearray(len(self.buffer) * 2)
+                buf[:unread] = self.buffer[self.start:self.end]
+                self.buffer = buf
+                self.view = memoryview(buf)
+            self.start, self.end = 0, unread
+        return self.view[self.end:]
+
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+        self.last_activity = time.time()
+        if not self.is_open:
+            self._read_handshake()
+        if self.is_open:
+            self._read_frames()
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def send_binary(self, data):
+        self._send_frame(_OPCODE_BINARY, data)
+
+    def close(self):
+        if self.is_open and not self.is_closing and not self.transport.is_closing():
+            self._send_frame(_OPCODE_CLOSE, _CLOSE_NORMAL)
+        self.is_closing = True
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.close()
+
+    def pause_writing(self):
+        self.local.transport.pause_reading()
+
+    def resume_writing(self):
+        self.local.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        if self.ping_handle is not None:
+            self.ping_handle.cancel()
+        if not self.handshake.done():
+            self.handshake.set_exception(exc or CLIError('The connection closed during the websocket handshake'))
+        self.local.close()
+
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        header = bytearray([0x80 | opcode])
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 65536:
+            header.append(0x80 | 126)
+            header.extend(struct.pack('!H', length))
+        else:
+            header.append(0x80 | 127)
+            header.extend(struct.pack('!Q', length))
+        mask_key = os.urandom(4)
+        header.extend(mask_key)
+        self.transport.writelines([header, _mask(mask_key, payload)])
+        self.last_activity = time.time()
+
+    def _read_handshake(self):
+        header_end = self.buffer.find(b'\r\n\r\n', self.start, self.end)
+        if header_end < 0:
+            return
+        lines = bytes(self.buffer[self.start:header_end]).decode('latin-1').split('\r\n')
+        self.start = header_end + 4
+        status = lines[0].split(' ', 2)
+        headers = dict((name.strip().lower(), value.strip())
+                       for name, value in (line.split(':', 1) for line in lines[1:] if ':' in line))
+        accept = base64.b64encode(hashlib.sha1((self.key + _WEBSOCKET_GUID).encode('utf-8')).digest()).decode('utf-8')
+        if len(status) < 2 or status[1] != '101' or headers.get('sec-websocket-accept') != accept:
+            self.handshake.set_exception(CLIError('Failed to connect the websocket: {}'.format(lines[0])))
+            self.transport.close()
+            return
+        self.is_open = True
+        self.handshake.set_result(self)
+        self._schedule_ping()
+
+    def _read_frames(self):
+        while self.end - self.start >= 2:
+            second_byte = self.buffer[self.start + 1]
+            length = second_byte & 0x7F
+            header_length = 2
+            if length == 126:
+                header_length = 4
+            elif length == 127:
+                header_length = 10
+            masked = second_byte & 0x80
+            if masked:
+                header_length += 4
+            if self.end - self.start < header_length:
+                return
+            if length == 126:
+                length = struct.unpack_from('!H', self.buffer, self.start + 2)[0]
+            elif length == 127:
+                length = struct.unpack_from('!Q', self.buffer, self.start + 2)[0]
+            frame_end = self.start + header_length + length
+            if frame_end > self.end:
+                return
+
+            opcode = self.buffer[self.start] & 0x0F
+            payload = self.view[self.start + header_length:frame_end]
+            if masked:
+                # servers don't mask their frames, but nothing forbids it
+                payload = _mask(bytes(self.buffer[self.start + header_length - 4:self.start + header_length]), payload)
+            self.start = frame_end
+            self._frame_received(opcode, payload)
+
+    def _frame_received(self, opcode, payload):
+        if opcode in (_OPCODE_BINARY, _OPCODE_TEXT, _OPCODE_CONTINUATION):
+            # the transport may keep the data it can't send right away, while the buffer is read into again
+            self.local.write(bytes(payload))
+        elif opcode == _OPCODE_PING:
+            self._send_frame(_OPCODE_PONG, payload)
+        elif opcode == _OPCODE_PONG:
+            if self.ping_sent is not None:
+                self.server.stats.ping_time = time.time() - self.ping_sent
+                self.ping_sent = None
+        elif opcode == _OPCODE_CLOSE:
+            logger.info('Websocket of connection %s closed by the remote server', self.local.index)
+            self.close()
+
+    def _schedule_ping(self):
+        self.ping_handle = self.server.loop.call_later(PING_TIMEOUT, self._ping)
+
+    def _ping(self):
+        now = time.time()
+        if self.ping_sent is not None and now - self.ping_sent > PING_TIMEOUT:
+            logger.warning('Websocket of connection %s is not responding, closing it', self.local.index)
+            self.close()
+            return
+        if self.ping_sent is None and now - self.last_activity >= PING_INTERVAL:
+            self._send_frame(_OPCODE_PING, b'')
+            self.ping_sent = now
+        self._schedule_ping()
 
 
 # pylint: disable=no-member,too-many-instance-attributes,bare-except,no-self-use
 class TunnelServer(object):
+    """
+    forwards every connection to the local port through its own websocket to the remote server,
+    with all the connections served concurrently by an asyncio event loop
+    """
+
     def __init__(self, local_addr, local_port, remote_addr, remote_user_name, remote_password):
         self.local_addr = local_addr
         self.local_port = local_port
@@ -44,8 +353,9 @@ class TunnelServer(object):
         self.remote_addr = remote_addr
         self.remote_user_name = remote_user_name
         self.remote_password = remote_password
-        self.client = None
-        self.ws = None
+        self.loop = None
+        self.index = 0
+        self.stats = TunnelStats()
         logger.info('Creating a socket on port: %s', self.local_port)
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         logger.info('Setting socket options')
@@ -102,89 +412,52 @@ class TunnelServer(object):
             return True
         return False
 
-    def _listen(self):
-        self.sock.listen(100)
-        index = 0
-        basic_auth_string = self.create_basic_auth()
-        while True:
-            self.client, _address = self.sock.accept()
-            self.client.settimeout(1800)
-            host = 'wss://{}{}'.format(self.remote_addr, '.scm.azurewebsites.net/AppServiceTunnel/Tunnel.ashx')
-            basic_auth_header = 'Authorization: Basic {}'.format(basic_auth_string)
-            cli_logger = get_logger()  # get CLI logger which has the level set through command lines
-            is_verbose = any(handler.level <= logs.INFO for handler in cli_logger.handlers)
-            if is_verbose:
-                logger.info('Websocket tracing enabled')
-                websocket.enableTrace(True)
-            else:
-                logger.warning('Websocket tracing disabled, use --verbose flag to enable')
-                websocket.enableTrace(False)
-            self.ws = create_connection(host,
-                                        sockopt=((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),),
-                                        class_=TunnelWebSocket,
-                                        header=[basic_auth_header],
-                                        sslopt={'cert_reqs': ssl.CERT_NONE},
-                                        enable_multithread=True)
-            logger.info('Websocket, connected status: %s', self.ws.connected)
-            index = index + 1
-            logger.info('Got debugger connection... index: %s', index)
-            debugger_thread = Thread(target=self._listen_to_client, args=(self.client, self.ws, index))
-            web_socket_thread = Thread(target=self._listen_to_web_socket, args=(self.client, self.ws, index))
-            debugger_thread.start()
-            web_socket_thread.start()
-            logger.info('Both debugger and websocket threads started...')
-            logger.warning('Successfully connected to local server..')
-            debugger_thread.join()
-            web_socket_thread.join()
-            logger.info('Both debugger and websocket threads stopped...')
-            logger.warning('Stopped local server..')
-
-    def _listen_to_web_socket(self, client, ws_socket, index):
-        while True:
-            try:
-                logger.info('Waiting for websocket data, connection status: %s, index: %s', ws_socket.connected, index)
-                data = ws_socket.recv()
-                logger.info('Received websocket data: %s, index: %s', data, index)
-                if data:
-                    # Set the response to echo back the recieved data
-                    response = data
-                    logger.info('Sending to debugger, response: %s, index: %s', response, index)
-                    client.sendall(response)
-                    logger.info('Done sending to debugger, index: %s', index)
-                else:
-                    logger.info('Client disconnected!, index: %s', index)
-                    client.close()
-                    ws_socket.close()
-                    break
-            except:
-                traceback.print_exc(file=sys.stdout)
-                client.close()
-                ws_socket.close()
-                return False
-
-    def _listen_to_client(self, client, ws_socket, index):
-        while True:
-            try:
-                logger.info('Waiting for debugger data, index: %s', index)
-                buf = bytearray(4096)
-                nbytes = client.recv_into(buf, 4096)
-                logger.info('Received debugger data, nbytes: %s, index: %s', nbytes, index)
-                if nbytes > 0:
-                    responseData = buf[0:nbytes]
-                    logger.info('Sending to websocket, response data: %s, index: %s', responseData, index)
-                    ws_socket.send_binary(responseData)
-                    logger.info('Done sending to websocket, index: %s', index)
-                else:
-                    logger.warning('Client disconnected %s', index)
-                    client.close()
-                    ws_socket.close()
-                    break
-            except:
-                traceback.print_exc(file=sys.stdout)
-                client.close()
-                ws_socket.close()
-                return False
+    def next_index(self):
+        self.index += 1
+        return self.index
+
+    def connection_made(self, local):
+        self.stats.connections += 1
+        self.stats.active_connections += 1
+        logger.info('Got connection... index: %s', local.index)
+        self.loop.create_task(self._connect_websocket(local))
+
+    def connection_lost(self, local):
+        self.stats.active_connections -= 1
+        logger.info('Connection %s closed, sent: %s bytes, received: %s bytes', local.index, local.bytes_sent,
+                    local.bytes_received)
+        logger.info('Tunnel statistics: %s', self.stats.to_dict())
+
+    async def _connect_websocket(self, local):
+        host = '{}.scm.azurewebsites.net'.format(self.remote_addr)
+        # like before, the certificate of the scm site isn't verified
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        start = time.time()
+        try:
+            _, websocket = await self.loop.create_connection(
+                lambda: _WebSocketConnection(self, local, host, self.create_basic_auth()), host, 443, ssl=ssl_context)
+            await websocket.handshake
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.warning('Failed to connect to the remote server for connection %s: %s', local.index, ex)
+            local.close()
+            return
+
+        connect_time = time.time() - start
+        self.stats.add_connect_time(connect_time)
+        if local.transport.is_closing():
+            websocket.close()
+            return
+        local.websocket = websocket
+        local.transport.resume_reading()
+        logger.warning('Successfully connected to local server.. index: %s, websocket connected in %d ms',
+                       local.index, connect_time * 1000)
 
     def start_server(self):
         logger.warning('Start your favorite client and connect to port %s', self.local_port)
-        self._listen()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(
+            self.loop.create_server(lambda: _LocalConnection(self), sock=self.sock, backlog=100))
+        self.loop.run_forever()